@@ -0,0 +1,42 @@
+"""Store admin audit details as structured JSON.
+
+Revision ID: 20261019_02
+Revises: 20261019_01
+Create Date: 2026-10-19 11:00:00.000000
+"""
+
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.audit import parse_legacy_details
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_02"
+down_revision: Union[str, None] = "20261019_01"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.text("SELECT id, action, details FROM admin_audit_logs WHERE details IS NOT NULL")
+    ).fetchall()
+    updates = [
+        {"id": row.id, "details": json.dumps(parse_legacy_details(row.action, row.details), ensure_ascii=False)}
+        for row in rows
+    ]
+    if updates:
+        conn.execute(sa.text("UPDATE admin_audit_logs SET details = :details WHERE id = :id"), updates)
+
+    if conn.dialect.name == "postgresql":
+        op.execute("ALTER TABLE admin_audit_logs ALTER COLUMN details TYPE JSONB USING details::jsonb")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("ALTER TABLE admin_audit_logs ALTER COLUMN details TYPE TEXT USING details::text")
@@ -0,0 +1,35 @@
+"""Add admin audit log indexes for filtered keyset pagination.
+
+Revision ID: 20261019_03
+Revises: 20261019_02
+Create Date: 2026-10-19 12:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_03"
+down_revision: Union[str, None] = "20261019_02"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_admin_audit_logs_created_at_id", "admin_audit_logs", ["created_at", "id"])
+    op.create_index(
+        "ix_admin_audit_logs_admin_created", "admin_audit_logs", ["admin_user_id", "created_at", "id"]
+    )
+    op.create_index(
+        "ix_admin_audit_logs_target_created", "admin_audit_logs", ["target_user_id", "created_at", "id"]
+    )
+    op.create_index("ix_admin_audit_logs_action_created", "admin_audit_logs", ["action", "created_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_admin_audit_logs_action_created", table_name="admin_audit_logs")
+    op.drop_index("ix_admin_audit_logs_target_created", table_name="admin_audit_logs")
+    op.drop_index("ix_admin_audit_logs_admin_created", table_name="admin_audit_logs")
+    op.drop_index("ix_admin_audit_logs_created_at_id", table_name="admin_audit_logs")
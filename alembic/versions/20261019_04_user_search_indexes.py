@@ -0,0 +1,54 @@
+"""Add username search indexes (pg_trgm on Postgres, FTS5 on SQLite).
+
+Revision ID: 20261019_04
+Revises: 20261019_03
+Create Date: 2026-10-19 13:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_04"
+down_revision: Union[str, None] = "20261019_03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (username gin_trgm_ops)")
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+        "username, content='users', content_rowid='id', tokenize='trigram')"
+    )
+    op.execute("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+        "INSERT INTO users_fts(rowid, username) VALUES (new.id, new.username); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+        "INSERT INTO users_fts(users_fts, rowid, username) VALUES ('delete', old.id, old.username); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username ON users BEGIN "
+        "INSERT INTO users_fts(users_fts, rowid, username) VALUES ('delete', old.id, old.username); "
+        "INSERT INTO users_fts(rowid, username) VALUES (new.id, new.username); END"
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_users_username_trgm")
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS users_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS users_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS users_fts_ai")
+    op.execute("DROP TABLE IF EXISTS users_fts")
@@ -0,0 +1,63 @@
+"""Add listing closed_at, listings_archive and scheduler leases.
+
+Revision ID: 20261019_05
+Revises: 20261019_04
+Create Date: 2026-10-19 14:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_05"
+down_revision: Union[str, None] = "20261019_04"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("listings", sa.Column("closed_at", sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE listings SET closed_at = created_at WHERE status <> 'active' AND closed_at IS NULL")
+    op.create_index("ix_listings_status_created_at", "listings", ["status", "created_at"], unique=False)
+    op.create_index("ix_listings_status_closed_at", "listings", ["status", "closed_at"], unique=False)
+
+    op.create_table(
+        "listings_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("address", sa.String(), nullable=False),
+        sa.Column("payment", sa.String(), nullable=False),
+        sa.Column("contacts", sa.String(), nullable=False),
+        sa.Column("latitude", sa.Float(), nullable=False),
+        sa.Column("longitude", sa.Float(), nullable=False),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("closed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_listings_archive_user_id"), "listings_archive", ["user_id"], unique=False)
+
+    op.create_table(
+        "scheduler_leases",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("holder", sa.String(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("scheduler_leases")
+    op.drop_index(op.f("ix_listings_archive_user_id"), table_name="listings_archive")
+    op.drop_table("listings_archive")
+    op.drop_index("ix_listings_status_closed_at", table_name="listings")
+    op.drop_index("ix_listings_status_created_at", table_name="listings")
+    op.drop_column("listings", "closed_at")
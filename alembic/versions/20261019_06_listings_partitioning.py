@@ -0,0 +1,35 @@
+"""Partition listings by status and month on PostgreSQL.
+
+Revision ID: 20261019_06
+Revises: 20261019_05
+Create Date: 2026-10-19 15:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from backend.partitions import convert_listings_to_partitioned, convert_listings_to_plain
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_06"
+down_revision: Union[str, None] = "20261019_05"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # На SQLite listings остаётся обычной таблицей
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    moved = convert_listings_to_partitioned(bind)
+    print(f"listings секционирована, перенесено строк: {moved}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    convert_listings_to_plain(bind)
@@ -0,0 +1,33 @@
+"""Add listing_stats for view counters and popularity.
+
+Revision ID: 20261019_07
+Revises: 20261019_06
+Create Date: 2026-10-19 16:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_07"
+down_revision: Union[str, None] = "20261019_06"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "listing_stats",
+        sa.Column("listing_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("views", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("score", sa.Float(), nullable=True),
+        sa.Column("last_viewed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("listing_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("listing_stats")
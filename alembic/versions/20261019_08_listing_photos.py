@@ -0,0 +1,43 @@
+"""Add listing_photos.
+
+Revision ID: 20261019_08
+Revises: 20261019_07
+Create Date: 2026-10-19 17:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_08"
+down_revision: Union[str, None] = "20261019_07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "listing_photos",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("listing_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("digest", sa.String(length=64), nullable=False),
+        sa.Column("width", sa.Integer(), nullable=False),
+        sa.Column("height", sa.Integer(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("listing_id", "position", name="uq_listing_photos_listing_position"),
+    )
+    op.create_index(op.f("ix_listing_photos_id"), "listing_photos", ["id"], unique=False)
+    op.create_index(op.f("ix_listing_photos_digest"), "listing_photos", ["digest"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_listing_photos_digest"), table_name="listing_photos")
+    op.drop_index(op.f("ix_listing_photos_id"), table_name="listing_photos")
+    op.drop_table("listing_photos")
@@ -0,0 +1,52 @@
+"""Add listing signatures and LSH buckets for near-duplicate detection.
+
+Revision ID: 20261019_09
+Revises: 20261019_08
+Create Date: 2026-10-19 18:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.similarity import backfill_signatures
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_09"
+down_revision: Union[str, None] = "20261019_08"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "listing_signatures",
+        sa.Column("listing_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("minhash", sa.LargeBinary(), nullable=True),
+        sa.Column("duplicate_of", sa.Integer(), nullable=True),
+        sa.Column("similarity", sa.Float(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint("listing_id"),
+    )
+    op.create_index("ix_listing_signatures_duplicate_of", "listing_signatures", ["duplicate_of"], unique=False)
+    op.create_table(
+        "listing_signature_buckets",
+        sa.Column("bucket", sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column("listing_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.PrimaryKeyConstraint("bucket", "listing_id"),
+    )
+    op.create_index(
+        "ix_listing_signature_buckets_listing_id", "listing_signature_buckets", ["listing_id"], unique=False
+    )
+    # Подписи уже опубликованных активных объявлений
+    backfill_signatures(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_index("ix_listing_signature_buckets_listing_id", table_name="listing_signature_buckets")
+    op.drop_table("listing_signature_buckets")
+    op.drop_index("ix_listing_signatures_duplicate_of", table_name="listing_signatures")
+    op.drop_table("listing_signatures")
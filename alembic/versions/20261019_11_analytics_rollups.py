@@ -0,0 +1,51 @@
+"""Add analytics rollup tables for the admin dashboard.
+
+Revision ID: 20261019_11
+Revises: 20261019_10
+Create Date: 2026-10-19 20:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_11"
+down_revision: Union[str, None] = "20261019_10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "analytics_rollups",
+        sa.Column("period", sa.String(length=8), nullable=False),
+        sa.Column("metric", sa.String(), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("listing_type", sa.String(), server_default="", nullable=False),
+        sa.Column("cell", sa.String(), server_default="", nullable=False),
+        sa.Column("value", sa.BigInteger(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("period", "metric", "bucket_start", "listing_type", "cell"),
+    )
+    op.create_table(
+        "analytics_cursors",
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("last_id", sa.BigInteger(), nullable=True),
+        sa.Column("last_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("source"),
+    )
+    op.create_table(
+        "analytics_active_users",
+        sa.Column("period", sa.String(length=8), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("user_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.PrimaryKeyConstraint("period", "bucket_start", "user_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("analytics_active_users")
+    op.drop_table("analytics_cursors")
+    op.drop_table("analytics_rollups")
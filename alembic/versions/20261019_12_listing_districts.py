@@ -0,0 +1,36 @@
+"""Add district_id to listings and listings_archive.
+
+Revision ID: 20261019_12
+Revises: 20261019_11
+Create Date: 2026-10-19 21:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.districts import backfill_districts
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_12"
+down_revision: Union[str, None] = "20261019_11"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("listings", sa.Column("district_id", sa.SmallInteger(), nullable=True))
+    op.add_column("listings_archive", sa.Column("district_id", sa.SmallInteger(), nullable=True))
+    op.create_index(
+        "ix_listings_status_district_id", "listings", ["status", "district_id", "type"], unique=False
+    )
+    # Районы уже опубликованных объявлений по встроенным границам
+    backfill_districts(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_index("ix_listings_status_district_id", table_name="listings")
+    op.drop_column("listings_archive", "district_id")
+    op.drop_column("listings", "district_id")
@@ -0,0 +1,29 @@
+"""Normalize SQLite admin audit timestamps for keyset pagination.
+
+Revision ID: 20261019_13
+Revises: 20261019_12
+Create Date: 2026-10-19 22:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from backend.database import normalize_sqlite_timestamps
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_13"
+down_revision: Union[str, None] = "20261019_12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Записи со значением по умолчанию CURRENT_TIMESTAMP хранятся без микросекунд
+    normalize_sqlite_timestamps(op.get_bind(), "admin_audit_logs", ("created_at",))
+
+
+def downgrade() -> None:
+    # Формат с микросекундами читается так же, возвращать старый не нужно
+    pass
@@ -0,0 +1,37 @@
+"""Add listing_idempotency_keys for replayed listing creation.
+
+Revision ID: 20261019_14
+Revises: 20261019_13
+Create Date: 2026-10-19 22:30:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_14"
+down_revision: Union[str, None] = "20261019_13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "listing_idempotency_keys",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("listing_id", sa.Integer(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("user_id", "key"),
+    )
+    op.create_index(
+        "ix_listing_idempotency_keys_expires_at", "listing_idempotency_keys", ["expires_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_listing_idempotency_keys_expires_at", table_name="listing_idempotency_keys")
+    op.drop_table("listing_idempotency_keys")
@@ -0,0 +1,31 @@
+"""Normalize SQLite listing closed_at timestamps for the analytics cursor.
+
+Revision ID: 20261019_15
+Revises: 20261019_14
+Create Date: 2026-10-19 23:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from backend.database import normalize_sqlite_timestamps
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_15"
+down_revision: Union[str, None] = "20261019_14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 20261019_05 скопировала closed_at из created_at, а там CURRENT_TIMESTAMP без микросекунд
+    bind = op.get_bind()
+    normalize_sqlite_timestamps(bind, "listings", ("closed_at",))
+    normalize_sqlite_timestamps(bind, "listings_archive", ("closed_at",))
+
+
+def downgrade() -> None:
+    # Формат с микросекундами читается так же, возвращать старый не нужно
+    pass
@@ -0,0 +1,506 @@
+"""
+Подписки на новые объявления («сохранённые поиски»).
+
+Новое объявление ставится в очередь, фоновая задача сопоставляет его с
+подписками через индексы (сетка по области + инвертированный индекс по
+ключевым словам) и пачками рассылает совпадения через Telegram-бота.
+
+Индекс подписок свой у каждого воркера. Роуты меняют подписки только в БД и
+публикуют subscription_changed или user_changed (бан, разбан) в шину
+инвалидации; каждый воркер, включая свой, перечитывает подписки этого
+пользователя. Событие без ключа перечитывает индекс целиком. Подписчик шины
+только запоминает id и будит фоновый поток перечитывания: publish из
+обработчика запроса не ходит в БД в цикле событий, а серия событий
+сливается в одно перечитывание.
+"""
+
+import asyncio
+import json
+import math
+import os
+import queue
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Iterable, Optional, Protocol
+
+from .invalidation import subscribe
+
+
+# Размеры ячеек сетки (в градусах) для разных уровней.
+# Подписка кладётся на самый мелкий уровень, где её область покрывает не более 2x2 ячеек,
+# поэтому поиск — это одна проверка ячейки на каждом уровне.
+GRID_LEVELS = (0.01, 0.04, 0.16, 0.64, 2.56)
+
+# Упрощённая «основа» слова: русские окончания отбрасываются обрезкой до 5 символов.
+KEYWORD_STEM_LENGTH = 5
+MAX_RADIUS_KM = 50.0
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_AMOUNT_RE = re.compile(r"\d+(?:[ \u00a0]\d{3})*(?:[.,]\d+)?")
+
+
+def keyword_stems(text: Optional[str]) -> frozenset:
+    if not text:
+        return frozenset()
+    return frozenset(
+        word[:KEYWORD_STEM_LENGTH]
+        for word in _WORD_RE.findall(text.lower())
+        if len(word) >= 2
+    )
+
+
+def parse_payment_amount(payment: Optional[str]) -> Optional[float]:
+    """Первое число из свободного текста оплаты: «от 1 500 руб/час» -> 1500.0"""
+    if not payment:
+        return None
+    match = _AMOUNT_RE.search(payment)
+    if not match:
+        return None
+    raw = match.group(0).replace(" ", "").replace("\u00a0", "").replace(",", ".")
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1_r, lat2_r = math.radians(lat1), math.radians(lat2)
+    d_lat = lat2_r - lat1_r
+    d_lon = math.radians(lon2 - lon1)
+    a = math.sin(d_lat / 2) ** 2 + math.cos(lat1_r) * math.cos(lat2_r) * math.sin(d_lon / 2) ** 2
+    return 6371.0 * 2 * math.asin(min(1.0, math.sqrt(a)))
+
+
+@dataclass
+class SubscriptionEntry:
+    id: int
+    user_id: int
+    chat_id: int
+    latitude: float
+    longitude: float
+    radius_km: float
+    type: Optional[str] = None
+    keyword: Optional[str] = None
+    min_payment: Optional[float] = None
+    stems: frozenset = field(default_factory=frozenset)
+    level: int = 0
+    cells: tuple = ()
+    index_stem: Optional[str] = None
+
+
+class SubscriptionMatcher:
+    """
+    Индекс подписок в памяти.
+
+    Подписки лежат в многоуровневой сетке по своей области; подписки с ключевым
+    словом дополнительно разложены по самой длинной основе слова, так что для
+    объявления просматриваются только ячейки его точки и только основы из его текста.
+    """
+
+    def __init__(self):
+        self._entries: dict[int, SubscriptionEntry] = {}
+        self._by_user: dict[int, set[int]] = defaultdict(set)
+        # (основа слова или None, уровень, ячейка) -> id подписок
+        self._index: dict[tuple, set[int]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, entry: SubscriptionEntry) -> None:
+        self.remove(entry.id)
+        entry.stems = keyword_stems(entry.keyword)
+        entry.index_stem = max(entry.stems, key=len) if entry.stems else None
+        entry.level, entry.cells = self._cells_for_area(entry)
+        for key in self._index_keys(entry):
+            self._index[key].add(entry.id)
+        self._entries[entry.id] = entry
+        self._by_user[entry.user_id].add(entry.id)
+
+    def remove(self, subscription_id: int) -> None:
+        entry = self._entries.pop(subscription_id, None)
+        if not entry:
+            return
+        for key in self._index_keys(entry):
+            bucket = self._index.get(key)
+            if bucket is not None:
+                bucket.discard(entry.id)
+                if not bucket:
+                    del self._index[key]
+        user_ids = self._by_user.get(entry.user_id)
+        if user_ids is not None:
+            user_ids.discard(entry.id)
+            if not user_ids:
+                del self._by_user[entry.user_id]
+
+    def remove_user(self, user_id: int) -> None:
+        for subscription_id in list(self._by_user.get(user_id, ())):
+            self.remove(subscription_id)
+
+    def match(self, listing: dict) -> list[SubscriptionEntry]:
+        lat = listing["latitude"]
+        lon = listing["longitude"]
+        listing_stems = keyword_stems(f"{listing.get('title') or ''} {listing.get('description') or ''}")
+        candidates: set[int] = set()
+        for level, cell_size in enumerate(GRID_LEVELS):
+            cell = (math.floor(lat / cell_size), math.floor(lon / cell_size))
+            for stem in (None, *listing_stems):
+                bucket = self._index.get((stem, level, cell))
+                if bucket:
+                    candidates.update(bucket)
+
+        amount = parse_payment_amount(listing.get("payment"))
+        matched = []
+        for subscription_id in candidates:
+            entry = self._entries[subscription_id]
+            if entry.user_id == listing.get("user_id"):
+                continue
+            if entry.type and entry.type != listing.get("type"):
+                continue
+            if entry.min_payment is not None and (amount is None or amount < entry.min_payment):
+                continue
+            if entry.stems and not entry.stems <= listing_stems:
+                continue
+            if distance_km(entry.latitude, entry.longitude, lat, lon) > entry.radius_km:
+                continue
+            matched.append(entry)
+        return matched
+
+    @staticmethod
+    def _index_keys(entry: SubscriptionEntry) -> list[tuple]:
+        return [(entry.index_stem, entry.level, cell) for cell in entry.cells]
+
+    @staticmethod
+    def _cells_for_area(entry: SubscriptionEntry) -> tuple[int, tuple]:
+        d_lat = entry.radius_km / 111.0
+        d_lon = entry.radius_km / (111.0 * max(0.01, math.cos(math.radians(entry.latitude))))
+        for level, cell_size in enumerate(GRID_LEVELS):
+            if cell_size >= 2 * max(d_lat, d_lon) or level == len(GRID_LEVELS) - 1:
+                break
+        rows = range(math.floor((entry.latitude - d_lat) / cell_size), math.floor((entry.latitude + d_lat) / cell_size) + 1)
+        cols = range(math.floor((entry.longitude - d_lon) / cell_size), math.floor((entry.longitude + d_lon) / cell_size) + 1)
+        return level, tuple((row, col) for row in rows for col in cols)
+
+
+class AlertSender(Protocol):
+    def send_message(self, chat_id: int, text: str) -> bool:
+        ...
+
+
+class TelegramBotSender:
+    """Отправка сообщений через Bot API. api_base можно направить на локальный фейковый сервер."""
+
+    def __init__(self, token: str, api_base: str = "https://api.telegram.org", timeout: float = 10.0):
+        self.token = token
+        self.api_base = api_base.rstrip("/")
+        self.timeout = timeout
+
+    def send_message(self, chat_id: int, text: str) -> bool:
+        payload = json.dumps(
+            {"chat_id": chat_id, "text": text, "disable_web_page_preview": True}
+        ).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.api_base}/bot{self.token}/sendMessage",
+            data=payload,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read().decode("utf-8") or "{}")
+                return bool(body.get("ok"))
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            print(f"Не удалось отправить уведомление chat_id={chat_id}: {e}")
+            return False
+
+
+def build_sender_from_env() -> Optional[AlertSender]:
+    token = os.getenv("TELEGRAM_BOT_TOKEN", "")
+    if not token:
+        return None
+    api_base = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+    return TelegramBotSender(token=token, api_base=api_base)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def subscription_entry(subscription, chat_id: int) -> SubscriptionEntry:
+    return SubscriptionEntry(
+        id=subscription.id,
+        user_id=subscription.user_id,
+        chat_id=chat_id,
+        latitude=subscription.latitude,
+        longitude=subscription.longitude,
+        radius_km=subscription.radius_km,
+        type=subscription.type,
+        keyword=subscription.keyword,
+        min_payment=subscription.min_payment,
+    )
+
+
+def format_alert_message(listings: list[dict], skipped: int = 0) -> str:
+    lines = ["Новые объявления по вашей подписке:"]
+    for listing in listings:
+        type_text = "Задача" if listing.get("type") == "task" else "Исполнитель"
+        lines.append(
+            f"• {type_text}: {listing.get('title')} — {listing.get('payment')} ({listing.get('address')})"
+        )
+    if skipped:
+        lines.append(f"…и ещё {skipped}. Откройте карту, чтобы посмотреть все.")
+    return "\n".join(lines)
+
+
+class AlertDispatcher:
+    """
+    Очередь новых объявлений и фоновая рассылка совпадений.
+
+    Раз в batch_interval секунд очередь вычитывается целиком, совпадения
+    группируются по получателю (одно сообщение на пользователя за пачку),
+    а на каждого пользователя действует ограничение user_limit доставленных
+    сообщений за user_window секунд. Неудачная отправка в лимит не идёт, а
+    получатели без отправок в окне удаляются из учёта.
+    """
+
+    def __init__(
+        self,
+        matcher: Optional[SubscriptionMatcher] = None,
+        sender: Optional[AlertSender] = None,
+        batch_interval: float = 5.0,
+        user_limit: int = 10,
+        user_window: float = 3600.0,
+        max_listings_per_message: int = 5,
+    ):
+        self.matcher = matcher or SubscriptionMatcher()
+        self.sender = sender
+        self.batch_interval = batch_interval
+        self.user_limit = user_limit
+        self.user_window = user_window
+        self.max_listings_per_message = max_listings_per_message
+        self._queue: "queue.SimpleQueue[dict]" = queue.SimpleQueue()
+        # Готовые сообщения (например, об истечении объявлений): уходят с тем же лимитом на получателя
+        self._notices: "queue.SimpleQueue[tuple[int, str]]" = queue.SimpleQueue()
+        self._sent_at: dict[int, deque] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Индекс меняет поток перечитывания, а сопоставляет цикл событий
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._reload_users: set[int] = set()
+        self._reload_all = False
+        self._reload_thread: Optional[threading.Thread] = None
+        self._reloaded = threading.Event()
+        self._reloaded.set()
+
+    @classmethod
+    def from_env(cls) -> "AlertDispatcher":
+        return cls(
+            sender=build_sender_from_env(),
+            batch_interval=_env_float("ALERTS_BATCH_INTERVAL_SECONDS", 5.0),
+            user_limit=int(_env_float("ALERTS_USER_LIMIT", 10)),
+            user_window=_env_float("ALERTS_USER_WINDOW_SECONDS", 3600.0),
+        )
+
+    def set_sender(self, sender: Optional[AlertSender]) -> None:
+        self.sender = sender
+
+    @staticmethod
+    def _active_subscriptions(db, *filters) -> list:
+        from .models import Subscription, User
+
+        return (
+            db.query(Subscription, User.telegram_id)
+            .join(User, User.id == Subscription.user_id)
+            .filter(Subscription.is_active.is_(True), User.is_banned.is_(False), *filters)
+            .all()
+        )
+
+    def load(self, db) -> int:
+        """Строит индекс заново по активным подпискам незаблокированных пользователей"""
+        rows = self._active_subscriptions(db)
+        matcher = SubscriptionMatcher()
+        for subscription, telegram_id in rows:
+            matcher.add(subscription_entry(subscription, telegram_id))
+        with self._lock:
+            self.matcher = matcher
+        return len(rows)
+
+    def load_user(self, db, user_id: int) -> None:
+        """Перечитывает подписки пользователя: у заблокированного в индексе не остаётся ни одной"""
+        from .models import Subscription
+
+        rows = self._active_subscriptions(db, Subscription.user_id == user_id)
+        with self._lock:
+            self.matcher.remove_user(user_id)
+            for subscription, telegram_id in rows:
+                self.matcher.add(subscription_entry(subscription, telegram_id))
+
+    def on_user_changed(self, event: str, key: Optional[str]) -> None:
+        """subscription_changed / user_changed из шины: key — users.id, None — перечитать всё"""
+        with self._reload_lock:
+            if key is None:
+                self._reload_all = True
+            else:
+                self._reload_users.add(int(key))
+            self._reloaded.clear()
+            if self._reload_thread is None:
+                self._reload_thread = threading.Thread(target=self._reload_pending, name="alerts-reload", daemon=True)
+                self._reload_thread.start()
+
+    def _reload_pending(self) -> None:
+        from .database import SessionLocal
+
+        while True:
+            with self._reload_lock:
+                users, reload_all = self._reload_users, self._reload_all
+                self._reload_users, self._reload_all = set(), False
+                if not users and not reload_all:
+                    self._reload_thread = None
+                    self._reloaded.set()
+                    return
+            db = SessionLocal()
+            try:
+                if reload_all:
+                    self.load(db)
+                else:
+                    for user_id in sorted(users):
+                        self.load_user(db, user_id)
+            except Exception as e:
+                print(f"Не удалось перечитать подписки, повтор через секунду: {e}")
+                with self._reload_lock:
+                    self._reload_users |= users
+                    self._reload_all = self._reload_all or reload_all
+                time.sleep(1.0)
+            finally:
+                db.close()
+
+    def wait_reloaded(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт, пока фоновый поток применит все полученные события"""
+        return self._reloaded.wait(timeout)
+
+    def enqueue(self, listing: dict) -> None:
+        if len(self.matcher):
+            self._queue.put(listing)
+
+    def notify(self, chat_id: int, text: str) -> None:
+        """Ставит готовое сообщение в очередь рассылки; отправка — в следующей пачке"""
+        if self.sender:
+            self._notices.put((chat_id, text))
+
+    @staticmethod
+    def _drain_queue(source: queue.SimpleQueue) -> list:
+        items = []
+        while True:
+            try:
+                items.append(source.get_nowait())
+            except queue.Empty:
+                return items
+
+    def drain(self) -> list[dict]:
+        return self._drain_queue(self._queue)
+
+    def build_batch(self, listings: Iterable[dict], now: Optional[float] = None) -> list[tuple[int, str]]:
+        """Сопоставляет пачку объявлений и возвращает сообщения (chat_id, text) с учётом лимитов."""
+        now = time.monotonic() if now is None else now
+        per_chat: dict[int, list[dict]] = {}
+        seen: set[tuple[int, int]] = set()
+        with self._lock:
+            matches = [(listing, self.matcher.match(listing)) for listing in listings]
+        for listing, entries in matches:
+            for entry in entries:
+                key = (entry.chat_id, listing["id"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                per_chat.setdefault(entry.chat_id, []).append(listing)
+
+        messages = []
+        for chat_id, matched in per_chat.items():
+            if not self._allow(chat_id, now):
+                continue
+            shown = matched[: self.max_listings_per_message]
+            messages.append((chat_id, format_alert_message(shown, skipped=len(matched) - len(shown))))
+        return messages
+
+    def _recent(self, chat_id: int, now: float) -> Optional[deque]:
+        """Отправки получателю за окно; получатель без них удаляется из учёта"""
+        sent = self._sent_at.get(chat_id)
+        if sent is None:
+            return None
+        while sent and now - sent[0] >= self.user_window:
+            sent.popleft()
+        if not sent:
+            del self._sent_at[chat_id]
+            return None
+        return sent
+
+    def _allow(self, chat_id: int, now: float) -> bool:
+        sent = self._recent(chat_id, now)
+        return sent is None or len(sent) < self.user_limit
+
+    def record_sent(self, chat_id: int, now: Optional[float] = None) -> None:
+        self._sent_at.setdefault(chat_id, deque()).append(time.monotonic() if now is None else now)
+
+    def prune(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        for chat_id in list(self._sent_at):
+            self._recent(chat_id, now)
+
+    async def _send(self, chat_id: int, text: str, now: float) -> bool:
+        if await asyncio.to_thread(self.sender.send_message, chat_id, text):
+            self.record_sent(chat_id, now)
+            return True
+        return False
+
+    async def flush(self) -> int:
+        listings = self.drain()
+        notices = self._drain_queue(self._notices)
+        if not (listings or notices) or not self.sender:
+            return 0
+        now = time.monotonic()
+        self.prune(now)
+        delivered = 0
+        for chat_id, text in self.build_batch(listings, now):
+            delivered += await self._send(chat_id, text, now)
+        for chat_id, text in notices:
+            if not self._allow(chat_id, now):
+                # Получатель исчерпал лимит: сообщение подождёт следующей пачки
+                self._notices.put((chat_id, text))
+                continue
+            delivered += await self._send(chat_id, text, now)
+        return delivered
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.batch_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Ошибка рассылки уведомлений по подпискам: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+
+alert_dispatcher = AlertDispatcher.from_env()
+subscribe("subscription_changed", alert_dispatcher.on_user_changed)
+subscribe("user_changed", alert_dispatcher.on_user_changed)
@@ -0,0 +1,459 @@
+"""
+Аналитика спроса и предложения для админки на заранее агрегированных рядах.
+
+Дашборд (/api/admin/stats) читает только analytics_rollups — несколько сотен
+строк за любой диапазон — и никогда не сканирует listings, users или журнал.
+Строка rollup — счётчик (period, metric, bucket_start, listing_type, cell):
+
+  - period hour и day, cell = '' — временные ряды по городу;
+  - period day и week, cell = 'r:c' — тепловая карта по ячейкам сетки
+    ANALYTICS_CELL_LAT x ANALYTICS_CELL_LON градусов (~2 км).
+
+Границы дней и недель — по ANALYTICS_TIMEZONE (по умолчанию Минск).
+
+Метрики:
+    listings_created, listings_closed, listings_expired — по типу объявления;
+    new_users, active_users — новые и активные (с авторизованными запросами);
+    audit_<action> — действия из журнала (ban_user, admin_close_listing, ...).
+
+Счётчики пополняет фоновое задание refresh_analytics (планировщик, только
+лидер) по курсорам analytics_cursors: новые строки listings/users/журнала —
+по id, закрытия — по (closed_at, id). Каждая пачка — одна транзакция:
+приращения добавляются к rollup (value = value + delta) вместе со сдвигом
+курсора, поэтому повторный запуск ничего не считает дважды. Строки моложе
+ANALYTICS_SETTLE_SECONDS ждут следующего запуска: к этому времени
+параллельные транзакции с меньшими id успевают закоммититься.
+
+Активных пользователей отмечает каждый воркер в памяти (ActivityTracker,
+из _get_current_user) и раз в ANALYTICS_ACTIVITY_FLUSH_SECONDS сбрасывает
+в analytics_active_users; агрегатор пересчитывает по ним текущий и прошлый
+час/день и удаляет более старые строки.
+
+При первом запуске история берётся из listings и listings_archive; секции,
+отсоединённые от секционированной listings до включения аналитики, не
+учитываются.
+"""
+
+import asyncio
+import math
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import and_, bindparam, delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .database import engine
+from .lifecycle import CLOSED_STATUSES
+from .models import (
+    AdminAuditLog,
+    AnalyticsActiveUser,
+    AnalyticsCursor,
+    AnalyticsRollup,
+    Listing,
+    ListingArchive,
+    User,
+)
+
+ANALYTICS_INTERVAL_SECONDS = float(os.getenv("ANALYTICS_INTERVAL_SECONDS", "60"))
+ANALYTICS_SETTLE_SECONDS = float(os.getenv("ANALYTICS_SETTLE_SECONDS", "15"))
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "5000"))
+ANALYTICS_ACTIVITY_FLUSH_SECONDS = float(os.getenv("ANALYTICS_ACTIVITY_FLUSH_SECONDS", "30"))
+ANALYTICS_TIMEZONE = ZoneInfo(os.getenv("ANALYTICS_TIMEZONE", "Europe/Minsk"))
+ANALYTICS_CELL_LAT = float(os.getenv("ANALYTICS_CELL_LAT", "0.02"))
+ANALYTICS_CELL_LON = float(os.getenv("ANALYTICS_CELL_LON", "0.032"))
+
+# Диапазон дашборда: длина, период рядов, период тепловой карты
+STATS_RANGES = {
+    "day": (timedelta(hours=24), "hour", "day"),
+    "week": (timedelta(days=7), "day", "week"),
+    "month": (timedelta(days=30), "day", "week"),
+}
+HEATMAP_METRIC = "listings_created"
+
+_ROLLUP_KEY = ("period", "metric", "bucket_start", "listing_type", "cell")
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite отдаёт время без зоны, а пишется оно в UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def hour_start(at: datetime) -> datetime:
+    return _utc(at).replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(at: datetime) -> datetime:
+    local = _utc(at).astimezone(ANALYTICS_TIMEZONE)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0).astimezone(timezone.utc)
+
+
+def week_start(at: datetime) -> datetime:
+    local = _utc(at).astimezone(ANALYTICS_TIMEZONE)
+    monday = local.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=local.weekday())
+    return monday.astimezone(timezone.utc)
+
+
+BUCKETS = {"hour": hour_start, "day": day_start, "week": week_start}
+
+
+def cell_key(latitude: float, longitude: float) -> str:
+    return f"{math.floor(latitude / ANALYTICS_CELL_LAT)}:{math.floor(longitude / ANALYTICS_CELL_LON)}"
+
+
+def cell_origin(key: str) -> tuple[float, float]:
+    """Юго-западный угол ячейки"""
+    row, col = key.split(":")
+    return round(int(row) * ANALYTICS_CELL_LAT, 6), round(int(col) * ANALYTICS_CELL_LON, 6)
+
+
+def _count_series(deltas: Counter, metric: str, at: datetime, listing_type: str = "") -> None:
+    for period in ("hour", "day"):
+        deltas[(period, metric, BUCKETS[period](at), listing_type, "")] += 1
+
+
+def _count_cells(deltas: Counter, metric: str, at: datetime, listing_type: str, latitude: float, longitude: float) -> None:
+    cell = cell_key(latitude, longitude)
+    for period in ("day", "week"):
+        deltas[(period, metric, BUCKETS[period](at), listing_type, cell)] += 1
+
+
+def _insert():
+    return pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+
+
+def _upsert_rollups(conn, values: dict, replace: bool = False) -> None:
+    """Добавляет приращения к счётчикам (replace=True — записывает значения как есть)"""
+    if not values:
+        return
+    stmt = _insert()(AnalyticsRollup).values(**{name: bindparam(name) for name in (*_ROLLUP_KEY, "value")})
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[getattr(AnalyticsRollup, name) for name in _ROLLUP_KEY],
+        set_={"value": stmt.excluded.value if replace else AnalyticsRollup.value + stmt.excluded.value},
+    )
+    conn.execute(stmt, [{**dict(zip(_ROLLUP_KEY, key)), "value": value} for key, value in values.items()])
+
+
+def _load_cursor(conn, source: str) -> Optional[AnalyticsCursor]:
+    row = conn.execute(
+        select(AnalyticsCursor.last_id, AnalyticsCursor.last_at).where(AnalyticsCursor.source == source)
+    ).first()
+    return row
+
+
+def _save_cursor(conn, source: str, last_id: Optional[int], last_at: Optional[datetime]) -> None:
+    stmt = _insert()(AnalyticsCursor).values(source=source, last_id=last_id, last_at=last_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AnalyticsCursor.source],
+        set_={"last_id": stmt.excluded.last_id, "last_at": stmt.excluded.last_at},
+    )
+    conn.execute(stmt)
+
+
+# --- источники событий ---
+# fetch(conn, last_id, last_at, limit) -> строки по порядку курсора;
+# settled_at(row) — время события для проверки ANALYTICS_SETTLE_SECONDS;
+# emit(deltas, row) — приращения; position(row) -> (last_id, last_at).
+
+
+def _fetch_created(conn, last_id, last_at, limit):
+    return conn.execute(
+        select(Listing.id, Listing.type, Listing.latitude, Listing.longitude, Listing.created_at)
+        .where(Listing.id > (last_id or 0))
+        .order_by(Listing.id)
+        .limit(limit)
+    ).all()
+
+
+def _emit_created(deltas: Counter, row) -> None:
+    _count_series(deltas, "listings_created", row.created_at, row.type)
+    _count_cells(deltas, "listings_created", row.created_at, row.type, row.latitude, row.longitude)
+
+
+def _fetch_closed(conn, last_id, last_at, limit):
+    query = select(
+        Listing.id, Listing.type, Listing.status, Listing.latitude, Listing.longitude, Listing.closed_at
+    ).where(Listing.status.in_(CLOSED_STATUSES), Listing.closed_at.is_not(None))
+    if last_at is not None:
+        query = query.where(
+            or_(Listing.closed_at > last_at, and_(Listing.closed_at == last_at, Listing.id > last_id))
+        )
+    return conn.execute(query.order_by(Listing.closed_at, Listing.id).limit(limit)).all()
+
+
+def _emit_closed(deltas: Counter, row) -> None:
+    _count_series(deltas, f"listings_{row.status}", row.closed_at, row.type)
+
+
+def _fetch_archived(conn, last_id, last_at, limit):
+    return conn.execute(
+        select(
+            ListingArchive.id, ListingArchive.type, ListingArchive.status, ListingArchive.latitude,
+            ListingArchive.longitude, ListingArchive.created_at, ListingArchive.closed_at,
+        )
+        .where(ListingArchive.id > (last_id or 0))
+        .order_by(ListingArchive.id)
+        .limit(limit)
+    ).all()
+
+
+def _emit_archived(deltas: Counter, row) -> None:
+    if row.created_at is not None:
+        _emit_created(deltas, row)
+    if row.closed_at is not None and row.status in CLOSED_STATUSES:
+        _emit_closed(deltas, row)
+
+
+def _fetch_users(conn, last_id, last_at, limit):
+    return conn.execute(
+        select(User.id, User.created_at).where(User.id > (last_id or 0)).order_by(User.id).limit(limit)
+    ).all()
+
+
+def _emit_user(deltas: Counter, row) -> None:
+    _count_series(deltas, "new_users", row.created_at)
+
+
+def _fetch_audit(conn, last_id, last_at, limit):
+    return conn.execute(
+        select(AdminAuditLog.id, AdminAuditLog.action, AdminAuditLog.created_at)
+        .where(AdminAuditLog.id > (last_id or 0))
+        .order_by(AdminAuditLog.id)
+        .limit(limit)
+    ).all()
+
+
+def _emit_audit(deltas: Counter, row) -> None:
+    _count_series(deltas, f"audit_{row.action}", row.created_at)
+
+
+SOURCES = (
+    # (имя курсора, fetch, emit, время события, позиция курсора)
+    ("listings_created", _fetch_created, _emit_created, lambda row: row.created_at, lambda row: (row.id, None)),
+    ("listings_closed", _fetch_closed, _emit_closed, lambda row: row.closed_at, lambda row: (row.id, row.closed_at)),
+    ("users", _fetch_users, _emit_user, lambda row: row.created_at, lambda row: (row.id, None)),
+    ("admin_audit_logs", _fetch_audit, _emit_audit, lambda row: row.created_at, lambda row: (row.id, None)),
+)
+
+
+def _consume(source: str, fetch, emit, settled_at, position, cutoff: datetime) -> int:
+    """Учитывает строки источника пачками до первой, которая ещё не «отстоялась»"""
+    processed = 0
+    while True:
+        with engine.begin() as conn:
+            cursor = _load_cursor(conn, source)
+            last_id, last_at = (cursor.last_id, cursor.last_at) if cursor else (None, None)
+            rows = fetch(conn, last_id, last_at, ANALYTICS_BATCH_SIZE)
+            deltas: Counter = Counter()
+            taken = 0
+            for row in rows:
+                at = settled_at(row)
+                if at is not None and _utc(at) > cutoff:
+                    break
+                if at is not None:
+                    emit(deltas, row)
+                last_id, last_at = position(row)
+                taken += 1
+            if not taken:
+                return processed
+            _upsert_rollups(conn, deltas)
+            _save_cursor(conn, source, last_id, last_at)
+        processed += taken
+        if taken < len(rows) or len(rows) < ANALYTICS_BATCH_SIZE:
+            return processed
+
+
+def _backfill_archive() -> int:
+    """Один раз при первом запуске: история, уже перенесённая в listings_archive"""
+    with engine.connect() as conn:
+        if _load_cursor(conn, "listings_created") is not None:
+            return 0
+        cursor = _load_cursor(conn, "listings_archive")
+        if cursor is not None and cursor.last_at is not None:
+            return 0
+    processed = 0
+    while True:
+        with engine.begin() as conn:
+            cursor = _load_cursor(conn, "listings_archive")
+            rows = _fetch_archived(conn, cursor.last_id if cursor else None, None, ANALYTICS_BATCH_SIZE)
+            deltas: Counter = Counter()
+            for row in rows:
+                _emit_archived(deltas, row)
+            _upsert_rollups(conn, deltas)
+            done = len(rows) < ANALYTICS_BATCH_SIZE
+            last_id = rows[-1].id if rows else (cursor.last_id if cursor else 0)
+            _save_cursor(conn, "listings_archive", last_id, datetime.now(timezone.utc) if done else None)
+        processed += len(rows)
+        if done:
+            return processed
+
+
+def _refresh_active_users(conn, now: datetime) -> None:
+    """Пересчёт активных за текущий и прошлый час/день и удаление более старых отметок"""
+    since = {"hour": hour_start(now) - timedelta(hours=1), "day": day_start(day_start(now) - timedelta(hours=1))}
+    in_window = or_(*[
+        and_(AnalyticsActiveUser.period == period, AnalyticsActiveUser.bucket_start >= start)
+        for period, start in since.items()
+    ])
+    rows = conn.execute(
+        select(AnalyticsActiveUser.period, AnalyticsActiveUser.bucket_start, func.count())
+        .where(in_window)
+        .group_by(AnalyticsActiveUser.period, AnalyticsActiveUser.bucket_start)
+    ).all()
+    _upsert_rollups(
+        conn,
+        {(period, "active_users", _utc(bucket), "", ""): count for period, bucket, count in rows},
+        replace=True,
+    )
+    conn.execute(delete(AnalyticsActiveUser).where(~in_window))
+
+
+def refresh_analytics(now: Optional[datetime] = None) -> int:
+    """Фоновое задание: учитывает новые события всех источников, возвращает число строк"""
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=ANALYTICS_SETTLE_SECONDS)
+    processed = _backfill_archive()
+    for source, fetch, emit, settled_at, position in SOURCES:
+        processed += _consume(source, fetch, emit, settled_at, position, cutoff)
+    with engine.begin() as conn:
+        _refresh_active_users(conn, now)
+        _save_cursor(conn, "refreshed", None, cutoff)
+    return processed
+
+
+class ActivityTracker:
+    """Отметки активных пользователей в памяти воркера с периодическим сбросом в БД"""
+
+    def __init__(self, flush_interval: float = ANALYTICS_ACTIVITY_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self._pending: set[tuple[datetime, datetime, int]] = set()
+        # Кто уже отмечен в текущем часе: повторные запросы не берут блокировку
+        self._seen_hour: Optional[datetime] = None
+        self._seen: set[int] = set()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: int, at: Optional[datetime] = None) -> None:
+        at = at or datetime.now(timezone.utc)
+        hour = hour_start(at)
+        if hour == self._seen_hour and user_id in self._seen:
+            return
+        with self._lock:
+            if hour != self._seen_hour:
+                self._seen_hour, self._seen = hour, set()
+            self._seen.add(user_id)
+            self._pending.add((hour, day_start(at), user_id))
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        if not pending:
+            return 0
+        rows = [
+            {"period": period, "bucket_start": bucket, "user_id": user_id}
+            for hour, day, user_id in pending
+            for period, bucket in (("hour", hour), ("day", day))
+        ]
+        stmt = _insert()(AnalyticsActiveUser).values(
+            period=bindparam("period"), bucket_start=bindparam("bucket_start"), user_id=bindparam("user_id")
+        ).on_conflict_do_nothing()
+        try:
+            with engine.begin() as conn:
+                conn.execute(stmt, rows)
+        except Exception:
+            with self._lock:
+                self._pending |= pending
+            raise
+        return len(pending)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Не удалось записать активных пользователей: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+activity_tracker = ActivityTracker()
+
+
+def stats_payload(db, range_name: str, now: Optional[datetime] = None) -> dict:
+    """Ряды и тепловая карта дашборда из analytics_rollups"""
+    now = now or datetime.now(timezone.utc)
+    length, series_period, heatmap_period = STATS_RANGES[range_name]
+    series_since = BUCKETS[series_period](now - length)
+    heatmap_since = BUCKETS[heatmap_period](now - length)
+
+    series_rows = db.execute(
+        select(AnalyticsRollup.metric, AnalyticsRollup.listing_type, AnalyticsRollup.bucket_start, AnalyticsRollup.value)
+        .where(
+            AnalyticsRollup.period == series_period,
+            AnalyticsRollup.cell == "",
+            AnalyticsRollup.bucket_start >= series_since,
+        )
+        .order_by(AnalyticsRollup.metric, AnalyticsRollup.listing_type, AnalyticsRollup.bucket_start)
+    ).all()
+    series: dict[str, dict[str, list]] = {}
+    totals: dict[str, dict[str, int]] = {}
+    for metric, listing_type, bucket, value in series_rows:
+        series.setdefault(metric, {}).setdefault(listing_type, []).append([_utc(bucket).isoformat(), value])
+        # Активных нельзя складывать по часам — для них итог не считаем
+        if metric != "active_users":
+            metric_totals = totals.setdefault(metric, {})
+            metric_totals[listing_type] = metric_totals.get(listing_type, 0) + value
+
+    heatmap_rows = db.execute(
+        select(AnalyticsRollup.cell, AnalyticsRollup.listing_type, func.sum(AnalyticsRollup.value))
+        .where(
+            AnalyticsRollup.period == heatmap_period,
+            AnalyticsRollup.metric == HEATMAP_METRIC,
+            AnalyticsRollup.cell != "",
+            AnalyticsRollup.bucket_start >= heatmap_since,
+        )
+        .group_by(AnalyticsRollup.cell, AnalyticsRollup.listing_type)
+    ).all()
+    cells: dict[str, dict] = {}
+    for cell, listing_type, value in heatmap_rows:
+        south, west = cell_origin(cell)
+        entry = cells.setdefault(cell, {"cell": cell, "south": south, "west": west, "task": 0, "worker": 0})
+        entry[listing_type] = int(value)
+
+    refreshed = db.execute(
+        select(AnalyticsCursor.last_at).where(AnalyticsCursor.source == "refreshed")
+    ).scalar()
+    return {
+        "range": range_name,
+        "period": series_period,
+        "since": series_since.isoformat(),
+        "series": series,
+        "totals": totals,
+        "heatmap": {
+            "metric": HEATMAP_METRIC,
+            "period": heatmap_period,
+            "since": heatmap_since.isoformat(),
+            "cell_lat": ANALYTICS_CELL_LAT,
+            "cell_lon": ANALYTICS_CELL_LON,
+            "cells": sorted(cells.values(), key=lambda entry: entry["cell"]),
+        },
+        "rows_read": len(series_rows) + len(heatmap_rows),
+        "updated_until": _utc(refreshed).isoformat() if refreshed else None,
+    }
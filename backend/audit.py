@@ -0,0 +1,208 @@
+"""
+Журнал действий администраторов.
+
+AUDIT_MODE=inline (по умолчанию) — запись добавляется в ту же транзакцию, что и
+само действие, и коммитится вместе с ним одним fsync.
+AUDIT_MODE=background — записи копятся в сессии до успешного коммита действия,
+затем уходят в очередь фонового писателя, который вставляет их пачками
+(executemany). Неудачная пачка повторяется AUDIT_WRITE_ATTEMPTS раз с растущей
+паузой, затем пишется по одной записи: строка, которую вставить нельзя
+(нарушение внешнего ключа, несериализуемый details), отбрасывается с выводом
+в лог и не блокирует остальные. При остановке приложения очередь дописывается
+до конца, без пауз и без исключений.
+"""
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal, engine
+from .models import AdminAuditLog
+
+AUDIT_MODE = os.getenv("AUDIT_MODE", "inline").lower()
+AUDIT_WRITE_ATTEMPTS = max(1, int(os.getenv("AUDIT_WRITE_ATTEMPTS", "5")))
+
+_PENDING_KEY = "admin_audit_pending"
+_LEGACY_PAIR_RE = re.compile(r"^\s*(\w+)=(.*)$")
+
+
+def audit_row(
+    admin_user_id: int,
+    action: str,
+    target_user_id: Optional[int] = None,
+    details: Optional[dict] = None,
+) -> dict:
+    return {
+        "admin_user_id": admin_user_id,
+        "target_user_id": target_user_id,
+        "action": action,
+        "details": details,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def record(
+    db: Session,
+    admin_user_id: int,
+    action: str,
+    target_user_id: Optional[int] = None,
+    details: Optional[dict] = None,
+) -> None:
+    """Добавляет запись аудита к текущей транзакции. Коммит делает вызывающий код."""
+    record_many(db, [audit_row(admin_user_id, action, target_user_id, details)])
+
+
+def record_many(db: Session, rows: list[dict]) -> None:
+    if not rows:
+        return
+    if AUDIT_MODE == "background":
+        db.info.setdefault(_PENDING_KEY, []).extend(rows)
+        return
+    db.execute(AdminAuditLog.__table__.insert(), rows)
+
+
+def parse_legacy_details(action: str, details: Any) -> Optional[dict]:
+    """Переводит старый формат details ('listing_id=1; reason=...', причина бана, роль) в словарь"""
+    if details is None or isinstance(details, dict):
+        return details
+    text = str(details)
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return parsed
+    except ValueError:
+        pass
+
+    pairs = [_LEGACY_PAIR_RE.match(part) for part in text.split(";")]
+    if pairs and all(pairs):
+        result = {}
+        for match in pairs:
+            key, value = match.group(1), match.group(2).strip()
+            result[key] = int(value) if value.isdigit() else value
+        return result
+    if action == "ban_user":
+        return {"reason": text}
+    if action == "update_role":
+        return {"role": text}
+    return {"text": text}
+
+
+class AuditWriter:
+    """Фоновый поток, который вставляет накопленные записи пачками"""
+
+    def __init__(self, flush_interval: float = 1.0, batch_size: int = 500, attempts: int = AUDIT_WRITE_ATTEMPTS):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.attempts = attempts
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, rows: list[dict]) -> None:
+        for row in rows:
+            self._queue.put(row)
+
+    def _take_batch(self, wait: bool) -> tuple[list[dict], bool]:
+        # Ждём первую запись, затем ещё flush_interval секунд добираем пачку
+        rows = []
+        stop = False
+        deadline = None
+        while len(rows) < self.batch_size:
+            if not wait:
+                block, timeout = False, None
+            elif deadline is None:
+                block, timeout = True, None
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                block = True
+            try:
+                item = self._queue.get(block=block, timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            rows.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return rows, stop
+
+    def _write(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        with self._lock, engine.begin() as conn:
+            conn.execute(AdminAuditLog.__table__.insert(), rows)
+
+    def _deliver(self, rows: list[dict], retry_delay: float) -> int:
+        """Пишет пачку с повторами, затем по одной записи; возвращает число записанных"""
+        for attempt in range(1, self.attempts + 1):
+            try:
+                self._write(rows)
+                return len(rows)
+            except Exception as e:
+                print(f"Не удалось записать журнал аудита ({len(rows)} записей, попытка {attempt}): {e}")
+            if attempt < self.attempts and retry_delay:
+                time.sleep(retry_delay * 2 ** (attempt - 1))
+        written = 0
+        for row in rows:
+            try:
+                self._write([row])
+                written += 1
+            except Exception as e:
+                print(f"Запись аудита отброшена: {e}; {json.dumps(row, default=str, ensure_ascii=False)}")
+        return written
+
+    def _run(self) -> None:
+        while True:
+            rows, stop = self._take_batch(wait=True)
+            self._deliver(rows, self.flush_interval)
+            if stop:
+                return
+
+    def flush(self) -> int:
+        """Синхронно дописывает всё, что лежит в очереди; не записанные строки отбрасываются"""
+        written = 0
+        while not self._queue.empty():
+            rows, _ = self._take_batch(wait=False)
+            written += self._deliver(rows, retry_delay=0)
+        return written
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> int:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        return self.flush()
+
+
+audit_writer = AuditWriter(
+    flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0")),
+    batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "500")),
+)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _submit_pending_audit(session: Session) -> None:
+    rows = session.info.pop(_PENDING_KEY, None)
+    if rows:
+        audit_writer.submit(rows)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_pending_audit(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
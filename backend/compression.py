@@ -0,0 +1,299 @@
+"""
+Сжатие ответов с выбором кодировки по Accept-Encoding (br или gzip).
+
+CompressionMiddleware сжимает текстовые ответы (JSON, HTML, CSS/JS, CSV,
+NDJSON, метрики) не короче COMPRESSION_MIN_SIZE байт:
+
+  - ответ одним куском сжимается целиком, Content-Length пересчитывается;
+  - потоковый ответ (StreamingResponse выгрузок) сжимается по кускам с
+    flush после каждого, клиент получает данные по мере готовности;
+  - ответы, у которых уже есть Content-Encoding, и картинки не трогаются.
+
+Тело или кусок от COMPRESSION_THREAD_MIN_SIZE байт сжимается в потоке
+(asyncio.to_thread): лента в 3 МБ сжимается ~25 мс, и в цикле событий это
+время стояли бы все остальные запросы. Короткие тела сжимаются на месте —
+переход в поток для них дороже самого сжатия.
+
+Сжатое представление отличается от исходного побайтно, поэтому ETag
+становится слабым (W/"..."); If-None-Match сравнивается со слабыми
+ETag (routes._etag_matches), и 304 работает как раньше.
+
+Кэшируемые ответы (лента объявлений) хранят PrecompressedBody: сжатые
+варианты считаются один раз на заполнение кэша, а не на каждый запрос,
+и отдаются через precompressed_response() мимо middleware (первое сжатие
+большого тела — тоже в потоке).
+
+Уровни по умолчанию выбраны по python -m bench.compression_bench: brotli 4
+и gzip 6 дают наименьшее «сжать + передать» для ленты в 3 МБ на канале
+10 Мбит/с, для кэшируемых тел brotli 5 — на 6% меньше байт, а время сжатия
+платится раз на заполнение кэша. Без модуля brotli остаётся только gzip.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+from .metrics import LATENCY_BUCKETS, Counter, Histogram, register
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_CACHED_BROTLI_QUALITY = int(os.getenv("COMPRESSION_CACHED_BROTLI_QUALITY", "5"))
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", str(64 * 1024)))
+
+# При равном q в Accept-Encoding выбирается первая
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/xml",
+    "image/svg+xml",
+}
+
+COMPRESSED_RESPONSES = register(
+    Counter("http_compressed_responses_total", "Сжатые ответы", ("encoding", "mode"))
+)
+COMPRESSION_INPUT_BYTES = register(
+    Counter("http_compression_input_bytes_total", "Байт до сжатия", ("encoding",))
+)
+COMPRESSION_OUTPUT_BYTES = register(
+    Counter("http_compression_output_bytes_total", "Байт после сжатия", ("encoding",))
+)
+COMPRESSION_SECONDS = register(
+    Histogram("http_compression_seconds", "Время сжатия ответа", LATENCY_BUCKETS, ("encoding",))
+)
+
+
+def set_enabled(enabled: bool) -> None:
+    global COMPRESSION_ENABLED
+    COMPRESSION_ENABLED = enabled
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Кодировка из Accept-Encoding с наибольшим q среди поддерживаемых или None"""
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES or media_type.endswith("+json")
+
+
+def compress(data: bytes, encoding: str, brotli_quality: int = COMPRESSION_BROTLI_QUALITY) -> bytes:
+    started = time.perf_counter()
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=brotli_quality)
+    else:
+        compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        compressed = compressor.compress(data) + compressor.flush()
+    COMPRESSION_SECONDS.observe(time.perf_counter() - started, encoding)
+    COMPRESSION_INPUT_BYTES.inc(encoding, amount=len(data))
+    COMPRESSION_OUTPUT_BYTES.inc(encoding, amount=len(compressed))
+    return compressed
+
+
+async def _off_loop(size: int, func, *args):
+    """Вызывает func в потоке, если объём данных того стоит"""
+    if size >= COMPRESSION_THREAD_MIN_SIZE:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+class StreamCompressor:
+    """Сжатие потока по кускам: после каждого куска — flush, чтобы клиент не ждал конца"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._gzip = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes, final: bool = False) -> bytes:
+        started = time.perf_counter()
+        if self.encoding == "br":
+            out = self._brotli.process(data) + (self._brotli.finish() if final else self._brotli.flush())
+        else:
+            out = self._gzip.compress(data) + self._gzip.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        COMPRESSION_SECONDS.observe(time.perf_counter() - started, self.encoding)
+        COMPRESSION_INPUT_BYTES.inc(self.encoding, amount=len(data))
+        COMPRESSION_OUTPUT_BYTES.inc(self.encoding, amount=len(out))
+        return out
+
+
+def weak_etag(etag: str) -> str:
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+class PrecompressedBody:
+    """Готовое тело ответа и его сжатые варианты: каждый считается один раз на значение"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._variants: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.body
+        variant = self._variants.get(encoding)
+        if variant is None:
+            # Под блокировкой: одновременные промахи не сжимают одно и то же дважды
+            with self._lock:
+                variant = self._variants.get(encoding)
+                if variant is None:
+                    variant = compress(self.body, encoding, brotli_quality=COMPRESSION_CACHED_BROTLI_QUALITY)
+                    self._variants[encoding] = variant
+        return variant
+
+    async def encoded_async(self, encoding: Optional[str]) -> bytes:
+        """encoded(), но первое сжатие большого тела — в потоке"""
+        if encoding is None or encoding in self._variants:
+            return self.encoded(encoding)
+        return await _off_loop(len(self.body), self.encoded, encoding)
+
+
+async def precompressed_response(
+    body: PrecompressedBody,
+    accept_encoding: Optional[str],
+    media_type: str = "application/json",
+    headers: Optional[dict] = None,
+) -> Response:
+    headers = dict(headers or {})
+    encoding = None
+    if COMPRESSION_ENABLED and len(body.body) >= COMPRESSION_MIN_SIZE:
+        encoding = negotiate(accept_encoding)
+    headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        if "ETag" in headers:
+            headers["ETag"] = weak_etag(headers["ETag"])
+        COMPRESSED_RESPONSES.inc(encoding, "cached")
+    return Response(content=await body.encoded_async(encoding), media_type=media_type, headers=headers)
+
+
+def _add_vary(headers: MutableHeaders) -> None:
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+class CompressionMiddleware:
+    """ASGI-middleware: br/gzip по Accept-Encoding, целиком или потоком"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    message["status"] < 200
+                    or message["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type", ""))
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                # Заголовки отправляются вместе с первым куском тела, когда ясно, сжимать ли
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is not None:
+                chunk = await _off_loop(len(body), compressor.chunk, body, not more_body)
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            _add_vary(headers)
+            if not more_body:
+                # Ответ целиком: короткие отдаём как есть
+                if len(body) < COMPRESSION_MIN_SIZE:
+                    await send(start_message)
+                    await send(message)
+                    return
+                body = await _off_loop(len(body), compress, body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                if "etag" in headers:
+                    headers["ETag"] = weak_etag(headers["etag"])
+                COMPRESSED_RESPONSES.inc(encoding, "buffered")
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            # Потоковый ответ: длина заранее неизвестна
+            compressor = StreamCompressor(encoding)
+            headers["Content-Encoding"] = encoding
+            if "content-length" in headers:
+                del headers["content-length"]
+            if "etag" in headers:
+                headers["ETag"] = weak_etag(headers["etag"])
+            COMPRESSED_RESPONSES.inc(encoding, "streaming")
+            await send(start_message)
+            chunk = await _off_loop(len(body), compressor.chunk, body)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        await self.app(scope, receive, send_compressed)
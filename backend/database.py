@@ -1,6 +1,7 @@
 from sqlalchemy import create_engine, text, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import json
 import os
 from dotenv import load_dotenv
 
@@ -107,7 +108,167 @@ def _ensure_users_columns(conn):
             conn.execute(text("ALTER TABLE users ADD COLUMN accepted_terms_at DATETIME"))
 
 
+def _ensure_listings_columns(conn):
+    columns = {col["name"] for col in inspect(conn).get_columns("listings")}
+    if "closed_at" not in columns:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("ALTER TABLE listings ADD COLUMN closed_at TIMESTAMPTZ"))
+        else:
+            conn.execute(text("ALTER TABLE listings ADD COLUMN closed_at DATETIME"))
+        # Для старых закрытых объявлений точного времени нет — считаем от даты создания
+        conn.execute(
+            text("UPDATE listings SET closed_at = created_at WHERE status <> 'active' AND closed_at IS NULL")
+        )
+
+
+def _ensure_listings_district(conn):
+    # Секционирование пересоздаёт listings без district_id, поэтому колонка добавляется после него
+    from .districts import backfill_districts
+
+    added = False
+    for table in ("listings", "listings_archive"):
+        if table not in inspect(conn).get_table_names():
+            continue
+        if "district_id" not in {col["name"] for col in inspect(conn).get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN district_id SMALLINT"))
+            added = True
+    if added:
+        tagged = backfill_districts(conn)
+        print(f"Районы проставлены объявлениям: {tagged}")
+
+
+def normalize_sqlite_timestamps(conn, table: str, columns: tuple[str, ...]) -> int:
+    """Приводит время вида 'YYYY-MM-DD HH:MM:SS' (CURRENT_TIMESTAMP в SQLite) к формату SQLAlchemy с микросекундами.
+
+    SQLite сравнивает время как текст: без приведения строка '...:SS' меньше
+    курсора '...:SS.000000' той же секунды, и keyset-пагинация по (время, id)
+    отдаёт такие строки повторно. На PostgreSQL ничего не делает.
+    """
+    if conn.dialect.name != "sqlite":
+        return 0
+    updated = 0
+    for column in columns:
+        result = conn.execute(
+            text(f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19")
+        )
+        updated += result.rowcount
+    return updated
+
+
+def _ensure_audit_details_json(conn):
+    # Старые записи хранили details строкой 'listing_id=1; reason=...'
+    from .audit import parse_legacy_details
+
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        column = next(
+            col for col in inspect(conn).get_columns("admin_audit_logs") if col["name"] == "details"
+        )
+        if str(column["type"]).upper() in {"JSON", "JSONB"}:
+            return
+        rows = conn.execute(
+            text("SELECT id, action, details FROM admin_audit_logs WHERE details IS NOT NULL")
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            text(
+                "SELECT id, action, details FROM admin_audit_logs "
+                "WHERE details IS NOT NULL AND substr(details, 1, 1) <> '{'"
+            )
+        ).fetchall()
+
+    updates = [
+        {"id": row.id, "details": json.dumps(parse_legacy_details(row.action, row.details), ensure_ascii=False)}
+        for row in rows
+    ]
+    if updates:
+        conn.execute(text("UPDATE admin_audit_logs SET details = :details WHERE id = :id"), updates)
+    if dialect == "postgresql":
+        conn.execute(
+            text("ALTER TABLE admin_audit_logs ALTER COLUMN details TYPE JSONB USING details::jsonb")
+        )
+
+
+# Режим поиска пользователей по username: trgm (Postgres), fts5_trigram / fts5_prefix (SQLite) или like
+USER_SEARCH_MODE = "like"
+
+
+def _ensure_user_search_index(conn):
+    global USER_SEARCH_MODE
+
+    if conn.dialect.name == "postgresql":
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(
+                    text(
+                        "CREATE INDEX IF NOT EXISTS ix_users_username_trgm "
+                        "ON users USING gin (username gin_trgm_ops)"
+                    )
+                )
+            USER_SEARCH_MODE = "trgm"
+        except Exception as e:
+            print(f"pg_trgm недоступен, поиск пользователей без индекса: {e}")
+        return
+
+    existing = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+    ).scalar()
+    if existing is None:
+        try:
+            with conn.begin_nested():
+                conn.execute(
+                    text(
+                        "CREATE VIRTUAL TABLE users_fts USING fts5("
+                        "username, content='users', content_rowid='id', tokenize='trigram')"
+                    )
+                )
+        except Exception:
+            # SQLite < 3.34 не знает токенайзер trigram: ищем по префиксам слов
+            conn.execute(
+                text(
+                    "CREATE VIRTUAL TABLE users_fts USING fts5("
+                    "username, content='users', content_rowid='id')"
+                )
+            )
+        conn.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+        existing = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+        ).scalar()
+
+    conn.execute(
+        text(
+            "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+            "INSERT INTO users_fts(rowid, username) VALUES (new.id, new.username); END"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+            "INSERT INTO users_fts(users_fts, rowid, username) VALUES ('delete', old.id, old.username); END"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username ON users BEGIN "
+            "INSERT INTO users_fts(users_fts, rowid, username) VALUES ('delete', old.id, old.username); "
+            "INSERT INTO users_fts(rowid, username) VALUES (new.id, new.username); END"
+        )
+    )
+    USER_SEARCH_MODE = "fts5_trigram" if "trigram" in existing else "fts5_prefix"
+
+
+def _ensure_indexes(conn):
+    # create_all не добавляет новые индексы в уже существующие таблицы
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
 def _ensure_schema_upgrades():
+    from .partitions import ensure_listings_partitioning
+    from .similarity import backfill_signatures
+
     inspector = inspect(engine)
     tables = set(inspector.get_table_names())
     if "users" not in tables:
@@ -115,6 +276,23 @@ def _ensure_schema_upgrades():
 
     with engine.begin() as conn:
         _ensure_users_columns(conn)
+        if "listings" in tables:
+            _ensure_listings_columns(conn)
+            ensure_listings_partitioning(conn)
+            _ensure_listings_district(conn)
+            # closed_at старых закрытых объявлений скопирован из created_at без микросекунд
+            normalize_sqlite_timestamps(conn, "listings", ("closed_at",))
+            if "listings_archive" in tables:
+                normalize_sqlite_timestamps(conn, "listings_archive", ("closed_at",))
+        if "admin_audit_logs" in tables:
+            _ensure_audit_details_json(conn)
+            normalize_sqlite_timestamps(conn, "admin_audit_logs", ("created_at",))
+        _ensure_indexes(conn)
+        _ensure_user_search_index(conn)
+        if "listings" in tables:
+            filled = backfill_signatures(conn)
+            if filled:
+                print(f"Посчитаны отпечатки для поиска копий: {filled}")
 
 
 def _ensure_default_terms_document():
@@ -0,0 +1,275 @@
+"""
+Районы Минска: привязка координат объявления к району по подготовленной сетке.
+
+Границы районов лежат в data/minsk_districts.json (GeoJSON, Polygon или
+MultiPolygon, в properties — id, slug, name). Встроенный файл — заглушка
+("approximate": true): секторы от центра по направлениям девяти
+административных районов, внешняя граница — эллипс вокруг МКАД с запасом;
+микрорайонов в нём нет. Для точных границ достаточно положить выгрузку
+OpenStreetMap в том же формате и указать её в DISTRICTS_FILE, затем
+пересчитать районы: python -m backend.districts backfill --retag.
+
+При загрузке охват всех районов делится на ячейки DISTRICT_GRID_DEGREES.
+Ячейка, которую не пересекает ни одна граница, целиком лежит в одном районе
+или вне зоны обслуживания — ответ для неё готов заранее. Только для ячеек на
+границах точка проверяется лучом (чёт-нечет) по полигонам нескольких районов.
+
+district_for() вызывается при создании объявления. Точка вне всех районов
+получает district_id = NULL, но объявление принимается: границы могут быть
+неточными, а адрес у края города — настоящим. Отклоняются только точки вне
+SERVICE_AREA_BBOX — заведомо широкой рамки вокруг Минска с пригородами.
+Район хранится в listings.district_id, поэтому фильтр /api/listings и
+счётчики по району — равенство по индексу (status, district_id, type), а не
+поиск подстроки в адресе.
+"""
+
+import argparse
+import json
+import math
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+
+DISTRICTS_FILE = os.getenv("DISTRICTS_FILE", str(Path(__file__).parent / "data" / "minsk_districts.json"))
+DISTRICT_GRID_DEGREES = float(os.getenv("DISTRICT_GRID_DEGREES", "0.005"))
+DISTRICT_BACKFILL_BATCH_SIZE = int(os.getenv("DISTRICT_BACKFILL_BATCH_SIZE", "2000"))
+# min_lat,min_lon,max_lat,max_lon: Минск и пригороды примерно в 20 км от МКАД
+SERVICE_AREA_BBOX = tuple(
+    float(value) for value in os.getenv("SERVICE_AREA_BBOX", "53.70,27.20,54.10,27.95").split(",")
+)
+
+# Точка: (долгота, широта), как в GeoJSON
+Ring = tuple[tuple[float, float], ...]
+
+
+@dataclass(frozen=True)
+class District:
+    id: int
+    slug: str
+    name: str
+    rings: tuple[Ring, ...]
+    bbox: tuple[float, float, float, float]  # min_lon, min_lat, max_lon, max_lat
+
+    def contains(self, lon: float, lat: float) -> bool:
+        """Луч на восток: нечётное число пересечений со всеми кольцами — точка внутри (дыры учтены)"""
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        if not (min_lon <= lon <= max_lon and min_lat <= lat <= max_lat):
+            return False
+        inside = False
+        for ring in self.rings:
+            x1, y1 = ring[-1]
+            for x2, y2 in ring:
+                if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+                    inside = not inside
+                x1, y1 = x2, y2
+        return inside
+
+    def public(self) -> dict:
+        return {"id": self.id, "slug": self.slug, "name": self.name}
+
+
+def _read_collection(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def boundaries_approximate(path: str = DISTRICTS_FILE) -> bool:
+    """Файл границ помечен как заглушка ("approximate": true)"""
+    return bool(_read_collection(path).get("approximate"))
+
+
+def load_districts(path: str = DISTRICTS_FILE) -> list[District]:
+    collection = _read_collection(path)
+    districts = []
+    for feature in collection["features"]:
+        geometry = feature["geometry"]
+        polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+        rings = tuple(tuple((float(lon), float(lat)) for lon, lat in ring) for polygon in polygons for ring in polygon)
+        points = [point for ring in rings for point in ring]
+        properties = feature["properties"]
+        districts.append(
+            District(
+                id=int(properties["id"]),
+                slug=properties["slug"],
+                name=properties["name"],
+                rings=rings,
+                bbox=(
+                    min(lon for lon, _ in points),
+                    min(lat for _, lat in points),
+                    max(lon for lon, _ in points),
+                    max(lat for _, lat in points),
+                ),
+            )
+        )
+    return districts
+
+
+def _segment_crosses_box(x1, y1, x2, y2, min_x, min_y, max_x, max_y) -> bool:
+    """Пересекает ли отрезок прямоугольник (отсечение Лианга — Барски)"""
+    t0, t1 = 0.0, 1.0
+    dx, dy = x2 - x1, y2 - y1
+    for p, q in ((-dx, x1 - min_x), (dx, max_x - x1), (-dy, y1 - min_y), (dy, max_y - y1)):
+        if p == 0:
+            if q < 0:
+                return False
+            continue
+        t = q / p
+        if p < 0:
+            if t > t1:
+                return False
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return False
+            t1 = min(t1, t)
+    return True
+
+
+class DistrictIndex:
+    """Сетка над охватом районов: для каждой ячейки — готовый район, «вне зоны» или кандидаты на проверку"""
+
+    def __init__(self, districts: list[District], cell_degrees: float = DISTRICT_GRID_DEGREES):
+        self.districts = {district.id: district for district in districts}
+        self.cell = cell_degrees
+        self.min_lon = min(district.bbox[0] for district in districts)
+        self.min_lat = min(district.bbox[1] for district in districts)
+        self.cols = math.ceil((max(district.bbox[2] for district in districts) - self.min_lon) / cell_degrees) or 1
+        self.rows = math.ceil((max(district.bbox[3] for district in districts) - self.min_lat) / cell_degrees) or 1
+        # int — район (0 — вне зоны), tuple — районы, чьи границы проходят через ячейку
+        self.cells: list = [0] * (self.rows * self.cols)
+        self._build()
+
+    def _cell_box(self, row: int, col: int) -> tuple[float, float, float, float]:
+        min_lon = self.min_lon + col * self.cell
+        min_lat = self.min_lat + row * self.cell
+        return min_lon, min_lat, min_lon + self.cell, min_lat + self.cell
+
+    def _build(self) -> None:
+        boundary: dict[int, set[int]] = {}
+        for district in self.districts.values():
+            for ring in district.rings:
+                for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                    col_from, col_to = sorted((self._col(x1), self._col(x2)))
+                    row_from, row_to = sorted((self._row(y1), self._row(y2)))
+                    for row in range(row_from, row_to + 1):
+                        for col in range(col_from, col_to + 1):
+                            if _segment_crosses_box(x1, y1, x2, y2, *self._cell_box(row, col)):
+                                boundary.setdefault(row * self.cols + col, set()).add(district.id)
+
+        for row in range(self.rows):
+            for col in range(self.cols):
+                index = row * self.cols + col
+                min_lon, min_lat, max_lon, max_lat = self._cell_box(row, col)
+                center = ((min_lon + max_lon) / 2, (min_lat + max_lat) / 2)
+                crossing = boundary.get(index, set())
+                # Район без границы в ячейке и с центром ячейки внутри покрывает её целиком
+                covering = [
+                    district.id
+                    for district in self.districts.values()
+                    if district.id not in crossing and district.contains(*center)
+                ]
+                if not crossing:
+                    self.cells[index] = covering[0] if covering else 0
+                else:
+                    self.cells[index] = tuple(
+                        self.districts[district_id] for district_id in [*covering, *sorted(crossing)]
+                    )
+
+    def _col(self, lon: float) -> int:
+        return min(max(int((lon - self.min_lon) / self.cell), 0), self.cols - 1)
+
+    def _row(self, lat: float) -> int:
+        return min(max(int((lat - self.min_lat) / self.cell), 0), self.rows - 1)
+
+    def lookup(self, latitude: float, longitude: float) -> Optional[int]:
+        col = (longitude - self.min_lon) / self.cell
+        row = (latitude - self.min_lat) / self.cell
+        if not (0 <= col < self.cols and 0 <= row < self.rows):
+            return None
+        cell = self.cells[int(row) * self.cols + int(col)]
+        if isinstance(cell, int):
+            return cell or None
+        for district in cell:
+            if district.contains(longitude, latitude):
+                return district.id
+        return None
+
+    def stats(self) -> dict:
+        prepared = sum(isinstance(cell, int) for cell in self.cells)
+        return {"cells": len(self.cells), "prepared": prepared, "boundary": len(self.cells) - prepared}
+
+
+district_index = DistrictIndex(load_districts())
+DISTRICTS = district_index.districts
+DISTRICTS_APPROXIMATE = boundaries_approximate()
+
+
+def district_for(latitude: float, longitude: float) -> Optional[int]:
+    """id района или None, если точка вне границ всех районов"""
+    return district_index.lookup(latitude, longitude)
+
+
+def in_service_area(latitude: float, longitude: float) -> bool:
+    min_lat, min_lon, max_lat, max_lon = SERVICE_AREA_BBOX
+    return min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon
+
+
+def backfill_districts(conn, retag: bool = False, batch_size: int = DISTRICT_BACKFILL_BATCH_SIZE) -> int:
+    """Проставляет district_id в listings и listings_archive (retag — пересчитать и уже заполненные)"""
+    updated = 0
+    for table in ("listings", "listings_archive"):
+        after = 0
+        condition = "" if retag else "AND district_id IS NULL "
+        while True:
+            rows = conn.execute(
+                text(
+                    f"SELECT id, latitude, longitude, district_id FROM {table} "
+                    f"WHERE id > :after {condition}ORDER BY id LIMIT :limit"
+                ),
+                {"after": after, "limit": batch_size},
+            ).all()
+            if not rows:
+                break
+            after = rows[-1].id
+            # Точки вне зоны остаются NULL; курсор по id не даёт выбирать их снова
+            changes = [
+                {"id": row.id, "district_id": district_id}
+                for row in rows
+                if (district_id := district_for(row.latitude, row.longitude)) != row.district_id
+            ]
+            if changes:
+                conn.execute(text(f"UPDATE {table} SET district_id = :district_id WHERE id = :id"), changes)
+                updated += len(changes)
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Районы Минска для объявлений")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="проставить district_id объявлениям")
+    backfill.add_argument("--retag", action="store_true", help="пересчитать и уже заполненные (после смены границ)")
+    lookup = commands.add_parser("lookup", help="район точки")
+    lookup.add_argument("latitude", type=float)
+    lookup.add_argument("longitude", type=float)
+    args = parser.parse_args()
+
+    if args.command == "lookup":
+        district_id = district_for(args.latitude, args.longitude)
+        if district_id:
+            print(DISTRICTS[district_id].name)
+        else:
+            print("Вне районов" if in_service_area(args.latitude, args.longitude) else "Вне зоны обслуживания")
+        return
+
+    from .database import engine
+
+    with engine.begin() as conn:
+        updated = backfill_districts(conn, retag=args.retag)
+    print(f"Районы проставлены объявлениям: {updated}; сетка {district_index.stats()}")
+
+
+if __name__ == "__main__":
+    main()
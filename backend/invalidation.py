@@ -0,0 +1,293 @@
+"""
+Шина инвалидации in-process кэшей между воркерами uvicorn.
+
+Пишущие роуты после коммита публикуют типизированные события:
+
+    user_changed      — пользователь создан, заблокирован, сменил роль или принял условия;
+    subscription_changed — пользователь создал или удалил подписку на объявления;
+    terms_changed     — сменилась активная версия условий;
+    listing_changed   — объявление создано, изменено, закрыто, архивировано, сменились фото.
+
+Подписчики своего воркера вызываются сразу в publish(), остальные воркеры
+получают событие через транспорт (CACHE_BUS):
+
+    postgres  — LISTEN/NOTIFY на канале CACHE_BUS_CHANNEL; слушатель держит
+                отдельное соединение вне пула;
+    socket    — датаграммы через unix-сокеты в каталоге CACHE_BUS_SOCKET_DIR:
+                каждый воркер слушает свой сокет, публикация рассылается
+                по всем сокетам каталога (SQLite всё равно означает один хост);
+    off       — только свой воркер;
+    auto      — postgres на PostgreSQL, иначе socket (по умолчанию).
+
+Событие несёт время публикации: задержка доставки видна в метрике
+cache_invalidation_lag_seconds. Если слушатель переподключался и мог
+пропустить события, подписчикам рассылаются все типы событий — кэши
+сбрасываются целиком.
+
+Опубликовать событие вручную (например, после правки условий в БД):
+
+    python -m backend.invalidation terms_changed
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import select
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+from .database import DATABASE_URL, DB_TYPE, engine
+from .metrics import LATENCY_BUCKETS, Counter, Histogram, register
+
+EVENT_TYPES = ("user_changed", "subscription_changed", "terms_changed", "listing_changed")
+
+CACHE_BUS = os.getenv("CACHE_BUS", "auto").lower()
+CACHE_BUS_CHANNEL = os.getenv("CACHE_BUS_CHANNEL", "cache_invalidation")
+CACHE_BUS_SOCKET_DIR = os.getenv(
+    "CACHE_BUS_SOCKET_DIR",
+    # Каталог свой для каждой БД: два приложения на одном хосте не должны слышать друг друга
+    os.path.join(tempfile.gettempdir(), f"minsk_jobs_bus_{hashlib.sha1(DATABASE_URL.encode()).hexdigest()[:10]}"),
+)
+CACHE_BUS_RECONNECT_SECONDS = 1.0
+
+INVALIDATIONS_PUBLISHED = register(
+    Counter("cache_invalidations_published_total", "Опубликованные события инвалидации", ("event",))
+)
+INVALIDATIONS_RECEIVED = register(
+    Counter("cache_invalidations_received_total", "События инвалидации от других воркеров", ("event",))
+)
+INVALIDATION_LAG = register(
+    Histogram("cache_invalidation_lag_seconds", "Задержка доставки события инвалидации", LATENCY_BUCKETS, ("event",))
+)
+
+Subscriber = Callable[[str, Optional[str]], None]
+
+
+class PostgresTransport:
+    """NOTIFY при публикации, LISTEN на выделенном соединении"""
+
+    def __init__(self, channel: str = CACHE_BUS_CHANNEL):
+        self.channel = channel
+        self._connection = None
+
+    def send(self, payload: str) -> None:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+            conn.commit()
+
+    def open(self) -> None:
+        raw = engine.raw_connection()
+        # Соединение забирается из пула насовсем: LISTEN живёт, пока оно открыто
+        raw.detach()
+        connection = raw.driver_connection
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        self._connection = connection
+
+    def receive(self, timeout: float) -> list[str]:
+        connection = self._connection
+        if not select.select([connection], [], [], timeout)[0]:
+            return []
+        connection.poll()
+        payloads = [notify.payload for notify in connection.notifies]
+        connection.notifies.clear()
+        return payloads
+
+    def close(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            finally:
+                self._connection = None
+
+
+class SocketTransport:
+    """Unix-датаграммы: сокет на воркер в общем каталоге"""
+
+    MAX_PAYLOAD = 4096
+
+    def __init__(self, directory: str = CACHE_BUS_SOCKET_DIR):
+        self.directory = directory
+        self.path: Optional[str] = None
+        self._socket: Optional[socket.socket] = None
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+
+    def send(self, payload: str) -> None:
+        data = payload.encode()
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if path == self.path or not name.endswith(".sock"):
+                continue
+            try:
+                self._sender.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Сокет остался от завершившегося воркера
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                # Очередь получателя переполнена: его кэш догонит TTL
+                pass
+
+    def open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.path)
+        self._socket = sock
+
+    def receive(self, timeout: float) -> list[str]:
+        if not select.select([self._socket], [], [], timeout)[0]:
+            return []
+        payloads = []
+        while True:
+            try:
+                payloads.append(self._socket.recv(self.MAX_PAYLOAD, socket.MSG_DONTWAIT).decode())
+            except BlockingIOError:
+                return payloads
+
+    def close(self) -> None:
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+def _create_transport(kind: str = CACHE_BUS):
+    if kind == "auto":
+        kind = "postgres" if DB_TYPE == "postgresql" else "socket"
+    if kind == "postgres":
+        return PostgresTransport()
+    if kind == "socket":
+        return SocketTransport()
+    if kind != "off":
+        print(f"Неизвестный CACHE_BUS={kind!r}: инвалидация только внутри воркера")
+    return None
+
+
+class InvalidationBus:
+    def __init__(self, transport=None):
+        self.transport = transport
+        self.origin = uuid.uuid4().hex
+        self._subscribers: dict[str, list[Subscriber]] = defaultdict(list)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def subscribe(self, event: str, callback: Subscriber) -> None:
+        if event not in EVENT_TYPES:
+            raise ValueError(f"Неизвестное событие инвалидации: {event}")
+        self._subscribers[event].append(callback)
+
+    def publish(self, event: str, key=None) -> None:
+        """Сбрасывает кэши своего воркера и рассылает событие остальным"""
+        if event not in EVENT_TYPES:
+            raise ValueError(f"Неизвестное событие инвалидации: {event}")
+        key = None if key is None else str(key)
+        INVALIDATIONS_PUBLISHED.inc(event)
+        self._dispatch(event, key)
+        if self.transport is None:
+            return
+        payload = json.dumps({"o": self.origin, "e": event, "k": key, "t": time.time()})
+        try:
+            self.transport.send(payload)
+        except Exception as e:
+            print(f"Шина инвалидации: не удалось разослать {event}: {e}")
+
+    def _dispatch(self, event: str, key: Optional[str]) -> None:
+        for callback in self._subscribers.get(event, ()):
+            try:
+                callback(event, key)
+            except Exception as e:
+                print(f"Шина инвалидации: ошибка подписчика {event}: {e}")
+
+    def _dispatch_all(self) -> None:
+        for event in EVENT_TYPES:
+            self._dispatch(event, None)
+
+    def _deliver(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("o") == self.origin or message.get("e") not in EVENT_TYPES:
+            return
+        event = message["e"]
+        INVALIDATIONS_RECEIVED.inc(event)
+        INVALIDATION_LAG.observe(max(time.time() - message.get("t", time.time()), 0.0), event)
+        self._dispatch(event, message.get("k"))
+
+    def _run(self) -> None:
+        connected = False
+        while not self._stop.is_set():
+            try:
+                if not connected:
+                    self.transport.open()
+                    if connected is None:
+                        # Пока слушателя не было, события могли потеряться
+                        self._dispatch_all()
+                    connected = True
+                for payload in self.transport.receive(timeout=0.5):
+                    self._deliver(payload)
+            except Exception as e:
+                print(f"Шина инвалидации: соединение потеряно, переподключение: {e}")
+                self.transport.close()
+                connected = None
+                self._stop.wait(CACHE_BUS_RECONNECT_SECONDS)
+        self.transport.close()
+
+    def start(self) -> None:
+        if self.transport is None or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="invalidation-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+invalidation_bus = InvalidationBus(_create_transport())
+
+
+def subscribe(event: str, callback: Subscriber) -> None:
+    invalidation_bus.subscribe(event, callback)
+
+
+def publish(event: str, key=None) -> None:
+    invalidation_bus.publish(event, key)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Опубликовать событие инвалидации для всех воркеров")
+    parser.add_argument("event", choices=EVENT_TYPES)
+    parser.add_argument("key", nargs="?")
+    args = parser.parse_args()
+    publish(args.event, args.key)
+    print(f"Опубликовано: {args.event} {args.key or ''}".rstrip())
+
+
+if __name__ == "__main__":
+    main()
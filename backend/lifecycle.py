@@ -0,0 +1,196 @@
+"""
+Жизненный цикл объявлений: закрытие, автоистечение и архивация.
+
+Активное объявление старше LISTING_TTL_DAYS переводится в статус expired,
+а владельцу уходит сообщение от бота: оно ставится в очередь диспетчера
+уведомлений (alerts.py) и отправляется его фоновой задачей с тем же лимитом
+на получателя, поэтому задание не ждёт Telegram. Закрытые и истёкшие объявления старше
+ARCHIVE_AFTER_DAYS переносятся пачками в listings_archive, чтобы таблица,
+которую читают лента и карта, не росла бесконечно (на секционированной
+PostgreSQL-таблице вместо этого отсоединяются старые секции, см. partitions.py).
+Оба задания запускает фоновый планировщик (см. scheduler.py), он же удаляет
+истёкшие ключи Idempotency-Key создания объявлений.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from .alerts import alert_dispatcher
+from .database import SessionLocal, engine
+from .invalidation import publish
+from .models import (
+    Listing,
+    ListingArchive,
+    ListingIdempotencyKey,
+    ListingPhoto,
+    ListingSignature,
+    ListingSignatureBucket,
+    ListingStats,
+    User,
+)
+from .partitions import is_partitioned
+from .photos import remove_photo_files
+
+LISTING_TTL_DAYS = float(os.getenv("LISTING_TTL_DAYS", "30"))
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "500"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+EXPIRY_INTERVAL_SECONDS = float(os.getenv("EXPIRY_INTERVAL_SECONDS", "600"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+CLOSED_STATUSES = ("closed", "expired")
+
+_ARCHIVE_COLUMNS = (
+    "id", "user_id", "type", "title", "description", "address", "payment",
+    "contacts", "latitude", "longitude", "status", "created_at", "closed_at", "district_id",
+)
+
+
+def close_active_listings(db: Session, *conditions, status: str = "closed") -> list:
+    """Закрывает активные объявления по условию одним UPDATE и возвращает (id, user_id, title) закрытых"""
+    where = [Listing.status == "active", *conditions]
+    values = {"status": status, "closed_at": datetime.now(timezone.utc)}
+    if db.bind.dialect.update_returning:
+        stmt = (
+            update(Listing)
+            .where(*where)
+            .values(**values)
+            .returning(Listing.id, Listing.user_id, Listing.title)
+            .execution_options(synchronize_session=False)
+        )
+        return db.execute(stmt).all()
+
+    rows = db.query(Listing.id, Listing.user_id, Listing.title).filter(*where).all()
+    if rows:
+        db.execute(
+            update(Listing)
+            .where(Listing.id.in_([row.id for row in rows]))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+    return rows
+
+
+def _notify_expired(db: Session, rows: list) -> int:
+    """Ставит владельцам сообщения об истечении в очередь диспетчера; возвращает их число"""
+    if not alert_dispatcher.sender or not rows:
+        return 0
+    chat_ids = dict(
+        db.query(User.id, User.telegram_id).filter(User.id.in_({row.user_id for row in rows})).all()
+    )
+    per_user: dict[int, list[str]] = {}
+    for row in rows:
+        per_user.setdefault(row.user_id, []).append(row.title)
+
+    queued = 0
+    for user_id, titles in per_user.items():
+        chat_id = chat_ids.get(user_id)
+        if not chat_id:
+            continue
+        lines = [f"Срок публикации истёк ({LISTING_TTL_DAYS:g} дн.), объявления сняты с карты:"]
+        lines.extend(f"• {title}" for title in titles[:10])
+        if len(titles) > 10:
+            lines.append(f"…и ещё {len(titles) - 10}")
+        lines.append("Если предложение ещё актуально, разместите его заново.")
+        alert_dispatcher.notify(chat_id, "\n".join(lines))
+        queued += 1
+    return queued
+
+
+def expire_listings(now: Optional[datetime] = None, ttl_days: Optional[float] = None) -> int:
+    """Переводит просроченные активные объявления в expired пачками по EXPIRY_BATCH_SIZE"""
+    ttl_days = LISTING_TTL_DAYS if ttl_days is None else ttl_days
+    if ttl_days <= 0:
+        return 0
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=ttl_days)
+    expired = 0
+    while True:
+        db = SessionLocal()
+        try:
+            batch = (
+                select(Listing.id)
+                .where(Listing.status == "active", Listing.created_at < cutoff)
+                .order_by(Listing.created_at)
+                .limit(EXPIRY_BATCH_SIZE)
+            )
+            rows = close_active_listings(db, Listing.id.in_(batch), status="expired")
+            db.commit()
+            if rows:
+                publish("listing_changed")
+            _notify_expired(db, rows)
+        finally:
+            db.close()
+        expired += len(rows)
+        if len(rows) < EXPIRY_BATCH_SIZE:
+            return expired
+
+
+def remove_orphaned_photos(digests: set) -> int:
+    """После коммита удаления записей: файлы фото, которые больше не нужны ни одному объявлению"""
+    if not digests:
+        return 0
+    with engine.connect() as conn:
+        shared = set(conn.execute(select(ListingPhoto.digest).where(ListingPhoto.digest.in_(digests))).scalars())
+    return remove_photo_files(digests - shared)
+
+
+def archive_closed_listings(now: Optional[datetime] = None, after_days: Optional[float] = None) -> int:
+    """Переносит закрытые давнее after_days объявления в listings_archive пачками по ARCHIVE_BATCH_SIZE"""
+    with engine.connect() as conn:
+        if is_partitioned(conn):
+            # Историю в секционированной listings отсоединяют целыми месяцами (см. partitions.py)
+            return 0
+    after_days = ARCHIVE_AFTER_DAYS if after_days is None else after_days
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=after_days)
+    listing_columns = [getattr(Listing, name) for name in _ARCHIVE_COLUMNS]
+    archived = 0
+    while True:
+        # Каждая пачка — отдельная короткая транзакция: INSERT … SELECT и DELETE по одним и тем же id
+        with engine.begin() as conn:
+            ids = conn.execute(
+                select(Listing.id)
+                .where(Listing.status.in_(CLOSED_STATUSES), Listing.closed_at < cutoff)
+                .order_by(Listing.closed_at)
+                .limit(ARCHIVE_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if ids:
+                conn.execute(
+                    insert(ListingArchive).from_select(
+                        [*_ARCHIVE_COLUMNS, "archived_at"],
+                        select(*listing_columns, literal(now, ListingArchive.archived_at.type)).where(
+                            Listing.id.in_(ids)
+                        ),
+                    )
+                )
+                conn.execute(delete(Listing).where(Listing.id.in_(ids)))
+                conn.execute(delete(ListingStats).where(ListingStats.listing_id.in_(ids)))
+                conn.execute(delete(ListingSignature).where(ListingSignature.listing_id.in_(ids)))
+                conn.execute(delete(ListingSignatureBucket).where(ListingSignatureBucket.listing_id.in_(ids)))
+                digests = set(
+                    conn.execute(select(ListingPhoto.digest).where(ListingPhoto.listing_id.in_(ids))).scalars()
+                )
+                conn.execute(delete(ListingPhoto).where(ListingPhoto.listing_id.in_(ids)))
+        if ids:
+            publish("listing_changed")
+            remove_orphaned_photos(digests)
+        archived += len(ids)
+        if len(ids) < ARCHIVE_BATCH_SIZE:
+            return archived
+
+
+def purge_idempotency_keys() -> int:
+    """Задача планировщика: удаляет ключи Idempotency-Key старше LISTING_IDEMPOTENCY_TTL_HOURS"""
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            delete(ListingIdempotencyKey).where(ListingIdempotencyKey.expires_at < datetime.now(timezone.utc))
+        )
+        db.commit()
+        return result.rowcount or 0
+    finally:
+        db.close()
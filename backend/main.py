@@ -1,15 +1,42 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
+from typing import Optional
+import asyncio
 import os
 
 # Импортируем модули как часть пакета backend
-from .routes import router
-from .database import init_db
+from .routes import is_admin_init_data, router, telegram_id_from_init_data
+from .alerts import alert_dispatcher
+from .analytics import ANALYTICS_INTERVAL_SECONDS, activity_tracker, refresh_analytics
+from .audit import AUDIT_MODE, audit_writer
+from .compression import CompressionMiddleware
+from .database import SessionLocal, init_db
+from .districts import DISTRICTS_APPROXIMATE
+from .invalidation import invalidation_bus
+from .lifecycle import (
+    ARCHIVE_INTERVAL_SECONDS,
+    EXPIRY_INTERVAL_SECONDS,
+    archive_closed_listings,
+    expire_listings,
+    purge_idempotency_keys,
+)
+from .matching import matching_engine
+from .metrics import MetricsMiddleware, render_metrics
+from .partitions import PARTITION_MAINTENANCE_INTERVAL_SECONDS, maintain_listing_partitions
+from .photos import shutdown_photo_pool
+from .profiling import ProfilingMiddleware
+from .ratelimit import RATE_LIMIT_BACKEND, RateLimitMiddleware, purge_expired_counters
+from .scheduler import scheduler
+from .stats import view_counter
+from .tiles import tile_cache
 
 app = FastAPI(title="Minsk Jobs Telegram Mini App")
 
+# Ограничение частоты записи и авторизации; ближе всех к роутам, чтобы ответ 429 получил CORS-заголовки
+app.add_middleware(RateLimitMiddleware, identify=telegram_id_from_init_data)
+
 # CORS для разработки (в продакшене можно ограничить)
 app.add_middleware(
     CORSMiddleware,
@@ -19,6 +46,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Сжатие br/gzip снаружи CORS; метрики ниже видят уже сжатые размеры ответов
+app.add_middleware(CompressionMiddleware)
+
+# Профилирование по флагу администратора или по PROFILE_SAMPLE_RATE
+app.add_middleware(ProfilingMiddleware, authorize=is_admin_init_data)
+
+# Метрики добавляются последними, чтобы снаружи мерить всё, включая CORS
+app.add_middleware(MetricsMiddleware)
+
 # Подключаем роуты API
 app.include_router(router)
 
@@ -45,6 +81,32 @@ async def startup_event():
     try:
         # Инициализируем базу данных (PostgreSQL или SQLite)
         init_db()
+        db = SessionLocal()
+        try:
+            subscriptions_count = alert_dispatcher.load(db)
+        finally:
+            db.close()
+        alert_dispatcher.start()
+        scheduler.add_job("expire_listings", EXPIRY_INTERVAL_SECONDS, expire_listings)
+        scheduler.add_job("archive_closed_listings", ARCHIVE_INTERVAL_SECONDS, archive_closed_listings)
+        scheduler.add_job("maintain_listing_partitions", PARTITION_MAINTENANCE_INTERVAL_SECONDS, maintain_listing_partitions)
+        scheduler.add_job("purge_idempotency_keys", 3600, purge_idempotency_keys)
+        if RATE_LIMIT_BACKEND == "database":
+            scheduler.add_job("purge_rate_limit_counters", 300, purge_expired_counters)
+        scheduler.add_job("refresh_analytics", ANALYTICS_INTERVAL_SECONDS, refresh_analytics)
+        scheduler.start()
+        view_counter.start()
+        activity_tracker.start()
+        invalidation_bus.start()
+        matching_engine.start()
+        await asyncio.to_thread(tile_cache.ensure_loaded)
+        if AUDIT_MODE == "background":
+            audit_writer.start()
+        print(f"Подписок на уведомления загружено: {subscriptions_count}")
+        if not alert_dispatcher.sender:
+            print("TELEGRAM_BOT_TOKEN не задан: уведомления по подпискам не отправляются")
+        if DISTRICTS_APPROXIMATE:
+            print("Границы районов приблизительные (заглушка): укажите точные в DISTRICTS_FILE")
         print("Приложение готово к работе")
         print("=" * 50)
     except Exception as e:
@@ -55,12 +117,36 @@ async def startup_event():
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Останавливаем планировщик, сбрасываем просмотры, досылаем уведомления и дописываем журнал аудита"""
+    await scheduler.stop()
+    await view_counter.stop()
+    await activity_tracker.stop()
+    invalidation_bus.stop()
+    matching_engine.stop()
+    await alert_dispatcher.stop()
+    await asyncio.to_thread(shutdown_photo_pool)
+    written = audit_writer.stop()
+    if written:
+        print(f"Журнал аудита: дописано записей при остановке: {written}")
+
+
 @app.get("/api/health")
 async def health_check():
     """Проверка работоспособности API"""
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Метрики в формате Prometheus (если задан METRICS_TOKEN — только с Bearer-токеном)"""
+    token = os.getenv("METRICS_TOKEN")
+    if token and authorization != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Неверный токен метрик")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/")
 async def index():
     """
@@ -79,6 +165,18 @@ async def board():
     return FileResponse(board_file)
 
 
+@app.get("/sw.js", include_in_schema=False)
+async def service_worker():
+    """
+    Service worker из frontend/sw.js; с корня, чтобы он управлял / и /board.html
+    """
+    return FileResponse(
+        os.path.join(frontend_path, "sw.js"),
+        media_type="application/javascript",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
 @app.get("/admin.html")
 async def admin():
     """
@@ -0,0 +1,581 @@
+"""
+Подбор пар «задача — исполнитель» с заранее посчитанными рекомендациями.
+
+Оценка пары (симметрична, поэтому одно число годится для обоих списков):
+
+    score = MATCH_WEIGHT_TEXT · текст + MATCH_WEIGHT_DISTANCE · расстояние
+            + MATCH_WEIGHT_PAYMENT · оплата
+
+  - текст — косинус TF-IDF векторов заголовка (вес 2) и описания; слова
+    нормализуются как в similarity.py (ё → е) и обрезаются до основы, как
+    ключевые слова подписок (alerts.KEYWORD_STEM_LENGTH). Основы, которые
+    встречаются больше чем в MATCH_STOP_DF_RATIO объявлений («помощь»,
+    шаблонные фразы), в вектор не входят;
+  - расстояние — exp(−d / MATCH_DISTANCE_SCALE_KM), дальше
+    MATCH_MAX_DISTANCE_KM пара не рассматривается;
+  - оплата — 1, если задача платит не меньше, чем просит исполнитель, иначе
+    доля; 0.5, если сумма не указана («договорная») или единицы разные
+    (в час против в день).
+
+Кандидаты противоположного типа берутся из инвертированного индекса по
+основам и из соседних ячеек сетки (в пределах ~1 км пара интересна и без
+общих слов). Пары одного автора не предлагаются.
+
+Индекс живёт в памяти каждого воркера, как подписки в alerts.py. Для каждого
+объявления хранится MATCH_TOP_K лучших пар и MATCH_TOP_K_SPARE запасных:
+  - новое или изменённое объявление считает свой список и вставляется в
+    списки кандидатов, если проходит в них;
+  - снятое удаляется из чужих списков; список пересчитывается целиком, только
+    когда запас кончился и в нём меньше MATCH_TOP_K пар (запас гарантирует,
+    что оставшиеся — действительно лучшие).
+Поэтому /api/listings/{id}/matches читает готовый список. Изменения приходят
+событием listing_changed шины инвалидации (с id объявления — точечно, без id
+после массовых закрытий — сверкой множества активных id) и обрабатываются
+фоновым потоком; если обработка упала, id возвращаются в очередь и
+повторяются, а первая загрузка индекса повторяется с растущей паузой (до
+MATCH_LOAD_RETRY_MAX_SECONDS), пока не удастся. После старта списки досчитываются в фоне (на 50k объявлений —
+около 3 мс на список), запрос к ещё не посчитанному объявлению считает его
+список на месте.
+
+Веса IDF фиксируются при построении вектора объявления и со временем слегка
+расходятся с текущими частотами — для ранжирования это несущественно.
+Стоимость обновления на 50k объявлений: python -m bench.matching_bench.
+"""
+
+import bisect
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+
+from .alerts import KEYWORD_STEM_LENGTH, parse_payment_amount
+from .database import engine
+from .invalidation import subscribe
+from .metrics import LATENCY_BUCKETS, Counter, Histogram, register
+from .models import Listing
+
+MATCHING_ENABLED = os.getenv("MATCHING_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "10"))
+MATCH_TOP_K_SPARE = int(os.getenv("MATCH_TOP_K_SPARE", "10"))
+MATCH_MAX_DISTANCE_KM = float(os.getenv("MATCH_MAX_DISTANCE_KM", "20"))
+MATCH_DISTANCE_SCALE_KM = float(os.getenv("MATCH_DISTANCE_SCALE_KM", "3"))
+MATCH_MIN_SCORE = float(os.getenv("MATCH_MIN_SCORE", "0.25"))
+MATCH_WEIGHT_TEXT = float(os.getenv("MATCH_WEIGHT_TEXT", "0.5"))
+MATCH_WEIGHT_DISTANCE = float(os.getenv("MATCH_WEIGHT_DISTANCE", "0.35"))
+MATCH_WEIGHT_PAYMENT = float(os.getenv("MATCH_WEIGHT_PAYMENT", "0.15"))
+MATCH_STOP_DF_RATIO = float(os.getenv("MATCH_STOP_DF_RATIO", "0.2"))
+# Досчёт списков после старта идёт пачками под блокировкой с паузой такой же длины,
+# чтобы не занимать GIL и чтение списков больше чем наполовину
+MATCH_WARMUP_BATCH = int(os.getenv("MATCH_WARMUP_BATCH", "20"))
+
+LISTING_TYPES = ("task", "worker")
+# Частоты на маленькой базе ничего не говорят: основа становится «стоп-словом» не раньше этого df
+STOP_MIN_DF = 50
+# Ячейка ~1.1 x 1.1 км на широте Минска; кандидаты без общих слов — из 3x3 соседних ячеек
+CELL_LAT = 0.01
+CELL_LON = 0.016
+TITLE_WEIGHT = 2
+REFRESH_CHUNK = 500
+MATCH_LOAD_RETRY_MAX_SECONDS = float(os.getenv("MATCH_LOAD_RETRY_MAX_SECONDS", "60"))
+# Пауза перед повтором обновлений (и первая пауза перед повтором загрузки), если БД недоступна
+UPDATE_RETRY_SECONDS = 1.0
+KM_PER_DEGREE_LAT = 110.57
+KM_PER_DEGREE_LON = 111.32 * math.cos(math.radians(53.9))
+
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+_HOUR_RE = re.compile(r"/\s*ч|в\s+час|час")
+_DAY_RE = re.compile(r"/\s*д|в\s+день|день|смен|сутк")
+
+MATCH_UPDATES = register(Counter("matching_updates_total", "Обновления индекса подбора", ("op",)))
+MATCH_UPDATE_SECONDS = register(
+    Histogram("matching_update_seconds", "Время обновления индекса подбора", LATENCY_BUCKETS, ("op",))
+)
+MATCH_RECOMPUTES = register(
+    Counter("matching_recomputes_total", "Полные пересчёты списков после исчерпания запаса")
+)
+
+
+def listing_stems(title: str, description: str) -> dict[str, int]:
+    """Частоты основ слов; слова заголовка считаются TITLE_WEIGHT раз"""
+    counts: dict[str, int] = defaultdict(int)
+    for text, weight in ((title, TITLE_WEIGHT), (description, 1)):
+        for word in _WORD_RE.findall((text or "").lower().replace("ё", "е")):
+            if len(word) >= 3:
+                counts[word[:KEYWORD_STEM_LENGTH]] += weight
+    return counts
+
+
+def payment_terms(payment: Optional[str]) -> tuple[Optional[float], Optional[str]]:
+    """Сумма и единица оплаты: «от 15 BYN/час» -> (15.0, 'hour'), «договорная» -> (None, None)"""
+    amount = parse_payment_amount(payment)
+    if amount is None:
+        return None, None
+    text = payment.lower()
+    if _HOUR_RE.search(text):
+        return amount, "hour"
+    if _DAY_RE.search(text):
+        return amount, "day"
+    return amount, None
+
+
+def payment_score(offered: tuple, asked: tuple) -> float:
+    """Совместимость оплаты задачи offered с запросом исполнителя asked (пары из payment_terms)"""
+    offered_amount, offered_unit = offered
+    asked_amount, asked_unit = asked
+    if offered_amount is None or asked_amount is None or offered_unit != asked_unit:
+        return 0.5
+    if offered_amount >= asked_amount or asked_amount <= 0:
+        return 1.0
+    return offered_amount / asked_amount
+
+
+def _plane_km(latitude: float, longitude: float) -> tuple[float, float]:
+    # Равнопромежуточная проекция с опорной широтой Минска: в пределах города ошибка
+    # расстояний меньше процента, а пара считается одним hypot вместо haversine
+    return longitude * KM_PER_DEGREE_LON, latitude * KM_PER_DEGREE_LAT
+
+
+def _cell(latitude: float, longitude: float) -> tuple[int, int]:
+    return int(math.floor(latitude / CELL_LAT)), int(math.floor(longitude / CELL_LON))
+
+
+def _opposite(listing_type: str) -> str:
+    return "worker" if listing_type == "task" else "task"
+
+
+@dataclass
+class MatchEntry:
+    id: int
+    user_id: int
+    type: str
+    x: float
+    y: float
+    pay: tuple
+    stems: frozenset
+    vector: dict
+    cell: tuple
+    summary: dict
+    fingerprint: tuple
+
+
+def _fingerprint(row: dict) -> tuple:
+    return (
+        row["user_id"], row["type"], row["title"], row["description"],
+        row["payment"], row["latitude"], row["longitude"],
+    )
+
+
+def _summary(row: dict) -> dict:
+    created_at = row.get("created_at")
+    return {
+        "id": row["id"],
+        "type": row["type"],
+        "title": row["title"],
+        "address": row["address"],
+        "payment": row["payment"],
+        "latitude": row["latitude"],
+        "longitude": row["longitude"],
+        "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+    }
+
+
+class MatchIndex:
+    """
+    Индекс активных объявлений и их списки лучших пар. Не потокобезопасен:
+    вызывающий держит блокировку (MatchingEngine).
+
+    tops[id] — до MATCH_TOP_K + MATCH_TOP_K_SPARE пар (−score, other_id) по
+    возрастанию, referrers[id] — чьи списки содержат id, exhaustive — списки,
+    в которые вошли все подходящие кандидаты (их пересчитывать не нужно).
+    """
+
+    def __init__(self, top_k: int = MATCH_TOP_K, spare: int = MATCH_TOP_K_SPARE):
+        self.top_k = top_k
+        self.capacity = top_k + spare
+        self.entries: dict[int, MatchEntry] = {}
+        self.points: dict[int, tuple] = {}
+        self.df: dict[str, int] = defaultdict(int)
+        self.postings: dict[tuple, dict[int, float]] = defaultdict(dict)
+        self.cells: dict[tuple, set[int]] = defaultdict(set)
+        self.tops: dict[int, list[tuple[float, int]]] = {}
+        self.referrers: dict[int, set[int]] = defaultdict(set)
+        self.exhaustive: set[int] = set()
+        self.without_top: deque[int] = deque()
+        self.recomputes = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # --- построение записей ---
+
+    def _vector(self, counts: dict[str, int], total: int) -> dict[str, float]:
+        stop_df = max(STOP_MIN_DF, MATCH_STOP_DF_RATIO * total)
+        weights = {
+            stem: (1 + math.log(count)) * (math.log((total + 1) / (self.df[stem] + 1)) + 1)
+            for stem, count in counts.items()
+            if self.df[stem] <= stop_df
+        }
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        return {stem: w / norm for stem, w in weights.items()} if norm else {}
+
+    def _entry(self, row: dict, counts: dict[str, int], total: int) -> MatchEntry:
+        x, y = _plane_km(row["latitude"], row["longitude"])
+        return MatchEntry(
+            id=row["id"],
+            user_id=row["user_id"],
+            type=row["type"],
+            x=x,
+            y=y,
+            pay=payment_terms(row["payment"]),
+            stems=frozenset(counts),
+            vector=self._vector(counts, total),
+            cell=_cell(row["latitude"], row["longitude"]),
+            summary=_summary(row),
+            fingerprint=_fingerprint(row),
+        )
+
+    def _attach(self, entry: MatchEntry) -> None:
+        self.entries[entry.id] = entry
+        self.points[entry.id] = (entry.x, entry.y, entry.user_id, entry.pay)
+        for stem, weight in entry.vector.items():
+            self.postings[(entry.type, stem)][entry.id] = weight
+        self.cells[(entry.type, entry.cell)].add(entry.id)
+
+    def load(self, rows: Iterable[dict]) -> int:
+        """Начальная загрузка: сначала частоты по всем объявлениям, потом векторы; списки — позже"""
+        parsed = [
+            (row, listing_stems(row["title"], row["description"]))
+            for row in rows
+            if row["type"] in LISTING_TYPES
+        ]
+        for _, counts in parsed:
+            for stem in counts:
+                self.df[stem] += 1
+        total = len(self.entries) + len(parsed)
+        for row, counts in parsed:
+            self._attach(self._entry(row, counts, total))
+        self.without_top.extend(row["id"] for row, _ in parsed)
+        return len(parsed)
+
+    # --- оценка ---
+
+    def _candidates(self, entry: MatchEntry) -> dict[int, float]:
+        """Кандидаты противоположного типа с косинусом текста (0 — только соседи по сетке)"""
+        other_type = _opposite(entry.type)
+        scores: dict[int, float] = defaultdict(float)
+        for stem, weight in entry.vector.items():
+            for other_id, other_weight in self.postings.get((other_type, stem), {}).items():
+                scores[other_id] += weight * other_weight
+        row, col = entry.cell
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                for other_id in self.cells.get((other_type, (row + d_row, col + d_col)), ()):
+                    scores.setdefault(other_id, 0.0)
+        return scores
+
+    def _scored(self, entry: MatchEntry) -> list[tuple[float, int]]:
+        """Все подходящие пары (−score, other_id). Самый горячий цикл индекса: поля
+        кандидатов читаются из кортежей points, оплата считается раз на вариант"""
+        points = self.points
+        is_task = entry.type == "task"
+        max_distance_sq = MATCH_MAX_DISTANCE_KM ** 2
+        payment_scores: dict[tuple, float] = {}
+        scored = []
+        for other_id, text in self._candidates(entry).items():
+            x, y, user_id, pay = points[other_id]
+            if user_id == entry.user_id:
+                continue
+            dx, dy = x - entry.x, y - entry.y
+            distance_sq = dx * dx + dy * dy
+            if distance_sq > max_distance_sq:
+                continue
+            payment = payment_scores.get(pay)
+            if payment is None:
+                payment = payment_score(entry.pay, pay) if is_task else payment_score(pay, entry.pay)
+                payment_scores[pay] = payment
+            score = (
+                MATCH_WEIGHT_TEXT * text
+                + MATCH_WEIGHT_DISTANCE * math.exp(-math.sqrt(distance_sq) / MATCH_DISTANCE_SCALE_KM)
+                + MATCH_WEIGHT_PAYMENT * payment
+            )
+            if score >= MATCH_MIN_SCORE:
+                scored.append((-score, other_id))
+        return scored
+
+    def _set_top(self, listing_id: int, scored: list[tuple[float, int]]) -> None:
+        for _, other_id in self.tops.get(listing_id, ()):
+            self.referrers[other_id].discard(listing_id)
+        top = heapq.nsmallest(self.capacity, scored)
+        self.tops[listing_id] = top
+        for _, other_id in top:
+            self.referrers[other_id].add(listing_id)
+        if len(scored) <= self.capacity:
+            self.exhaustive.add(listing_id)
+        else:
+            self.exhaustive.discard(listing_id)
+
+    def compute_top(self, listing_id: int) -> None:
+        """Полный пересчёт списка одного объявления (другие списки не трогаются)"""
+        self._set_top(listing_id, self._scored(self.entries[listing_id]))
+
+    def _offer(self, owner_id: int, score: float, listing_id: int) -> None:
+        """Вставляет пару в чужой посчитанный список, если она туда проходит"""
+        top = self.tops[owner_id]
+        item = (-score, listing_id)
+        if len(top) >= self.capacity:
+            if item >= top[-1]:
+                self.exhaustive.discard(owner_id)
+                return
+            _, dropped = top.pop()
+            self.referrers[dropped].discard(owner_id)
+            self.exhaustive.discard(owner_id)
+        bisect.insort(top, item)
+        self.referrers[listing_id].add(owner_id)
+
+    # --- изменения ---
+
+    def upsert(self, row: dict) -> bool:
+        """Добавляет или обновляет активное объявление; False — значимые поля не менялись"""
+        current = self.entries.get(row["id"])
+        if current is not None and current.fingerprint == _fingerprint(row):
+            current.summary = _summary(row)
+            return False
+        depleted = self._detach(row["id"]) if current is not None else set()
+        counts = listing_stems(row["title"], row["description"])
+        for stem in counts:
+            self.df[stem] += 1
+        entry = self._entry(row, counts, len(self.entries) + 1)
+        self._attach(entry)
+
+        scored = self._scored(entry)
+        for negative_score, other_id in scored:
+            if other_id in self.tops:
+                self._offer(other_id, -negative_score, entry.id)
+        self._set_top(entry.id, scored)
+        self._refill(depleted)
+        return True
+
+    def remove(self, listing_id: int) -> bool:
+        if listing_id not in self.entries:
+            return False
+        self._refill(self._detach(listing_id))
+        return True
+
+    def _detach(self, listing_id: int) -> set[int]:
+        """Убирает объявление из индекса и чужих списков; возвращает списки, где кончился запас"""
+        entry = self.entries.pop(listing_id)
+        del self.points[listing_id]
+        for stem in entry.stems:
+            self.df[stem] -= 1
+            if not self.df[stem]:
+                del self.df[stem]
+        for stem in entry.vector:
+            postings = self.postings[(entry.type, stem)]
+            postings.pop(listing_id, None)
+            if not postings:
+                del self.postings[(entry.type, stem)]
+        cell = self.cells[(entry.type, entry.cell)]
+        cell.discard(listing_id)
+        if not cell:
+            del self.cells[(entry.type, entry.cell)]
+
+        for _, other_id in self.tops.pop(listing_id, ()):
+            self.referrers[other_id].discard(listing_id)
+        self.exhaustive.discard(listing_id)
+
+        depleted = set()
+        for owner_id in self.referrers.pop(listing_id, ()):
+            top = self.tops[owner_id]
+            top[:] = [item for item in top if item[1] != listing_id]
+            if len(top) < self.top_k and owner_id not in self.exhaustive:
+                depleted.add(owner_id)
+        return depleted
+
+    def _refill(self, owners: set[int]) -> None:
+        for owner_id in owners:
+            if owner_id in self.entries:
+                MATCH_RECOMPUTES.inc()
+                self.recomputes += 1
+                self.compute_top(owner_id)
+
+    def warm_up(self, limit: int) -> int:
+        """Досчитывает до limit списков, не посчитанных после загрузки"""
+        done = 0
+        while self.without_top and done < limit:
+            listing_id = self.without_top.popleft()
+            if listing_id in self.entries and listing_id not in self.tops:
+                self.compute_top(listing_id)
+                done += 1
+        return done
+
+    # --- чтение ---
+
+    def matches(self, listing_id: int, limit: int) -> Optional[list[dict]]:
+        entry = self.entries.get(listing_id)
+        if entry is None:
+            return None
+        if listing_id not in self.tops:
+            self.compute_top(listing_id)
+        items = []
+        for negative_score, other_id in self.tops[listing_id][: min(limit, self.top_k)]:
+            other = self.entries[other_id]
+            task, worker = (entry, other) if entry.type == "task" else (other, entry)
+            text = sum(weight * other.vector.get(stem, 0.0) for stem, weight in entry.vector.items())
+            items.append({
+                **other.summary,
+                "score": round(-negative_score, 3),
+                "distance_km": round(math.hypot(other.x - entry.x, other.y - entry.y), 2),
+                "text_similarity": round(text, 3),
+                "payment_compatibility": round(payment_score(task.pay, worker.pay), 2),
+            })
+        return items
+
+
+_LISTING_COLUMNS = (
+    Listing.id, Listing.user_id, Listing.type, Listing.title, Listing.description,
+    Listing.address, Listing.payment, Listing.latitude, Listing.longitude, Listing.created_at,
+)
+
+
+class MatchingEngine:
+    """Индекс подбора воркера: загрузка из БД, фоновый поток обновлений, чтение под блокировкой"""
+
+    def __init__(self, index: Optional[MatchIndex] = None):
+        self.index = index or MatchIndex()
+        self.ready = False
+        self._lock = threading.Lock()
+        self._pending: set[int] = set()
+        self._resync = False
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def on_listing_changed(self, event: str, key: Optional[str]) -> None:
+        with self._pending_lock:
+            if key is None:
+                self._resync = True
+            else:
+                self._pending.add(int(key))
+        self._wake.set()
+
+    def load(self) -> int:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(*_LISTING_COLUMNS)
+                .where(Listing.status == "active")
+                .order_by(Listing.created_at.desc())
+            ).mappings().all()
+        with self._lock:
+            count = self.index.load(rows)
+        self.ready = True
+        return count
+
+    def refresh(self, listing_ids: Iterable[int]) -> None:
+        """Перечитывает объявления из БД: активные — в индекс, остальные — из индекса"""
+        listing_ids = list(listing_ids)
+        rows = {}
+        with engine.connect() as conn:
+            for start in range(0, len(listing_ids), REFRESH_CHUNK):
+                chunk = listing_ids[start:start + REFRESH_CHUNK]
+                for row in conn.execute(
+                    select(*_LISTING_COLUMNS, Listing.status).where(Listing.id.in_(chunk))
+                ).mappings():
+                    rows[row["id"]] = row
+        for listing_id in listing_ids:
+            row = rows.get(listing_id)
+            started = time.perf_counter()
+            with self._lock:
+                if row is not None and row["status"] == "active" and row["type"] in LISTING_TYPES:
+                    op = "upsert" if self.index.upsert(row) else "unchanged"
+                else:
+                    op = "remove" if self.index.remove(listing_id) else "unchanged"
+            MATCH_UPDATES.inc(op)
+            MATCH_UPDATE_SECONDS.observe(time.perf_counter() - started, op)
+
+    def resync(self) -> None:
+        """После массовых закрытий: сверка множества активных id с индексом"""
+        with engine.connect() as conn:
+            active = set(conn.execute(select(Listing.id).where(Listing.status == "active")).scalars())
+        with self._lock:
+            known = set(self.index.entries)
+        changed = (known - active) | (active - known)
+        if changed:
+            self.refresh(sorted(changed))
+
+    def matches(self, listing_id: int, limit: int = MATCH_TOP_K) -> Optional[list[dict]]:
+        with self._lock:
+            return self.index.matches(listing_id, limit)
+
+    def _take_pending(self) -> tuple[set[int], bool]:
+        with self._pending_lock:
+            pending, resync = self._pending, self._resync
+            self._pending, self._resync = set(), False
+            self._wake.clear()
+        return pending, resync
+
+    def _requeue(self, pending: set[int], resync: bool) -> None:
+        with self._pending_lock:
+            self._pending |= pending
+            self._resync = self._resync or resync
+
+    def _load_until_ready(self) -> bool:
+        delay = UPDATE_RETRY_SECONDS
+        while not self._stop.is_set():
+            try:
+                count = self.load()
+                print(f"Подбор пар: загружено объявлений: {count}")
+                return True
+            except Exception as e:
+                print(f"Подбор пар: не удалось загрузить объявления, повтор через {delay:.0f} с: {e}")
+            self._stop.wait(delay)
+            delay = min(delay * 2, MATCH_LOAD_RETRY_MAX_SECONDS)
+        return False
+
+    def _run(self) -> None:
+        if not self._load_until_ready():
+            return
+        while not self._stop.is_set():
+            pending, resync = self._take_pending()
+            try:
+                if resync:
+                    self.resync()
+                if pending:
+                    self.refresh(sorted(pending))
+            except Exception as e:
+                print(f"Подбор пар: ошибка обновления индекса, повтор через {UPDATE_RETRY_SECONDS:.0f} с: {e}")
+                self._requeue(pending, resync)
+                self._stop.wait(UPDATE_RETRY_SECONDS)
+                continue
+            if pending or resync:
+                continue
+            started = time.perf_counter()
+            with self._lock:
+                warmed = self.index.warm_up(MATCH_WARMUP_BATCH)
+            self._wake.wait(timeout=time.perf_counter() - started if warmed else 1.0)
+
+    def start(self) -> None:
+        if not MATCHING_ENABLED or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="matching", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+matching_engine = MatchingEngine()
+subscribe("listing_changed", matching_engine.on_listing_changed)
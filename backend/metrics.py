@@ -0,0 +1,332 @@
+"""
+Метрики в формате Prometheus и учёт SQL на каждый запрос.
+
+MetricsMiddleware меряет латентность и размеры запросов/ответов по шаблону
+роута, а обработчики событий SQLAlchemy считают выполненные выражения и
+время в БД — общее и в разрезе текущего запроса (через contextvar).
+Запросы дольше SLOW_REQUEST_MS печатаются вместе с выполненным SQL.
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+
+from .cache import CACHES
+from .database import engine
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_MAX_STATEMENTS = 50
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+def set_enabled(enabled: bool) -> None:
+    global METRICS_ENABLED
+    METRICS_ENABLED = enabled
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value:g}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        # label_values -> [счётчики по бакетам..., +Inf, сумма]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(label_values)
+            if row is None:
+                row = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(key, list(row)) for key, row in self._values.items()]
+        for label_values, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = 'le="%g"' % bound
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}"
+            cumulative += row[len(self.buckets)]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {row[-1]:g}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}"
+
+
+class Gauge:
+    """Значение снимается функцией в момент выгрузки /metrics"""
+
+    TYPE = "gauge"
+
+    def __init__(self, name: str, help_text: str, collect: Callable[[], list[tuple[tuple, float]]], labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.collect = collect
+        self.labels = labels
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+        for label_values, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value:g}"
+
+
+class CollectedCounter(Gauge):
+    """Монотонный счётчик, который ведёт сам объект (например, TTLCache); снимается при выгрузке /metrics"""
+
+    TYPE = "counter"
+
+
+REGISTRY: list = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = register(
+    Counter("http_requests_total", "HTTP-запросы", ("method", "route", "status"))
+)
+HTTP_LATENCY = register(
+    Histogram("http_request_duration_seconds", "Время обработки запроса", LATENCY_BUCKETS, ("method", "route"))
+)
+HTTP_REQUEST_SIZE = register(
+    Histogram("http_request_size_bytes", "Размер тела запроса", SIZE_BUCKETS, ("method", "route"))
+)
+HTTP_RESPONSE_SIZE = register(
+    Histogram("http_response_size_bytes", "Размер тела ответа", SIZE_BUCKETS, ("method", "route"))
+)
+DB_STATEMENTS = register(Counter("db_statements_total", "Выполненные SQL-выражения"))
+DB_TIME = register(Counter("db_time_seconds_total", "Суммарное время выполнения SQL"))
+DB_STATEMENTS_PER_REQUEST = register(
+    Histogram("http_request_db_statements", "SQL-выражений на запрос", COUNT_BUCKETS, ("route",))
+)
+DB_TIME_PER_REQUEST = register(
+    Histogram("http_request_db_seconds", "Время в БД на запрос", LATENCY_BUCKETS, ("route",))
+)
+SLOW_REQUESTS = register(Counter("http_slow_requests_total", "Запросы дольше SLOW_REQUEST_MS", ("route",)))
+
+
+def _collect_cache(value: Callable) -> Callable[[], list[tuple[tuple, float]]]:
+    return lambda: [((name,), value(cache)) for name, cache in list(CACHES.items())]
+
+
+register(CollectedCounter("cache_hits_total", "Попадания в in-process кэши", _collect_cache(lambda c: c.hits), ("cache",)))
+register(CollectedCounter("cache_misses_total", "Промахи in-process кэшей", _collect_cache(lambda c: c.misses), ("cache",)))
+register(Gauge("cache_entries", "Записей в in-process кэшах", _collect_cache(len), ("cache",)))
+
+
+def _collect_pool() -> list[tuple[tuple, float]]:
+    pool = engine.pool
+    values = []
+    for name in ("size", "checkedout", "overflow", "checkedin"):
+        getter = getattr(pool, name, None)
+        if callable(getter):
+            values.append(((name,), getter()))
+    return values
+
+
+def _collect_pool_saturation() -> list[tuple[tuple, float]]:
+    pool = engine.pool
+    size = getattr(pool, "size", None)
+    checkedout = getattr(pool, "checkedout", None)
+    if not callable(size) or not callable(checkedout) or not size():
+        return []
+    return [((), checkedout() / size())]
+
+
+register(Gauge("db_pool_connections", "Состояние пула соединений", _collect_pool, ("state",)))
+register(Gauge("db_pool_saturation", "Доля занятых соединений от размера пула", _collect_pool_saturation))
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_time", "log", "log_limit", "active_statement")
+
+    def __init__(self, log_limit: int = SLOW_REQUEST_MAX_STATEMENTS):
+        self.statements = 0
+        self.db_time = 0.0
+        self.log: list[tuple[str, float]] = []
+        self.log_limit = log_limit
+        # Выражение, которое выполняется прямо сейчас (его видит сэмплирующий профилировщик)
+        self.active_statement: Optional[str] = None
+
+
+_current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "metrics_current_request", default=None
+)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+def begin_request_stats(stats: RequestStats) -> contextvars.Token:
+    """Включает учёт SQL для текущего запроса, даже если сами метрики выключены"""
+    return _current_request.set(stats)
+
+
+def end_request_stats(token: contextvars.Token) -> None:
+    _current_request.reset(token)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_request.get()
+    if (METRICS_ENABLED or stats is not None) and context is not None:
+        # Начало хранится в контексте выражения: при ошибке он просто отбрасывается
+        # и не оставляет на соединении пула чужого времени старта
+        context.metrics_query_start = time.perf_counter()
+        if stats is not None:
+            stats.active_statement = statement
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "metrics_query_start", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if METRICS_ENABLED:
+        DB_STATEMENTS.inc()
+        DB_TIME.inc(amount=elapsed)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.active_statement = None
+        stats.statements += 1
+        stats.db_time += elapsed
+        if len(stats.log) < stats.log_limit:
+            stats.log.append((statement, elapsed))
+
+
+@event.listens_for(engine, "handle_error")
+def _handle_error(exception_context):
+    stats = _current_request.get()
+    if stats is not None:
+        stats.active_statement = None
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: латентность, размеры и SQL-статистика по каждому HTTP-запросу"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        request_size = 0
+        response_size = 0
+        status_code = 500
+
+        async def receive_wrapper():
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_size, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            _current_request.reset(token)
+            elapsed = time.perf_counter() - started
+            method = scope["method"]
+            route = _route_label(scope)
+            HTTP_REQUESTS.inc(method, route, status_code)
+            HTTP_LATENCY.observe(elapsed, method, route)
+            HTTP_REQUEST_SIZE.observe(request_size, method, route)
+            HTTP_RESPONSE_SIZE.observe(response_size, method, route)
+            DB_STATEMENTS_PER_REQUEST.observe(stats.statements, route)
+            DB_TIME_PER_REQUEST.observe(stats.db_time, route)
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                SLOW_REQUESTS.inc(route)
+                _log_slow_request(method, scope.get("path", route), elapsed, status_code, stats)
+
+
+def _log_slow_request(method: str, path: str, elapsed: float, status_code: int, stats: RequestStats) -> None:
+    print(
+        f"МЕДЛЕННЫЙ ЗАПРОС {method} {path} -> {status_code}: {elapsed * 1000:.0f} мс, "
+        f"SQL: {stats.statements} шт., {stats.db_time * 1000:.0f} мс"
+    )
+    for statement, statement_time in stats.log:
+        print(f"    {statement_time * 1000:7.1f} мс  {' '.join(statement.split())[:500]}")
+    if stats.statements > len(stats.log):
+        print(f"    … ещё {stats.statements - len(stats.log)} выражений")
@@ -2,13 +2,19 @@ from sqlalchemy import (
     Column,
     Integer,
     BigInteger,
+    SmallInteger,
     String,
     Float,
     DateTime,
     Text,
     ForeignKey,
     Boolean,
+    JSON,
+    Index,
+    LargeBinary,
+    UniqueConstraint,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -32,7 +38,16 @@ class User(Base):
 
 
 class Listing(Base):
+    # На PostgreSQL таблица секционирована по статусу и месяцу (см. partitions.py),
+    # первичный ключ в БД там (id, status, created_at); ORM адресует строки по id.
     __tablename__ = "listings"
+    # Лента и автоистечение идут по (status, created_at), архивация — по (status, closed_at),
+    # фильтр и счётчики по району — по (status, district_id, type)
+    __table_args__ = (
+        Index("ix_listings_status_created_at", "status", "created_at"),
+        Index("ix_listings_status_closed_at", "status", "closed_at"),
+        Index("ix_listings_status_district_id", "status", "district_id", "type"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -44,12 +59,36 @@ class Listing(Base):
     contacts = Column(String, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
-    status = Column(String, default="active")  # 'active' или 'closed'
+    status = Column(String, default="active")  # 'active', 'closed' или 'expired'
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+    district_id = Column(SmallInteger, nullable=True)  # район из districts.py; NULL — вне известных районов
 
     user = relationship("User", backref="listings")
 
 
+class ListingArchive(Base):
+    """Давно закрытые объявления, перенесённые из listings фоновым заданием"""
+
+    __tablename__ = "listings_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    type = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=False)
+    address = Column(String, nullable=False)
+    payment = Column(String, nullable=False)
+    contacts = Column(String, nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    status = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+    district_id = Column(SmallInteger, nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class TermsDocument(Base):
     __tablename__ = "terms_documents"
 
@@ -63,11 +102,156 @@ class TermsDocument(Base):
 
 class AdminAuditLog(Base):
     __tablename__ = "admin_audit_logs"
+    # Индексы под фильтры журнала с keyset-пагинацией по (created_at, id)
+    __table_args__ = (
+        Index("ix_admin_audit_logs_created_at_id", "created_at", "id"),
+        Index("ix_admin_audit_logs_admin_created", "admin_user_id", "created_at", "id"),
+        Index("ix_admin_audit_logs_target_created", "target_user_id", "created_at", "id"),
+        Index("ix_admin_audit_logs_action_created", "action", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     admin_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     target_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     action = Column(String, nullable=False)
-    details = Column(Text, nullable=True)
+    # Структурированные детали действия: {"listing_id": 1, "reason": "..."}
+    details = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+
+class Subscription(Base):
+    __tablename__ = "subscriptions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    type = Column(String, nullable=True)  # 'task', 'worker' или None (любой)
+    keyword = Column(String, nullable=True)
+    min_payment = Column(Float, nullable=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    radius_km = Column(Float, nullable=False)
+    is_active = Column(Boolean, nullable=False, default=True, server_default="1")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    user = relationship("User", backref="subscriptions")
+
+
+class SchedulerLease(Base):
+    """Аренда лидерства фонового планировщика между воркерами"""
+
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class RateLimitCounter(Base):
+    """Счётчик запросов за одно окно ограничителя частоты (RATE_LIMIT_BACKEND=database)"""
+
+    __tablename__ = "rate_limit_counters"
+
+    key = Column(String, primary_key=True)
+    window_index = Column(BigInteger, primary_key=True, autoincrement=False)
+    hits = Column(Integer, nullable=False, default=0)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class ListingIdempotencyKey(Base):
+    """Ключ Idempotency-Key создания объявления: повтор запроса из очереди клиента не создаёт копию"""
+
+    __tablename__ = "listing_idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True, autoincrement=False)
+    key = Column(String(64), primary_key=True)
+    # Без ForeignKey: на PostgreSQL listings секционирована и её ключ — (id, status, created_at)
+    listing_id = Column(Integer, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class ListingStats(Base):
+    """Счётчики просмотров объявления, пишутся пачками из stats.py"""
+
+    __tablename__ = "listing_stats"
+
+    # Без ForeignKey: на PostgreSQL listings секционирована и её ключ — (id, status, created_at)
+    listing_id = Column(Integer, primary_key=True, autoincrement=False)
+    views = Column(BigInteger, nullable=False, default=0, server_default="0")
+    score = Column(Float, nullable=True)  # ln затухающего числа просмотров, см. stats.py
+    last_viewed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ListingPhoto(Base):
+    """Фото объявления; файлы вариантов адресуются digest (см. photos.py)"""
+
+    __tablename__ = "listing_photos"
+    # Обложка — фото с position = 0; ленты подтягивают её одним join по этому ключу
+    __table_args__ = (UniqueConstraint("listing_id", "position", name="uq_listing_photos_listing_position"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Без ForeignKey: на PostgreSQL listings секционирована и её ключ — (id, status, created_at)
+    listing_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    digest = Column(String(64), nullable=False, index=True)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ListingSignature(Base):
+    """MinHash-подпись объявления для поиска копий (см. similarity.py)"""
+
+    __tablename__ = "listing_signatures"
+    __table_args__ = (Index("ix_listing_signatures_duplicate_of", "duplicate_of"),)
+
+    # Без ForeignKey: на PostgreSQL listings секционирована и её ключ — (id, status, created_at)
+    listing_id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    minhash = Column(LargeBinary, nullable=True)  # None — текст слишком короткий для сравнения
+    duplicate_of = Column(Integer, nullable=True)  # ближайшая активная копия на момент публикации
+    similarity = Column(Float, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ListingSignatureBucket(Base):
+    """LSH-корзины подписей: поиск кандидатов в копии идёт по первичному ключу"""
+
+    __tablename__ = "listing_signature_buckets"
+    __table_args__ = (Index("ix_listing_signature_buckets_listing_id", "listing_id"),)
+
+    bucket = Column(BigInteger, primary_key=True, autoincrement=False)
+    listing_id = Column(Integer, primary_key=True, autoincrement=False)
+
+
+class AnalyticsRollup(Base):
+    """Предагрегированные счётчики админской аналитики (см. analytics.py)"""
+
+    __tablename__ = "analytics_rollups"
+
+    period = Column(String(8), primary_key=True)  # 'hour', 'day' или 'week'
+    metric = Column(String, primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    listing_type = Column(String, primary_key=True, default="", server_default="")  # '' — без разбивки
+    cell = Column(String, primary_key=True, default="", server_default="")  # '' — весь город
+    value = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+
+class AnalyticsCursor(Base):
+    """До какой строки источника события уже учтены в analytics_rollups"""
+
+    __tablename__ = "analytics_cursors"
+
+    source = Column(String, primary_key=True)
+    last_id = Column(BigInteger, nullable=True)
+    last_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class AnalyticsActiveUser(Base):
+    """Кто был активен в текущем и прошлом часе/дне; старые строки удаляет агрегатор"""
+
+    __tablename__ = "analytics_active_users"
+
+    period = Column(String(8), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
@@ -0,0 +1,246 @@
+"""
+Секционирование таблицы listings на PostgreSQL.
+
+    listings                      PARTITION BY LIST (status)
+    ├── listings_active           FOR VALUES IN ('active')
+    └── listings_closed           DEFAULT, PARTITION BY RANGE (created_at)
+        ├── listings_closed_YYYY_MM   по одной секции на месяц
+        └── listings_closed_default   всё, что не попало в месячные секции
+
+Лента, карта и админка читают только status = 'active', поэтому планировщик
+отсекает все секции, кроме listings_active, и латентность не зависит от
+объёма истории. При закрытии объявления PostgreSQL сам переносит строку в
+нужную секцию.
+
+В секционированной таблице первичный ключ обязан включать ключи секционирования,
+поэтому в БД он (id, status, created_at); ORM по-прежнему адресует строки по id,
+уникальность которого обеспечивает общая последовательность listings_id_seq.
+
+maintain_listing_partitions создаёт месячные секции на PARTITION_MONTHS_AHEAD
+вперёд и отсоединяет (DETACH) секции старше PARTITION_RETENTION_MONTHS:
+отсоединённая таблица остаётся в БД как архив и больше не участвует в запросах.
+
+На SQLite listings остаётся обычной таблицей, все функции здесь ничего не делают.
+"""
+
+import os
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "24"))
+PARTITION_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL_SECONDS", "21600"))
+
+_MONTH_PARTITION_RE = re.compile(r"^listings_closed_(\d{4})_(\d{2})$")
+
+_LISTING_COLUMNS = (
+    "id, user_id, type, title, description, address, payment, contacts, "
+    "latitude, longitude, status, created_at, closed_at"
+)
+
+# Индексы родительской таблицы создаются во всех секциях автоматически
+_PARENT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_listings_id ON listings (id)",
+    "CREATE INDEX IF NOT EXISTS ix_listings_status_created_at ON listings (status, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_listings_status_closed_at ON listings (status, closed_at)",
+)
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    month_index = value.year * 12 + value.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"listings_closed_{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(
+        conn.execute(
+            text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('listings'))")
+        ).scalar()
+    )
+
+
+def _attached_month_partitions(conn) -> list[str]:
+    rows = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass('listings_closed')"
+        )
+    ).scalars()
+    return [name for name in rows if _MONTH_PARTITION_RE.match(name)]
+
+
+def create_month_partition(conn, month: datetime) -> bool:
+    """Создаёт секцию listings_closed на месяц month; False, если она уже есть"""
+    name = _partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar():
+        return False
+    start = month.strftime("%Y-%m-%d")
+    end = _add_months(month, 1).strftime("%Y-%m-%d")
+    conn.execute(
+        text(
+            f"CREATE TABLE {name} PARTITION OF listings_closed "
+            f"FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00')"
+        )
+    )
+    return True
+
+
+def create_partitioned_listings(conn, first_month: datetime, now: Optional[datetime] = None) -> None:
+    """Создаёт пустую секционированную listings с месячными секциями от first_month до now + запас"""
+    now = now or datetime.now(timezone.utc)
+    conn.execute(
+        text(
+            """
+            CREATE TABLE listings (
+                id INTEGER NOT NULL DEFAULT nextval('listings_id_seq'),
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                type VARCHAR NOT NULL,
+                title VARCHAR NOT NULL,
+                description TEXT NOT NULL,
+                address VARCHAR NOT NULL,
+                payment VARCHAR NOT NULL,
+                contacts VARCHAR NOT NULL,
+                latitude DOUBLE PRECISION NOT NULL,
+                longitude DOUBLE PRECISION NOT NULL,
+                status VARCHAR NOT NULL DEFAULT 'active',
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                closed_at TIMESTAMPTZ,
+                CONSTRAINT pk_listings_partitioned PRIMARY KEY (id, status, created_at)
+            ) PARTITION BY LIST (status)
+            """
+        )
+    )
+    conn.execute(text("CREATE TABLE listings_active PARTITION OF listings FOR VALUES IN ('active')"))
+    conn.execute(text("CREATE TABLE listings_closed PARTITION OF listings DEFAULT PARTITION BY RANGE (created_at)"))
+    conn.execute(text("CREATE TABLE listings_closed_default PARTITION OF listings_closed DEFAULT"))
+
+    month = _month_start(first_month)
+    last = _add_months(_month_start(now), PARTITION_MONTHS_AHEAD)
+    while month <= last:
+        create_month_partition(conn, month)
+        month = _add_months(month, 1)
+    for statement in _PARENT_INDEXES:
+        conn.execute(text(statement))
+
+
+def convert_listings_to_partitioned(conn, now: Optional[datetime] = None) -> int:
+    """Переводит обычную listings в секционированную с переносом данных. Возвращает число строк."""
+    if conn.dialect.name != "postgresql" or is_partitioned(conn):
+        return 0
+    now = now or datetime.now(timezone.utc)
+
+    conn.execute(text("ALTER TABLE listings RENAME TO listings_unpartitioned"))
+    # Последовательность переживает удаление старой таблицы и продолжает нумерацию
+    conn.execute(text("ALTER SEQUENCE listings_id_seq OWNED BY NONE"))
+    for index in ("ix_listings_id", "ix_listings_status_created_at", "ix_listings_status_closed_at"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+    first_closed = conn.execute(
+        text("SELECT min(created_at) FROM listings_unpartitioned WHERE status IS DISTINCT FROM 'active'")
+    ).scalar()
+    create_partitioned_listings(conn, first_month=first_closed or now, now=now)
+
+    moved = conn.execute(
+        text(
+            f"INSERT INTO listings ({_LISTING_COLUMNS}) "
+            "SELECT id, user_id, type, title, description, address, payment, contacts, "
+            "latitude, longitude, COALESCE(status, 'closed'), COALESCE(created_at, now()), closed_at "
+            "FROM listings_unpartitioned"
+        )
+    ).rowcount
+    conn.execute(text("DROP TABLE listings_unpartitioned"))
+    conn.execute(text("ALTER SEQUENCE listings_id_seq OWNED BY listings.id"))
+    conn.execute(text("SELECT setval('listings_id_seq', COALESCE((SELECT max(id) FROM listings), 0) + 1, false)"))
+    return moved
+
+
+def convert_listings_to_plain(conn) -> int:
+    """Обратное преобразование (downgrade). Отсоединённые секции не возвращаются."""
+    if not is_partitioned(conn):
+        return 0
+    conn.execute(text("ALTER TABLE listings RENAME TO listings_partitioned"))
+    conn.execute(text("ALTER SEQUENCE listings_id_seq OWNED BY NONE"))
+    for index in ("ix_listings_id", "ix_listings_status_created_at", "ix_listings_status_closed_at"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    conn.execute(
+        text(
+            """
+            CREATE TABLE listings (
+                id INTEGER PRIMARY KEY DEFAULT nextval('listings_id_seq'),
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                type VARCHAR NOT NULL,
+                title VARCHAR NOT NULL,
+                description TEXT NOT NULL,
+                address VARCHAR NOT NULL,
+                payment VARCHAR NOT NULL,
+                contacts VARCHAR NOT NULL,
+                latitude DOUBLE PRECISION NOT NULL,
+                longitude DOUBLE PRECISION NOT NULL,
+                status VARCHAR,
+                created_at TIMESTAMPTZ DEFAULT now(),
+                closed_at TIMESTAMPTZ
+            )
+            """
+        )
+    )
+    moved = conn.execute(
+        text(f"INSERT INTO listings ({_LISTING_COLUMNS}) SELECT {_LISTING_COLUMNS} FROM listings_partitioned")
+    ).rowcount
+    conn.execute(text("DROP TABLE listings_partitioned CASCADE"))
+    conn.execute(text("ALTER SEQUENCE listings_id_seq OWNED BY listings.id"))
+    for statement in _PARENT_INDEXES:
+        conn.execute(text(statement))
+    return moved
+
+
+def maintain_listing_partitions(now: Optional[datetime] = None) -> int:
+    """Фоновое задание: секции на будущие месяцы и отсоединение старых. Возвращает число изменений."""
+    from .database import engine
+
+    now = now or datetime.now(timezone.utc)
+    changes = 0
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return 0
+
+        current = _month_start(now)
+        for offset in range(PARTITION_MONTHS_AHEAD + 1):
+            try:
+                with conn.begin_nested():
+                    changes += create_month_partition(conn, _add_months(current, offset))
+            except Exception as e:
+                # Например, в listings_closed_default уже лежат строки за этот месяц
+                print(f"Не удалось создать секцию {_partition_name(_add_months(current, offset))}: {e}")
+
+        oldest_kept = _add_months(current, -PARTITION_RETENTION_MONTHS)
+        for name in _attached_month_partitions(conn):
+            match = _MONTH_PARTITION_RE.match(name)
+            month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+            if month < oldest_kept:
+                conn.execute(text(f"ALTER TABLE listings_closed DETACH PARTITION {name}"))
+                print(f"Секция {name} отсоединена от listings и оставлена как архивная таблица")
+                changes += 1
+    return changes
+
+
+def ensure_listings_partitioning(conn) -> None:
+    """Старт приложения: пустую listings на PostgreSQL сразу делаем секционированной"""
+    if conn.dialect.name != "postgresql" or is_partitioned(conn):
+        return
+    if conn.execute(text("SELECT EXISTS (SELECT 1 FROM listings)")).scalar():
+        print("listings не секционирована: примените миграцию alembic 20261019_06")
+        return
+    convert_listings_to_partitioned(conn)
@@ -0,0 +1,242 @@
+"""
+Фотографии объявлений.
+
+Загрузка: тело multipart-запроса разбирается потоково (python-multipart) и
+кусками пишется во временный файл с подсчётом SHA-256 — файл целиком в
+памяти не держится, а превышение PHOTO_MAX_BYTES обрывает приём сразу.
+
+Обработка: декодирование и ресайз идут в пуле процессов (PHOTO_WORKERS),
+чтобы не занимать ни цикл событий, ни GIL. Из исходника получаются:
+
+    <sha256>_thumb.webp, <sha256>_thumb.jpg   превью PHOTO_THUMB_SIZE px (JPEG — запасной)
+    <sha256>_full.webp                        карточка PHOTO_FULL_SIZE px
+
+Файлы адресуются хэшем исходника и лежат в PHOTOS_DIR/<первые 2 символа>/,
+поэтому одинаковые фото хранятся один раз, а URL никогда не меняет
+содержимое и отдаётся с Cache-Control: immutable. Исходник не сохраняется:
+варианты перекодированы и не содержат EXIF (в том числе геометок).
+Файлы может делить несколько объявлений, поэтому при удалении записей
+listing_photos (удаление фото, архивация объявлений) они стираются, только
+когда на digest больше не ссылается ни одна запись.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+PHOTOS_DIR = os.getenv(
+    "PHOTOS_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "media", "photos")
+)
+PHOTO_MAX_BYTES = int(os.getenv("PHOTO_MAX_BYTES", str(10 * 1024 * 1024)))
+PHOTO_MAX_PIXELS = int(os.getenv("PHOTO_MAX_PIXELS", str(40_000_000)))
+PHOTO_MAX_PER_LISTING = int(os.getenv("PHOTO_MAX_PER_LISTING", "5"))
+PHOTO_THUMB_SIZE = int(os.getenv("PHOTO_THUMB_SIZE", "320"))
+PHOTO_FULL_SIZE = int(os.getenv("PHOTO_FULL_SIZE", "1600"))
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", str(min(4, os.cpu_count() or 1))))
+PHOTO_CHUNK_SIZE = 64 * 1024
+
+PHOTO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PHOTO_VARIANTS = (("thumb", "webp"), ("thumb", "jpg"), ("full", "webp"))
+PHOTO_FILE_RE = re.compile(r"^(?P<digest>[0-9a-f]{64})_(?P<variant>thumb|full)\.(?P<ext>webp|jpg)$")
+PHOTO_MEDIA_TYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+
+
+class PhotoError(ValueError):
+    """Загрузку нельзя принять; текст сообщения показывается пользователю"""
+
+
+class PhotoTooLarge(PhotoError):
+    pass
+
+
+@dataclass
+class ReceivedUpload:
+    path: str
+    digest: str
+    size: int
+
+
+def photo_path(name: str) -> Optional[str]:
+    """Путь к файлу варианта по имени из URL или None, если имя некорректно"""
+    match = PHOTO_FILE_RE.match(name)
+    if not match:
+        return None
+    return os.path.join(PHOTOS_DIR, match.group("digest")[:2], name)
+
+
+def remove_photo_files(digests) -> int:
+    """Удаляет файлы вариантов для digest, на которые уже не ссылаются записи listing_photos"""
+    removed = 0
+    for digest in digests:
+        for variant, ext in PHOTO_VARIANTS:
+            try:
+                os.unlink(photo_path(f"{digest}_{variant}.{ext}"))
+            except FileNotFoundError:
+                continue
+            removed += 1
+    return removed
+
+
+def photo_url(digest: Optional[str], variant: str = "thumb", ext: str = "webp") -> Optional[str]:
+    if not digest:
+        return None
+    return f"/media/photos/{digest}_{variant}.{ext}"
+
+
+def variants_exist(digest: str) -> bool:
+    return all(os.path.exists(photo_path(f"{digest}_{variant}.{ext}")) for variant, ext in PHOTO_VARIANTS)
+
+
+async def receive_upload(request, field: str = "file") -> ReceivedUpload:
+    """Потоково сохраняет файл из поля field multipart-запроса во временный файл"""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise PhotoError("Ожидается multipart/form-data с файлом")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > PHOTO_MAX_BYTES + PHOTO_CHUNK_SIZE:
+        raise PhotoTooLarge(f"Файл больше {PHOTO_MAX_BYTES // (1024 * 1024)} МБ")
+
+    tmp_dir = os.path.join(PHOTOS_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".upload")
+    out = os.fdopen(fd, "wb")
+    hasher = hashlib.sha256()
+    state = {"header_field": b"", "header_value": b"", "disposition": b"", "target": False, "found": False, "size": 0}
+
+    def on_part_begin():
+        state.update(header_field=b"", header_value=b"", disposition=b"", target=False)
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        if state["header_field"].lower() == b"content-disposition":
+            state["disposition"] = state["header_value"]
+        state["header_field"] = state["header_value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["disposition"])
+        if options.get(b"name") == field.encode() and b"filename" in options and not state["found"]:
+            state["target"] = state["found"] = True
+
+    def on_part_data(data, start, end):
+        if not state["target"]:
+            return
+        chunk = data[start:end]
+        state["size"] += len(chunk)
+        if state["size"] > PHOTO_MAX_BYTES:
+            raise PhotoTooLarge(f"Файл больше {PHOTO_MAX_BYTES // (1024 * 1024)} МБ")
+        hasher.update(chunk)
+        out.write(chunk)
+
+    def on_part_end():
+        state["target"] = False
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+        out.close()
+    except Exception as e:
+        out.close()
+        os.unlink(tmp_path)
+        if isinstance(e, PhotoError):
+            raise
+        raise PhotoError("Не удалось прочитать загрузку") from e
+
+    if not state["found"] or state["size"] == 0:
+        os.unlink(tmp_path)
+        raise PhotoError(f"В запросе нет файла в поле {field!r}")
+    return ReceivedUpload(path=tmp_path, digest=hasher.hexdigest(), size=state["size"])
+
+
+def _save_atomic(image, path: str, fmt: str, **options) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    image.save(tmp_path, fmt, **options)
+    os.replace(tmp_path, path)
+
+
+def render_variants(source_path: str, digest: str, photos_dir: str) -> tuple[int, int]:
+    """Выполняется в процессе пула: пишет варианты и возвращает размеры полного варианта"""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = PHOTO_MAX_PIXELS
+    target_dir = os.path.join(photos_dir, digest[:2])
+    os.makedirs(target_dir, exist_ok=True)
+    try:
+        with Image.open(source_path) as image:
+            # JPEG можно декодировать сразу в уменьшенном масштабе — это в разы быстрее
+            image.draft("RGB", (PHOTO_FULL_SIZE, PHOTO_FULL_SIZE))
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGB")
+    except (Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise PhotoError("Файл не похож на изображение") from e
+
+    full = image.copy()
+    full.thumbnail((PHOTO_FULL_SIZE, PHOTO_FULL_SIZE), Image.Resampling.LANCZOS)
+    _save_atomic(full, os.path.join(target_dir, f"{digest}_full.webp"), "WEBP", quality=82, method=4)
+
+    thumb = full.copy()
+    thumb.thumbnail((PHOTO_THUMB_SIZE, PHOTO_THUMB_SIZE), Image.Resampling.LANCZOS)
+    _save_atomic(thumb, os.path.join(target_dir, f"{digest}_thumb.webp"), "WEBP", quality=75, method=4)
+    _save_atomic(thumb, os.path.join(target_dir, f"{digest}_thumb.jpg"), "JPEG", quality=80, optimize=True, progressive=True)
+    return full.size
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max(PHOTO_WORKERS, 1))
+    return _executor
+
+
+async def process_upload(upload: ReceivedUpload) -> tuple[int, int]:
+    """Строит варианты в пуле процессов и удаляет временный файл"""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            _pool(), render_variants, upload.path, upload.digest, PHOTOS_DIR
+        )
+    finally:
+        if os.path.exists(upload.path):
+            os.unlink(upload.path)
+
+
+def discard_upload(upload: ReceivedUpload) -> None:
+    if os.path.exists(upload.path):
+        os.unlink(upload.path)
+
+
+def shutdown_photo_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
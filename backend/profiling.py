@@ -0,0 +1,317 @@
+"""
+Профилирование отдельных запросов по требованию.
+
+Запрос профилируется, если администратор передал заголовок X-Profile
+(или параметр ?_profile=) со значением cprofile/sample, либо если он попал
+в случайную выборку PROFILE_SAMPLE_RATE. Права проверяются до запуска
+обработчика: флаг от не-администратора молча игнорируется.
+
+cprofile — детерминированный профиль (выгружается как .pstats), sample —
+статистический сэмплер стека потока event loop (выгружается в формате
+speedscope). В оба профиля попадает список выполненного SQL со временем,
+в сэмплы — ещё и синтетический кадр «SQL: …» поверх стека, если в момент
+сэмпла шло выражение. Готовые профили лежат в кольцевом буфере в памяти.
+
+Обработчики API асинхронные и выполняются в потоке event loop, поэтому
+профиль снимается с этого потока; параллельные запросы в тот же момент
+тоже в него попадают.
+"""
+
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Optional
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool
+
+from .metrics import RequestStats, begin_request_stats, current_request_stats, end_request_stats
+
+PROFILE_KINDS = ("cprofile", "sample")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLED_KIND = os.getenv("PROFILE_SAMPLED_KIND", "sample")
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "20"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "2"))
+PROFILE_MAX_STATEMENTS = 1000
+PROFILE_MAX_STACK_DEPTH = 200
+
+
+class ProfileRecord:
+    __slots__ = (
+        "id", "kind", "trigger", "method", "path", "route", "status_code",
+        "started_at", "duration", "sql", "sql_count", "sql_time", "data",
+    )
+
+    def __init__(self, kind: str, trigger: str, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.trigger = trigger
+        self.method = method
+        self.path = path
+        self.route = path
+        self.status_code = 500
+        self.started_at = datetime.now(timezone.utc)
+        self.duration = 0.0
+        self.sql: list[tuple[str, float]] = []
+        self.sql_count = 0
+        self.sql_time = 0.0
+        # cprofile: словарь pstats; sample: (кадры, стеки, веса в секундах)
+        self.data = None
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "trigger": self.trigger,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 2),
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_time * 1000, 2),
+        }
+
+
+class ProfileStore:
+    """Кольцевой буфер последних профилей"""
+
+    def __init__(self, size: int):
+        self._items: "deque[ProfileRecord]" = deque(maxlen=max(size, 1))
+        self._lock = threading.Lock()
+
+    def add(self, record: ProfileRecord) -> None:
+        with self._lock:
+            self._items.append(record)
+
+    def list(self) -> list[ProfileRecord]:
+        with self._lock:
+            return list(reversed(self._items))
+
+    def get(self, profile_id: str) -> Optional[ProfileRecord]:
+        with self._lock:
+            for record in self._items:
+                if record.id == profile_id:
+                    return record
+        return None
+
+
+profile_store = ProfileStore(PROFILE_BUFFER_SIZE)
+
+
+class StackSampler:
+    """Раз в interval секунд снимает стек потока thread_id из отдельного потока"""
+
+    def __init__(self, thread_id: int, interval: float, stats: RequestStats):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stats = stats
+        self.frames: list[tuple[str, str, int]] = []
+        self._frame_index: dict[tuple[str, str, int], int] = {}
+        self.stacks: dict[tuple[int, ...], float] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _frame_id(self, key: tuple[str, str, int]) -> int:
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append(key)
+        return index
+
+    def _sample(self, weight: float) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None and len(stack) < PROFILE_MAX_STACK_DEPTH:
+            code = frame.f_code
+            stack.append(self._frame_id((code.co_qualname, code.co_filename, code.co_firstlineno)))
+            frame = frame.f_back
+        stack.reverse()
+        statement = self.stats.active_statement
+        if statement:
+            stack.append(self._frame_id(("SQL: " + " ".join(statement.split())[:200], "", 0)))
+        key = tuple(stack)
+        self.stacks[key] = self.stacks.get(key, 0.0) + weight
+
+    def _run(self) -> None:
+        previous = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            self._sample(now - previous)
+            previous = now
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> tuple:
+        self._stop.set()
+        self._thread.join()
+        return self.frames, self.stacks
+
+
+def _profile_flag(scope) -> Optional[str]:
+    value = None
+    for name, header_value in scope.get("headers", ()):
+        if name == b"x-profile":
+            value = header_value.decode("latin-1")
+            break
+    if value is None and scope.get("query_string"):
+        values = parse_qs(scope["query_string"].decode("latin-1")).get("_profile")
+        value = values[0] if values else None
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value in {"1", "true", "yes", "on"}:
+        return "cprofile"
+    return value if value in PROFILE_KINDS else None
+
+
+def _init_data(scope) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == b"x-telegram-init-data":
+            return value.decode("utf-8", errors="replace")
+    return None
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware, которое снимает профиль с выбранных запросов"""
+
+    def __init__(self, app, authorize: Callable[[Optional[str]], bool]):
+        self.app = app
+        # Синхронная проверка, что init data принадлежит администратору
+        self.authorize = authorize
+        # cProfile в одном потоке может работать только один
+        self._cprofile_lock = threading.Lock()
+
+    async def _choose_kind(self, scope) -> tuple[Optional[str], str]:
+        flag = _profile_flag(scope)
+        if flag and await run_in_threadpool(self.authorize, _init_data(scope)):
+            return flag, "flag"
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return PROFILE_SAMPLED_KIND, "sampled"
+        return None, ""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/api/admin/profiles"):
+            await self.app(scope, receive, send)
+            return
+        kind, trigger = await self._choose_kind(scope)
+        if kind is None:
+            await self.app(scope, receive, send)
+            return
+        if kind == "cprofile" and not self._cprofile_lock.acquire(blocking=False):
+            kind = "sample"
+
+        record = ProfileRecord(kind, trigger, scope["method"], scope["path"])
+        stats = current_request_stats()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = begin_request_stats(stats)
+        stats.log_limit = max(stats.log_limit, PROFILE_MAX_STATEMENTS)
+        statements_before = stats.statements
+        db_time_before = stats.db_time
+        log_before = len(stats.log)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                record.status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", record.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = sampler = None
+        if kind == "cprofile":
+            profiler = cProfile.Profile()
+        else:
+            sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL_MS / 1000, stats)
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            else:
+                sampler.start()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record.duration = time.perf_counter() - started
+            if profiler is not None:
+                self._cprofile_lock.release()
+                record.data = pstats.Stats(profiler).stats
+            else:
+                record.data = sampler.stop()
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                record.route = route
+            record.sql = list(stats.log[log_before:])
+            record.sql_count = stats.statements - statements_before
+            record.sql_time = stats.db_time - db_time_before
+            if token is not None:
+                end_request_stats(token)
+            profile_store.add(record)
+
+
+def top_functions(record: ProfileRecord, limit: int = 40) -> str:
+    """Текстовая сводка pstats по накопленному времени (для просмотра в админке)"""
+    if record.kind != "cprofile" or not record.data:
+        return ""
+    stats = pstats.Stats(_StatsSource(dict(record.data)), stream=io.StringIO())
+    stats.sort_stats("cumulative").print_stats(limit)
+    return stats.stream.getvalue()
+
+
+class _StatsSource:
+    # pstats.Stats принимает объект с create_stats()/stats вместо файла
+    def __init__(self, data: dict):
+        self.stats = data
+
+    def create_stats(self) -> None:
+        pass
+
+
+def export_pstats(record: ProfileRecord) -> bytes:
+    """Тот же формат, что пишет pstats.Stats.dump_stats (открывается snakeviz, pstats)"""
+    return marshal.dumps(record.data)
+
+
+def export_speedscope(record: ProfileRecord) -> bytes:
+    frames, stacks = record.data
+    name = f"{record.method} {record.path}"
+    document = {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "minsk-jobs",
+        "shared": {
+            "frames": [
+                {"name": func, "file": filename, "line": line} if filename else {"name": func}
+                for func, filename, line in frames
+            ]
+        },
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(record.duration * 1000, 3),
+                "samples": [list(stack) for stack in stacks],
+                "weights": [round(weight * 1000, 3) for weight in stacks.values()],
+            }
+        ],
+    }
+    return json.dumps(document, ensure_ascii=False).encode("utf-8")
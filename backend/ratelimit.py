@@ -0,0 +1,347 @@
+"""
+Ограничение частоты пишущих запросов и авторизации.
+
+Каждый такой запрос — запись в БД с коммитом, а у SQLite писатель один:
+один зациклившийся клиент может занять его целиком. RateLimitMiddleware
+до роутинга сопоставляет метод и путь с правилами и считает запросы
+отдельно по telegram_id (из проверенного initData) и по IP клиента.
+
+Окно скользящее, приближённое двумя соседними фиксированными окнами:
+
+    оценка = предыдущее · (1 − доля прошедшего текущего окна) + текущее
+
+На ключ хранятся номер окна и два счётчика, а точность — в пределах пары
+процентов от точного журнала запросов. Отклонённые запросы не засчитываются, поэтому
+клиент, соблюдающий Retry-After, не продлевает себе блокировку.
+
+Хранилище (RATE_LIMIT_BACKEND):
+    memory    — словарь в памяти процесса (по умолчанию); с несколькими
+                воркерами лимит действует на каждый воркер отдельно;
+    database  — таблица rate_limit_counters общей БД, для нескольких
+                воркеров на PostgreSQL (на SQLite сама добавляет запись).
+Другое хранилище подключается через set_backend(): нужен объект с методом
+hit(checks, now) -> 0.0 или Retry-After в секундах.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from starlette.concurrency import run_in_threadpool
+
+from .cache import TTLCache
+from .database import SessionLocal, engine
+from .metrics import Counter, register
+from .models import RateLimitCounter
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+# За прокси (Render, nginx) адрес клиента есть только в X-Forwarded-For
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in {"1", "true", "yes", "on"}
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+_MISSING = object()
+
+RATE_LIMITED = register(
+    Counter("rate_limited_requests_total", "Запросы, отклонённые ограничителем частоты", ("rule",))
+)
+
+# (ключ, лимит, окно в секундах)
+Check = tuple[str, int, float]
+
+
+def _parse_limit(name: str, default: str) -> Optional[tuple[int, float]]:
+    """'30/60' — 30 запросов за 60 секунд; '0' или пусто — без ограничения"""
+    raw = os.getenv(name, default).strip()
+    if not raw or raw == "0":
+        return None
+    count, _, seconds = raw.partition("/")
+    return int(count), float(seconds or 60)
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    name: str
+    per_user: Optional[tuple[int, float]]
+    per_ip: Optional[tuple[int, float]]
+
+
+AUTH_RULE = RateLimitRule(
+    "auth", _parse_limit("RATE_LIMIT_AUTH", "10/60"), _parse_limit("RATE_LIMIT_AUTH_IP", "60/60")
+)
+# Для IP лимит выше: за мобильным NAT оператора сидит много пользователей
+WRITE_RULE = RateLimitRule(
+    "write", _parse_limit("RATE_LIMIT_WRITE", "30/60"), _parse_limit("RATE_LIMIT_WRITE_IP", "120/60")
+)
+
+_EXACT_ROUTES = {
+    ("POST", "/api/auth/telegram"): AUTH_RULE,
+    ("POST", "/api/listings"): WRITE_RULE,
+    ("POST", "/api/terms/accept"): WRITE_RULE,
+    ("POST", "/api/subscriptions"): WRITE_RULE,
+}
+_PATTERN_ROUTES = [
+    ("PUT", re.compile(r"^/api/listings/\d+$"), WRITE_RULE),
+    ("POST", re.compile(r"^/api/listings/\d+/photos$"), WRITE_RULE),
+]
+
+
+def match_rule(method: str, path: str) -> Optional[RateLimitRule]:
+    rule = _EXACT_ROUTES.get((method, path.rstrip("/") or "/"))
+    if rule is not None:
+        return rule
+    for route_method, pattern, rule in _PATTERN_ROUTES:
+        if method == route_method and pattern.match(path):
+            return rule
+    return None
+
+
+def retry_after(previous: int, current: int, limit: int, window: float, elapsed: float) -> float:
+    """Через сколько секунд оценка окна опустится ниже лимита"""
+    if current >= limit:
+        # Ждём следующего окна, где текущее станет предыдущим и начнёт убывать
+        wait = (window - elapsed) + window * (1 - limit / current)
+    else:
+        wait = window * (1 - (limit - current) / previous) - elapsed
+    return max(wait, 0.0)
+
+
+class MemoryBackend:
+    """Счётчики в словаре: ключ -> [номер окна, текущее, предыдущее, длина окна]"""
+
+    SWEEP_INTERVAL_SECONDS = 60.0
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._counters: dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def hit(self, checks: list[Check], now: float) -> float:
+        with self._lock:
+            if now >= self._next_sweep or len(self._counters) > self.max_keys:
+                self._sweep(now)
+            wait = 0.0
+            states = []
+            for key, limit, window in checks:
+                index = int(now // window)
+                state = self._counters.get(key)
+                if state is None:
+                    state = self._counters[key] = [index, 0, 0, window]
+                elif state[0] != index:
+                    state[2] = state[1] if state[0] == index - 1 else 0
+                    state[1] = 0
+                    state[0] = index
+                elapsed = now - index * window
+                if state[2] * (1 - elapsed / window) + state[1] >= limit:
+                    wait = max(wait, retry_after(state[2], state[1], limit, window, elapsed))
+                states.append(state)
+            if wait:
+                return wait
+            for state in states:
+                state[1] += 1
+            return 0.0
+
+    def _sweep(self, now: float) -> None:
+        """Удаляет ключи, у которых закончились оба окна"""
+        self._next_sweep = now + self.SWEEP_INTERVAL_SECONDS
+        stale = [key for key, state in self._counters.items() if state[0] < int(now // state[3]) - 1]
+        for key in stale:
+            del self._counters[key]
+        # Если живых ключей всё равно слишком много — сбрасываем всё: лучше пропустить лишнее, чем съесть память
+        if len(self._counters) > self.max_keys:
+            print(f"Ограничитель частоты: больше {self.max_keys} ключей, счётчики сброшены")
+            self._counters.clear()
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+class DatabaseBackend:
+    """Счётчики в таблице rate_limit_counters: строка на (ключ, окно), общая для всех воркеров"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+
+    def hit(self, checks: list[Check], now: float) -> float:
+        db = self.session_factory()
+        try:
+            wait = 0.0
+            for key, limit, window in checks:
+                index = int(now // window)
+                stmt = self._insert(RateLimitCounter).values(
+                    key=key,
+                    window_index=index,
+                    hits=1,
+                    expires_at=datetime.fromtimestamp((index + 2) * window, timezone.utc),
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[RateLimitCounter.key, RateLimitCounter.window_index],
+                    set_={"hits": RateLimitCounter.hits + 1},
+                ).returning(RateLimitCounter.hits)
+                # Счётчик уже увеличен — сравниваем оценку без этого запроса
+                current = db.execute(stmt).scalar_one() - 1
+                previous = db.execute(
+                    select(RateLimitCounter.hits).where(
+                        RateLimitCounter.key == key, RateLimitCounter.window_index == index - 1
+                    )
+                ).scalar() or 0
+                elapsed = now - index * window
+                if previous * (1 - elapsed / window) + current >= limit:
+                    wait = max(wait, retry_after(previous, current, limit, window, elapsed))
+            if wait:
+                # Отклонённый запрос не засчитываем ни по одному ключу
+                db.rollback()
+                return wait
+            db.commit()
+            return 0.0
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def purge_expired_counters() -> int:
+    """Задача планировщика (при RATE_LIMIT_BACKEND=database): удаляет закончившиеся окна"""
+    db = SessionLocal()
+    try:
+        result = db.execute(delete(RateLimitCounter).where(RateLimitCounter.expires_at < datetime.now(timezone.utc)))
+        db.commit()
+        return result.rowcount or 0
+    finally:
+        db.close()
+
+
+def _checks(rule: RateLimitRule, telegram_id: Optional[int], ip: Optional[str]) -> list[Check]:
+    checks = []
+    if rule.per_user and telegram_id is not None:
+        checks.append((f"{rule.name}:user:{telegram_id}", *rule.per_user))
+    if rule.per_ip and ip:
+        checks.append((f"{rule.name}:ip:{ip}", *rule.per_ip))
+    return checks
+
+
+def _create_backend():
+    if RATE_LIMIT_BACKEND == "database":
+        return DatabaseBackend()
+    if RATE_LIMIT_BACKEND != "memory":
+        print(f"Неизвестный RATE_LIMIT_BACKEND={RATE_LIMIT_BACKEND!r}, используется memory")
+    return MemoryBackend()
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = _create_backend()
+    return _backend
+
+
+def set_backend(backend) -> None:
+    global _backend
+    _backend = backend
+
+
+def set_enabled(enabled: bool) -> None:
+    global RATE_LIMIT_ENABLED
+    RATE_LIMIT_ENABLED = enabled
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def client_ip(scope) -> Optional[str]:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = _header(scope, b"x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",", 1)[0].strip()
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+class RateLimitMiddleware:
+    """ASGI-middleware: 429 с Retry-After, если запрос превышает лимит своего правила"""
+
+    def __init__(self, app, identify: Callable[[Optional[str]], Optional[int]]):
+        self.app = app
+        # initData -> telegram_id, только если подпись верна (иначе чужой id можно было бы «заблокировать»)
+        self.identify = identify
+        # Клиент шлёт одну и ту же строку initData всю сессию, а проверка подписи — десятки микросекунд
+        self.identities = TTLCache("ratelimit_identities", ttl=300, maxsize=10_000)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope["method"] == "GET":
+            await self.app(scope, receive, send)
+            return
+        rule = match_rule(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        init_data = _header(scope, b"x-telegram-init-data")
+        telegram_id = None
+        if init_data:
+            telegram_id = self.identities.get(init_data, _MISSING)
+            if telegram_id is _MISSING:
+                telegram_id = self.identify(init_data)
+                self.identities.set(init_data, telegram_id)
+        checks = _checks(rule, telegram_id, client_ip(scope))
+        if not checks:
+            await self.app(scope, receive, send)
+            return
+
+        backend = get_backend()
+        now = time.time()
+        if isinstance(backend, MemoryBackend):
+            wait = backend.hit(checks, now)
+        else:
+            try:
+                wait = await run_in_threadpool(backend.hit, checks, now)
+            except Exception as e:
+                # Недоступное хранилище не должно класть запись объявлений
+                print(f"Ограничитель частоты: ошибка хранилища, запрос пропущен: {e}")
+                wait = 0.0
+        if not wait:
+            await self.app(scope, receive, send)
+            return
+
+        # С запасом: ровно на границе оценка ещё равна лимиту
+        seconds = int(wait) + 1
+        RATE_LIMITED.inc(rule.name)
+        body = json.dumps(
+            {
+                "detail": {
+                    "code": "rate_limited",
+                    "message": "Слишком много запросов, попробуйте позже",
+                    "retry_after": seconds,
+                }
+            },
+            ensure_ascii=False,
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(seconds).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -1,23 +1,70 @@
-from datetime import datetime, timezone
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from typing import Optional
+import asyncio
+import base64
+import csv
 import hashlib
 import hmac
+import io
 import json
 import os
 import re
 from urllib.parse import unquote
 
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, Header, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import cast, String
-
-from .database import DB_TYPE, get_db
-from .models import AdminAuditLog, Listing, TermsDocument, User
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, or_, select, text, tuple_, update
+
+from . import audit, database, similarity
+from .alerts import MAX_RADIUS_KM, alert_dispatcher
+from .analytics import STATS_RANGES, activity_tracker, stats_payload
+from .cache import TTLCache
+from .compression import PrecompressedBody, precompressed_response
+from .database import DB_TYPE, SessionLocal, get_db
+from .districts import DISTRICTS, DISTRICTS_APPROXIMATE, district_for, in_service_area
+from .invalidation import publish, subscribe
+from .lifecycle import close_active_listings, remove_orphaned_photos
+from .matching import MATCH_TOP_K, matching_engine
+from .models import (
+    AdminAuditLog,
+    Listing,
+    ListingIdempotencyKey,
+    ListingPhoto,
+    ListingSignature,
+    ListingStats,
+    Subscription,
+    TermsDocument,
+    User,
+)
+from .photos import (
+    PHOTO_CACHE_CONTROL,
+    PHOTO_FILE_RE,
+    PHOTO_MAX_PER_LISTING,
+    PHOTO_MEDIA_TYPES,
+    PhotoError,
+    PhotoTooLarge,
+    discard_upload,
+    photo_path,
+    photo_url,
+    process_upload,
+    receive_upload,
+    variants_exist,
+)
+from .profiling import export_pstats, export_speedscope, profile_store, top_functions
+from .stats import popularity, view_counter
+from .tiles import TILE_CACHE_CONTROL, TileError, parse_tile, tile_proxy
 from .schemas import (
     AcceptTermsRequest,
+    AdminBulkBanRequest,
+    AdminBulkCloseListingsRequest,
+    AdminCloseByTextRequest,
     AdminListingCloseRequest,
     AdminListingResponse,
+    AdminAuditPageResponse,
     AdminAuditResponse,
     AdminUserBanRequest,
     AdminUserResponse,
@@ -26,6 +73,8 @@ from .schemas import (
     DeleteListingRequest,
     ListingCreate,
     ListingUpdate,
+    SubscriptionCreate,
+    SubscriptionResponse,
     TermsDocumentResponse,
 )
 
@@ -72,6 +121,8 @@ FORBIDDEN_WORD_PATTERNS = [
 
 FORBIDDEN_REGEXES = [re.compile(pattern, re.IGNORECASE) for pattern in FORBIDDEN_WORD_PATTERNS]
 
+MAX_SUBSCRIPTIONS_PER_USER = 20
+
 
 def verify_telegram_webapp_data(init_data: str) -> Optional[dict]:
     try:
@@ -129,13 +180,36 @@ def _superadmin_telegram_id() -> Optional[int]:
         return None
 
 
-def _get_active_terms(db: Session) -> Optional[TermsDocument]:
-    return (
+@dataclass(frozen=True)
+class ActiveTerms:
+    """Снимок активной версии условий: в кэше не держим ORM-объекты чужих сессий"""
+
+    version: str
+    title: str
+    content: str
+    created_at: Optional[datetime]
+
+
+_MISSING = object()
+
+# Условия меняются редко; при смене на любом воркере кэш сбрасывается событием terms_changed
+active_terms_cache = TTLCache("active_terms", ttl=300.0, maxsize=1)
+subscribe("terms_changed", lambda event, key: active_terms_cache.invalidate())
+
+
+def _get_active_terms(db: Session) -> Optional[ActiveTerms]:
+    cached = active_terms_cache.get("active", _MISSING)
+    if cached is not _MISSING:
+        return cached
+    terms = (
         db.query(TermsDocument)
         .filter(TermsDocument.is_active.is_(True))
         .order_by(TermsDocument.created_at.desc(), TermsDocument.id.desc())
         .first()
     )
+    snapshot = ActiveTerms(terms.version, terms.title, terms.content, terms.created_at) if terms else None
+    active_terms_cache.set("active", snapshot)
+    return snapshot
 
 
 def _ensure_superadmin_role(user: User, db: Session) -> None:
@@ -157,10 +231,13 @@ def _upsert_user_by_telegram(
         db.add(user)
         db.commit()
         db.refresh(user)
+        # У нового пользователя нет подписок: событие шины не нужно, только счётчики админки
+        admin_user_count_cache.invalidate()
     elif username and user.username != username:
         user.username = username
         db.commit()
         db.refresh(user)
+        publish("user_changed", user.id)
 
     _ensure_superadmin_role(user, db)
     return user
@@ -172,8 +249,42 @@ def _get_or_create_local_user(db: Session) -> User:
     return _upsert_user_by_telegram(db, telegram_id=telegram_id, username=username)
 
 
-def _serialize_compliance(user: User, db: Session) -> dict:
-    active_terms = _get_active_terms(db)
+def _terms_etag(terms: ActiveTerms) -> str:
+    digest = hashlib.sha256(f"{terms.version}\n{terms.content}".encode("utf-8")).hexdigest()[:16]
+    return f'"terms-{digest}"'
+
+
+def _json_etag(prefix: str, value) -> str:
+    digest = hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+    return f'"{prefix}-{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Слабое сравнение: сжатый ответ уходит с W/-версией того же ETag
+    if not if_none_match:
+        return False
+    return etag.removeprefix("W/") in [value.strip().removeprefix("W/") for value in if_none_match.split(",")]
+
+
+def _without_popularity(listings: Optional[list[dict]]) -> Optional[list[dict]]:
+    # Популярность затухает со временем: с ней ETag менялся бы при каждом пересчёте, а не при правках
+    if listings is None:
+        return None
+    return [{key: value for key, value in listing.items() if key != "popularity"} for listing in listings]
+
+
+def _serialize_terms(terms: ActiveTerms) -> dict:
+    return {
+        "version": terms.version,
+        "title": terms.title,
+        "content": terms.content,
+        "created_at": terms.created_at,
+    }
+
+
+def _serialize_compliance(user: User, db: Session, active_terms: Optional[ActiveTerms] = None) -> dict:
+    if active_terms is None:
+        active_terms = _get_active_terms(db)
     active_version = active_terms.version if active_terms else None
     return {
         "user_id": user.id,
@@ -229,16 +340,16 @@ def _write_admin_audit(
     admin_user_id: int,
     action: str,
     target_user_id: Optional[int] = None,
-    details: Optional[str] = None,
+    details: Optional[dict] = None,
 ) -> None:
-    log_row = AdminAuditLog(
+    # Запись попадает в транзакцию действия: коммит делает вызывающий код
+    audit.record(
+        db,
         admin_user_id=admin_user_id,
-        target_user_id=target_user_id,
         action=action,
+        target_user_id=target_user_id,
         details=details,
     )
-    db.add(log_row)
-    db.commit()
 
 
 def _validate_listing_text_content(listing: ListingCreate) -> None:
@@ -332,7 +443,39 @@ def get_current_user(
     init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
     db: Session = Depends(get_db),
 ) -> User:
-    return _get_current_user(db=db, init_data=init_data)
+    user = _get_current_user(db=db, init_data=init_data)
+    activity_tracker.record(user.id)
+    return user
+
+
+def is_admin_init_data(init_data: Optional[str]) -> bool:
+    """Проверка прав для ProfilingMiddleware: выполняется до обработчика, только чтение —
+    подпись и роль по telegram_id, без создания пользователя и коммита"""
+    if init_data:
+        telegram_id = telegram_id_from_init_data(init_data)
+    elif _allow_local_auth_bypass():
+        telegram_id = int(os.getenv("LOCAL_TEST_TELEGRAM_ID", "999999999"))
+    else:
+        return False
+    if telegram_id is None:
+        return False
+    db = SessionLocal()
+    try:
+        row = db.query(User.role, User.is_banned).filter(User.telegram_id == telegram_id).first()
+    finally:
+        db.close()
+    if row is None or row.is_banned:
+        return False
+    return row.role == "admin" or telegram_id == _superadmin_telegram_id()
+
+
+def telegram_id_from_init_data(init_data: Optional[str]) -> Optional[int]:
+    """telegram_id из initData с верной подписью — ключ ограничителя частоты"""
+    user_data = verify_telegram_webapp_data(init_data) if init_data else None
+    if not user_data:
+        return None
+    telegram_id = user_data.get("id")
+    return telegram_id if isinstance(telegram_id, int) else None
 
 
 @router.post("/api/auth/telegram")
@@ -372,16 +515,20 @@ async def get_me_compliance(
 
 
 @router.get("/api/terms/active", response_model=TermsDocumentResponse)
-async def get_active_terms(db: Session = Depends(get_db)):
+async def get_active_terms(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
     terms = _get_active_terms(db)
     if not terms:
         raise HTTPException(status_code=404, detail="Активная версия условий не найдена")
-    return {
-        "version": terms.version,
-        "title": terms.title,
-        "content": terms.content,
-        "created_at": terms.created_at,
-    }
+    etag = _terms_etag(terms)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return _serialize_terms(terms)
 
 
 @router.post("/api/terms/accept")
@@ -404,6 +551,7 @@ async def accept_terms(
     user.accepted_terms_at = datetime.now(timezone.utc)
     db.commit()
     db.refresh(user)
+    publish("user_changed", user.id)
     return _serialize_compliance(user, db)
 
 
@@ -412,50 +560,107 @@ async def get_listings(
     db: Session = Depends(get_db),
     type: Optional[str] = None,
     status: str = "active",
+    sort: Optional[str] = Query(None, pattern="^(newest|popularity)$"),
+    district: Optional[int] = Query(None, ge=1),
     init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
 ):
     if init_data:
         user = _get_current_user(db=db, init_data=init_data)
         _require_not_banned(user)
 
-    query = db.query(Listing).filter(Listing.status == status)
-    if type:
-        query = query.filter(Listing.type == type)
+    feed = _listing_feed(db, status=status, listing_type=type, sort=sort, district_id=district)
+    headers = {"ETag": feed.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, feed.etag):
+        return Response(status_code=304, headers=headers)
+    # Тело и его сжатые варианты лежат в кэше ленты: на попадании не сериализуем и не сжимаем
+    return await precompressed_response(feed.body, accept_encoding, headers=headers)
 
-    listings = query.all()
-    result = []
-    for listing in listings:
-        result.append(
-            {
-                "id": listing.id,
-                "type": listing.type,
-                "title": listing.title,
-                "description": listing.description,
-                "address": listing.address,
-                "payment": listing.payment,
-                "contacts": listing.contacts,
-                "latitude": listing.latitude,
-                "longitude": listing.longitude,
-                "username": listing.user.username if listing.user else None,
-                "created_at": listing.created_at.isoformat() if listing.created_at else None,
-            }
+
+def _check_duplicates(
+    db: Session,
+    title: Optional[str],
+    description: Optional[str],
+    exclude_id: Optional[int] = None,
+) -> tuple[Optional[list[int]], Optional[tuple[int, float]]]:
+    """MinHash-подпись текста и ближайшая активная копия; в режиме reject копия — это ошибка 409"""
+    if similarity.DUPLICATE_MODE == "off":
+        return None, None
+    signature = similarity.minhash(title, description)
+    if signature is None:
+        return None, None
+    matches = similarity.find_duplicates(db, signature, exclude_id=exclude_id)
+    nearest = matches[0] if matches else None
+    if nearest and similarity.DUPLICATE_MODE == "reject":
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "code": "duplicate_listing",
+                "duplicate_of": nearest[0],
+                "message": "Такое объявление уже опубликовано. Измените текст или снимите прежнее объявление",
+            },
         )
-    return result
+    return signature, nearest
+
+
+# Клиент ставит Idempotency-Key на создание объявления: повтор из очереди offline
+# (ответ мог потеряться, хотя объявление создано) возвращает то же объявление
+LISTING_IDEMPOTENCY_TTL_HOURS = float(os.getenv("LISTING_IDEMPOTENCY_TTL_HOURS", "168"))
+
+
+def _created_listing_response(listing: Listing) -> dict:
+    return {
+        "id": listing.id,
+        "type": listing.type,
+        "title": listing.title,
+        "status": listing.status,
+    }
+
+
+def _replayed_listing(db: Session, user_id: int, idempotency_key: str) -> Optional[dict]:
+    listing_id = (
+        db.query(ListingIdempotencyKey.listing_id)
+        .filter(ListingIdempotencyKey.user_id == user_id, ListingIdempotencyKey.key == idempotency_key)
+        .scalar()
+    )
+    if listing_id is None:
+        return None
+    listing = db.query(Listing).filter(Listing.id == listing_id).first()
+    return _created_listing_response(listing) if listing else {"id": listing_id}
 
 
 @router.post("/api/listings")
 async def create_listing(
     listing: ListingCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=64),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     _require_not_banned(user)
     _require_terms_accepted(user, db)
+    if idempotency_key:
+        replayed = _replayed_listing(db, user.id, idempotency_key)
+        if replayed:
+            return replayed
     _validate_listing_text_content(listing)
 
     if listing.type not in ["task", "worker"]:
         raise HTTPException(status_code=400, detail="Тип должен быть 'task' или 'worker'")
 
+    if not in_service_area(listing.latitude, listing.longitude):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "outside_service_area",
+                "message": "Точка на карте вне зоны обслуживания: объявления принимаются только по Минску",
+            },
+        )
+    # Вне границ районов (в том числе неточных) объявление принимается без района
+    district_id = district_for(listing.latitude, listing.longitude)
+
+    signature, duplicate_of = _check_duplicates(db, listing.title, listing.description)
+
     db_listing = Listing(
         user_id=user.id,
         type=listing.type,
@@ -466,17 +671,47 @@ async def create_listing(
         contacts=listing.contacts,
         latitude=listing.latitude,
         longitude=listing.longitude,
+        district_id=district_id,
         status="active",
     )
     db.add(db_listing)
-    db.commit()
+    db.flush()
+    if similarity.DUPLICATE_MODE != "off":
+        similarity.store_signature(db, db_listing, signature, duplicate_of)
+    if idempotency_key:
+        db.add(
+            ListingIdempotencyKey(
+                user_id=user.id,
+                key=idempotency_key,
+                listing_id=db_listing.id,
+                expires_at=datetime.now(timezone.utc) + timedelta(hours=LISTING_IDEMPOTENCY_TTL_HOURS),
+            )
+        )
+    try:
+        db.commit()
+    except IntegrityError:
+        # Тот же ключ пришёл параллельно и уже создал объявление
+        db.rollback()
+        replayed = _replayed_listing(db, user.id, idempotency_key) if idempotency_key else None
+        if replayed is None:
+            raise
+        return replayed
     db.refresh(db_listing)
-    return {
-        "id": db_listing.id,
-        "type": db_listing.type,
-        "title": db_listing.title,
-        "status": db_listing.status,
-    }
+    publish("listing_changed", db_listing.id)
+    alert_dispatcher.enqueue(
+        {
+            "id": db_listing.id,
+            "user_id": db_listing.user_id,
+            "type": db_listing.type,
+            "title": db_listing.title,
+            "description": db_listing.description,
+            "address": db_listing.address,
+            "payment": db_listing.payment,
+            "latitude": db_listing.latitude,
+            "longitude": db_listing.longitude,
+        }
+    )
+    return _created_listing_response(db_listing)
 
 
 @router.get("/api/listings/my")
@@ -487,29 +722,512 @@ async def get_my_listings(
     _require_not_banned(user)
     _require_terms_accepted(user, db)
 
-    listings = (
-        db.query(Listing)
+    return _list_my_listings(db, user)
+
+
+def _serialize_listing(listing: Listing) -> dict:
+    return {
+        "id": listing.id,
+        "type": listing.type,
+        "title": listing.title,
+        "description": listing.description,
+        "address": listing.address,
+        "payment": listing.payment,
+        "contacts": listing.contacts,
+        "latitude": listing.latitude,
+        "longitude": listing.longitude,
+        "district_id": listing.district_id,
+        "created_at": listing.created_at.isoformat() if listing.created_at else None,
+    }
+
+
+def _cover_photo():
+    """Обложка объявления (фото с position = 0) для outer join в лентах"""
+    return aliased(ListingPhoto, name="cover_photo")
+
+
+# Лента и маркеры карты одинаковы для всех; любая запись объявлений на любом воркере
+# сбрасывает кэш событием listing_changed, TTL ограничивает лишь отставание популярности
+LISTING_FEED_CACHE_SECONDS = float(os.getenv("LISTING_FEED_CACHE_SECONDS", "15"))
+listing_feed_cache = TTLCache("listing_feed", ttl=LISTING_FEED_CACHE_SECONDS, maxsize=64)
+# Растёт с каждым сбросом: выборку, начатую до записи, в кэш уже не кладём
+_listing_feed_generation = 0
+
+
+def _invalidate_listing_feed(event: str, key: Optional[str]) -> None:
+    global _listing_feed_generation
+    _listing_feed_generation += 1
+    listing_feed_cache.invalidate()
+    board_index_cache.invalidate()
+    board_results_cache.invalidate()
+    district_counts_cache.invalidate()
+
+
+subscribe("listing_changed", _invalidate_listing_feed)
+
+
+@dataclass(frozen=True)
+class ListingFeed:
+    items: list[dict]
+    etag: str
+    body: PrecompressedBody
+
+
+def _listing_feed(
+    db: Session,
+    status: str = "active",
+    listing_type: Optional[str] = None,
+    sort: Optional[str] = None,
+    district_id: Optional[int] = None,
+) -> ListingFeed:
+    cache_key = (status, listing_type, sort, district_id)
+    if LISTING_FEED_CACHE_SECONDS > 0:
+        cached = listing_feed_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    generation = _listing_feed_generation
+    listings = _query_listings(db, status, listing_type, sort, district_id)
+    feed = ListingFeed(
+        items=listings,
+        etag=_json_etag("feed", _without_popularity(listings)),
+        body=PrecompressedBody(json.dumps(listings, ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+    )
+    if LISTING_FEED_CACHE_SECONDS > 0 and generation == _listing_feed_generation:
+        listing_feed_cache.set(cache_key, feed)
+    return feed
+
+
+def _list_listings(
+    db: Session,
+    status: str = "active",
+    listing_type: Optional[str] = None,
+    sort: Optional[str] = None,
+) -> list[dict]:
+    return _listing_feed(db, status, listing_type, sort).items
+
+
+def _query_listings(
+    db: Session,
+    status: str,
+    listing_type: Optional[str],
+    sort: Optional[str],
+    district_id: Optional[int] = None,
+) -> list[dict]:
+    # Имя автора, счётчики и обложку подтягиваем тем же запросом, а не ленивой загрузкой на каждое объявление
+    cover = _cover_photo()
+    query = (
+        db.query(Listing, User.username, ListingStats.score, cover.digest)
+        .outerjoin(User, User.id == Listing.user_id)
+        .outerjoin(ListingStats, ListingStats.listing_id == Listing.id)
+        .outerjoin(cover, (cover.listing_id == Listing.id) & (cover.position == 0))
+        .filter(Listing.status == status)
+    )
+    if listing_type:
+        query = query.filter(Listing.type == listing_type)
+    if district_id:
+        query = query.filter(Listing.district_id == district_id)
+    if sort == "popularity":
+        # score растёт со временем одинаково для всех, поэтому порядок по нему — порядок по популярности
+        query = query.order_by(ListingStats.score.desc().nulls_last(), Listing.created_at.desc())
+    elif sort == "newest":
+        query = query.order_by(Listing.created_at.desc())
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            **_serialize_listing(listing),
+            "username": username,
+            "popularity": round(popularity(score, now), 2),
+            "thumb_url": photo_url(cover_digest),
+        }
+        for listing, username, score, cover_digest in query.all()
+    ]
+
+
+BOARD_PAGE_SIZE = 30
+BOARD_PAGE_SIZE_MAX = 100
+BOARD_SORTS = ("newest", "oldest", "popularity", "payment_high", "payment_low", "title_asc")
+BOARD_DATE_DAYS = {"today": 1, "week": 7, "month": 30}
+# Сумма оплаты — первое число в строке («25 BYN/час» → 25), как и в фильтре клиента
+_PAYMENT_AMOUNT_RE = re.compile(r"(\d+\.?\d*)")
+
+# Индекс доски строится из той же ленты активных объявлений раз на её версию,
+# результаты фильтров кэшируются: следующие страницы — срез готового списка
+board_index_cache = TTLCache("board_index", ttl=LISTING_FEED_CACHE_SECONDS, maxsize=1)
+board_results_cache = TTLCache("board_results", ttl=LISTING_FEED_CACHE_SECONDS, maxsize=256)
+
+
+@dataclass(frozen=True)
+class BoardQuery:
+    listing_type: Optional[str]
+    district_id: Optional[int]
+    text: str
+    address: str
+    min_payment: float
+    payment_type: str
+    date: Optional[str]
+    sort: str
+
+
+@dataclass(frozen=True)
+class BoardEntry:
+    listing: dict
+    text: str
+    address: str
+    payment: str
+    amount: float
+    created_ts: Optional[float]
+
+
+def _payment_amount(payment: Optional[str]) -> float:
+    match = _PAYMENT_AMOUNT_RE.search(payment or "")
+    return float(match.group(1)) if match else 0.0
+
+
+def _created_timestamp(created_at: Optional[str]) -> Optional[float]:
+    if not created_at:
+        return None
+    created = datetime.fromisoformat(created_at)
+    if created.tzinfo is None:
+        # SQLite отдаёт время без зоны, пишется оно в UTC
+        created = created.replace(tzinfo=timezone.utc)
+    return created.timestamp()
+
+
+@dataclass(frozen=True)
+class BoardIndex:
+    entries: list[BoardEntry]
+    # ETag ленты, из которой построен индекс: страница и её ETag всегда из одной версии
+    feed_etag: str
+
+
+@dataclass(frozen=True)
+class BoardResults:
+    listings: list[dict]
+    available: int
+    feed_etag: str
+
+
+def _board_index(db: Session) -> BoardIndex:
+    generation = _listing_feed_generation
+    index = board_index_cache.get("active")
+    if index is not None:
+        return index
+    feed = _listing_feed(db)
+    entries = [
+        BoardEntry(
+            listing=listing,
+            text=f"{listing['title']}\n{listing['description']}".lower(),
+            address=listing["address"].lower(),
+            payment=(listing["payment"] or "").lower(),
+            amount=_payment_amount(listing["payment"]),
+            created_ts=_created_timestamp(listing["created_at"]),
+        )
+        for listing in feed.items
+    ]
+    index = BoardIndex(entries, feed.etag)
+    if generation == _listing_feed_generation:
+        board_index_cache.set("active", index)
+    return index
+
+
+def _board_matches(entry: BoardEntry, query: BoardQuery, created_after: Optional[float]) -> bool:
+    if query.listing_type and entry.listing["type"] != query.listing_type:
+        return False
+    if query.district_id and entry.listing["district_id"] != query.district_id:
+        return False
+    if query.text and query.text not in entry.text:
+        return False
+    if query.address and query.address not in entry.address:
+        return False
+    if query.min_payment > 0 and entry.amount < query.min_payment:
+        return False
+    if query.payment_type and query.payment_type not in entry.payment:
+        return False
+    if created_after is not None and entry.created_ts is not None and entry.created_ts <= created_after:
+        return False
+    return True
+
+
+def _board_sort_key(sort: str):
+    if sort in ("newest", "oldest"):
+        return lambda entry: entry.created_ts or 0.0
+    if sort == "popularity":
+        return lambda entry: entry.listing["popularity"] or 0.0
+    if sort in ("payment_high", "payment_low"):
+        return lambda entry: entry.amount
+    return lambda entry: (entry.listing["title"] or "").casefold()
+
+
+def _board_results(db: Session, query: BoardQuery) -> BoardResults:
+    """Отфильтрованная и отсортированная доска, общее число активных объявлений и ETag их ленты"""
+    generation = _listing_feed_generation
+    cached = board_results_cache.get(query)
+    if cached is not None:
+        return cached
+    index = _board_index(db)
+
+    created_after = None
+    if query.date:
+        created_after = datetime.now(timezone.utc).timestamp() - BOARD_DATE_DAYS[query.date] * 86400
+    entries = [entry for entry in index.entries if _board_matches(entry, query, created_after)]
+    entries.sort(key=_board_sort_key(query.sort), reverse=query.sort in ("newest", "popularity", "payment_high"))
+    results = BoardResults([entry.listing for entry in entries], len(index.entries), index.feed_etag)
+    if generation == _listing_feed_generation:
+        board_results_cache.set(query, results)
+    return results
+
+
+@router.get("/api/listings/board")
+async def get_board_page(
+    db: Session = Depends(get_db),
+    type: Optional[str] = Query(None, pattern="^(task|worker)$"),
+    district: Optional[int] = Query(None, ge=1),
+    q: Optional[str] = Query(None, max_length=200),
+    address: Optional[str] = Query(None, max_length=200),
+    min_payment: float = Query(0, ge=0),
+    payment_type: Optional[str] = Query(None, max_length=50),
+    date: Optional[str] = Query(None, pattern="^(today|week|month)$"),
+    sort: str = Query("newest", pattern=f"^({'|'.join(BOARD_SORTS)})$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(BOARD_PAGE_SIZE, ge=1, le=BOARD_PAGE_SIZE_MAX),
+    init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Страница доски объявлений: фильтры и сортировка считаются на сервере,
+    клиент подгружает следующие страницы по offset при прокрутке.
+    """
+    if init_data:
+        user = _get_current_user(db=db, init_data=init_data)
+        _require_not_banned(user)
+
+    board_query = BoardQuery(
+        listing_type=type,
+        district_id=district,
+        text=(q or "").strip().lower(),
+        address=(address or "").strip().lower(),
+        min_payment=min_payment,
+        payment_type=(payment_type or "").lower(),
+        date=date,
+        sort=sort,
+    )
+    results = _board_results(db, board_query)
+    listings = results.listings
+    page = listings[offset:offset + limit]
+    body = {
+        "items": page,
+        "total": len(listings),
+        "available": results.available,
+        "next_offset": offset + len(page) if offset + len(page) < len(listings) else None,
+    }
+    # Содержимое объявлений задаёт ETag ленты, из которой построена страница, состав и порядок — id
+    etag = _json_etag(
+        "board",
+        [results.feed_etag, [listing["id"] for listing in page], body["total"], body["available"]],
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
+
+
+# Счётчики по районам — агрегат по индексу (status, district_id, type), сбрасывается вместе с лентой
+district_counts_cache = TTLCache("district_counts", ttl=LISTING_FEED_CACHE_SECONDS, maxsize=1)
+
+
+def _district_counts(db: Session) -> dict[Optional[int], dict[str, int]]:
+    generation = _listing_feed_generation
+    counts = district_counts_cache.get("active")
+    if counts is not None:
+        return counts
+    counts = {}
+    rows = db.execute(
+        select(Listing.district_id, Listing.type, func.count())
+        .where(Listing.status == "active")
+        .group_by(Listing.district_id, Listing.type)
+    ).all()
+    for district_id, listing_type, count in rows:
+        counts.setdefault(district_id, {"task": 0, "worker": 0})[listing_type] = count
+    if generation == _listing_feed_generation:
+        district_counts_cache.set("active", counts)
+    return counts
+
+
+@router.get("/api/districts")
+async def get_districts(db: Session = Depends(get_db)):
+    """Районы Минска и число активных объявлений в каждом (для фильтра доски)"""
+    counts = _district_counts(db)
+    return {
+        "items": [
+            {**district.public(), "counts": counts.get(district.id, {"task": 0, "worker": 0})}
+            for district in sorted(DISTRICTS.values(), key=lambda district: district.name)
+        ],
+        # Точка вне границ всех районов
+        "unassigned": counts.get(None, {"task": 0, "worker": 0}),
+        "approximate": DISTRICTS_APPROXIMATE,
+    }
+
+
+def _list_my_listings(db: Session, user: User) -> list[dict]:
+    cover = _cover_photo()
+    rows = (
+        db.query(Listing, ListingStats.views, ListingStats.score, cover.digest)
+        .outerjoin(ListingStats, ListingStats.listing_id == Listing.id)
+        .outerjoin(cover, (cover.listing_id == Listing.id) & (cover.position == 0))
         .filter(Listing.user_id == user.id, Listing.status == "active")
         .all()
     )
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            **_serialize_listing(listing),
+            "views": (views or 0) + view_counter.pending(listing.id),
+            "popularity": round(popularity(score, now), 2),
+            "thumb_url": photo_url(cover_digest),
+        }
+        for listing, views, score, cover_digest in rows
+    ]
 
-    result = []
-    for listing in listings:
-        result.append(
-            {
-                "id": listing.id,
-                "type": listing.type,
-                "title": listing.title,
-                "description": listing.description,
-                "address": listing.address,
-                "payment": listing.payment,
-                "contacts": listing.contacts,
-                "latitude": listing.latitude,
-                "longitude": listing.longitude,
-                "created_at": listing.created_at.isoformat() if listing.created_at else None,
-            }
+
+@router.get("/api/bootstrap")
+async def bootstrap(
+    response: Response,
+    include_listings: bool = True,
+    include_my: bool = True,
+    if_none_match: Optional[str] = Header(None),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Всё, что нужно Mini App при открытии, одним ответом: статус пользователя,
+    активные условия (полный текст — только если их ещё нужно принять),
+    свои объявления и маркеры карты. Пользователь и условия ищутся один раз.
+    """
+    active_terms = _get_active_terms(db)
+    compliance = _serialize_compliance(user, db, active_terms)
+    accepted = compliance["is_terms_accepted"] or active_terms is None
+
+    terms = None
+    if active_terms:
+        terms = {"version": active_terms.version, "etag": _terms_etag(active_terms)}
+        if not compliance["is_terms_accepted"]:
+            terms.update(_serialize_terms(active_terms))
+
+    # Стартовый вид карты — весь Минск, поэтому первый экран маркеров = все активные объявления
+    feed = _listing_feed(db) if include_listings else None
+    my_listings = _list_my_listings(db, user) if include_my and accepted else None
+
+    # Клиент держит прошлый ответ в IndexedDB и перепроверяет его по ETag
+    etag = _json_etag(
+        "bootstrap",
+        [compliance, terms, feed.etag if feed else None, _without_popularity(my_listings)],
+    )
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "X-Telegram-Init-Data"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return {
+        "compliance": compliance,
+        "terms": terms,
+        "listings": feed.items if feed else None,
+        "my_listings": my_listings,
+    }
+
+
+def _serialize_subscription(subscription: Subscription) -> dict:
+    return SubscriptionResponse(
+        id=subscription.id,
+        type=subscription.type,
+        keyword=subscription.keyword,
+        min_payment=subscription.min_payment,
+        latitude=subscription.latitude,
+        longitude=subscription.longitude,
+        radius_km=subscription.radius_km,
+        created_at=subscription.created_at,
+    ).model_dump()
+
+
+@router.get("/api/subscriptions", response_model=list[SubscriptionResponse])
+async def get_my_subscriptions(
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    _require_not_banned(user)
+    rows = (
+        db.query(Subscription)
+        .filter(Subscription.user_id == user.id, Subscription.is_active.is_(True))
+        .order_by(Subscription.id.desc())
+        .all()
+    )
+    return [_serialize_subscription(row) for row in rows]
+
+
+@router.post("/api/subscriptions", response_model=SubscriptionResponse)
+async def create_subscription(
+    body: SubscriptionCreate,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    _require_not_banned(user)
+    _require_terms_accepted(user, db)
+
+    if body.type is not None and body.type not in ["task", "worker"]:
+        raise HTTPException(status_code=400, detail="Тип должен быть 'task' или 'worker'")
+    if not 0 < body.radius_km <= MAX_RADIUS_KM:
+        raise HTTPException(status_code=400, detail=f"Радиус должен быть от 0 до {MAX_RADIUS_KM:g} км")
+    if body.min_payment is not None and body.min_payment < 0:
+        raise HTTPException(status_code=400, detail="Минимальная оплата не может быть отрицательной")
+
+    active_count = (
+        db.query(Subscription)
+        .filter(Subscription.user_id == user.id, Subscription.is_active.is_(True))
+        .count()
+    )
+    if active_count >= MAX_SUBSCRIPTIONS_PER_USER:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Можно сохранить не более {MAX_SUBSCRIPTIONS_PER_USER} подписок",
         )
-    return result
+
+    subscription = Subscription(
+        user_id=user.id,
+        type=body.type,
+        keyword=(body.keyword or "").strip() or None,
+        min_payment=body.min_payment,
+        latitude=body.latitude,
+        longitude=body.longitude,
+        radius_km=body.radius_km,
+        is_active=True,
+    )
+    db.add(subscription)
+    db.commit()
+    db.refresh(subscription)
+    publish("subscription_changed", user.id)
+    return _serialize_subscription(subscription)
+
+
+@router.delete("/api/subscriptions/{subscription_id}")
+async def delete_subscription(
+    subscription_id: int,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    subscription = (
+        db.query(Subscription)
+        .filter(
+            Subscription.id == subscription_id,
+            Subscription.user_id == user.id,
+            Subscription.is_active.is_(True),
+        )
+        .first()
+    )
+    if not subscription:
+        raise HTTPException(status_code=404, detail="Подписка не найдена")
+
+    subscription.is_active = False
+    db.commit()
+    publish("subscription_changed", user.id)
+    return {"message": "Подписка удалена"}
 
 
 @router.delete("/api/listings/{listing_id}")
@@ -533,14 +1251,16 @@ async def delete_listing(
         raise HTTPException(status_code=400, detail="Укажите причину снятия объявления")
 
     listing.status = "closed"
-    db.commit()
+    listing.closed_at = datetime.now(timezone.utc)
     _write_admin_audit(
         db=db,
         admin_user_id=user.id,
         target_user_id=user.id,
         action="close_own_listing",
-        details=f"listing_id={listing.id}; reason={body.reason.strip()}",
+        details={"listing_id": listing.id, "reason": body.reason.strip()},
     )
+    db.commit()
+    publish("listing_changed", listing.id)
     return {"message": "Объявление снято с публикации"}
 
 
@@ -575,6 +1295,15 @@ async def update_listing(
 
     _validate_listing_text_update(body)
 
+    text_changed = body.title is not None or body.description is not None
+    if text_changed:
+        signature, duplicate_of = _check_duplicates(
+            db,
+            body.title if body.title is not None else listing.title,
+            body.description if body.description is not None else listing.description,
+            exclude_id=listing.id,
+        )
+
     if body.title is not None:
         listing.title = body.title
     if body.description is not None:
@@ -585,9 +1314,12 @@ async def update_listing(
         listing.payment = body.payment
     if body.contacts is not None:
         listing.contacts = body.contacts
+    if text_changed and similarity.DUPLICATE_MODE != "off":
+        similarity.store_signature(db, listing, signature, duplicate_of)
 
     db.commit()
     db.refresh(listing)
+    publish("listing_changed", listing.id)
 
     return {
         "id": listing.id,
@@ -609,6 +1341,7 @@ async def get_listing(
     init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
     db: Session = Depends(get_db),
 ):
+    user = None
     if init_data:
         user = _get_current_user(db=db, init_data=init_data)
         _require_not_banned(user)
@@ -621,6 +1354,10 @@ async def get_listing(
     if not listing:
         raise HTTPException(status_code=404, detail="Объявление не найдено")
 
+    # Анонимные просмотры и свои просмотры автора не засчитываем
+    if user is not None and user.id != listing.user_id:
+        view_counter.record_view(listing.id, user.id)
+
     return {
         "id": listing.id,
         "type": listing.type,
@@ -631,17 +1368,247 @@ async def get_listing(
         "contacts": listing.contacts,
         "latitude": listing.latitude,
         "longitude": listing.longitude,
+        "district_id": listing.district_id,
         "username": listing.user.username if listing.user else None,
         "created_at": listing.created_at.isoformat() if listing.created_at else None,
+        "photos": [_serialize_photo(photo) for photo in _listing_photos(db, listing.id)],
+    }
+
+
+@router.get("/api/listings/{listing_id}/matches")
+async def get_listing_matches(
+    listing_id: int,
+    limit: int = Query(MATCH_TOP_K, ge=1, le=MATCH_TOP_K),
+    init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(get_db),
+):
+    """Подходящие пары для объявления: исполнители для задачи, задачи для исполнителя"""
+    if init_data:
+        _require_not_banned(_get_current_user(db=db, init_data=init_data))
+    if not matching_engine.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Подбор пар ещё загружается, повторите позже",
+            headers={"Retry-After": "5"},
+        )
+    # Список обычно готов; блокировку индекса ждём в потоке, а не в цикле событий
+    items = await asyncio.to_thread(matching_engine.matches, listing_id, limit)
+    if items is None:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    return {"listing_id": listing_id, "items": items}
+
+
+@router.post("/api/listings/{listing_id}/view", status_code=204)
+async def record_listing_view(
+    listing_id: int,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Просмотр карточки, которую клиент показал из уже загруженного списка"""
+    owner_id = db.query(Listing.user_id).filter(Listing.id == listing_id, Listing.status == "active").scalar()
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    if user.id != owner_id:
+        view_counter.record_view(listing_id, user.id)
+    return Response(status_code=204)
+
+
+def _listing_photos(db: Session, listing_id: int) -> list[ListingPhoto]:
+    return db.query(ListingPhoto).filter(ListingPhoto.listing_id == listing_id).order_by(ListingPhoto.position).all()
+
+
+def _serialize_photo(photo: ListingPhoto) -> dict:
+    return {
+        "id": photo.id,
+        "position": photo.position,
+        "width": photo.width,
+        "height": photo.height,
+        "thumb_url": photo_url(photo.digest),
+        "thumb_jpeg_url": photo_url(photo.digest, ext="jpg"),
+        "url": photo_url(photo.digest, "full"),
     }
 
 
+def _get_own_active_listing(db: Session, user: User, listing_id: int) -> Listing:
+    listing = (
+        db.query(Listing)
+        .filter(Listing.id == listing_id, Listing.user_id == user.id, Listing.status == "active")
+        .first()
+    )
+    if not listing:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    return listing
+
+
+@router.post("/api/listings/{listing_id}/photos")
+async def upload_listing_photo(
+    listing_id: int,
+    request: Request,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Загрузка фото (multipart, поле file). Файл принимается потоково, варианты строятся в пуле процессов."""
+    _require_not_banned(user)
+    _require_terms_accepted(user, db)
+    _get_own_active_listing(db, user, listing_id)
+    count = db.query(ListingPhoto).filter(ListingPhoto.listing_id == listing_id).count()
+    if count >= PHOTO_MAX_PER_LISTING:
+        raise HTTPException(status_code=400, detail=f"Не больше {PHOTO_MAX_PER_LISTING} фото на объявление")
+    user_id = user.id
+    # Не держим соединение из пула, пока идёт приём и обработка файла
+    db.commit()
+
+    try:
+        upload = await receive_upload(request)
+    except PhotoTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except PhotoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    known = db.query(ListingPhoto.width, ListingPhoto.height).filter(ListingPhoto.digest == upload.digest).first()
+    if known and variants_exist(upload.digest):
+        discard_upload(upload)
+        width, height = known
+    else:
+        try:
+            width, height = await process_upload(upload)
+        except PhotoError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    photo = ListingPhoto(
+        listing_id=listing_id,
+        user_id=user_id,
+        digest=upload.digest,
+        width=width,
+        height=height,
+        position=count,
+    )
+    db.add(photo)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Фото загружаются одновременно, повторите попытку")
+    db.refresh(photo)
+    publish("listing_changed", listing_id)
+    return _serialize_photo(photo)
+
+
+@router.delete("/api/listings/{listing_id}/photos/{photo_id}", status_code=204)
+async def delete_listing_photo(
+    listing_id: int,
+    photo_id: int,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    _require_not_banned(user)
+    _get_own_active_listing(db, user, listing_id)
+    photos = _listing_photos(db, listing_id)
+    removed = next((photo for photo in photos if photo.id == photo_id), None)
+    if removed is None:
+        raise HTTPException(status_code=404, detail="Фото не найдено")
+    digest = removed.digest
+    db.delete(removed)
+    db.flush()
+    # Сдвигаем по одному по возрастанию: каждая строка занимает уже освободившуюся позицию
+    for photo in photos:
+        if photo.position > removed.position:
+            db.execute(
+                update(ListingPhoto)
+                .where(ListingPhoto.id == photo.id)
+                .values(position=photo.position - 1)
+                .execution_options(synchronize_session=False)
+            )
+    db.commit()
+    publish("listing_changed", listing_id)
+    # Файлы общие для одинаковых фото: удаляются, только если на digest не осталось записей
+    await asyncio.to_thread(remove_orphaned_photos, {digest})
+    return Response(status_code=204)
+
+
+@router.get("/media/photos/{name}", include_in_schema=False)
+async def get_photo_file(name: str):
+    path = photo_path(name)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Фото не найдено")
+    ext = PHOTO_FILE_RE.match(name).group("ext")
+    return FileResponse(path, media_type=PHOTO_MEDIA_TYPES[ext], headers={"Cache-Control": PHOTO_CACHE_CONTROL})
+
+
+@router.get("/tiles/{style}/{z}/{x}/{y}", include_in_schema=False)
+async def get_map_tile(style: str, z: int, x: int, y: str):
+    try:
+        path = await tile_proxy.get(parse_tile(style, z, x, y))
+    except TileError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return FileResponse(path, media_type="image/png", headers={"Cache-Control": TILE_CACHE_CONTROL})
+
+
+MAX_TELEGRAM_ID_DIGITS = 12
+
+# Точные COUNT(*) для фильтров админки кэшируются на полминуты
+admin_user_count_cache = TTLCache("admin_user_counts", ttl=30.0, maxsize=256)
+subscribe("user_changed", lambda event, key: admin_user_count_cache.invalidate())
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _telegram_id_prefix_filter(digits: str):
+    # Префикс числа = несколько диапазонов по уникальному индексу telegram_id
+    value = int(digits)
+    conditions = [User.telegram_id == value]
+    for extra_digits in range(1, MAX_TELEGRAM_ID_DIGITS - len(digits) + 1):
+        scale = 10 ** extra_digits
+        conditions.append(User.telegram_id.between(value * scale, (value + 1) * scale - 1))
+    return or_(*conditions)
+
+
+def _username_search_filter(db: Session, term: str):
+    mode = database.USER_SEARCH_MODE
+    if mode == "fts5_trigram" and len(term) >= 3:
+        match = '"' + term.replace('"', '""') + '"'
+    elif mode == "fts5_prefix":
+        match = '"' + term.replace('"', '""') + '"*'
+    else:
+        escaped = _escape_like(term)
+        if mode == "trgm" and len(term) >= 3:
+            return User.username.ilike(f"%{escaped}%", escape="\\")
+        return User.username.ilike(f"{escaped}%", escape="\\")
+
+    fts_ids = (
+        select(text("rowid"))
+        .select_from(text("users_fts"))
+        .where(text("users_fts MATCH :match").bindparams(match=match))
+    )
+    return User.id.in_(fts_ids)
+
+
+def _count_admin_users(db: Session, query, cache_key: tuple) -> tuple[int, bool]:
+    """Возвращает (total, is_estimate): COUNT (возможно, из кэша) или оценку планировщика Postgres"""
+    cached = admin_user_count_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    if cache_key == (None, None, None) and db.bind.dialect.name == "postgresql":
+        estimate = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'users'")
+        ).scalar()
+        if estimate and estimate > 0:
+            result = (int(estimate), True)
+            admin_user_count_cache.set(cache_key, result)
+            return result
+    result = (query.order_by(None).count(), False)
+    admin_user_count_cache.set(cache_key, result)
+    return result
+
+
 @router.get("/api/admin/users")
 async def admin_list_users(
     search: Optional[str] = Query(default=None),
     is_banned: Optional[bool] = Query(default=None),
     role: Optional[str] = Query(default=None),
-    page: int = Query(default=1, ge=1),
+    cursor: Optional[int] = Query(default=None, ge=1),
     page_size: int = Query(default=50, ge=1, le=200),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -649,24 +1616,28 @@ async def admin_list_users(
     _require_admin(user)
 
     query = db.query(User)
-    if search:
-        telegram_search = f"%{search}%"
-        query = query.filter(
-            (User.username.ilike(f"%{search}%"))
-            | (cast(User.telegram_id, String).ilike(telegram_search))
-        )
+    term = (search or "").strip().lstrip("@")
+    if term:
+        # Число длиннее любого telegram_id — не префикс id (и не влезло бы в BIGINT)
+        if term.isascii() and term.isdigit() and len(term) <= MAX_TELEGRAM_ID_DIGITS:
+            query = query.filter(_telegram_id_prefix_filter(term))
+        else:
+            query = query.filter(_username_search_filter(db, term))
     if is_banned is not None:
         query = query.filter(User.is_banned.is_(is_banned))
     if role:
         query = query.filter(User.role == role)
 
-    total = query.count()
-    rows = (
-        query.order_by(User.created_at.desc(), User.id.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
-    )
+    total, total_is_estimate = _count_admin_users(db, query, (term or None, is_banned, role or None))
+
+    if cursor:
+        query = query.filter(User.id < cursor)
+    rows = query.order_by(User.id.desc()).limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = rows[-1].id
+
     items = [
         AdminUserResponse(
             id=row.id,
@@ -681,7 +1652,26 @@ async def admin_list_users(
         ).model_dump()
         for row in rows
     ]
-    return {"total": total, "page": page, "page_size": page_size, "items": items}
+    return {
+        "total": total,
+        "total_is_estimate": total_is_estimate,
+        "page_size": page_size,
+        "next_cursor": next_cursor,
+        "items": items,
+    }
+
+
+@router.get("/api/admin/stats")
+async def admin_stats(
+    range_name: str = Query(default="week", alias="range"),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Спрос и предложение за сутки, неделю или месяц из analytics_rollups"""
+    _require_admin(user)
+    if range_name not in STATS_RANGES:
+        raise HTTPException(status_code=400, detail=f"range должен быть одним из: {', '.join(STATS_RANGES)}")
+    return stats_payload(db, range_name)
 
 
 @router.get("/api/admin/listings", response_model=list[AdminListingResponse])
@@ -692,7 +1682,8 @@ async def admin_list_active_listings(
 ):
     _require_admin(admin_user)
     rows = (
-        db.query(Listing)
+        db.query(Listing, ListingSignature.duplicate_of)
+        .outerjoin(ListingSignature, ListingSignature.listing_id == Listing.id)
         .filter(Listing.status == "active")
         .order_by(Listing.created_at.desc(), Listing.id.desc())
         .limit(limit)
@@ -711,11 +1702,68 @@ async def admin_list_active_listings(
             contacts=row.contacts,
             status=row.status,
             created_at=row.created_at,
+            duplicate_of=duplicate_of,
         )
-        for row in rows
+        for row, duplicate_of in rows
     ]
 
 
+@router.get("/api/admin/listings/duplicates")
+async def admin_list_duplicate_groups(
+    limit: int = Query(default=50, ge=1, le=200),
+    admin_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Активные объявления, помеченные как копии, сгруппированные вокруг самого раннего в группе"""
+    _require_admin(admin_user)
+    original = aliased(Listing, name="original")
+    pairs = (
+        db.query(ListingSignature.listing_id, ListingSignature.duplicate_of)
+        .join(Listing, Listing.id == ListingSignature.listing_id)
+        .join(original, original.id == ListingSignature.duplicate_of)
+        .filter(Listing.status == "active", original.status == "active")
+        .all()
+    )
+    # Копия копии попадает в ту же группу: объединяем пары системой непересекающихся множеств
+    parent: dict[int, int] = {}
+
+    def find(node: int) -> int:
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for listing_id, duplicate_of in pairs:
+        a, b = find(listing_id), find(duplicate_of)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+    groups: dict[int, list[int]] = {}
+    for node in parent:
+        groups.setdefault(find(node), []).append(node)
+
+    ordered = sorted(groups.values(), key=len, reverse=True)[:limit]
+    ids = [listing_id for group in ordered for listing_id in group]
+    rows = (
+        db.query(Listing, User.username)
+        .outerjoin(User, User.id == Listing.user_id)
+        .filter(Listing.id.in_(ids))
+        .all()
+        if ids
+        else []
+    )
+    members_by_id = {
+        listing.id: {**_serialize_listing(listing), "user_id": listing.user_id, "username": username}
+        for listing, username in rows
+    }
+    result = []
+    for group in ordered:
+        members = [members_by_id[listing_id] for listing_id in sorted(group) if listing_id in members_by_id]
+        if len(members) > 1:
+            result.append({"original_id": members[0]["id"], "size": len(members), "listings": members})
+    return result
+
+
 @router.post("/api/admin/listings/{listing_id}/close")
 async def admin_close_listing(
     listing_id: int,
@@ -737,17 +1785,216 @@ async def admin_close_listing(
         raise HTTPException(status_code=404, detail="Маркер не найден или уже снят")
 
     listing.status = "closed"
-    db.commit()
+    listing.closed_at = datetime.now(timezone.utc)
     _write_admin_audit(
         db=db,
         admin_user_id=admin_user.id,
         target_user_id=listing.user_id,
         action="admin_close_listing",
-        details=f"listing_id={listing.id}; reason={reason}",
+        details={"listing_id": listing.id, "reason": reason},
     )
+    db.commit()
+    publish("listing_changed", listing.id)
     return {"message": "Маркер удалён", "listing_id": listing.id}
 
 
+MAX_BULK_ITEMS = 1000
+
+
+def _bulk_ids(ids: list[int]) -> list[int]:
+    unique_ids = list(dict.fromkeys(ids))
+    if not unique_ids:
+        raise HTTPException(status_code=400, detail="Список пуст")
+    if len(unique_ids) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Не более {MAX_BULK_ITEMS} элементов за раз")
+    return unique_ids
+
+
+def _require_reason(reason: Optional[str]) -> str:
+    reason = (reason or "").strip()
+    if not reason:
+        raise HTTPException(status_code=400, detail="Нужно указать причину удаления маркера")
+    return reason
+
+
+@router.post("/api/admin/listings/bulk-close")
+async def admin_bulk_close_listings(
+    body: AdminBulkCloseListingsRequest,
+    admin_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    _require_admin(admin_user)
+    reason = _require_reason(body.reason)
+    listing_ids = _bulk_ids(body.listing_ids)
+
+    closed = close_active_listings(db, Listing.id.in_(listing_ids))
+    closed_ids = {row.id for row in closed}
+    missing_ids = [listing_id for listing_id in listing_ids if listing_id not in closed_ids]
+    existing_ids = set()
+    if missing_ids:
+        existing_ids = {row.id for row in db.query(Listing.id).filter(Listing.id.in_(missing_ids))}
+
+    audit.record_many(
+        db,
+        [
+            audit.audit_row(
+                admin_user_id=admin_user.id,
+                action="admin_close_listing",
+                target_user_id=row.user_id,
+                details={"listing_id": row.id, "reason": reason, "bulk": True},
+            )
+            for row in closed
+        ],
+    )
+    db.commit()
+    if closed:
+        publish("listing_changed")
+
+    results = []
+    for listing_id in listing_ids:
+        if listing_id in closed_ids:
+            result = "closed"
+        elif listing_id in existing_ids:
+            result = "already_closed"
+        else:
+            result = "not_found"
+        results.append({"id": listing_id, "result": result})
+    return {"closed": len(closed_ids), "results": results}
+
+
+@router.post("/api/admin/listings/close-by-text")
+async def admin_close_listings_by_text(
+    body: AdminCloseByTextRequest,
+    admin_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    _require_admin(admin_user)
+    reason = _require_reason(body.reason)
+    query_text = (body.query or "").strip()
+    if len(query_text) < 3:
+        raise HTTPException(status_code=400, detail="Текст для поиска должен быть не короче 3 символов")
+    if body.type is not None and body.type not in ["task", "worker"]:
+        raise HTTPException(status_code=400, detail="Тип должен быть 'task' или 'worker'")
+    if not 1 <= body.limit <= MAX_BULK_ITEMS:
+        raise HTTPException(status_code=400, detail=f"limit должен быть от 1 до {MAX_BULK_ITEMS}")
+
+    pattern = f"%{_escape_like(query_text)}%"
+    matching_ids = (
+        select(Listing.id)
+        .where(
+            Listing.status == "active",
+            or_(Listing.title.ilike(pattern, escape="\\"), Listing.description.ilike(pattern, escape="\\")),
+        )
+        .order_by(Listing.id)
+        .limit(body.limit)
+    )
+    if body.type:
+        matching_ids = matching_ids.where(Listing.type == body.type)
+
+    if body.dry_run:
+        rows = db.query(Listing.id, Listing.user_id, Listing.title).filter(Listing.id.in_(matching_ids)).all()
+        return {
+            "closed": 0,
+            "dry_run": True,
+            "results": [
+                {"id": row.id, "user_id": row.user_id, "title": row.title, "result": "would_close"}
+                for row in rows
+            ],
+        }
+
+    closed = close_active_listings(db, Listing.id.in_(matching_ids))
+    audit.record_many(
+        db,
+        [
+            audit.audit_row(
+                admin_user_id=admin_user.id,
+                action="admin_close_listing",
+                target_user_id=row.user_id,
+                details={"listing_id": row.id, "reason": reason, "bulk": True, "query": query_text},
+            )
+            for row in closed
+        ],
+    )
+    db.commit()
+    if closed:
+        publish("listing_changed")
+    return {
+        "closed": len(closed),
+        "dry_run": False,
+        "results": [{"id": row.id, "user_id": row.user_id, "result": "closed"} for row in closed],
+    }
+
+
+@router.post("/api/admin/users/bulk-ban")
+async def admin_bulk_ban_users(
+    body: AdminBulkBanRequest,
+    admin_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    _require_admin(admin_user)
+    user_ids = _bulk_ids(body.user_ids)
+    candidate_ids = [user_id for user_id in user_ids if user_id != admin_user.id]
+
+    ban_stmt = (
+        update(User)
+        .where(User.id.in_(candidate_ids), User.is_banned.is_(False))
+        .values(is_banned=True, ban_reason=body.reason, banned_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    if db.bind.dialect.update_returning:
+        banned_ids = {row.id for row in db.execute(ban_stmt.returning(User.id))}
+    else:
+        banned_ids = {
+            row.id
+            for row in db.query(User.id).filter(User.id.in_(candidate_ids), User.is_banned.is_(False))
+        }
+        if banned_ids:
+            db.execute(ban_stmt)
+
+    closed_by_user: dict[int, list[int]] = {}
+    if body.close_listings and banned_ids:
+        for row in close_active_listings(db, Listing.user_id.in_(banned_ids)):
+            closed_by_user.setdefault(row.user_id, []).append(row.id)
+
+    existing_ids = {row.id for row in db.query(User.id).filter(User.id.in_(user_ids))}
+    audit.record_many(
+        db,
+        [
+            audit.audit_row(
+                admin_user_id=admin_user.id,
+                action="ban_user",
+                target_user_id=user_id,
+                details={
+                    "reason": body.reason,
+                    "bulk": True,
+                    "closed_listing_ids": closed_by_user.get(user_id, []),
+                },
+            )
+            for user_id in sorted(banned_ids)
+        ],
+    )
+    db.commit()
+    for user_id in sorted(banned_ids):
+        publish("user_changed", user_id)
+    if closed_by_user:
+        publish("listing_changed")
+
+    results = []
+    for user_id in user_ids:
+        if user_id == admin_user.id:
+            result = "self"
+        elif user_id in banned_ids:
+            result = "banned"
+        elif user_id in existing_ids:
+            result = "already_banned"
+        else:
+            result = "not_found"
+        results.append(
+            {"id": user_id, "result": result, "closed_listings": len(closed_by_user.get(user_id, []))}
+        )
+    return {"banned": len(banned_ids), "results": results}
+
+
 @router.post("/api/admin/users/{user_id}/ban")
 async def admin_ban_user(
     user_id: int,
@@ -765,16 +2012,15 @@ async def admin_ban_user(
     target.is_banned = True
     target.ban_reason = body.reason
     target.banned_at = datetime.now(timezone.utc)
-    db.commit()
-    db.refresh(target)
-
     _write_admin_audit(
         db=db,
         admin_user_id=admin_user.id,
         target_user_id=target.id,
         action="ban_user",
-        details=body.reason,
+        details={"reason": body.reason},
     )
+    db.commit()
+    publish("user_changed", target.id)
     return {"message": "Пользователь заблокирован"}
 
 
@@ -792,9 +2038,6 @@ async def admin_unban_user(
     target.is_banned = False
     target.ban_reason = None
     target.banned_at = None
-    db.commit()
-    db.refresh(target)
-
     _write_admin_audit(
         db=db,
         admin_user_id=admin_user.id,
@@ -802,6 +2045,8 @@ async def admin_unban_user(
         action="unban_user",
         details=None,
     )
+    db.commit()
+    publish("user_changed", target.id)
     return {"message": "Блокировка снята"}
 
 
@@ -823,40 +2068,224 @@ async def admin_update_role(
         raise HTTPException(status_code=400, detail="Нельзя снять роль admin у самого себя")
 
     target.role = body.role
-    db.commit()
-    db.refresh(target)
-
     _write_admin_audit(
         db=db,
         admin_user_id=admin_user.id,
         target_user_id=target.id,
         action="update_role",
-        details=body.role,
+        details={"role": body.role},
     )
+    db.commit()
+    publish("user_changed", target.id)
     return {"message": "Роль обновлена"}
 
 
-@router.get("/api/admin/audit", response_model=list[AdminAuditResponse])
+AUDIT_EXPORT_CHUNK_SIZE = 2000
+
+
+def _encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    raw = f"{created_at.isoformat() if created_at else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[Optional[datetime], int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_raw, row_id = raw.rsplit("|", 1)
+        return (datetime.fromisoformat(created_raw) if created_raw else None), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Неверный курсор пагинации")
+
+
+def _audit_filters(
+    admin_user_id: Optional[int],
+    target_user_id: Optional[int],
+    action: Optional[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+) -> list:
+    filters = []
+    if admin_user_id is not None:
+        filters.append(AdminAuditLog.admin_user_id == admin_user_id)
+    if target_user_id is not None:
+        filters.append(AdminAuditLog.target_user_id == target_user_id)
+    if action:
+        filters.append(AdminAuditLog.action == action)
+    if since is not None:
+        filters.append(AdminAuditLog.created_at >= since)
+    if until is not None:
+        filters.append(AdminAuditLog.created_at < until)
+    return filters
+
+
+def _audit_page_query(query, filters: list, cursor: Optional[tuple[Optional[datetime], int]]):
+    query = query.filter(*filters)
+    if cursor:
+        created_at, row_id = cursor
+        if created_at is None:
+            query = query.filter(AdminAuditLog.id < row_id)
+        else:
+            query = query.filter(tuple_(AdminAuditLog.created_at, AdminAuditLog.id) < (created_at, row_id))
+    return query.order_by(AdminAuditLog.created_at.desc(), AdminAuditLog.id.desc())
+
+
+@router.get("/api/admin/audit", response_model=AdminAuditPageResponse)
 async def admin_get_audit(
     limit: int = Query(default=100, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None),
+    admin_user_id: Optional[int] = Query(default=None),
+    target_user_id: Optional[int] = Query(default=None),
+    action: Optional[str] = Query(default=None),
+    since: Optional[datetime] = Query(default=None),
+    until: Optional[datetime] = Query(default=None),
     admin_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     _require_admin(admin_user)
-    logs = (
-        db.query(AdminAuditLog)
-        .order_by(AdminAuditLog.created_at.desc(), AdminAuditLog.id.desc())
-        .limit(limit)
-        .all()
-    )
-    return [
-        AdminAuditResponse(
-            id=log.id,
-            admin_user_id=log.admin_user_id,
-            target_user_id=log.target_user_id,
-            action=log.action,
-            details=log.details,
-            created_at=log.created_at,
+    filters = _audit_filters(admin_user_id, target_user_id, action, since, until)
+    page_cursor = _decode_cursor(cursor) if cursor else None
+    logs = _audit_page_query(db.query(AdminAuditLog), filters, page_cursor).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = _encode_cursor(logs[-1].created_at, logs[-1].id)
+    return {
+        "items": [
+            AdminAuditResponse(
+                id=log.id,
+                admin_user_id=log.admin_user_id,
+                target_user_id=log.target_user_id,
+                action=log.action,
+                details=log.details,
+                created_at=log.created_at,
+            )
+            for log in logs
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+def _iter_audit_export(filters: list, export_format: str):
+    # Своя сессия: генератор живёт дольше запроса, а в памяти держим только один чанк
+    db = SessionLocal()
+    try:
+        columns = (
+            AdminAuditLog.id,
+            AdminAuditLog.admin_user_id,
+            AdminAuditLog.target_user_id,
+            AdminAuditLog.action,
+            AdminAuditLog.details,
+            AdminAuditLog.created_at,
         )
-        for log in logs
-    ]
+        if export_format == "csv":
+            yield "id,admin_user_id,target_user_id,action,details,created_at\n"
+
+        cursor = None
+        while True:
+            rows = _audit_page_query(db.query(*columns), filters, cursor).limit(AUDIT_EXPORT_CHUNK_SIZE).all()
+            db.commit()
+            if not rows:
+                return
+
+            buffer = io.StringIO()
+            if export_format == "csv":
+                writer = csv.writer(buffer, lineterminator="\n")
+                for row in rows:
+                    writer.writerow(
+                        [
+                            row.id,
+                            row.admin_user_id,
+                            row.target_user_id if row.target_user_id is not None else "",
+                            row.action,
+                            json.dumps(row.details, ensure_ascii=False) if row.details is not None else "",
+                            row.created_at.isoformat() if row.created_at else "",
+                        ]
+                    )
+            else:
+                for row in rows:
+                    buffer.write(
+                        json.dumps(
+                            {
+                                "id": row.id,
+                                "admin_user_id": row.admin_user_id,
+                                "target_user_id": row.target_user_id,
+                                "action": row.action,
+                                "details": row.details,
+                                "created_at": row.created_at.isoformat() if row.created_at else None,
+                            },
+                            ensure_ascii=False,
+                        )
+                    )
+                    buffer.write("\n")
+            yield buffer.getvalue()
+
+            if len(rows) < AUDIT_EXPORT_CHUNK_SIZE:
+                return
+            cursor = (rows[-1].created_at, rows[-1].id)
+    finally:
+        db.close()
+
+
+@router.get("/api/admin/audit/export")
+async def admin_export_audit(
+    format: str = Query(default="csv", pattern="^(csv|ndjson)$"),
+    admin_user_id: Optional[int] = Query(default=None),
+    target_user_id: Optional[int] = Query(default=None),
+    action: Optional[str] = Query(default=None),
+    since: Optional[datetime] = Query(default=None),
+    until: Optional[datetime] = Query(default=None),
+    admin_user: User = Depends(get_current_user),
+):
+    _require_admin(admin_user)
+    filters = _audit_filters(admin_user_id, target_user_id, action, since, until)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"admin_audit_{datetime.now(timezone.utc):%Y%m%d_%H%M%S}.{format}"
+    return StreamingResponse(
+        _iter_audit_export(filters, format),
+        media_type=f"{media_type}; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/api/admin/profiles")
+async def admin_list_profiles(admin_user: User = Depends(get_current_user)):
+    _require_admin(admin_user)
+    return {"items": [record.summary() for record in profile_store.list()]}
+
+
+def _get_profile_or_404(profile_id: str):
+    record = profile_store.get(profile_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Профиль не найден (буфер хранит только последние)")
+    return record
+
+
+@router.get("/api/admin/profiles/{profile_id}")
+async def admin_get_profile(profile_id: str, admin_user: User = Depends(get_current_user)):
+    _require_admin(admin_user)
+    record = _get_profile_or_404(profile_id)
+    return {
+        **record.summary(),
+        "sql": [
+            {"statement": statement, "ms": round(elapsed * 1000, 3)}
+            for statement, elapsed in record.sql
+        ],
+        "top_functions": top_functions(record),
+    }
+
+
+@router.get("/api/admin/profiles/{profile_id}/download")
+async def admin_download_profile(profile_id: str, admin_user: User = Depends(get_current_user)):
+    _require_admin(admin_user)
+    record = _get_profile_or_404(profile_id)
+    if record.kind == "cprofile":
+        content, media_type, extension = export_pstats(record), "application/octet-stream", "pstats"
+    else:
+        content, media_type, extension = export_speedscope(record), "application/json", "speedscope.json"
+    filename = f"profile_{record.id}.{extension}"
+    return Response(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,162 @@
+"""
+Фоновый планировщик периодических заданий.
+
+Работает как asyncio-задача в каждом воркере, но задания выполняет только
+лидер: раз в SCHEDULER_TICK_SECONDS воркер пытается продлить или захватить
+аренду в таблице scheduler_leases. Аренда истекает через SCHEDULER_LEASE_SECONDS,
+так что при падении лидера его место займёт другой воркер. Таблица работает
+одинаково на SQLite и PostgreSQL.
+
+Аренда продлевается перед каждым заданием и каждую треть срока, пока задание
+выполняется, поэтому долгое задание не отдаёт её второму воркеру. Если
+продлить не удалось (аренду забрали), текущее задание дорабатывает, а
+остальные в этом такте не запускаются.
+"""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from .database import engine
+from .models import SchedulerLease
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+
+
+class LeaderLease:
+    def __init__(self, name: str, ttl: float, holder: Optional[str] = None):
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    def try_acquire(self) -> bool:
+        """Продлевает свою аренду или забирает истёкшую чужую"""
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl)
+        with engine.begin() as conn:
+            result = conn.execute(
+                update(SchedulerLease)
+                .where(
+                    SchedulerLease.name == self.name,
+                    or_(SchedulerLease.holder == self.holder, SchedulerLease.expires_at < now),
+                )
+                .values(holder=self.holder, expires_at=expires_at)
+            )
+            if result.rowcount:
+                return True
+            try:
+                with conn.begin_nested():
+                    conn.execute(
+                        insert(SchedulerLease).values(name=self.name, holder=self.holder, expires_at=expires_at)
+                    )
+                return True
+            except IntegrityError:
+                return False
+
+    def release(self) -> None:
+        with engine.begin() as conn:
+            conn.execute(
+                delete(SchedulerLease).where(
+                    SchedulerLease.name == self.name, SchedulerLease.holder == self.holder
+                )
+            )
+
+
+class ScheduledJob:
+    def __init__(self, name: str, interval: float, func: Callable[[], int]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.last_run: Optional[float] = None
+
+    def is_due(self, now: float) -> bool:
+        return self.last_run is None or now - self.last_run >= self.interval
+
+
+class Scheduler:
+    def __init__(self, lease: LeaderLease, tick: float = 30.0):
+        self.lease = lease
+        self.tick = tick
+        self.jobs: list[ScheduledJob] = []
+        self.is_leader = False
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "Scheduler":
+        return cls(
+            lease=LeaderLease("scheduler", ttl=float(os.getenv("SCHEDULER_LEASE_SECONDS", "120"))),
+            tick=float(os.getenv("SCHEDULER_TICK_SECONDS", "30")),
+        )
+
+    def add_job(self, name: str, interval: float, func: Callable[[], int]) -> None:
+        self.jobs.append(ScheduledJob(name, interval, func))
+
+    async def run_pending(self) -> dict[str, int]:
+        """Один такт: проверка лидерства и запуск подошедших по времени заданий"""
+        self.is_leader = await asyncio.to_thread(self.lease.try_acquire)
+        results = {}
+        for job in self.jobs:
+            now = time.monotonic()
+            if not self.is_leader:
+                break
+            if not job.is_due(now):
+                continue
+            # Предыдущее задание могло идти долго: продлеваем аренду до запуска следующего
+            self.is_leader = await asyncio.to_thread(self.lease.try_acquire)
+            if not self.is_leader:
+                break
+            job.last_run = now
+            try:
+                results[job.name] = await self._run_job(job)
+            except Exception as e:
+                print(f"Ошибка фонового задания {job.name}: {e}")
+                continue
+            if results[job.name]:
+                print(f"Фоновое задание {job.name}: обработано {results[job.name]}")
+        return results
+
+    async def _run_job(self, job: ScheduledJob) -> int:
+        """Выполняет задание в потоке и продлевает аренду, пока оно идёт"""
+        running = asyncio.ensure_future(asyncio.to_thread(job.func))
+        while True:
+            done, _ = await asyncio.wait({running}, timeout=self.lease.ttl / 3)
+            if done:
+                return running.result()
+            if self.is_leader and not await asyncio.to_thread(self.lease.try_acquire):
+                self.is_leader = False
+                print(f"Аренда планировщика потеряна во время задания {job.name}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_pending()
+            except Exception as e:
+                print(f"Ошибка планировщика: {e}")
+            await asyncio.sleep(self.tick)
+
+    def start(self) -> None:
+        if self._task is None and SCHEDULER_ENABLED:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.is_leader:
+            await asyncio.to_thread(self.lease.release)
+            self.is_leader = False
+
+
+scheduler = Scheduler.from_env()
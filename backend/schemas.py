@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 
 
 class UserBase(BaseModel):
@@ -94,6 +94,25 @@ class AdminListingCloseRequest(BaseModel):
     reason: str
 
 
+class AdminBulkCloseListingsRequest(BaseModel):
+    listing_ids: list[int]
+    reason: str
+
+
+class AdminBulkBanRequest(BaseModel):
+    user_ids: list[int]
+    reason: Optional[str] = None
+    close_listings: bool = True
+
+
+class AdminCloseByTextRequest(BaseModel):
+    query: str
+    reason: str
+    type: Optional[str] = None
+    limit: int = 500
+    dry_run: bool = False
+
+
 class AdminUserResponse(BaseModel):
     id: int
     telegram_id: int
@@ -111,10 +130,15 @@ class AdminAuditResponse(BaseModel):
     admin_user_id: int
     target_user_id: Optional[int] = None
     action: str
-    details: Optional[str] = None
+    details: Optional[dict[str, Any]] = None
     created_at: Optional[datetime] = None
 
 
+class AdminAuditPageResponse(BaseModel):
+    items: list[AdminAuditResponse]
+    next_cursor: Optional[str] = None
+
+
 class AdminListingResponse(BaseModel):
     id: int
     user_id: int
@@ -127,4 +151,25 @@ class AdminListingResponse(BaseModel):
     contacts: str
     status: str
     created_at: Optional[datetime] = None
+    duplicate_of: Optional[int] = None  # ближайшая активная копия по MinHash
 
+
+
+class SubscriptionCreate(BaseModel):
+    type: Optional[str] = None  # 'task', 'worker' или None (любой)
+    keyword: Optional[str] = None
+    min_payment: Optional[float] = None
+    latitude: float
+    longitude: float
+    radius_km: float = 2.0
+
+
+class SubscriptionResponse(BaseModel):
+    id: int
+    type: Optional[str] = None
+    keyword: Optional[str] = None
+    min_payment: Optional[float] = None
+    latitude: float
+    longitude: float
+    radius_km: float
+    created_at: Optional[datetime] = None
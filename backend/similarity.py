@@ -0,0 +1,190 @@
+"""
+Поиск почти одинаковых объявлений (спам-копий) по MinHash.
+
+Текст объявления (заголовок + описание) нормализуется: нижний регистр,
+ё → е, любые числа → «0» (спамеры меняют цены и телефоны), эмодзи и
+пунктуация отбрасываются. Признаки — пары соседних слов (отдельные частые
+слова дали бы огромные общие корзины). Подпись — MINHASH_PERMUTATIONS
+минимумов хэшей признаков; доля совпавших позиций у двух подписей
+оценивает коэффициент Жаккара их наборов признаков.
+
+LSH: подпись режется на LSH_BANDS полос по LSH_ROWS значений, хэш каждой
+полосы (вместе с её номером) — «корзина» в listing_signature_buckets.
+Тексты с Жаккаром 0.7 попадают хотя бы в одну общую корзину с вероятностью
+≈ 0.99, с Жаккаром 0.3 — ≈ 0.12; кандидатов даёт один запрос
+«bucket IN (…)» по первичному ключу, а точная оценка сходства считается
+только для них. Стоимость проверки зависит от размера корзин, а не от
+числа активных объявлений (bench/duplicates_bench.py).
+
+DUPLICATE_MODE:
+    off     — не проверять;
+    flag    — публиковать, но помечать duplicate_of (видно в админке группами);
+    reject  — отклонять публикацию с 409.
+"""
+
+import hashlib
+import os
+import random
+import re
+import struct
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from .models import Listing, ListingSignature, ListingSignatureBucket
+
+DUPLICATE_MODE = os.getenv("DUPLICATE_MODE", "flag").lower()
+DUPLICATE_MIN_SIMILARITY = float(os.getenv("DUPLICATE_MIN_SIMILARITY", "0.6"))
+# Короткие тексты («Уборка квартиры») совпадают у честных объявлений — их не сравниваем
+DUPLICATE_MIN_TOKENS = int(os.getenv("DUPLICATE_MIN_TOKENS", "6"))
+DUPLICATE_CANDIDATE_LIMIT = 200
+
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+
+_MASK64 = (1 << 64) - 1
+# Хэши multiply-shift: (a·h + b) mod 2^64, старшие 32 бита. Параметры фиксированы —
+# подписи из БД должны совпадать между перезапусками.
+_rng = random.Random(20261019)
+_PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(MINHASH_PERMUTATIONS)]
+_SIGNATURE_FORMAT = f"<{MINHASH_PERMUTATIONS}I"
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def _tokens(value: str) -> list[str]:
+    value = _NUMBER_RE.sub("0", value.lower().replace("ё", "е"))
+    return _TOKEN_RE.findall(value)
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+
+
+def minhash(title: Optional[str], description: Optional[str]) -> Optional[list[int]]:
+    """MinHash-подпись текста или None, если текст слишком короткий для сравнения"""
+    tokens = _tokens(f"{title or ''} {description or ''}")
+    if len(tokens) < DUPLICATE_MIN_TOKENS:
+        return None
+    features = {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+    hashes = [_feature_hash(feature) for feature in features]
+    # Минимум по полным 64 битам и сдвиг дают тот же результат, что минимум по старшим 32 битам
+    return [min([(a * h + b) & _MASK64 for h in hashes]) >> 32 for a, b in _PERMUTATIONS]
+
+
+def similarity(a: list[int], b: list[int]) -> float:
+    """Оценка коэффициента Жаккара по двум подписям"""
+    return sum(x == y for x, y in zip(a, b)) / MINHASH_PERMUTATIONS
+
+
+def buckets(signature: list[int]) -> list[int]:
+    """Ключи LSH-корзин подписи: знаковые 64-битные хэши (номер полосы, её значения)"""
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<H{LSH_ROWS}I", band, *rows), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def pack(signature: list[int]) -> bytes:
+    return struct.pack(_SIGNATURE_FORMAT, *signature)
+
+
+def unpack(data: bytes) -> list[int]:
+    return list(struct.unpack(_SIGNATURE_FORMAT, data))
+
+
+def find_duplicates(db: Session, signature: list[int], exclude_id: Optional[int] = None) -> list[tuple[int, float]]:
+    """Активные объявления со сходством не ниже DUPLICATE_MIN_SIMILARITY: [(listing_id, сходство)], ближние первыми"""
+    # Сначала объявления, совпавшие в наибольшем числе корзин: переполненная корзина не вытеснит настоящую копию
+    conditions = [ListingSignatureBucket.bucket.in_(buckets(signature))]
+    if exclude_id is not None:
+        conditions.append(ListingSignatureBucket.listing_id != exclude_id)
+    candidate_ids = db.execute(
+        select(ListingSignatureBucket.listing_id)
+        .where(*conditions)
+        .group_by(ListingSignatureBucket.listing_id)
+        .order_by(func.count().desc())
+        .limit(DUPLICATE_CANDIDATE_LIMIT)
+    ).scalars().all()
+    if not candidate_ids:
+        return []
+    # Отдельным запросом по списку id: иначе планировщик SQLite начинает с перебора всех активных объявлений
+    rows = (
+        db.query(ListingSignature.listing_id, ListingSignature.minhash)
+        .join(Listing, Listing.id == ListingSignature.listing_id)
+        .filter(
+            ListingSignature.listing_id.in_(candidate_ids),
+            Listing.id.in_(candidate_ids),
+            Listing.status == "active",
+        )
+        .all()
+    )
+    matches = []
+    for listing_id, stored in rows:
+        score = similarity(signature, unpack(stored))
+        if score >= DUPLICATE_MIN_SIMILARITY:
+            matches.append((listing_id, score))
+    matches.sort(key=lambda match: (-match[1], match[0]))
+    return matches
+
+
+def store_signature(
+    db: Session,
+    listing: Listing,
+    signature: Optional[list[int]],
+    duplicate_of: Optional[tuple[int, float]] = None,
+) -> None:
+    """Сохраняет подпись объявления и его корзины в текущей транзакции (None — текст слишком короткий)"""
+    db.execute(delete(ListingSignatureBucket).where(ListingSignatureBucket.listing_id == listing.id))
+    row = db.get(ListingSignature, listing.id)
+    if row is None:
+        row = ListingSignature(listing_id=listing.id)
+        db.add(row)
+    row.user_id = listing.user_id
+    row.minhash = pack(signature) if signature is not None else None
+    row.duplicate_of = duplicate_of[0] if duplicate_of else None
+    row.similarity = duplicate_of[1] if duplicate_of else None
+    if signature is not None:
+        db.execute(
+            insert(ListingSignatureBucket),
+            [{"bucket": bucket, "listing_id": listing.id} for bucket in buckets(signature)],
+        )
+
+
+def backfill_signatures(conn, batch_size: int = 1000) -> int:
+    """Считает подписи активных объявлений, у которых их ещё нет (старт и миграция)"""
+    filled = 0
+    while True:
+        rows = conn.execute(
+            text(
+                "SELECT l.id, l.user_id, l.title, l.description FROM listings l "
+                "LEFT JOIN listing_signatures s ON s.listing_id = l.id "
+                "WHERE l.status = 'active' AND s.listing_id IS NULL "
+                "ORDER BY l.id LIMIT :limit"
+            ),
+            {"limit": batch_size},
+        ).all()
+        if not rows:
+            return filled
+        signature_rows, bucket_rows = [], []
+        for listing_id, user_id, title, description in rows:
+            signature = minhash(title, description)
+            # Для коротких текстов пишем пустую подпись, чтобы не выбирать их снова
+            signature_rows.append(
+                {"listing_id": listing_id, "user_id": user_id, "minhash": pack(signature) if signature else None}
+            )
+            if signature:
+                bucket_rows.extend({"bucket": bucket, "listing_id": listing_id} for bucket in buckets(signature))
+        # Корзины без подписи могли остаться от прерванной записи — пересоздаём их
+        conn.execute(
+            delete(ListingSignatureBucket).where(ListingSignatureBucket.listing_id.in_([row[0] for row in rows]))
+        )
+        conn.execute(insert(ListingSignature.__table__), signature_rows)
+        if bucket_rows:
+            conn.execute(insert(ListingSignatureBucket.__table__), bucket_rows)
+        filled += len(signature_rows)
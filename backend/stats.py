@@ -0,0 +1,188 @@
+"""
+Счётчики просмотров объявлений с отложенной записью и популярность.
+
+Просмотр только увеличивает счётчик в памяти. Счётчики разбиты на
+VIEW_SHARDS шардов по listing_id, у каждого своя блокировка, чтобы
+потоки обработчиков не толкались на одной. Раз в VIEW_FLUSH_INTERVAL_SECONDS
+накопленные приращения одним executemany-upsert'ом уходят в отдельную таблицу
+listing_stats — горячая listings при этом не трогается.
+
+Засчитываются только просмотры авторизованных пользователей, и один
+пользователь даёт объявлению не больше одного просмотра за
+VIEW_DEDUP_SECONDS: недавние пары (пользователь, объявление) хранятся в
+TTL-кэше view_dedup, так что цикл запросов не поднимает объявление в
+сортировке по популярности.
+
+Популярность — экспоненциально затухающее число просмотров с периодом
+полураспада POPULARITY_HALF_LIFE_HOURS. Хранится в логарифмической шкале
+относительно фиксированной эпохи: score = ln Σ exp(λ·(tᵢ − t₀)), поэтому
+новая пачка просмотров добавляется через logaddexp без пересчёта старых,
+а сортировка по score одинакова в любой момент времени. Текущее значение
+для показа: exp(score − λ·(now − t₀)).
+"""
+
+import asyncio
+import math
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import bindparam, event, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .cache import TTLCache
+from .database import engine
+from .models import ListingStats
+
+VIEW_SHARDS = int(os.getenv("VIEW_SHARDS", "16"))
+VIEW_FLUSH_INTERVAL_SECONDS = float(os.getenv("VIEW_FLUSH_INTERVAL_SECONDS", "5"))
+VIEW_DEDUP_SECONDS = float(os.getenv("VIEW_DEDUP_SECONDS", "1800"))
+VIEW_DEDUP_MAX_KEYS = int(os.getenv("VIEW_DEDUP_MAX_KEYS", "100000"))
+POPULARITY_HALF_LIFE_HOURS = float(os.getenv("POPULARITY_HALF_LIFE_HOURS", "72"))
+
+POPULARITY_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+DECAY_PER_SECOND = math.log(2) / (POPULARITY_HALF_LIFE_HOURS * 3600)
+
+
+def _logaddexp(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+
+@event.listens_for(engine, "connect")
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if engine.dialect.name == "sqlite":
+        dbapi_connection.create_function("logaddexp", 2, _logaddexp, deterministic=True)
+
+
+def _logaddexp_sql(a, b):
+    if engine.dialect.name == "sqlite":
+        return func.logaddexp(a, b)
+    high = func.greatest(a, b)
+    return func.coalesce(high + func.ln(1 + func.exp(-func.abs(a - b))), a, b)
+
+
+def _decay_offset(at: datetime) -> float:
+    return DECAY_PER_SECOND * (at - POPULARITY_EPOCH).total_seconds()
+
+
+def views_score(views: int, at: datetime) -> float:
+    """Вклад views просмотров в момент at в логарифмической шкале"""
+    return math.log(views) + _decay_offset(at)
+
+
+def popularity(score: Optional[float], now: Optional[datetime] = None) -> float:
+    """Текущее затухшее число просмотров"""
+    if score is None:
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    return math.exp(score - _decay_offset(now))
+
+
+class ViewCounter:
+    def __init__(self, shards: int = VIEW_SHARDS, flush_interval: float = VIEW_FLUSH_INTERVAL_SECONDS):
+        self.flush_interval = flush_interval
+        self._shards: list[dict[int, int]] = [{} for _ in range(max(shards, 1))]
+        self._locks = [threading.Lock() for _ in self._shards]
+        self._flush_lock = threading.Lock()
+        self._seen = TTLCache("view_dedup", VIEW_DEDUP_SECONDS, VIEW_DEDUP_MAX_KEYS)
+        self._seen_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record_view(self, listing_id: int, viewer_id: int) -> bool:
+        """Просмотр пользователя: False, если он уже смотрел объявление в течение VIEW_DEDUP_SECONDS"""
+        key = (viewer_id, listing_id)
+        with self._seen_lock:
+            if self._seen.get(key) is not None:
+                return False
+            self._seen.set(key, True)
+        self.record(listing_id)
+        return True
+
+    def record(self, listing_id: int, count: int = 1) -> None:
+        index = listing_id % len(self._shards)
+        with self._locks[index]:
+            shard = self._shards[index]
+            shard[listing_id] = shard.get(listing_id, 0) + count
+
+    def pending(self, listing_id: int) -> int:
+        index = listing_id % len(self._shards)
+        with self._locks[index]:
+            return self._shards[index].get(listing_id, 0)
+
+    def _drain(self) -> dict[int, int]:
+        drained: dict[int, int] = {}
+        for index, lock in enumerate(self._locks):
+            with lock:
+                shard = self._shards[index]
+                if shard:
+                    self._shards[index] = {}
+                    drained.update(shard)
+        return drained
+
+    def flush(self) -> int:
+        """Записывает накопленные приращения в listing_stats. Возвращает число строк."""
+        with self._flush_lock:
+            counts = self._drain()
+            if not counts:
+                return 0
+            now = datetime.now(timezone.utc)
+            rows = [
+                {"listing_id": listing_id, "views": views, "score": views_score(views, now), "last_viewed_at": now}
+                for listing_id, views in counts.items()
+            ]
+            insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+            stmt = insert(ListingStats).values(
+                listing_id=bindparam("listing_id"),
+                views=bindparam("views"),
+                score=bindparam("score"),
+                last_viewed_at=bindparam("last_viewed_at"),
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ListingStats.listing_id],
+                set_={
+                    "views": ListingStats.views + stmt.excluded.views,
+                    "score": _logaddexp_sql(ListingStats.score, stmt.excluded.score),
+                    "last_viewed_at": stmt.excluded.last_viewed_at,
+                },
+            )
+            try:
+                with engine.begin() as conn:
+                    conn.execute(stmt, rows)
+            except Exception:
+                # Не теряем просмотры: вернём их в шарды до следующей попытки
+                for listing_id, views in counts.items():
+                    self.record(listing_id, views)
+                raise
+            return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Не удалось записать счётчики просмотров: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+view_counter = ViewCounter()
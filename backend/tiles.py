@@ -0,0 +1,390 @@
+"""
+Кэширующий прокси тайлов карты.
+
+Фронтенд берёт тайлы с /tiles/{style}/{z}/{x}/{y}, а не напрямую с CDN
+CARTO и OpenStreetMap: одни и те же тайлы Минска скачиваются один раз и
+лежат в TILES_DIR/<style>/<z>/<x>/<y>.png. Объём каталога ограничен
+TILE_CACHE_MAX_BYTES — при переполнении удаляются тайлы, к которым дольше
+всего не обращались (порядок LRU держится в памяти, после перезапуска
+восстанавливается по mtime файлов).
+
+Прокси отдаёт не любой тайл мира: выше TILE_OPEN_MAX_ZOOM принимаются только
+тайлы, пересекающие MINSK_BBOX с запасом TILE_AREA_MARGIN_DEGREES, остальные —
+403. Иначе сервер можно использовать как открытый ретранслятор для массовой
+выгрузки тайлов OSM/CARTO, а чужие тайлы вытесняли бы из кэша минские.
+
+Одновременные запросы одного некэшированного тайла ждут одну загрузку.
+Тайл старше TILE_MAX_AGE_DAYS перекачивается; если источник недоступен,
+отдаётся устаревшая копия.
+
+TILE_UPSTREAM_URL подменяет адреса всех стилей шаблоном с {style}, {z},
+{x}, {y}, {r} — например, локальным фейковым сервером
+(bench/fake_tile_server.py) для проверки без сети.
+
+Предзаполнение кэша для Минска:
+
+    python -m backend.tiles --styles light --zooms 10-15
+
+Правила OSM и CARTO запрещают массовую выгрузку, поэтому по умолчанию
+засевается только стиль по умолчанию и небольшие масштабы.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from .metrics import Counter, Gauge, register
+
+TILES_DIR = os.getenv(
+    "TILES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "media", "tiles")
+)
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+TILE_MAX_AGE_DAYS = float(os.getenv("TILE_MAX_AGE_DAYS", "30"))
+TILE_UPSTREAM_URL = os.getenv("TILE_UPSTREAM_URL", "")
+TILE_UPSTREAM_TIMEOUT_SECONDS = float(os.getenv("TILE_UPSTREAM_TIMEOUT_SECONDS", "10"))
+TILE_USER_AGENT = os.getenv("TILE_USER_AGENT", "MinskJobsTileProxy/1.0")
+TILE_OPEN_MAX_ZOOM = int(os.getenv("TILE_OPEN_MAX_ZOOM", "6"))
+TILE_AREA_MARGIN_DEGREES = float(os.getenv("TILE_AREA_MARGIN_DEGREES", "0.5"))
+TILE_CACHE_CONTROL = "public, max-age=604800, stale-while-revalidate=86400"
+TILE_MAX_ZOOM = 19
+TILE_CHUNK_SIZE = 16 * 1024
+
+TILE_STYLES = {
+    "light": "https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png",
+    "voyager": "https://{s}.basemaps.cartocdn.com/rastertiles/voyager/{z}/{x}/{y}{r}.png",
+    "dark": "https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png",
+    "osm": "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png",
+}
+# Тайлы двойной плотности (@2x) есть только у CARTO
+TILE_RETINA_STYLES = {"light", "voyager", "dark"}
+TILE_SUBDOMAINS = "abc"
+TILE_Y_RE = re.compile(r"^(?P<y>\d+)(?P<retina>@2x)?(?:\.png)?$")
+
+# Границы Минска с запасом на МКАД и ближайшие пригороды
+MINSK_BBOX = (53.80, 27.38, 54.00, 27.72)
+
+TILE_REQUESTS = register(Counter("tile_requests_total", "Запросы тайлов через прокси", ("result",)))
+
+
+class TileError(Exception):
+    """Тайл не отдать: status_code — код ответа клиенту"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class TileKey:
+    style: str
+    z: int
+    x: int
+    y: int
+    retina: bool = False
+
+    @property
+    def relative_path(self) -> str:
+        return os.path.join(self.style, str(self.z), str(self.x), f"{self.y}{'@2x' if self.retina else ''}.png")
+
+
+def parse_tile(style: str, z: int, x: int, y: str) -> TileKey:
+    if style not in TILE_STYLES:
+        raise TileError(404, "Неизвестный стиль карты")
+    match = TILE_Y_RE.match(y)
+    if not match or not 0 <= z <= TILE_MAX_ZOOM:
+        raise TileError(404, "Тайл не найден")
+    tile_y = int(match.group("y"))
+    if not (0 <= x < 2 ** z and 0 <= tile_y < 2 ** z):
+        raise TileError(404, "Тайл не найден")
+    if z > TILE_OPEN_MAX_ZOOM and not tile_in_area(z, x, tile_y):
+        raise TileError(403, "Тайл вне зоны обслуживания")
+    retina = bool(match.group("retina")) and style in TILE_RETINA_STYLES
+    return TileKey(style, z, x, tile_y, retina)
+
+
+def _tile_lat(z: int, y: int) -> float:
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / 2 ** z))))
+
+
+def tile_in_area(z: int, x: int, y: int, margin: float = TILE_AREA_MARGIN_DEGREES) -> bool:
+    """Пересекает ли тайл MINSK_BBOX, расширенный на margin градусов"""
+    south, west, north, east = MINSK_BBOX
+    n = 2 ** z
+    tile_west, tile_east = x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+    tile_north, tile_south = _tile_lat(z, y), _tile_lat(z, y + 1)
+    return (
+        tile_west < east + margin
+        and tile_east > west - margin
+        and tile_south < north + margin
+        and tile_north > south - margin
+    )
+
+
+def upstream_url(key: TileKey) -> str:
+    template = TILE_UPSTREAM_URL or TILE_STYLES[key.style]
+    return template.format(
+        style=key.style,
+        s=TILE_SUBDOMAINS[(key.x + key.y) % len(TILE_SUBDOMAINS)],
+        z=key.z,
+        x=key.x,
+        y=key.y,
+        r="@2x" if key.retina else "",
+    )
+
+
+class TileCache:
+    """Каталог тайлов с ограничением объёма и вытеснением давно не запрошенных"""
+
+    def __init__(self, root: str = TILES_DIR, max_bytes: int = TILE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self) -> None:
+        """Восстанавливает порядок LRU по mtime файлов (выполняется один раз)"""
+        found = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, os.path.relpath(path, self.root), stat.st_size))
+        found.sort()
+        for _, relative_path, size in found:
+            self._entries[relative_path] = size
+            self.size += size
+        self._loaded = True
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._evict()
+
+    def lookup(self, key: TileKey) -> tuple[Optional[str], bool]:
+        """(путь к файлу или None, свежий ли тайл); отмечает обращение для LRU"""
+        self.ensure_loaded()
+        relative_path = key.relative_path
+        with self._lock:
+            if relative_path not in self._entries:
+                return None, False
+            self._entries.move_to_end(relative_path)
+        path = os.path.join(self.root, relative_path)
+        try:
+            age = time.time() - os.stat(path).st_mtime
+        except OSError:
+            self._forget(relative_path)
+            return None, False
+        return path, age < TILE_MAX_AGE_DAYS * 86400
+
+    def store(self, key: TileKey, tmp_path: str) -> str:
+        """Переносит скачанный файл на место тайла и вытесняет лишнее"""
+        self.ensure_loaded()
+        relative_path = key.relative_path
+        path = os.path.join(self.root, relative_path)
+        size = os.path.getsize(tmp_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.size += size - self._entries.pop(relative_path, 0)
+            self._entries[relative_path] = size
+            self._evict(keep=relative_path)
+        return path
+
+    def _forget(self, relative_path: str) -> None:
+        with self._lock:
+            self.size -= self._entries.pop(relative_path, 0)
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        while self.size > self.max_bytes and self._entries:
+            relative_path, size = next(iter(self._entries.items()))
+            if relative_path == keep:
+                break
+            del self._entries[relative_path]
+            self.size -= size
+            try:
+                os.unlink(os.path.join(self.root, relative_path))
+            except OSError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def download_tile(key: TileKey, cache: "TileCache") -> str:
+    """Скачивает тайл во временный файл рядом с кэшем и кладёт его в кэш (в рабочем потоке)"""
+    request = urllib.request.Request(upstream_url(key), headers={"User-Agent": TILE_USER_AGENT})
+    tmp_dir = os.path.join(cache.root, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            with urllib.request.urlopen(request, timeout=TILE_UPSTREAM_TIMEOUT_SECONDS) as response:
+                while True:
+                    chunk = response.read(TILE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+        return cache.store(key, tmp_path)
+    except urllib.error.HTTPError as e:
+        raise TileError(404 if e.code == 404 else 502, f"Источник тайлов ответил {e.code}") from e
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        raise TileError(502, "Источник тайлов недоступен") from e
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+class TileProxy:
+    """Отдаёт тайлы из кэша, а промахи объединяет: один тайл качается один раз"""
+
+    def __init__(self, cache: TileCache):
+        self.cache = cache
+        self._inflight: dict[TileKey, asyncio.Task] = {}
+
+    async def get(self, key: TileKey) -> str:
+        if not self.cache.loaded:
+            # Обход каталога кэша — в потоке; обычно его уже сделал старт приложения
+            await asyncio.to_thread(self.cache.ensure_loaded)
+        # stat одного файла — микросекунды, поток для этого не нужен
+        path, fresh = self.cache.lookup(key)
+        if path and fresh:
+            TILE_REQUESTS.inc("hit")
+            return path
+
+        task = self._inflight.get(key)
+        if task is None:
+            # Загрузка — отдельная задача: отключение первого клиента не обрывает её для остальных
+            task = self._inflight[key] = asyncio.create_task(self._fetch(key, path))
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            TILE_REQUESTS.inc("coalesced")
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: TileKey, stale_path: Optional[str]) -> str:
+        try:
+            path = await asyncio.to_thread(download_tile, key, self.cache)
+        except TileError:
+            if stale_path:
+                # Устаревшая копия лучше пустого квадрата на карте
+                TILE_REQUESTS.inc("stale")
+                return stale_path
+            TILE_REQUESTS.inc("error")
+            raise
+        TILE_REQUESTS.inc("miss")
+        return path
+
+    def _finished(self, key: TileKey, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        # Если все ожидающие отключились, ошибку никто не заберёт — помечаем её полученной
+        if not task.cancelled():
+            task.exception()
+
+
+tile_cache = TileCache()
+tile_proxy = TileProxy(tile_cache)
+
+register(Gauge("tile_cache_bytes", "Объём кэша тайлов на диске", lambda: [((), tile_cache.size)]))
+register(Gauge("tile_cache_entries", "Тайлов в кэше", lambda: [((), len(tile_cache))]))
+
+
+def tiles_for_bbox(bbox: tuple[float, float, float, float], zoom: int) -> list[tuple[int, int]]:
+    """Номера тайлов (x, y) веб-меркатора, покрывающих прямоугольник (юг, запад, север, восток)"""
+    south, west, north, east = bbox
+
+    def to_tile(lat: float, lon: float) -> tuple[int, int]:
+        n = 2 ** zoom
+        x = int((lon + 180.0) / 360.0 * n)
+        lat_rad = math.radians(lat)
+        y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+        return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+    x_min, y_min = to_tile(north, west)
+    x_max, y_max = to_tile(south, east)
+    return [(x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)]
+
+
+def _parse_zooms(value: str) -> list[int]:
+    zooms = []
+    for part in value.split(","):
+        start, _, end = part.partition("-")
+        zooms.extend(range(int(start), int(end or start) + 1))
+    return zooms
+
+
+def seed(styles: list[str], zooms: list[int], concurrency: int = 4, retina: bool = False) -> dict:
+    """Скачивает недостающие и устаревшие тайлы Минска; возвращает счётчики"""
+    counts = {"total": 0, "cached": 0, "downloaded": 0, "failed": 0}
+    keys = [
+        TileKey(style, zoom, x, y, retina and style in TILE_RETINA_STYLES)
+        for style in styles
+        for zoom in zooms
+        for x, y in tiles_for_bbox(MINSK_BBOX, zoom)
+    ]
+    counts["total"] = len(keys)
+    lock = threading.Lock()
+
+    def fetch(key: TileKey) -> None:
+        path, fresh = tile_cache.lookup(key)
+        if path and fresh:
+            result = "cached"
+        else:
+            try:
+                download_tile(key, tile_cache)
+                result = "downloaded"
+            except TileError as e:
+                print(f"Тайл {key.relative_path}: {e}")
+                result = "failed"
+        with lock:
+            counts[result] += 1
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        list(pool.map(fetch, keys))
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Предзаполнение кэша тайлов для Минска")
+    parser.add_argument("--styles", default="light", help="через запятую: " + ", ".join(TILE_STYLES))
+    parser.add_argument("--zooms", default="10-15", help="например 10-15 или 11,13-14")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--retina", action="store_true", help="тайлы @2x (только стили CARTO)")
+    args = parser.parse_args()
+
+    styles = [style.strip() for style in args.styles.split(",") if style.strip()]
+    unknown = [style for style in styles if style not in TILE_STYLES]
+    if unknown:
+        parser.error(f"неизвестные стили: {', '.join(unknown)}")
+    started = time.perf_counter()
+    counts = seed(styles, _parse_zooms(args.zooms), args.concurrency, args.retina)
+    print(
+        f"Тайлов: {counts['total']}, уже в кэше: {counts['cached']}, скачано: {counts['downloaded']}, "
+        f"ошибок: {counts['failed']} за {time.perf_counter() - started:.1f} с; "
+        f"кэш {tile_cache.size / (1024 * 1024):.1f} МБ"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Бенчмарк подписок: сопоставление новых объявлений со 100k подписок
+и доставка пачек через локальный фейковый Bot API.
+
+Запуск из корня проекта:
+    python -m bench.alerts_bench --subscriptions 100000 --listings 5000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.alerts import AlertDispatcher, SubscriptionEntry, SubscriptionMatcher, TelegramBotSender
+
+MINSK_CENTER = (53.9023, 27.5619)
+KEYWORDS = [
+    "уборка", "ремонт", "грузчик", "переезд", "сантехник", "электрик", "курьер", "няня", "покраска",
+    "мебель", "сиделка", "репетитор", "выгул", "стрижка", "маникюр", "плитка", "обои", "кровля",
+    "окна", "сварка", "ламинат", "поклейка", "доставка", "садовник", "сборка", "демонтаж", "штукатурка",
+    "мойка", "химчистка", "компьютер", "фотограф", "водитель", "повар", "официант", "бариста",
+]
+PAYMENTS = ["20 BYN", "50 руб", "от 100 руб/час", "договорная", "1 500 BYN", "35 BYN за час"]
+
+
+def _random_point(rng: random.Random) -> tuple[float, float]:
+    # Плотнее к центру, как реальные объявления по Минску
+    return (
+        MINSK_CENTER[0] + rng.gauss(0, 0.04),
+        MINSK_CENTER[1] + rng.gauss(0, 0.06),
+    )
+
+
+def build_matcher(count: int, rng: random.Random) -> SubscriptionMatcher:
+    matcher = SubscriptionMatcher()
+    for sub_id in range(1, count + 1):
+        lat, lon = _random_point(rng)
+        matcher.add(
+            SubscriptionEntry(
+                id=sub_id,
+                user_id=sub_id,
+                chat_id=sub_id,
+                latitude=lat,
+                longitude=lon,
+                radius_km=rng.choice([0.5, 1.0, 1.0, 2.0, 2.0, 3.0, 5.0, 10.0]),
+                type=rng.choice([None, "task", "task", "worker"]),
+                keyword=rng.choice(KEYWORDS) if rng.random() < 0.8 else None,
+                min_payment=rng.choice([None, None, 20.0, 50.0]),
+            )
+        )
+    return matcher
+
+
+def random_listing(listing_id: int, rng: random.Random) -> dict:
+    lat, lon = _random_point(rng)
+    keyword = rng.choice(KEYWORDS)
+    return {
+        "id": listing_id,
+        "user_id": 0,
+        "type": rng.choice(["task", "worker"]),
+        "title": f"Нужна {keyword}",
+        "description": f"Срочно: {keyword}, подробности в личке",
+        "address": "Минск",
+        "payment": rng.choice(PAYMENTS),
+        "latitude": lat,
+        "longitude": lon,
+    }
+
+
+class _FakeBotApiHandler(BaseHTTPRequestHandler):
+    received = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        with _FakeBotApiHandler.lock:
+            _FakeBotApiHandler.received += 1
+        body = json.dumps({"ok": True, "result": {}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(subscriptions: int, listings: int, deliver: int, seed: int) -> dict:
+    rng = random.Random(seed)
+
+    started = time.perf_counter()
+    matcher = build_matcher(subscriptions, rng)
+    build_seconds = time.perf_counter() - started
+
+    sample = [random_listing(i, rng) for i in range(1, listings + 1)]
+    started = time.perf_counter()
+    total_matches = sum(len(matcher.match(listing)) for listing in sample)
+    match_seconds = time.perf_counter() - started
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeBotApiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sender = TelegramBotSender("bench-token", api_base=f"http://127.0.0.1:{server.server_port}")
+    dispatcher = AlertDispatcher(matcher=matcher, sender=sender, user_limit=1_000_000)
+    for listing in sample[:deliver]:
+        dispatcher.enqueue(listing)
+    started = time.perf_counter()
+    delivered = asyncio.run(dispatcher.flush())
+    deliver_seconds = time.perf_counter() - started
+    server.shutdown()
+
+    return {
+        "subscriptions": subscriptions,
+        "index_build_seconds": round(build_seconds, 3),
+        "listings_matched": listings,
+        "listings_per_second": round(listings / match_seconds, 1),
+        "avg_matches_per_listing": round(total_matches / listings, 2),
+        "batch_listings": deliver,
+        "messages_delivered": delivered,
+        "delivery_seconds": round(deliver_seconds, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сопоставления подписок")
+    parser.add_argument("--subscriptions", type=int, default=100_000)
+    parser.add_argument("--listings", type=int, default=5_000)
+    parser.add_argument("--deliver", type=int, default=5, help="сколько объявлений отправить пачкой в фейковый Bot API")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(run(args.subscriptions, args.listings, args.deliver, args.seed), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
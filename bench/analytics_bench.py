@@ -0,0 +1,163 @@
+"""
+Дашборд статистики: чтение из analytics_rollups против подсчёта по listings.
+
+Заполняет базу из DATABASE_URL (как bench.seed) --users пользователями и
+--listings объявлениями за 90 дней, проставляет closed_at закрытым и меряет:
+
+  - первый refresh_analytics — учёт всей истории (разовая стоимость);
+  - инкрементальный refresh после --events новых и закрытых объявлений —
+    то, что фоновое задание делает раз в ANALYTICS_INTERVAL_SECONDS;
+  - /api/admin/stats за сутки, неделю и месяц (stats_payload: медиана
+    --repeat прогонов и число прочитанных строк rollup) против того же
+    ответа, посчитанного на лету по строкам listings за диапазон.
+
+    DATABASE_URL=sqlite:///./analytics_bench.db python -m bench.analytics_bench --listings 50000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, select, update
+
+from backend.analytics import BUCKETS, STATS_RANGES, _utc, cell_key, refresh_analytics, stats_payload
+from backend.database import SessionLocal, engine
+from backend.models import Listing
+from bench.run import _git_revision
+from bench.seed import PAYMENTS, STREETS, TASK_TITLES, _point, seed
+
+
+def _timed(action) -> tuple[float, object]:
+    started = time.perf_counter()
+    value = action()
+    return (time.perf_counter() - started) * 1000, value
+
+
+def _close_seeded(rng: random.Random) -> None:
+    """bench.seed не задаёт closed_at: закрытые получают его в пределах недели после создания"""
+    with engine.begin() as conn:
+        rows = conn.execute(
+            select(Listing.id, Listing.created_at).where(Listing.status == "closed", Listing.closed_at.is_(None))
+        ).all()
+        now = datetime.now(timezone.utc)
+        params = [
+            {"row_id": row.id, "closed_at": min(now, _utc(row.created_at) + timedelta(hours=rng.uniform(1, 24 * 7)))}
+            for row in rows
+        ]
+        if params:
+            conn.execute(
+                update(Listing).where(Listing.id == bindparam("row_id")).values(closed_at=bindparam("closed_at")),
+                params,
+            )
+
+
+def _add_events(rng: random.Random, events: int, user_id: int) -> None:
+    now = datetime.now(timezone.utc) - timedelta(minutes=5)
+    rows = []
+    for _ in range(events):
+        lat, lon = _point(rng)
+        rows.append({
+            "user_id": user_id,
+            "type": "task",
+            "title": rng.choice(TASK_TITLES),
+            "description": "Новое объявление для замера инкрементального обновления.",
+            "address": f"Минск, {rng.choice(STREETS)}, {rng.randint(1, 150)}",
+            "payment": rng.choice(PAYMENTS),
+            "contacts": "@bench",
+            "latitude": lat,
+            "longitude": lon,
+            "status": "active",
+            "created_at": now,
+        })
+    with engine.begin() as conn:
+        conn.execute(Listing.__table__.insert(), rows)
+        ids = conn.execute(select(Listing.id).where(Listing.status == "active").limit(events // 2)).scalars().all()
+        conn.execute(update(Listing).where(Listing.id.in_(ids)).values(status="closed", closed_at=datetime.now(timezone.utc)))
+
+
+def _live_payload(db, range_name: str) -> int:
+    """Тот же ответ без rollup: строки listings за диапазон, группировка в Python"""
+    now = datetime.now(timezone.utc)
+    length, series_period, heatmap_period = STATS_RANGES[range_name]
+    since = BUCKETS[heatmap_period](now - length)
+    series: Counter = Counter()
+    cells: Counter = Counter()
+    rows = db.execute(
+        select(Listing.type, Listing.latitude, Listing.longitude, Listing.created_at).where(Listing.created_at >= since)
+    ).all()
+    for row in rows:
+        series[(BUCKETS[series_period](row.created_at), row.type)] += 1
+        cells[(cell_key(row.latitude, row.longitude), row.type)] += 1
+    closed = db.execute(
+        select(Listing.type, Listing.status, Listing.closed_at).where(Listing.closed_at >= since)
+    ).all()
+    for row in closed:
+        series[(BUCKETS[series_period](row.closed_at), row.status, row.type)] += 1
+    return len(rows) + len(closed)
+
+
+def _measure(action, repeat: int) -> tuple[float, object]:
+    timings, value = [], None
+    for _ in range(repeat):
+        elapsed, value = _timed(action)
+        timings.append(elapsed)
+    return statistics.median(timings), value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--listings", type=int, default=50000)
+    parser.add_argument("--events", type=int, default=500, help="новых событий перед инкрементальным обновлением")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(seed(args.users, args.listings, 0.3, args.seed))
+    _close_seeded(rng)
+
+    result = {"revision": _git_revision(), "dialect": engine.dialect.name, "listings": args.listings}
+    # Время сдвинуто вперёд: свежие строки считаются «отстоявшимися»
+    later = lambda: datetime.now(timezone.utc) + timedelta(minutes=1)
+    elapsed, processed = _timed(lambda: refresh_analytics(later()))
+    result["first_refresh"] = {"ms": round(elapsed, 1), "rows": processed}
+    print(f"Первый пересчёт: {processed} строк за {elapsed:.0f} мс")
+
+    _add_events(rng, args.events, 1)
+    elapsed, processed = _timed(lambda: refresh_analytics(later()))
+    result["incremental_refresh"] = {"ms": round(elapsed, 1), "rows": processed}
+    print(f"Инкрементальный пересчёт: {processed} строк за {elapsed:.1f} мс")
+    elapsed, processed = _timed(lambda: refresh_analytics(later()))
+    result["idle_refresh"] = {"ms": round(elapsed, 1), "rows": processed}
+    print(f"Пересчёт без новых событий: {elapsed:.1f} мс")
+
+    result["ranges"] = {}
+    print(f"{'диапазон':<10}{'rollup мс':>12}{'строк':>8}{'на лету мс':>12}{'строк':>9}")
+    db = SessionLocal()
+    try:
+        for range_name in STATS_RANGES:
+            rollup_ms, payload = _measure(lambda: stats_payload(db, range_name), args.repeat)
+            live_ms, live_rows = _measure(lambda: _live_payload(db, range_name), max(1, args.repeat // 4))
+            result["ranges"][range_name] = {
+                "rollup_ms": round(rollup_ms, 2),
+                "rollup_rows": payload["rows_read"],
+                "live_ms": round(live_ms, 2),
+                "live_rows": live_rows,
+            }
+            print(f"{range_name:<10}{rollup_ms:>12.2f}{payload['rows_read']:>8}{live_ms:>12.2f}{live_rows:>9}")
+    finally:
+        db.close()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
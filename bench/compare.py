@@ -0,0 +1,41 @@
+"""
+Сравнение двух отчётов bench.run: изменение p50/p95/p99 и RPS по сценариям.
+
+    python -m bench.compare bench/results/base.json bench/results/head.json
+"""
+
+import argparse
+import json
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "rps")
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    return {item["scenario"]: item for item in report["scenarios"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнить два отчёта бенчмарка")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    args = parser.parse_args()
+
+    base, head = _load(args.base), _load(args.head)
+    print(f"{'сценарий':<20}" + "".join(f"{metric:>22}" for metric in METRICS))
+    for name in sorted(set(base) | set(head)):
+        cells = []
+        for metric in METRICS:
+            old = base.get(name, {}).get(metric)
+            new = head.get(name, {}).get(metric)
+            if old is None or new is None:
+                cells.append(f"{'-':>22}")
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            cells.append(f"{old:>8} → {new:<8}{change:+5.0f}%")
+        print(f"{name:<20}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Сжатие ответов API: процессор против байтов по уровням gzip и brotli.
+
+Строит в памяти типичные JSON-ответы (лента /api/listings на --listings
+объявлений, страница /api/admin/listings, страница /api/admin/users) в том
+же виде, что отдаёт приложение, и для каждого уровня меряет размер, время
+сжатия (медиана --repeats прогонов) и итоговое время «сжать + передать» по
+каналу --link-mbps. По этой таблице выбраны значения по умолчанию
+COMPRESSION_GZIP_LEVEL и COMPRESSION_BROTLI_QUALITY (backend/compression.py).
+
+    python -m bench.compression_bench --listings 5000 --link-mbps 10
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from bench.run import _git_revision
+from bench.seed import PAYMENTS, STREETS, TASK_TITLES, WORKER_TITLES, _point
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVELS = (1, 4, 6, 9)
+BROTLI_QUALITIES = (1, 3, 4, 5, 6, 8, 11)
+
+
+def _listing(rng: random.Random, listing_id: int, now: datetime) -> dict:
+    listing_type = "task" if rng.random() < 0.6 else "worker"
+    lat, lon = _point(rng)
+    return {
+        "id": listing_id,
+        "type": listing_type,
+        "title": rng.choice(TASK_TITLES if listing_type == "task" else WORKER_TITLES),
+        "description": "Синтетическое объявление для нагрузочного теста. " * rng.randint(1, 4),
+        "address": f"Минск, {rng.choice(STREETS)}, {rng.randint(1, 150)}",
+        "payment": rng.choice(PAYMENTS),
+        "contacts": f"@bench{rng.randint(1, 99999)}",
+        "latitude": lat,
+        "longitude": lon,
+        "created_at": (now - timedelta(minutes=rng.uniform(0, 60 * 24 * 30))).isoformat(),
+    }
+
+
+def build_payloads(listings: int, seed: int) -> dict[str, bytes]:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    feed = [
+        {
+            **_listing(rng, i, now),
+            "username": f"bench_user_{rng.randint(1, 10000)}",
+            "popularity": round(rng.uniform(0, 50), 2),
+            "thumb_url": f"/media/photos/{rng.getrandbits(64):016x}_thumb.webp" if rng.random() < 0.3 else None,
+        }
+        for i in range(1, listings + 1)
+    ]
+    admin_listings = [
+        {**_listing(rng, i, now), "user_id": rng.randint(1, 10000), "status": "active"} for i in range(1, 501)
+    ]
+    admin_users = {
+        "items": [
+            {
+                "id": i,
+                "telegram_id": 7_000_000_000 + i,
+                "username": f"bench_{rng.choice(['ivan', 'olga', 'sergey', 'anna'])}_{i}",
+                "role": "user",
+                "is_banned": rng.random() < 0.02,
+                "ban_reason": None,
+                "accepted_terms_version": "1.0",
+                "created_at": (now - timedelta(days=rng.uniform(0, 365))).isoformat(),
+            }
+            for i in range(1, 201)
+        ],
+        "total": 10000,
+        "page": 1,
+        "page_size": 200,
+    }
+
+    def encode(value) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+    return {
+        "listings_feed": encode(feed),
+        "admin_listings": encode(admin_listings),
+        "admin_users": encode(admin_users),
+    }
+
+
+def _gzip(level: int):
+    def compress(data: bytes) -> bytes:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    return compress
+
+
+def _brotli(quality: int):
+    return lambda data: brotli.compress(data, quality=quality)
+
+
+def measure(data: bytes, compress, repeats: int, link_mbps: float) -> dict:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        compressed = compress(data)
+        timings.append((time.perf_counter() - started) * 1000)
+    compress_ms = statistics.median(timings)
+    transfer_ms = len(compressed) * 8 / (link_mbps * 1000)
+    return {
+        "bytes": len(compressed),
+        "ratio": round(len(data) / len(compressed), 2),
+        "compress_ms": round(compress_ms, 3),
+        "mb_per_s": round(len(data) / 1_000_000 / (compress_ms / 1000), 1) if compress_ms else None,
+        "compress_plus_transfer_ms": round(compress_ms + transfer_ms, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--link-mbps", type=float, default=10.0, help="пропускная способность канала клиента")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    codecs = [(f"gzip-{level}", _gzip(level)) for level in GZIP_LEVELS]
+    if brotli is not None:
+        codecs += [(f"br-{quality}", _brotli(quality)) for quality in BROTLI_QUALITIES]
+    else:
+        print("Модуль brotli не установлен: меряется только gzip")
+
+    payloads = build_payloads(args.listings, args.seed)
+    result = {"revision": _git_revision(), "link_mbps": args.link_mbps, "payloads": {}}
+    for name, data in payloads.items():
+        rows = {"identity": {"bytes": len(data), "compress_plus_transfer_ms": round(len(data) * 8 / (args.link_mbps * 1000), 2)}}
+        for codec, compress in codecs:
+            rows[codec] = measure(data, compress, args.repeats, args.link_mbps)
+        result["payloads"][name] = rows
+
+        print(f"\n{name}: {len(data)} байт")
+        print(f"{'кодек':<10}{'байт':>10}{'сжатие':>9}{'мс':>10}{'МБ/с':>9}{'мс+сеть':>10}")
+        for codec, row in rows.items():
+            print(
+                f"{codec:<10}{row['bytes']:>10}{row.get('ratio', 1.0):>9}{row.get('compress_ms', 0):>10}"
+                f"{row.get('mb_per_s') or '-':>9}{row['compress_plus_transfer_ms']:>10}"
+            )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Привязка точки к району: подготовленная сетка против проверки всех полигонов.
+
+Для каждого размера ячейки из --cells строит DistrictIndex по границам из
+DISTRICTS_FILE и меряет время построения, долю ячеек с готовым ответом и
+время district_for() на --points точках (распределение bench.seed плюс
+равномерные точки по охвату с краями за пределами зоны). Базовая линия —
+проверка лучом по всем районам подряд. Ответы сетки сверяются с ней.
+
+    python -m bench.districts_bench --points 200000 --cells 0.02,0.01,0.005,0.0025
+"""
+
+import argparse
+import json
+import random
+import time
+
+from backend.districts import DistrictIndex, load_districts
+from bench.run import _git_revision
+from bench.seed import _point
+
+
+def _brute_force(districts):
+    def lookup(latitude: float, longitude: float):
+        for district in districts:
+            if district.contains(longitude, latitude):
+                return district.id
+        return None
+
+    return lookup
+
+
+def _timed_lookups(lookup, points) -> tuple[float, list]:
+    started = time.perf_counter()
+    answers = [lookup(lat, lon) for lat, lon in points]
+    return (time.perf_counter() - started) / len(points) * 1_000_000, answers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=200000)
+    parser.add_argument("--cells", default="0.02,0.01,0.005,0.0025", help="размеры ячейки сетки в градусах")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    districts = load_districts()
+    half = args.points // 2
+    points = [_point(rng) for _ in range(half)]
+    points += [(rng.uniform(53.78, 54.02), rng.uniform(27.35, 27.78)) for _ in range(args.points - half)]
+
+    brute_us, expected = _timed_lookups(_brute_force(districts), points)
+    outside = sum(answer is None for answer in expected) / len(expected)
+    result = {
+        "revision": _git_revision(),
+        "points": len(points),
+        "districts": len(districts),
+        "outside_share": round(outside, 3),
+        "brute_force_us": round(brute_us, 3),
+        "grids": {},
+    }
+    print(f"Перебор полигонов: {brute_us:.2f} мкс на точку; вне зоны {outside:.1%} точек")
+    print(f"{'ячейка':<10}{'построение мс':>15}{'ячеек':>8}{'готовых':>10}{'мкс/точка':>12}{'расхождений':>13}")
+    for cell in (float(value) for value in args.cells.split(",")):
+        started = time.perf_counter()
+        index = DistrictIndex(districts, cell)
+        build_ms = (time.perf_counter() - started) * 1000
+        lookup_us, answers = _timed_lookups(index.lookup, points)
+        stats = index.stats()
+        mismatches = sum(answer != wanted for answer, wanted in zip(answers, expected))
+        result["grids"][str(cell)] = {
+            "build_ms": round(build_ms, 1),
+            **stats,
+            "prepared_share": round(stats["prepared"] / stats["cells"], 3),
+            "lookup_us": round(lookup_us, 3),
+            "mismatches": mismatches,
+        }
+        print(
+            f"{cell:<10}{build_ms:>15.1f}{stats['cells']:>8}{stats['prepared'] / stats['cells']:>10.1%}"
+            f"{lookup_us:>12.2f}{mismatches:>13}"
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
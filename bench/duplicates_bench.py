@@ -0,0 +1,174 @@
+"""
+Поиск спам-копий на 100k активных объявлений.
+
+Создаёт в отдельной БД --listings активных объявлений со случайными
+текстами, их MinHash-подписи и LSH-корзины, затем проверяет --probes
+текстов через backend.similarity.find_duplicates:
+
+  - половина — слегка изменённые копии существующих объявлений
+    (заменено слово, другие цифры, эмодзи и знаки) — считается полнота;
+  - половина — новые тексты — считается доля ложных срабатываний.
+
+Для сравнения первые --scan-probes проверок повторяются полным перебором подписей в памяти.
+
+    python -m bench.duplicates_bench --listings 100000
+    python -m bench.duplicates_bench --database-url postgresql://localhost/bench
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend.models import Listing, ListingSignature, ListingSignatureBucket, User
+from backend.similarity import DUPLICATE_MIN_SIMILARITY, buckets, find_duplicates, minhash, pack, similarity
+
+_SYLLABLES = ["ра", "бо", "та", "ре", "мо", "нт", "кв", "ар", "ти", "ры", "ма", "ст", "ер", "по", "мо", "щь",
+              "уб", "ор", "ка", "сад", "дом", "ок", "на", "ли", "ве", "зу", "ко", "пе", "ре", "езд"]
+_NOISE = ["!!!", "🔥", "✅", "СРОЧНО", "...", "👍"]
+
+
+def _vocabulary(rng: random.Random, size: int) -> list[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _text(rng: random.Random, vocabulary: list[str]) -> tuple[str, str]:
+    # Частые слова встречаются чаще (примерно по Ципфу), как в настоящих объявлениях
+    def word() -> str:
+        return vocabulary[min(int(rng.paretovariate(1.1)) - 1, len(vocabulary) - 1)] if rng.random() < 0.5 else rng.choice(vocabulary)
+
+    title = " ".join(word() for _ in range(rng.randint(2, 5)))
+    description = " ".join(word() for _ in range(rng.randint(10, 35)))
+    return title, f"{description} оплата {rng.randint(10, 200)} BYN тел {rng.randint(10**8, 10**9)}"
+
+
+def _mutate(rng: random.Random, title: str, description: str, vocabulary: list[str]) -> tuple[str, str]:
+    words = description.split()
+    words[rng.randrange(len(words))] = rng.choice(vocabulary)
+    text = " ".join(words)
+    text = text.replace("BYN", f"{rng.randint(10, 200)} BYN")
+    return f"{title} {rng.choice(_NOISE)}", f"{rng.choice(_NOISE)} {text}"
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, int(round(pct / 100 * len(values))) - 1))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="по умолчанию — временный файл SQLite")
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--probes", type=int, default=2000)
+    parser.add_argument("--scan-probes", type=int, default=50, help="сколько проверок повторить полным перебором")
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'duplicates_bench.db')}"
+    engine = create_engine(database_url)
+    tables = [User.__table__, Listing.__table__, ListingSignature.__table__, ListingSignatureBucket.__table__]
+    for table in reversed(tables):
+        table.drop(engine, checkfirst=True)
+    for table in tables:
+        table.create(engine)
+
+    vocabulary = _vocabulary(rng, args.vocabulary)
+    texts = [_text(rng, vocabulary) for _ in range(args.listings)]
+
+    started = time.perf_counter()
+    signatures = [minhash(title, description) for title, description in texts]
+    hashing_seconds = time.perf_counter() - started
+
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [{"id": 1, "telegram_id": 1}])
+        for offset in range(0, args.listings, 5000):
+            chunk = range(offset, min(offset + 5000, args.listings))
+            conn.execute(
+                insert(Listing.__table__),
+                [
+                    {
+                        "id": i + 1, "user_id": 1, "type": "task", "title": texts[i][0], "description": texts[i][1],
+                        "address": "Минск", "payment": "50 BYN", "contacts": "@bench",
+                        "latitude": 53.9, "longitude": 27.56, "status": "active",
+                    }
+                    for i in chunk
+                ],
+            )
+            conn.execute(
+                insert(ListingSignature.__table__),
+                [{"listing_id": i + 1, "user_id": 1, "minhash": pack(signatures[i])} for i in chunk],
+            )
+            conn.execute(
+                insert(ListingSignatureBucket.__table__),
+                [{"bucket": bucket, "listing_id": i + 1} for i in chunk for bucket in buckets(signatures[i])],
+            )
+
+    probes = []
+    for index in range(args.probes):
+        if index % 2 == 0:
+            source = rng.randrange(args.listings)
+            probes.append((source + 1, *_mutate(rng, *texts[source], vocabulary)))
+        else:
+            probes.append((None, *_text(rng, vocabulary)))
+
+    session = sessionmaker(bind=engine)()
+    lsh_ms, scan_ms = [], []
+    found = copies = false_positives = fresh = scan_found = scan_copies = 0
+    for index, (source_id, title, description) in enumerate(probes):
+        signature = minhash(title, description)
+        started = time.perf_counter()
+        matches = find_duplicates(session, signature)
+        lsh_ms.append((time.perf_counter() - started) * 1000)
+
+        if index < args.scan_probes:
+            started = time.perf_counter()
+            scanned = [
+                i + 1 for i, stored in enumerate(signatures) if similarity(signature, stored) >= DUPLICATE_MIN_SIMILARITY
+            ]
+            scan_ms.append((time.perf_counter() - started) * 1000)
+            if source_id is not None:
+                scan_copies += 1
+                scan_found += source_id in scanned
+
+        matched_ids = {listing_id for listing_id, _ in matches}
+        if source_id is not None:
+            copies += 1
+            found += source_id in matched_ids
+        else:
+            fresh += 1
+            false_positives += bool(matched_ids)
+    session.close()
+
+    result = {
+        "database": engine.dialect.name,
+        "listings": args.listings,
+        "probes": args.probes,
+        "min_similarity": DUPLICATE_MIN_SIMILARITY,
+        "minhash_us": round(hashing_seconds / args.listings * 1e6, 1),
+        "lsh_p50_ms": round(statistics.median(lsh_ms), 3),
+        "lsh_p95_ms": round(_percentile(lsh_ms, 95), 3),
+        "scan_p50_ms": round(statistics.median(scan_ms), 3),
+        "recall": round(found / copies, 3) if copies else None,
+        "recall_full_scan": round(scan_found / scan_copies, 3) if scan_copies else None,
+        "false_positive_rate": round(false_positives / fresh, 4) if fresh else None,
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
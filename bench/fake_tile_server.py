@@ -0,0 +1,111 @@
+"""
+Локальный фейковый сервер тайлов для проверки прокси /tiles без сети.
+
+Отдаёт по /{style}/{z}/{x}/{y}.png (и {y}@2x.png) однотонный PNG 256x256,
+цвет которого зависит от координат, с задержкой --latency-ms. Сколько раз
+запрашивался каждый путь, видно по GET /stats.
+
+    python -m bench.fake_tile_server --port 8901 --latency-ms 80
+    TILE_UPSTREAM_URL='http://127.0.0.1:8901/{style}/{z}/{x}/{y}{r}.png' uvicorn backend.main:app
+"""
+
+import argparse
+import json
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TILE_PATH_RE = re.compile(r"^/(?P<style>\w+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)(?P<retina>@2x)?\.png$")
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def solid_png(size: int, rgb: tuple[int, int, int]) -> bytes:
+    row = b"\x00" + bytes(rgb) * size
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            _png_chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)),
+            _png_chunk(b"IDAT", zlib.compress(row * size)),
+            _png_chunk(b"IEND", b""),
+        ]
+    )
+
+
+class FakeTileServer:
+    def __init__(self, port: int, latency_ms: float = 0.0, host: str = "127.0.0.1"):
+        self.latency = latency_ms / 1000
+        self.hits: Counter = Counter()
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/stats":
+                    with server._lock:
+                        body = json.dumps(dict(server.hits)).encode()
+                    self._reply(200, body, "application/json")
+                    return
+                match = TILE_PATH_RE.match(self.path)
+                if not match:
+                    self._reply(404, b"not found", "text/plain")
+                    return
+                with server._lock:
+                    server.hits[self.path] += 1
+                time.sleep(server.latency)
+                z, x, y = int(match.group("z")), int(match.group("x")), int(match.group("y"))
+                size = 512 if match.group("retina") else 256
+                self._reply(200, solid_png(size, (x * 37 % 256, y * 53 % 256, z * 11 % 256)), "image/png")
+
+            def _reply(self, status: int, body: bytes, content_type: str) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+
+    def start(self) -> "FakeTileServer":
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def hits_for(self, path: str) -> int:
+        with self._lock:
+            return self.hits[path]
+
+    def total_hits(self) -> int:
+        with self._lock:
+            return sum(self.hits.values())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    args = parser.parse_args()
+    server = FakeTileServer(args.port, args.latency_ms)
+    print(f"Фейковый сервер тайлов: {server.url}/{{style}}/{{z}}/{{x}}/{{y}}{{r}}.png")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Задержка доставки событий шины инвалидации между процессами.
+
+Поднимает --subscribers процессов-«воркеров», каждый со своей шиной и
+транспортом --transport (socket — unix-сокеты, postgres — LISTEN/NOTIFY на
+DATABASE_URL), затем публикует --events событий listing_changed с паузой
+--interval-ms. Задержка — от publish() до вызова подписчика в другом
+процессе; часы общие, хост один.
+
+    python -m bench.invalidation_bench --subscribers 4
+    DB_TYPE=postgresql DATABASE_URL=postgresql://localhost/bench python -m bench.invalidation_bench --transport postgres
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+
+from bench.run import _git_revision, percentile
+
+
+def _subscriber(transport: str, ready, results, stop) -> None:
+    from backend.invalidation import InvalidationBus, _create_transport
+
+    received = {}
+    bus = InvalidationBus(_create_transport(transport))
+    bus.subscribe("listing_changed", lambda event, key: received.setdefault(key, time.time()))
+    bus.start()
+    # Слушателю нужно успеть открыть сокет или выполнить LISTEN
+    time.sleep(1.0)
+    ready.put(True)
+    stop.wait()
+    bus.stop()
+    results.put(received)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", choices=["socket", "postgres"], default="socket")
+    parser.add_argument("--subscribers", type=int, default=4)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--interval-ms", type=float, default=2.0)
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    ready, results, stop = context.Queue(), context.Queue(), context.Event()
+    processes = [
+        context.Process(target=_subscriber, args=(args.transport, ready, results, stop))
+        for _ in range(args.subscribers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get(timeout=60)
+
+    from backend.invalidation import InvalidationBus, _create_transport
+
+    bus = InvalidationBus(_create_transport(args.transport))
+    published = {}
+    publish_us = []
+    for seq in range(args.events):
+        key = str(seq)
+        started = time.perf_counter()
+        published[key] = time.time()
+        bus.publish("listing_changed", key)
+        publish_us.append((time.perf_counter() - started) * 1_000_000)
+        time.sleep(args.interval_ms / 1000)
+    time.sleep(1.0)
+    stop.set()
+
+    lags = []
+    lost = 0
+    for _ in processes:
+        received = results.get(timeout=60)
+        for key, sent_at in published.items():
+            if key in received:
+                lags.append((received[key] - sent_at) * 1000)
+            else:
+                lost += 1
+    for process in processes:
+        process.join()
+
+    lags.sort()
+    publish_us.sort()
+    result = {
+        "revision": _git_revision(),
+        "transport": args.transport,
+        "subscribers": args.subscribers,
+        "events": args.events,
+        "deliveries": len(lags),
+        "lost": lost,
+        "publish_p50_us": round(percentile(publish_us, 50), 1),
+        "lag_p50_ms": round(percentile(lags, 50), 3),
+        "lag_p95_ms": round(percentile(lags, 95), 3),
+        "lag_p99_ms": round(percentile(lags, 99), 3),
+        "lag_max_ms": round(lags[-1], 3) if lags else None,
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Подбор пар «задача — исполнитель»: стоимость инкрементального обновления.
+
+Строит в памяти индекс backend/matching.py на --listings активных
+объявлениях (те же заголовки, адреса и «центры притяжения», что у
+bench.seed), досчитывает списки всех объявлений, как фоновый поток после
+старта, и меряет по --ops операций каждого вида:
+
+  - create — новое объявление: свой список + вставка в списки кандидатов;
+  - update — правка заголовка и оплаты существующего объявления;
+  - close  — снятие: удаление из чужих списков и пересчёт исчерпанных;
+  - read   — чтение готового списка, как /api/listings/{id}/matches.
+
+Для каждого вида — p50/p95/p99 и максимум в миллисекундах. В конце
+--verify случайных списков сравниваются с пересчётом с нуля: доля совпавших
+top-k показывает, что инкрементальные обновления не теряют пар.
+
+    python -m bench.matching_bench --listings 50000 --ops 2000
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.matching import MATCH_TOP_K, MatchIndex
+from bench.run import _git_revision, percentile
+from bench.seed import PAYMENTS, STREETS, TASK_TITLES, WORKER_TITLES, _point
+
+
+def _row(rng: random.Random, listing_id: int, users: int, now: datetime) -> dict:
+    listing_type = "task" if rng.random() < 0.6 else "worker"
+    lat, lon = _point(rng)
+    return {
+        "id": listing_id,
+        "user_id": rng.randint(1, users),
+        "type": listing_type,
+        "title": rng.choice(TASK_TITLES if listing_type == "task" else WORKER_TITLES),
+        "description": "Синтетическое объявление для нагрузочного теста. " * rng.randint(1, 4),
+        "address": f"Минск, {rng.choice(STREETS)}, {rng.randint(1, 150)}",
+        "payment": rng.choice(PAYMENTS),
+        "latitude": lat,
+        "longitude": lon,
+        "created_at": now - timedelta(minutes=rng.uniform(0, 60 * 24 * 30)),
+    }
+
+
+def _summary(timings: list[float]) -> dict:
+    timings = sorted(timings)
+    return {
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "max_ms": round(max(timings), 3),
+        "count": len(timings),
+    }
+
+
+def _timed(action) -> float:
+    started = time.perf_counter()
+    action()
+    return (time.perf_counter() - started) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--ops", type=int, default=2000, help="операций каждого вида")
+    parser.add_argument("--verify", type=int, default=300, help="сколько списков сверить с пересчётом с нуля")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    rows = [_row(rng, i, args.users, now) for i in range(1, args.listings + 1)]
+    index = MatchIndex()
+
+    load_ms = _timed(lambda: index.load(rows))
+    print(f"Загрузка {args.listings} объявлений: {load_ms:.0f} мс")
+    warm_ms = _timed(lambda: index.warm_up(len(rows)))
+    print(f"Списки для всех объявлений: {warm_ms / 1000:.1f} с ({warm_ms / len(rows):.3f} мс на объявление)")
+
+    result = {
+        "revision": _git_revision(),
+        "listings": args.listings,
+        "top_k": MATCH_TOP_K,
+        "load_ms": round(load_ms, 1),
+        "warm_up_ms": round(warm_ms, 1),
+        "operations": {},
+    }
+
+    next_id = args.listings + 1
+    timings = []
+    for _ in range(args.ops):
+        row = _row(rng, next_id, args.users, now)
+        next_id += 1
+        timings.append(_timed(lambda: index.upsert(row)))
+    result["operations"]["create"] = _summary(timings)
+
+    ids = list(index.entries)
+    timings = []
+    for _ in range(args.ops):
+        entry = index.entries[rng.choice(ids)]
+        row = {
+            **entry.summary,
+            "user_id": entry.user_id,
+            "title": rng.choice(TASK_TITLES if entry.type == "task" else WORKER_TITLES),
+            "description": "Синтетическое объявление для нагрузочного теста. Правка.",
+            "payment": rng.choice(PAYMENTS),
+        }
+        timings.append(_timed(lambda: index.upsert(row)))
+    result["operations"]["update"] = _summary(timings)
+
+    recomputes_before = index.recomputes
+    timings = []
+    for _ in range(args.ops):
+        listing_id = rng.randrange(1, next_id)
+        if listing_id in index.entries:
+            timings.append(_timed(lambda: index.remove(listing_id)))
+    result["operations"]["close"] = _summary(timings)
+    result["recomputes_per_close"] = round((index.recomputes - recomputes_before) / max(len(timings), 1), 2)
+
+    ids = list(index.entries)
+    timings = []
+    for _ in range(args.ops):
+        listing_id = rng.choice(ids)
+        timings.append(_timed(lambda: index.matches(listing_id, MATCH_TOP_K)))
+    result["operations"]["read"] = _summary(timings)
+
+    agreed = 0
+    for listing_id in rng.sample(ids, min(args.verify, len(ids))):
+        fresh = sorted(index._scored(index.entries[listing_id]))[:MATCH_TOP_K]
+        stored = index.tops[listing_id][:MATCH_TOP_K]
+        agreed += [other for _, other in fresh] == [other for _, other in stored]
+    result["verified_top_k_agreement"] = round(agreed / max(min(args.verify, len(ids)), 1), 3)
+
+    print(f"{'операция':<10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name, row in result["operations"].items():
+        print(f"{name:<10}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+    print(f"Пересчётов списков на снятие: {result['recomputes_per_close']}")
+    print(f"Совпадение top-{MATCH_TOP_K} с пересчётом с нуля: {result['verified_top_k_agreement']:.1%}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
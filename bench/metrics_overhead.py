@@ -0,0 +1,94 @@
+"""
+Накладные расходы метрик: одни и те же запросы прогоняются через ASGI-приложение
+напрямую (без сети) с включёнными и выключенными метриками.
+
+    DATABASE_URL=sqlite:///./bench.db python -m bench.metrics_overhead --iterations 2000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from backend import metrics
+from backend.database import init_db
+from backend.main import app
+
+PATHS = ["/api/health", "/api/terms/active", "/api/listings?type=task"]
+
+
+async def _call(path: str) -> int:
+    raw_path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": raw_path,
+        "raw_path": raw_path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _timed_call(path: str, enabled: bool) -> float:
+    metrics.set_enabled(enabled)
+    started = time.perf_counter()
+    await _call(path)
+    return (time.perf_counter() - started) * 1_000_000
+
+
+async def run(iterations: int) -> list[dict]:
+    for path in PATHS:
+        for _ in range(50):  # прогрев
+            await _call(path)
+
+    results = []
+    for path in PATHS:
+        # Включение и выключение чередуются на каждом запросе, чтобы шум машины делился поровну
+        enabled_runs, disabled_runs = [], []
+        for _ in range(iterations):
+            disabled_runs.append(await _timed_call(path, False))
+            enabled_runs.append(await _timed_call(path, True))
+        disabled = statistics.median(disabled_runs)
+        enabled = statistics.median(enabled_runs)
+        results.append(
+            {
+                "path": path,
+                "median_us_without_metrics": round(disabled, 1),
+                "median_us_with_metrics": round(enabled, 1),
+                "overhead_percent": round((enabled - disabled) / disabled * 100, 2),
+            }
+        )
+    metrics.set_enabled(True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы метрик и SQL-инструментирования")
+    parser.add_argument("--iterations", type=int, default=3000)
+    args = parser.parse_args()
+    init_db()
+    for row in asyncio.run(run(args.iterations)):
+        print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Латентность активной ленты при росте истории закрытых объявлений.
+
+Число активных объявлений фиксировано, закрытых — растёт ступенями
+(--history). На каждой ступени меряются два запроса, которые делает
+приложение: карта (все активные) и лента админки (последние активные
+по created_at). На PostgreSQL сравниваются обычная и секционированная
+listings (DDL берётся из backend.partitions, каждая раскладка — в своей
+схеме); на SQLite меряется только обычная таблица.
+
+    python -m bench.partition_bench --database-url postgresql://localhost/bench
+    python -m bench.partition_bench --database-url sqlite:///./bench_partitions.db --history 0,100000,1000000
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, text
+
+from backend.partitions import _month_start, create_partitioned_listings
+
+HISTORY_DAYS = 720
+
+MAP_QUERY = (
+    "SELECT id, type, title, latitude, longitude, created_at FROM listings WHERE status = 'active'"
+)
+FEED_QUERY = (
+    "SELECT id, type, title, created_at FROM listings WHERE status = 'active' "
+    "ORDER BY created_at DESC LIMIT 100"
+)
+
+_PLAIN_DDL = """
+CREATE TABLE listings (
+    id {id_type},
+    user_id INTEGER NOT NULL,
+    type VARCHAR NOT NULL,
+    title VARCHAR NOT NULL,
+    description TEXT NOT NULL,
+    address VARCHAR NOT NULL,
+    payment VARCHAR NOT NULL,
+    contacts VARCHAR NOT NULL,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    status VARCHAR,
+    created_at {ts_type},
+    closed_at {ts_type}
+)
+"""
+
+_PLAIN_INDEXES = (
+    "CREATE INDEX ix_listings_status_created_at ON listings (status, created_at)",
+    "CREATE INDEX ix_listings_status_closed_at ON listings (status, closed_at)",
+)
+
+_LISTING_COLUMNS = (
+    "user_id, type, title, description, address, payment, contacts, latitude, longitude, status, created_at, closed_at"
+)
+
+
+def _insert_rows_sql(dialect: str, status: str) -> str:
+    closed_at = "NULL" if status == "active" else "{created_at}"
+    if dialect == "postgresql":
+        created_at = f"now() - (g % {HISTORY_DAYS}) * interval '1 day' - (g % 1440) * interval '1 minute'"
+        return (
+            f"INSERT INTO listings ({_LISTING_COLUMNS}) "
+            f"SELECT 1, CASE WHEN g % 2 = 0 THEN 'task' ELSE 'worker' END, 'Объявление ' || g, "
+            f"'Описание', 'Минск', '50 BYN', '@bench', 53.9 + (g % 1000) * 0.0001, 27.55 + (g % 997) * 0.0001, "
+            f"'{status}', {created_at}, {closed_at.format(created_at=created_at)} "
+            "FROM generate_series(1, :n) AS g"
+        )
+    created_at = f"datetime('now', '-' || (x % {HISTORY_DAYS}) || ' days', '-' || (x % 1440) || ' minutes')"
+    return (
+        "WITH RECURSIVE g(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM g WHERE x < :n) "
+        f"INSERT INTO listings ({_LISTING_COLUMNS}) "
+        f"SELECT 1, CASE WHEN x % 2 = 0 THEN 'task' ELSE 'worker' END, 'Объявление ' || x, "
+        f"'Описание', 'Минск', '50 BYN', '@bench', 53.9 + (x % 1000) * 0.0001, 27.55 + (x % 997) * 0.0001, "
+        f"'{status}', {created_at}, {closed_at.format(created_at=created_at)} FROM g"
+    )
+
+
+def _prepare_layout(engine, layout: str) -> None:
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            schema = f"bench_{layout}"
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+            conn.execute(text(f"SET search_path TO {schema}"))
+            conn.execute(text("CREATE TABLE users (id SERIAL PRIMARY KEY)"))
+            conn.execute(text("INSERT INTO users DEFAULT VALUES"))
+            conn.execute(text("CREATE SEQUENCE listings_id_seq"))
+            if layout == "partitioned":
+                now = datetime.now(timezone.utc)
+                first_month = _month_start(now - timedelta(days=HISTORY_DAYS))
+                create_partitioned_listings(conn, first_month=first_month, now=now)
+                return
+            conn.execute(
+                text(_PLAIN_DDL.format(id_type="INTEGER PRIMARY KEY DEFAULT nextval('listings_id_seq')", ts_type="TIMESTAMPTZ"))
+            )
+        else:
+            conn.execute(text("DROP TABLE IF EXISTS listings"))
+            conn.execute(text(_PLAIN_DDL.format(id_type="INTEGER PRIMARY KEY", ts_type="DATETIME")))
+        for statement in _PLAIN_INDEXES:
+            conn.execute(text(statement))
+
+
+def _insert(engine, layout: str, status: str, count: int) -> None:
+    if count <= 0:
+        return
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(f"SET search_path TO bench_{layout}"))
+        conn.execute(text(_insert_rows_sql(engine.dialect.name, status)), {"n": count})
+        conn.execute(text("ANALYZE" if engine.dialect.name == "sqlite" else "ANALYZE listings"))
+
+
+def _measure(engine, layout: str, query: str, repeat: int) -> dict:
+    timings = []
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(f"SET search_path TO bench_{layout}"))
+        conn.execute(text(query)).fetchall()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(text(query)).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        conn.rollback()
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[max(0, int(len(timings) * 0.95) - 1)], 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--active", type=int, default=5000, help="активных объявлений")
+    parser.add_argument("--history", default="0,100000,1000000,3000000", help="ступени числа закрытых объявлений")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    layouts = ["plain", "partitioned"] if engine.dialect.name == "postgresql" else ["plain"]
+    steps = [int(value) for value in args.history.split(",")]
+
+    results = []
+    for layout in layouts:
+        _prepare_layout(engine, layout)
+        _insert(engine, layout, "active", args.active)
+        inserted = 0
+        for history in steps:
+            _insert(engine, layout, "closed", history - inserted)
+            inserted = history
+            row = {
+                "layout": layout,
+                "closed_rows": history,
+                "map": _measure(engine, layout, MAP_QUERY, args.repeat),
+                "feed": _measure(engine, layout, FEED_QUERY, args.repeat),
+            }
+            results.append(row)
+            print(
+                f"{layout:12} закрытых={history:>9}  карта p50={row['map']['p50_ms']:8.2f} мс  "
+                f"лента p50={row['feed']['p50_ms']:7.2f} мс"
+            )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"active": args.active, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Накладные расходы ограничителя частоты на запрос.
+
+RateLimitMiddleware оборачивает пустое ASGI-приложение, поэтому в замер
+попадает только сам ограничитель: сопоставление маршрута, проверка подписи
+initData, обращение к счётчикам. Запросы идут от --users пользователей и
+--ips адресов вразброс, а лимиты подняты так, чтобы ни один не отклонялся
+(отказ — более короткий путь). Отдельно меряется MemoryBackend.hit при
+--keys живых ключах.
+
+    python -m bench.ratelimit_overhead
+    DATABASE_URL=sqlite:///./bench.db python -m bench.ratelimit_overhead --backend database
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:bench-token")
+# Лимиты заведомо выше числа запросов: меряется путь пропуска
+for _name in ("RATE_LIMIT_AUTH", "RATE_LIMIT_AUTH_IP", "RATE_LIMIT_WRITE", "RATE_LIMIT_WRITE_IP"):
+    os.environ.setdefault(_name, "1000000000/60")
+
+from backend import ratelimit  # noqa: E402
+from backend.database import init_db  # noqa: E402
+from backend.ratelimit import DatabaseBackend, MemoryBackend, RateLimitMiddleware  # noqa: E402
+from backend.routes import telegram_id_from_init_data  # noqa: E402
+from bench.initdata import mint_init_data  # noqa: E402
+from bench.seed import TELEGRAM_ID_BASE  # noqa: E402
+
+# Запросы без ограничения, запись по initData и запись без него (только по IP)
+CASES = [
+    ("GET", "/api/listings", False),
+    ("POST", "/api/listings", True),
+    ("PUT", "/api/listings/123", True),
+    ("POST", "/api/terms/accept", False),
+]
+
+
+async def _inner_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _scope(method: str, path: str, ip: str, init_data: str | None) -> dict:
+    headers = [(b"host", b"bench"), (b"content-type", b"application/json")]
+    if init_data:
+        headers.append((b"x-telegram-init-data", init_data.encode()))
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": headers,
+        "client": (ip, 40000),
+    }
+
+
+async def _call(app, scope) -> int:
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _timed(app, scope) -> tuple[float, int]:
+    started = time.perf_counter()
+    status = await _call(app, scope)
+    return (time.perf_counter() - started) * 1_000_000, status
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    token = os.environ["TELEGRAM_BOT_TOKEN"]
+    init_data = [mint_init_data(token, TELEGRAM_ID_BASE + i, f"bench_user_{i}") for i in range(1, args.users + 1)]
+    ips = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(args.ips)]
+    limited = RateLimitMiddleware(_inner_app, identify=telegram_id_from_init_data)
+
+    cases = []
+    rejected = 0
+    for method, path, with_init_data in CASES:
+        # Без ограничителя и с ним — вперемешку на каждом запросе, чтобы шум машины делился поровну
+        baseline_runs, limited_runs = [], []
+        for _ in range(args.iterations):
+            scope = _scope(method, path, rng.choice(ips), rng.choice(init_data) if with_init_data else None)
+            baseline_runs.append((await _timed(_inner_app, scope))[0])
+            elapsed, status = await _timed(limited, scope)
+            limited_runs.append(elapsed)
+            rejected += status == 429
+        baseline = statistics.median(baseline_runs)
+        with_limiter = statistics.median(limited_runs)
+        cases.append(
+            {
+                "request": f"{method} {path}" + (" (initData)" if with_init_data else ""),
+                "median_us_without_limiter": round(baseline, 2),
+                "median_us_with_limiter": round(with_limiter, 2),
+                "overhead_us": round(with_limiter - baseline, 2),
+            }
+        )
+
+    # Сам счётчик при большом числе живых ключей
+    backend = MemoryBackend(max_keys=args.keys * 2)
+    now = time.time()
+    for i in range(args.keys):
+        backend.hit([(f"write:ip:k{i}", 1_000_000, 60.0)], now)
+    hit_runs = []
+    for _ in range(args.iterations):
+        key = f"write:ip:k{rng.randrange(args.keys)}"
+        started = time.perf_counter()
+        backend.hit([(key, 1_000_000, 60.0)], time.time())
+        hit_runs.append((time.perf_counter() - started) * 1_000_000)
+
+    return {
+        "backend": args.backend,
+        "iterations": args.iterations,
+        "users": args.users,
+        "ips": args.ips,
+        "rejected": rejected,
+        "cases": cases,
+        "memory_hit_keys": args.keys,
+        "memory_hit_median_us": round(statistics.median(hit_runs), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["memory", "database"], default="memory")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--ips", type=int, default=5000)
+    parser.add_argument("--keys", type=int, default=100_000, help="живых ключей для замера MemoryBackend.hit")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    ratelimit.set_enabled(True)
+    if args.backend == "database":
+        init_db()
+        ratelimit.set_backend(DatabaseBackend())
+    else:
+        ratelimit.set_backend(MemoryBackend())
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Нагрузочные сценарии против запущенного сервера (или поднятого здесь же через --spawn).
+
+Каждый сценарий гоняет запросы в --concurrency потоков в течение --duration
+секунд и пишет p50/p95/p99 латентности и RPS в JSON, который удобно
+сравнивать между коммитами (python -m bench.compare old.json new.json).
+
+    DATABASE_URL=sqlite:///./bench.db python -m bench.seed --users 2000 --listings 20000
+    DATABASE_URL=sqlite:///./bench.db python -m bench.run --spawn --out bench/results/head.json
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from bench.initdata import mint_init_data
+from bench.seed import TELEGRAM_ID_BASE, STREETS, TASK_TITLES, _point
+
+BENCH_BOT_TOKEN = "123456:bench-token"
+
+
+class Client:
+    def __init__(self, base_url: str, init_data: Optional[str] = None, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.init_data = init_data
+        self.timeout = timeout
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> tuple[int, bytes]:
+        headers = {"Accept": "application/json"}
+        if self.init_data:
+            headers["X-Telegram-Init-Data"] = self.init_data
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def run_scenario(name: str, step: Callable[[random.Random], int], concurrency: int, duration: float, seed: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed * 1000 + worker_id)
+        local_latencies = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = step(rng)
+            except OSError:
+                status = 599
+            local_latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+def build_scenarios(base_url: str, bot_token: str, users: int) -> dict[str, Callable[[random.Random], int]]:
+    admin = Client(base_url, mint_init_data(bot_token, TELEGRAM_ID_BASE, "bench_admin"))
+    clients = [
+        Client(base_url, mint_init_data(bot_token, TELEGRAM_ID_BASE + i, f"bench_user_{i}"))
+        for i in range(1, max(2, min(users, 200)))
+    ]
+    search_terms = ["ivan", "olga", "bench_s", "anna_1", str(TELEGRAM_ID_BASE)[:6], "pav"]
+
+    def map_load(rng: random.Random) -> int:
+        return rng.choice(clients).request("GET", "/api/listings")[0]
+
+    def board_filter(rng: random.Random) -> int:
+        listing_type = rng.choice(["task", "worker"])
+        return rng.choice(clients).request("GET", f"/api/listings?type={listing_type}")[0]
+
+    def board_search(rng: random.Random) -> int:
+        # Набор запроса в поиске доски: префиксы заголовка, как после каждой паузы в наборе
+        title = rng.choice(TASK_TITLES)
+        query = urllib.parse.quote(title[: rng.randint(2, len(title))])
+        return rng.choice(clients).request("GET", f"/api/listings/board?type=task&q={query}&limit=30")[0]
+
+    def create_edit_burst(rng: random.Random) -> int:
+        client = rng.choice(clients)
+        lat, lon = _point(rng)
+        status, body = client.request(
+            "POST",
+            "/api/listings",
+            {
+                "type": "task",
+                "title": rng.choice(TASK_TITLES),
+                "description": "Нагрузочный тест: создание и правка",
+                "address": f"Минск, {rng.choice(STREETS)}, {rng.randint(1, 150)}",
+                "payment": "25 BYN",
+                "contacts": "@bench",
+                "latitude": lat,
+                "longitude": lon,
+            },
+        )
+        if status >= 400:
+            return status
+        listing_id = json.loads(body)["id"]
+        return client.request("PUT", f"/api/listings/{listing_id}", {"payment": "30 BYN"})[0]
+
+    def admin_search(rng: random.Random) -> int:
+        term = rng.choice(search_terms)
+        return admin.request("GET", f"/api/admin/users?search={term}&page_size=50")[0]
+
+    return {
+        "map_load": map_load,
+        "board_filter": board_filter,
+        "board_search": board_search,
+        "create_edit_burst": create_edit_burst,
+        "admin_search": admin_search,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _spawn_server(port: int, bot_token: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["TELEGRAM_BOT_TOKEN"] = bot_token
+    env["SUPERADMIN_TELEGRAM_ID"] = str(TELEGRAM_ID_BASE)
+    env["ALLOW_LOCAL_AUTH_BYPASS"] = "false"
+    # Вся нагрузка идёт с одного IP — лимит по IP сразу отклонял бы сценарии записи
+    env.setdefault("RATE_LIMIT_ENABLED", "false")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    health = Client(f"http://127.0.0.1:{port}")
+    for _ in range(100):
+        try:
+            if health.request("GET", "/api/health")[0] == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Сервер не поднялся за 10 секунд")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочные сценарии Minsk Jobs")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="поднять uvicorn на --port с тестовым токеном")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--bot-token", default=os.getenv("TELEGRAM_BOT_TOKEN") or BENCH_BOT_TOKEN)
+    parser.add_argument("--users", type=int, default=1000, help="сколько пользователей засеяно через bench.seed")
+    parser.add_argument("--scenarios", default="map_load,board_filter,board_search,create_edit_burst,admin_search")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench/results/latest.json")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if args.spawn:
+        args.bot_token = BENCH_BOT_TOKEN
+        server = _spawn_server(args.port, args.bot_token)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        scenarios = build_scenarios(base_url, args.bot_token, args.users)
+        results = []
+        for name in args.scenarios.split(","):
+            result = run_scenario(name, scenarios[name], args.concurrency, args.duration, args.seed)
+            print(json.dumps(result, ensure_ascii=False))
+            results.append(result)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "revision": _git_revision(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "concurrency": args.concurrency,
+        "duration_seconds": args.duration,
+        "scenarios": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Генератор синтетических данных: N пользователей и M объявлений по Минску.
+
+Пишет в базу из DATABASE_URL/DB_TYPE (как само приложение), так что одна и та
+же команда заполняет и SQLite, и Postgres. Время строк отсчитывается от
+--now (по умолчанию — момент запуска), поэтому при одинаковых --seed и --now
+на пустой базе данные совпадают байт в байт.
+
+    DATABASE_URL=sqlite:///./bench.db python -m bench.seed --users 10000 --listings 50000
+    python -m bench.seed --seed 42 --now 2026-10-01T00:00:00+00:00
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import func, select
+
+from backend.database import SessionLocal, engine, init_db
+from backend.models import Listing, TermsDocument, User
+
+# Первый сгенерированный пользователь — администратор (для сценария поиска в админке)
+TELEGRAM_ID_BASE = 7_000_000_000
+
+# Центры притяжения: центр, спальные районы, промзоны (широта, долгота, разброс в градусах, вес)
+MINSK_HOTSPOTS = [
+    (53.9023, 27.5619, 0.012, 5),  # центр
+    (53.9386, 27.6660, 0.015, 3),  # Уручье / Восток
+    (53.8650, 27.4370, 0.015, 3),  # Малиновка / Каменная Горка
+    (53.9260, 27.4350, 0.012, 2),  # Каменная Горка
+    (53.8550, 27.6800, 0.015, 2),  # Шабаны
+    (53.8660, 27.5400, 0.012, 2),  # Серебрянка
+    (53.9510, 27.5900, 0.012, 2),  # Зелёный Луг
+    (53.8900, 27.6200, 0.010, 2),  # Партизанский
+    (53.9000, 27.4800, 0.010, 2),  # Запад
+]
+
+TASK_TITLES = [
+    "Помочь с переездом", "Уборка квартиры", "Собрать шкаф", "Выгулять собаку",
+    "Поклеить обои", "Починить кран", "Донести покупки", "Покрасить забор",
+    "Разгрузить машину", "Помыть окна", "Повесить полки", "Вывезти мусор",
+]
+WORKER_TITLES = [
+    "Грузчик, свободен сегодня", "Мастер на час", "Няня с опытом", "Сантехник",
+    "Электрик, быстро", "Репетитор по математике", "Курьер на своём авто",
+    "Уборка после ремонта", "Сборка мебели", "Покраска и штукатурка",
+]
+STREETS = [
+    "пр-т Независимости", "ул. Немига", "пр-т Победителей", "ул. Притыцкого",
+    "пр-т Дзержинского", "ул. Кальварийская", "ул. Сурганова", "пр-т Партизанский",
+    "ул. Якуба Коласа", "ул. Есенина", "ул. Ложинская", "ул. Максима Богдановича",
+]
+PAYMENTS = ["20 BYN", "30 BYN", "50 BYN", "от 15 BYN/час", "договорная", "100 BYN", "40 руб"]
+
+
+def _point(rng: random.Random) -> tuple[float, float]:
+    lat, lon, spread, _ = rng.choices(MINSK_HOTSPOTS, weights=[h[3] for h in MINSK_HOTSPOTS])[0]
+    return round(rng.gauss(lat, spread), 6), round(rng.gauss(lon, spread * 1.6), 6)
+
+
+def _insert_chunks(table, rows, chunk_size: int = 5000) -> None:
+    for start in range(0, len(rows), chunk_size):
+        with engine.begin() as conn:
+            conn.execute(table.insert(), rows[start:start + chunk_size])
+
+
+def seed(users: int, listings: int, closed_ratio: float, seed_value: int, now: Optional[datetime] = None) -> dict:
+    rng = random.Random(seed_value)
+    init_db()
+
+    db = SessionLocal()
+    try:
+        terms = db.query(TermsDocument).filter(TermsDocument.is_active.is_(True)).first()
+        terms_version = terms.version if terms else None
+        id_offset = db.execute(select(func.coalesce(func.max(User.id), 0))).scalar()
+    finally:
+        db.close()
+
+    now = now or datetime.now(timezone.utc)
+    started = time.perf_counter()
+    user_rows = [
+        {
+            "id": id_offset + i + 1,
+            "telegram_id": TELEGRAM_ID_BASE + id_offset + i,
+            "username": f"bench_{rng.choice(['ivan', 'olga', 'sergey', 'anna', 'pavel', 'maria'])}_{id_offset + i}",
+            "role": "admin" if id_offset + i == 0 else "user",
+            "is_banned": False,
+            "accepted_terms_version": terms_version,
+            "accepted_terms_at": now if terms_version else None,
+            "created_at": now - timedelta(days=rng.uniform(0, 365)),
+        }
+        for i in range(users)
+    ]
+    _insert_chunks(User.__table__, user_rows)
+
+    listing_rows = []
+    for _ in range(listings):
+        listing_type = "task" if rng.random() < 0.6 else "worker"
+        lat, lon = _point(rng)
+        listing_rows.append(
+            {
+                "user_id": rng.choice(user_rows)["id"],
+                "type": listing_type,
+                "title": rng.choice(TASK_TITLES if listing_type == "task" else WORKER_TITLES),
+                "description": "Синтетическое объявление для нагрузочного теста. " * rng.randint(1, 4),
+                "address": f"Минск, {rng.choice(STREETS)}, {rng.randint(1, 150)}",
+                "payment": rng.choice(PAYMENTS),
+                "contacts": f"@bench{rng.randint(1, 99999)}",
+                "latitude": lat,
+                "longitude": lon,
+                "status": "closed" if rng.random() < closed_ratio else "active",
+                "created_at": now - timedelta(minutes=rng.uniform(0, 60 * 24 * 90)),
+            }
+        )
+    _insert_chunks(Listing.__table__, listing_rows)
+
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for table in ("users", "listings"):
+                conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                )
+
+    return {
+        "users": users,
+        "listings": listings,
+        "first_telegram_id": TELEGRAM_ID_BASE + id_offset,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def _utc_datetime(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заполнить БД синтетическими пользователями и объявлениями")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--closed-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--now", type=_utc_datetime, help="ISO-время, от которого отсчитываются даты (без зоны — UTC)"
+    )
+    args = parser.parse_args()
+    print(seed(args.users, args.listings, args.closed_ratio, args.seed, args.now))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Прокси тайлов против локального фейкового источника (без сети).
+
+Поднимает bench.fake_tile_server с задержкой --upstream-latency-ms и
+uvicorn с TILE_UPSTREAM_URL на него и пустым TILES_DIR, затем меряет:
+
+  - cold — первые запросы --tiles разных тайлов (загрузка из источника);
+  - warm — те же тайлы повторно (отдача с диска);
+  - coalescing — --concurrency одновременных запросов одного нового
+    тайла: сколько раз его запросил прокси у источника (ожидается 1);
+  - seed — предзаполнение Минска (python -m backend.tiles) на --seed-zooms
+    в тот же каталог, повторный прогон должен ничего не качать.
+
+    python -m bench.tiles_bench --tiles 200 --concurrency 32
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.tiles import MINSK_BBOX, tiles_for_bbox
+from bench.fake_tile_server import FakeTileServer
+from bench.run import BENCH_BOT_TOKEN, _git_revision, _spawn_server, percentile
+
+
+def _get(url: str) -> tuple[int, float, str]:
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            response.read()
+            return response.status, (time.perf_counter() - started) * 1000, response.headers.get("Cache-Control", "")
+    except urllib.error.HTTPError as e:
+        return e.code, (time.perf_counter() - started) * 1000, ""
+
+
+def _seed(zooms: str, env: dict) -> dict:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-m", "backend.tiles", "--styles", "light", "--zooms", zooms, "--concurrency", "8"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip().splitlines()
+    return {"seconds": round(time.perf_counter() - started, 2), "report": output[-1] if output else ""}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--upstream-port", type=int, default=8901)
+    parser.add_argument("--upstream-latency-ms", type=float, default=80.0)
+    parser.add_argument("--tiles", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed-zooms", default="10-14")
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    upstream = FakeTileServer(args.upstream_port, args.upstream_latency_ms).start()
+    os.environ["TILE_UPSTREAM_URL"] = upstream.url + "/{style}/{z}/{x}/{y}{r}.png"
+    os.environ["TILES_DIR"] = tempfile.mkdtemp(prefix="bench_tiles_")
+    server = _spawn_server(args.port, BENCH_BOT_TOKEN)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        tiles = [(15, x, y) for x, y in tiles_for_bbox(MINSK_BBOX, 15)[:args.tiles]]
+        cold = [_get(f"{base_url}/tiles/light/{z}/{x}/{y}.png") for z, x, y in tiles]
+        warm = [_get(f"{base_url}/tiles/light/{z}/{x}/{y}.png") for z, x, y in tiles]
+
+        # Тайл масштаба, который не засевается и не запрашивался выше
+        z, (x, y) = 16, tiles_for_bbox(MINSK_BBOX, 16)[0]
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            burst = list(pool.map(lambda _: _get(f"{base_url}/tiles/light/{z}/{x}/{y}.png"), range(args.concurrency)))
+
+        seed_env = dict(os.environ)
+        first_seed = _seed(args.seed_zooms, seed_env)
+        second_seed = _seed(args.seed_zooms, seed_env)
+    finally:
+        server.terminate()
+        server.wait()
+        upstream.stop()
+
+    cold_ms = sorted(latency for _, latency, _ in cold)
+    warm_ms = sorted(latency for _, latency, _ in warm)
+    result = {
+        "revision": _git_revision(),
+        "upstream_latency_ms": args.upstream_latency_ms,
+        "tiles": args.tiles,
+        "cold_p50_ms": round(percentile(cold_ms, 50), 2),
+        "cold_p95_ms": round(percentile(cold_ms, 95), 2),
+        "warm_p50_ms": round(percentile(warm_ms, 50), 2),
+        "warm_p95_ms": round(percentile(warm_ms, 95), 2),
+        "errors": sum(status != 200 for status, _, _ in cold + warm + burst),
+        "cache_control": warm[0][2] if warm else "",
+        "coalescing_requests": args.concurrency,
+        "coalescing_upstream_fetches": upstream.hits_for(f"/light/{z}/{x}/{y}.png"),
+        "seed_first": first_seed,
+        "seed_second": second_seed,
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Пропускная способность загрузки фото при параллельных запросах.
+
+Каждый поток создаёт объявление от своего пользователя и в течение
+--duration секунд шлёт в него multipart-загрузки JPEG размером --width x --height.
+По умолчанию каждое фото уникально (после маркера конца JPEG дописываются
+случайные байты, декодер их игнорирует), чтобы каждая загрузка доходила до
+пула обработки; с --same-image меряется повторная загрузка, когда варианты
+уже есть на диске. Нужны засеянные bench.seed пользователи и Pillow.
+
+    DATABASE_URL=sqlite:///./bench.db python -m bench.seed --users 200 --listings 0
+    DATABASE_URL=sqlite:///./bench.db python -m bench.upload_bench --spawn --concurrency 8
+"""
+
+import argparse
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from bench.initdata import mint_init_data
+from bench.run import BENCH_BOT_TOKEN, Client, _git_revision, _spawn_server, percentile
+from bench.seed import TELEGRAM_ID_BASE
+
+
+def _jpeg(width: int, height: int) -> bytes:
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def _post_photo(client: Client, listing_id: int, payload: bytes) -> int:
+    boundary = uuid.uuid4().hex
+    body = b"".join(
+        [
+            f"--{boundary}\r\n".encode(),
+            b'Content-Disposition: form-data; name="file"; filename="bench.jpg"\r\n',
+            b"Content-Type: image/jpeg\r\n\r\n",
+            payload,
+            f"\r\n--{boundary}--\r\n".encode(),
+        ]
+    )
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    if client.init_data:
+        headers["X-Telegram-Init-Data"] = client.init_data
+    request = urllib.request.Request(
+        f"{client.base_url}/api/listings/{listing_id}/photos", data=body, headers=headers, method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=client.timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _create_listing(client: Client) -> int:
+    status, body = client.request(
+        "POST",
+        "/api/listings",
+        {
+            "type": "worker",
+            "title": "Нагрузочный тест фото",
+            "description": "Загрузка фото",
+            "address": "Минск",
+            "payment": "25 BYN",
+            "contacts": "@bench",
+            "latitude": 53.9,
+            "longitude": 27.56,
+        },
+    )
+    if status >= 400:
+        raise RuntimeError(f"Не удалось создать объявление: {status} {body[:200]!r}")
+    return json.loads(body)["id"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="поднять uvicorn на --port с тестовым токеном")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--bot-token", default=os.getenv("TELEGRAM_BOT_TOKEN") or BENCH_BOT_TOKEN)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--same-image", action="store_true", help="слать одно и то же фото (повторная загрузка)")
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if args.spawn:
+        # Лимит фото на объявление снимаем, файлы складываем во временный каталог
+        os.environ.setdefault("PHOTO_MAX_PER_LISTING", "1000000")
+        os.environ.setdefault("PHOTOS_DIR", tempfile.mkdtemp(prefix="bench_photos_"))
+        args.bot_token = BENCH_BOT_TOKEN
+        server = _spawn_server(args.port, args.bot_token)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    base_image = _jpeg(args.width, args.height)
+    latencies: list[float] = []
+    errors = 0
+    uploaded_bytes = 0
+    lock = threading.Lock()
+
+    def worker(worker_id: int) -> None:
+        nonlocal errors, uploaded_bytes
+        client = Client(base_url, mint_init_data(args.bot_token, TELEGRAM_ID_BASE + 1 + worker_id, f"bench_user_{worker_id + 1}"))
+        listing_id = _create_listing(client)
+        local_latencies, local_errors, local_bytes = [], 0, 0
+        while time.perf_counter() < deadline:
+            payload = base_image if args.same_image else base_image + uuid.uuid4().bytes
+            started = time.perf_counter()
+            try:
+                status = _post_photo(client, listing_id, payload)
+            except OSError:
+                status = 599
+            local_latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                local_errors += 1
+            else:
+                local_bytes += len(payload)
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+            uploaded_bytes += local_bytes
+
+    try:
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(worker, range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    latencies.sort()
+    result = {
+        "revision": _git_revision(),
+        "concurrency": args.concurrency,
+        "image": f"{args.width}x{args.height}",
+        "image_bytes": len(base_image),
+        "same_image": args.same_image,
+        "uploads": len(latencies),
+        "errors": errors,
+        "uploads_per_second": round(len(latencies) / elapsed, 2),
+        "mb_per_second": round(uploaded_bytes / elapsed / (1024 * 1024), 2),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
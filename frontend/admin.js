@@ -33,15 +33,138 @@ function formatDate(value) {
     return dt.toLocaleString("ru-RU");
 }
 
-function renderUsers(items) {
+const STATS_METRIC_LABELS = {
+    listings_created: "Новые объявления",
+    listings_closed: "Закрыто",
+    listings_expired: "Истекло",
+    new_users: "Новые пользователи",
+    active_users: "Активные пользователи",
+};
+const STATS_CHART_METRICS = ["listings_created", "listings_closed", "new_users", "active_users"];
+
+function statsMetricLabel(metric) {
+    if (STATS_METRIC_LABELS[metric]) return STATS_METRIC_LABELS[metric];
+    return metric.startsWith("audit_") ? `Журнал: ${metric.slice(6)}` : metric;
+}
+
+function sumSeriesByBucket(byType) {
+    const sums = new Map();
+    Object.values(byType || {}).forEach((points) => {
+        points.forEach(([bucket, value]) => {
+            const key = new Date(bucket).getTime();
+            sums.set(key, (sums.get(key) || 0) + value);
+        });
+    });
+    return sums;
+}
+
+function renderStatsBars(sums, since, stepMs) {
+    const bars = [];
+    for (let at = new Date(since).getTime(); at <= Date.now(); at += stepMs) {
+        bars.push([at, sums.get(at) || 0]);
+    }
+    const max = Math.max(1, ...bars.map(([, value]) => value));
+    return bars
+        .map(([at, value]) => `<div title="${formatDate(at)}: ${value}" style="height:${Math.max(1, (value / max) * 100)}%"></div>`)
+        .join("");
+}
+
+function renderStatsHeatmap(heatmap) {
+    const box = document.getElementById("statsHeatmap");
+    if (!box) return;
+    const cells = heatmap.cells || [];
+    if (!cells.length) {
+        box.style.gridTemplateColumns = "";
+        box.innerHTML = "<small>Данных пока нет</small>";
+        return;
+    }
+    const parsed = cells.map((cell) => {
+        const [row, col] = cell.cell.split(":").map(Number);
+        return { ...cell, row, col };
+    });
+    const rows = parsed.map((cell) => cell.row);
+    const cols = parsed.map((cell) => cell.col);
+    const minRow = Math.min(...rows);
+    const maxRow = Math.max(...rows);
+    const minCol = Math.min(...cols);
+    const maxCol = Math.max(...cols);
+    const byKey = new Map(parsed.map((cell) => [`${cell.row}:${cell.col}`, cell]));
+    const max = Math.max(1, ...parsed.map((cell) => cell.task + cell.worker));
+
+    const html = [];
+    // Север сверху: строки сетки идут от большей широты к меньшей
+    for (let row = maxRow; row >= minRow; row -= 1) {
+        for (let col = minCol; col <= maxCol; col += 1) {
+            const cell = byKey.get(`${row}:${col}`);
+            if (!cell) {
+                html.push("<div></div>");
+                continue;
+            }
+            const total = cell.task + cell.worker;
+            const alpha = (0.15 + 0.85 * (total / max)).toFixed(2);
+            const color = cell.task >= cell.worker ? `rgba(37, 99, 235, ${alpha})` : `rgba(22, 163, 74, ${alpha})`;
+            html.push(
+                `<div style="background:${color}" title="${cell.south.toFixed(3)}, ${cell.west.toFixed(3)}: задач ${cell.task}, исполнителей ${cell.worker}"></div>`
+            );
+        }
+    }
+    box.style.gridTemplateColumns = `repeat(${maxCol - minCol + 1}, minmax(6px, 1fr))`;
+    box.innerHTML = html.join("");
+}
+
+async function loadStats() {
+    const range = document.getElementById("statsRange")?.value || "week";
+    const totalsBox = document.getElementById("statsTotals");
+    const seriesBox = document.getElementById("statsSeries");
+    try {
+        const response = await fetch(`/api/admin/stats?range=${encodeURIComponent(range)}`, { headers: apiHeaders() });
+        const payload = await response.json();
+        if (!response.ok) {
+            throw new Error(payload.detail?.message || payload.detail || "Не удалось загрузить статистику");
+        }
+
+        const updated = document.getElementById("statsUpdated");
+        if (updated) {
+            updated.textContent = payload.updated_until ? `Данные по ${formatDate(payload.updated_until)}` : "Агрегаты ещё не посчитаны";
+        }
+
+        if (totalsBox) {
+            totalsBox.innerHTML = Object.entries(payload.totals || {})
+                .map(([metric, byType]) => {
+                    const total = Object.values(byType).reduce((sum, value) => sum + value, 0);
+                    const split = byType.task !== undefined || byType.worker !== undefined
+                        ? `<div>задачи ${byType.task || 0} · исполнители ${byType.worker || 0}</div>`
+                        : "";
+                    return `<div class="stats-total">${escapeHtml(statsMetricLabel(metric))}<strong>${total}</strong>${split}</div>`;
+                })
+                .join("");
+        }
+
+        if (seriesBox) {
+            const stepMs = payload.period === "hour" ? 3600 * 1000 : 24 * 3600 * 1000;
+            seriesBox.innerHTML = STATS_CHART_METRICS
+                .filter((metric) => payload.series?.[metric])
+                .map((metric) => `<small>${escapeHtml(statsMetricLabel(metric))}</small>
+                    <div class="stats-bars">${renderStatsBars(sumSeriesByBucket(payload.series[metric]), payload.since, stepMs)}</div>`)
+                .join("");
+        }
+
+        renderStatsHeatmap(payload.heatmap || {});
+    } catch (error) {
+        console.error(error);
+        if (totalsBox) totalsBox.textContent = "Ошибка загрузки статистики";
+    }
+}
+
+function renderUsers(items, append = false) {
     const body = document.getElementById("usersBody");
     if (!body) return;
-    if (!items || items.length === 0) {
+    if (!append && (!items || items.length === 0)) {
         body.innerHTML = "<tr><td colspan='7'>Пользователи не найдены</td></tr>";
         return;
     }
 
-    body.innerHTML = items
+    const html = items
         .map((user) => {
             const roleClass = user.role === "admin" ? "admin" : "user";
             const banLabel = user.is_banned
@@ -73,9 +196,19 @@ function renderUsers(items) {
             `;
         })
         .join("");
+    if (append) {
+        body.insertAdjacentHTML("beforeend", html);
+    } else {
+        body.innerHTML = html;
+    }
 }
 
-async function loadUsers() {
+let usersNextCursor = null;
+let usersRequestId = 0;
+let usersSearchTimer = null;
+
+async function loadUsers(append = false) {
+    const requestId = ++usersRequestId;
     try {
         setStatus("Загрузка пользователей...");
         const search = document.getElementById("searchInput")?.value?.trim() || "";
@@ -86,8 +219,8 @@ async function loadUsers() {
         if (search) params.set("search", search);
         if (role) params.set("role", role);
         if (isBanned) params.set("is_banned", isBanned);
-        params.set("page", "1");
         params.set("page_size", "100");
+        if (append && usersNextCursor) params.set("cursor", String(usersNextCursor));
 
         const response = await fetch(`/api/admin/users?${params.toString()}`, {
             headers: apiHeaders(),
@@ -96,8 +229,14 @@ async function loadUsers() {
         if (!response.ok) {
             throw new Error(payload.detail?.message || payload.detail || "Ошибка загрузки пользователей");
         }
-        renderUsers(payload.items || []);
-        setStatus(`Пользователей: ${payload.total || 0}`);
+        // Ответ на устаревший запрос (пользователь уже набрал другой текст) игнорируем
+        if (requestId !== usersRequestId) return;
+        usersNextCursor = payload.next_cursor || null;
+        const moreButton = document.getElementById("usersMoreButton");
+        if (moreButton) moreButton.style.display = usersNextCursor ? "" : "none";
+        renderUsers(payload.items || [], append);
+        const approx = payload.total_is_estimate ? "≈" : "";
+        setStatus(`Пользователей: ${approx}${payload.total || 0}`);
     } catch (error) {
         console.error(error);
         setStatus("Ошибка загрузки пользователей");
@@ -105,6 +244,11 @@ async function loadUsers() {
     }
 }
 
+function scheduleUsersSearch() {
+    clearTimeout(usersSearchTimer);
+    usersSearchTimer = setTimeout(() => loadUsers(), 300);
+}
+
 async function banUser(userId) {
     const reason = prompt("Причина блокировки:", "") || "";
     try {
@@ -157,38 +301,161 @@ async function updateRole(userId, role) {
     }
 }
 
-async function loadAudit() {
+function formatAuditDetails(details) {
+    if (!details || typeof details !== "object") return "-";
+    const parts = Object.entries(details)
+        .filter(([, value]) => value !== null && value !== undefined && value !== "")
+        .map(([key, value]) => `${escapeHtml(key)}: ${escapeHtml(value)}`);
+    return parts.length ? parts.join("; ") : "-";
+}
+
+let auditNextCursor = null;
+
+function auditFilterParams() {
+    const params = new URLSearchParams();
+    const adminId = document.getElementById("auditAdminFilter")?.value?.trim() || "";
+    const targetId = document.getElementById("auditTargetFilter")?.value?.trim() || "";
+    const action = document.getElementById("auditActionFilter")?.value || "";
+    const since = document.getElementById("auditSinceFilter")?.value || "";
+    const until = document.getElementById("auditUntilFilter")?.value || "";
+    if (adminId) params.set("admin_user_id", adminId);
+    if (targetId) params.set("target_user_id", targetId);
+    if (action) params.set("action", action);
+    if (since) params.set("since", new Date(`${since}T00:00:00`).toISOString());
+    if (until) {
+        const untilDate = new Date(`${until}T00:00:00`);
+        untilDate.setDate(untilDate.getDate() + 1);
+        params.set("until", untilDate.toISOString());
+    }
+    return params;
+}
+
+function renderAuditRows(rows) {
+    return rows
+        .map((row) => {
+            return `<div style="padding:6px 0;border-bottom:1px solid #e5e7eb;">
+                    <strong>${row.action}</strong>
+                    <div>admin=${row.admin_user_id}, target=${row.target_user_id || "-"}</div>
+                    <div>${formatAuditDetails(row.details)}</div>
+                    <small>${formatDate(row.created_at)}</small>
+                </div>`;
+        })
+        .join("");
+}
+
+async function loadAudit(append = false) {
+    const box = document.getElementById("auditBox");
+    const moreButton = document.getElementById("auditMoreButton");
     try {
-        const response = await fetch("/api/admin/audit?limit=100", {
+        const params = auditFilterParams();
+        params.set("limit", "100");
+        if (append && auditNextCursor) params.set("cursor", auditNextCursor);
+
+        const response = await fetch(`/api/admin/audit?${params.toString()}`, {
             headers: apiHeaders(),
         });
         const payload = await response.json();
         if (!response.ok) {
             throw new Error(payload.detail?.message || payload.detail || "Не удалось загрузить аудит");
         }
-        const box = document.getElementById("auditBox");
+        auditNextCursor = payload.next_cursor || null;
+        if (moreButton) moreButton.style.display = auditNextCursor ? "" : "none";
         if (!box) return;
-        if (!payload.length) {
+        const items = payload.items || [];
+        if (!append && !items.length) {
             box.textContent = "Журнал пуст";
             return;
         }
-        box.innerHTML = payload
-            .map((row) => {
-                return `<div style="padding:6px 0;border-bottom:1px solid #e5e7eb;">
-                    <strong>${row.action}</strong>
-                    <div>admin=${row.admin_user_id}, target=${row.target_user_id || "-"}</div>
-                    <div>${row.details || "-"}</div>
-                    <small>${formatDate(row.created_at)}</small>
-                </div>`;
-            })
-            .join("");
+        if (append) {
+            box.insertAdjacentHTML("beforeend", renderAuditRows(items));
+        } else {
+            box.innerHTML = renderAuditRows(items);
+        }
     } catch (error) {
         console.error(error);
-        const box = document.getElementById("auditBox");
         if (box) box.textContent = "Ошибка загрузки журнала";
     }
 }
 
+async function exportAudit(format) {
+    try {
+        const params = auditFilterParams();
+        params.set("format", format);
+        const response = await fetch(`/api/admin/audit/export?${params.toString()}`, {
+            headers: apiHeaders(),
+        });
+        if (!response.ok) {
+            const payload = await response.json().catch(() => ({}));
+            throw new Error(payload.detail?.message || payload.detail || "Не удалось выгрузить журнал");
+        }
+        const blob = await response.blob();
+        const link = document.createElement("a");
+        link.href = URL.createObjectURL(blob);
+        link.download = `admin_audit.${format}`;
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+        URL.revokeObjectURL(link.href);
+    } catch (error) {
+        alert(error.message || "Ошибка выгрузки журнала");
+    }
+}
+
+function renderProfileRows(items) {
+    return items
+        .map((row) => {
+            const format = row.kind === "cprofile" ? "pstats" : "speedscope";
+            return `<div style="padding:6px 0;border-bottom:1px solid #e5e7eb;">
+                    <strong>${escapeHtml(row.method)} ${escapeHtml(row.route)}</strong> → ${row.status_code}
+                    <div>${row.duration_ms} мс, SQL: ${row.sql_count} шт. / ${row.sql_ms} мс, ${escapeHtml(row.kind)} (${escapeHtml(row.trigger)})</div>
+                    <small>${formatDate(row.started_at)}</small>
+                    <button type="button" class="secondary" onclick="downloadProfile('${escapeHtml(row.id)}')">Скачать ${format}</button>
+                </div>`;
+        })
+        .join("");
+}
+
+async function loadProfiles() {
+    const box = document.getElementById("profilesBox");
+    try {
+        const response = await fetch("/api/admin/profiles", { headers: apiHeaders() });
+        const payload = await response.json();
+        if (!response.ok) {
+            throw new Error(payload.detail?.message || payload.detail || "Не удалось загрузить профили");
+        }
+        if (!box) return;
+        const items = payload.items || [];
+        box.innerHTML = items.length ? renderProfileRows(items) : "Профилей пока нет";
+    } catch (error) {
+        console.error(error);
+        if (box) box.textContent = "Ошибка загрузки профилей";
+    }
+}
+
+async function downloadProfile(profileId) {
+    try {
+        const response = await fetch(`/api/admin/profiles/${encodeURIComponent(profileId)}/download`, {
+            headers: apiHeaders(),
+        });
+        if (!response.ok) {
+            const payload = await response.json().catch(() => ({}));
+            throw new Error(payload.detail?.message || payload.detail || "Не удалось скачать профиль");
+        }
+        const disposition = response.headers.get("Content-Disposition") || "";
+        const match = disposition.match(/filename="([^"]+)"/);
+        const blob = await response.blob();
+        const link = document.createElement("a");
+        link.href = URL.createObjectURL(blob);
+        link.download = match ? match[1] : `profile_${profileId}`;
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+        URL.revokeObjectURL(link.href);
+    } catch (error) {
+        alert(error.message || "Ошибка скачивания профиля");
+    }
+}
+
 function escapeHtml(value) {
     return String(value || "")
         .replaceAll("&", "&amp;")
@@ -211,7 +478,11 @@ function renderListingModeration(items) {
             const typeText = listing.type === "task" ? "Задача" : "Исполнитель";
             return `
                 <div class="listing-moderation-item">
-                    <div><strong>#${listing.id} · ${typeText}</strong> · ${escapeHtml(listing.title)}</div>
+                    <div>
+                        <input type="checkbox" class="listing-select" value="${listing.id}" data-user-id="${listing.user_id}">
+                        <strong>#${listing.id} · ${typeText}</strong> · ${escapeHtml(listing.title)}
+                        ${listing.duplicate_of ? `<span class="pill banned">копия #${listing.duplicate_of}</span>` : ""}
+                    </div>
                     <div class="listing-moderation-meta">Автор: ${escapeHtml(listing.username || "-")} (user_id=${listing.user_id})</div>
                     <div class="listing-moderation-meta">Адрес: ${escapeHtml(listing.address)}</div>
                     <div class="listing-moderation-meta">Оплата: ${escapeHtml(listing.payment)}</div>
@@ -268,6 +539,193 @@ async function closeListingByAdmin(listingId) {
     }
 }
 
+function selectedListingCheckboxes() {
+    return Array.from(document.querySelectorAll(".listing-select:checked"));
+}
+
+function bulkReason() {
+    return (document.getElementById("bulkReasonInput")?.value || "").trim();
+}
+
+function summarizeBulkResults(results) {
+    const counts = {};
+    (results || []).forEach((item) => {
+        counts[item.result] = (counts[item.result] || 0) + 1;
+    });
+    return Object.entries(counts)
+        .map(([result, count]) => `${result}: ${count}`)
+        .join(", ");
+}
+
+async function postBulk(url, body, errorText) {
+    const response = await fetch(url, {
+        method: "POST",
+        headers: apiHeaders({ "Content-Type": "application/json" }),
+        body: JSON.stringify(body),
+    });
+    const payload = await response.json();
+    if (!response.ok) {
+        throw new Error(payload.detail?.message || payload.detail || errorText);
+    }
+    return payload;
+}
+
+async function bulkCloseSelectedListings() {
+    const listingIds = selectedListingCheckboxes().map((box) => Number(box.value));
+    const reason = bulkReason();
+    if (!listingIds.length) {
+        alert("Отметьте маркеры");
+        return;
+    }
+    if (!reason) {
+        alert("Причина удаления обязательна");
+        return;
+    }
+    try {
+        const payload = await postBulk(
+            "/api/admin/listings/bulk-close",
+            { listing_ids: listingIds, reason },
+            "Не удалось удалить маркеры"
+        );
+        alert(`Удалено маркеров: ${payload.closed}\n${summarizeBulkResults(payload.results)}`);
+        await Promise.all([loadAdminListings(), loadAudit()]);
+    } catch (error) {
+        alert(error.message || "Ошибка массового удаления");
+    }
+}
+
+async function bulkBanSelectedAuthors() {
+    const userIds = Array.from(
+        new Set(selectedListingCheckboxes().map((box) => Number(box.dataset.userId)))
+    );
+    if (!userIds.length) {
+        alert("Отметьте маркеры, авторов которых нужно заблокировать");
+        return;
+    }
+    if (!confirm(`Заблокировать авторов (${userIds.length}) и снять все их маркеры?`)) {
+        return;
+    }
+    try {
+        const payload = await postBulk(
+            "/api/admin/users/bulk-ban",
+            { user_ids: userIds, reason: bulkReason() || null, close_listings: true },
+            "Не удалось заблокировать авторов"
+        );
+        alert(`Заблокировано: ${payload.banned}\n${summarizeBulkResults(payload.results)}`);
+        await Promise.all([loadAdminListings(), loadUsers(), loadAudit()]);
+    } catch (error) {
+        alert(error.message || "Ошибка массовой блокировки");
+    }
+}
+
+async function closeListingsByText() {
+    const query = (document.getElementById("bulkTextInput")?.value || "").trim();
+    const reason = bulkReason();
+    if (query.length < 3) {
+        alert("Текст для поиска должен быть не короче 3 символов");
+        return;
+    }
+    if (!reason) {
+        alert("Причина удаления обязательна");
+        return;
+    }
+    try {
+        const preview = await postBulk(
+            "/api/admin/listings/close-by-text",
+            { query, reason, dry_run: true },
+            "Не удалось найти маркеры"
+        );
+        if (!preview.results.length) {
+            alert("Подходящих активных маркеров нет");
+            return;
+        }
+        if (!confirm(`Будет удалено маркеров: ${preview.results.length}. Продолжить?`)) {
+            return;
+        }
+        const payload = await postBulk(
+            "/api/admin/listings/close-by-text",
+            { query, reason },
+            "Не удалось удалить маркеры"
+        );
+        alert(`Удалено маркеров: ${payload.closed}`);
+        await Promise.all([loadAdminListings(), loadAudit()]);
+    } catch (error) {
+        alert(error.message || "Ошибка удаления по тексту");
+    }
+}
+
+function renderDuplicateGroups(groups) {
+    const container = document.getElementById("duplicateGroupsList");
+    if (!container) return;
+    if (!groups || groups.length === 0) {
+        container.innerHTML = "<div class='listing-moderation-item'>Похожих объявлений не найдено.</div>";
+        return;
+    }
+    container.innerHTML = groups
+        .map((group) => {
+            const [original, ...copies] = group.listings;
+            const copyIds = copies.map((listing) => listing.id).join(",");
+            const rows = group.listings
+                .map(
+                    (listing) => `
+                        <div class="listing-moderation-meta">
+                            #${listing.id} · ${escapeHtml(listing.title)} · ${escapeHtml(listing.username || "-")} (user_id=${listing.user_id}) · ${formatDate(listing.created_at)}
+                        </div>
+                    `
+                )
+                .join("");
+            return `
+                <div class="listing-moderation-item">
+                    <div><strong>Группа из ${group.size}</strong> · оригинал #${original.id}</div>
+                    ${rows}
+                    <div class="listing-moderation-actions">
+                        <button type="button" class="warn" onclick="closeDuplicateCopies('${copyIds}')">Удалить копии (${copies.length})</button>
+                    </div>
+                </div>
+            `;
+        })
+        .join("");
+}
+
+async function loadDuplicateGroups() {
+    try {
+        const response = await fetch("/api/admin/listings/duplicates", {
+            headers: apiHeaders(),
+        });
+        const payload = await response.json();
+        if (!response.ok) {
+            throw new Error(payload.detail?.message || payload.detail || "Не удалось загрузить копии");
+        }
+        renderDuplicateGroups(payload);
+    } catch (error) {
+        const container = document.getElementById("duplicateGroupsList");
+        if (container) {
+            container.innerHTML = "<div class='listing-moderation-item'>Ошибка загрузки копий.</div>";
+        }
+    }
+}
+
+async function closeDuplicateCopies(copyIds) {
+    const listingIds = copyIds.split(",").map(Number).filter(Boolean);
+    const reason = bulkReason() || "Повторная публикация одинакового объявления";
+    if (!listingIds.length) return;
+    if (!confirm(`Удалить копии (${listingIds.length}) с причиной «${reason}»?`)) {
+        return;
+    }
+    try {
+        const payload = await postBulk(
+            "/api/admin/listings/bulk-close",
+            { listing_ids: listingIds, reason },
+            "Не удалось удалить копии"
+        );
+        alert(`Удалено маркеров: ${payload.closed}`);
+        await Promise.all([loadDuplicateGroups(), loadAdminListings(), loadAudit()]);
+    } catch (error) {
+        alert(error.message || "Ошибка удаления копий");
+    }
+}
+
 document.addEventListener("DOMContentLoaded", async () => {
-    await Promise.all([loadUsers(), loadAudit(), loadAdminListings()]);
+    document.getElementById("searchInput")?.addEventListener("input", scheduleUsersSearch);
+    await Promise.all([loadStats(), loadUsers(), loadAudit(), loadAdminListings(), loadDuplicateGroups(), loadProfiles()]);
 });
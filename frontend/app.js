@@ -5,7 +5,11 @@ let currentMode = null; // 'task' или 'worker'
 let currentCoords = null;
 let currentAddress = null;
 let tempMarker = null; // временный маркер при постановке
-let markers = [];      // маркеры всех объявлений на карте
+let markersById = new Map(); // маркеры объявлений на карте: id -> L.circleMarker
+let markerLayer = null;       // общий слой маркеров объявлений
+let markerRenderer = null;    // canvas, на котором рисуются все маркеры
+let markerRenderTimes = [];   // длительность последних renderMapMarkers, мс (window.getMarkerRenderStats)
+let firstMarkerAt = null;     // время от начала загрузки страницы до первых маркеров, мс
 let mapListings = [];  // все объявления, загруженные для карты
 let currentMapFilter = 'all'; // all | task | worker
 let userInfo = null;
@@ -17,35 +21,38 @@ let termsState = {
     currentTerms: null,
 };
 let accessBlocked = false;
+// Данные из /api/bootstrap, которые используются один раз вместо отдельных запросов
+let preloadedListings = null;
+let preloadedMyListings = null;
 
-// Доступные стили карты
+// Доступные стили карты (тайлы идут через кэширующий прокси /tiles, см. backend/tiles.py)
 const MAP_STYLES = {
     light: {
         key: 'light',
         name: 'Positron',
         icon: '☀️',
-        url: 'https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png',
+        url: '/tiles/light/{z}/{x}/{y}{r}.png',
         attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors &copy; <a href="https://carto.com/">CARTO</a>'
     },
     voyager: {
         key: 'voyager',
         name: 'Voyager',
         icon: '🧭',
-        url: 'https://{s}.basemaps.cartocdn.com/rastertiles/voyager/{z}/{x}/{y}{r}.png',
+        url: '/tiles/voyager/{z}/{x}/{y}{r}.png',
         attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors &copy; <a href="https://carto.com/">CARTO</a>'
     },
     dark: {
         key: 'dark',
         name: 'Dark Matter',
         icon: '🌙',
-        url: 'https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png',
+        url: '/tiles/dark/{z}/{x}/{y}{r}.png',
         attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors &copy; <a href="https://carto.com/">CARTO</a>'
     },
     osm: {
         key: 'osm',
         name: 'OpenStreetMap Standard',
         icon: '🗺️',
-        url: 'https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png',
+        url: '/tiles/osm/{z}/{x}/{y}.png',
         attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
     }
 };
@@ -72,8 +79,12 @@ try {
 
 // Инициализация приложения
 document.addEventListener('DOMContentLoaded', async () => {
-    await initAuth();
-    await checkTermsGate();
+    DataStore.registerServiceWorker();
+    const bootstrapped = await loadBootstrap();
+    if (!bootstrapped) {
+        await initAuth();
+        await checkTermsGate();
+    }
     if (termsState.accepted) {
         await bootstrapApp();
     }
@@ -102,11 +113,8 @@ async function bootstrapApp() {
             map.setView([parseFloat(lat), parseFloat(lng)], 15);
             
             // Находим маркер и показываем его popup
-            const marker = markers.find(m => {
-                const listingId = m._listingId;
-                return listingId && listingId.toString() === showId;
-            });
-            
+            const marker = markersById.get(Number(showId));
+
             if (marker) {
                 marker.openPopup();
             }
@@ -118,6 +126,90 @@ async function bootstrapApp() {
 
     // Показываем онбординг новым пользователям после небольшой задержки
     setTimeout(maybeShowOnboarding, 800);
+
+    // Объявления, созданные или изменённые без сети, отправляются при первой возможности
+    window.addEventListener('online', flushPendingWrites);
+    flushPendingWrites();
+}
+
+// Кэш ответов в IndexedDB разделяется по пользователю Telegram
+function cacheUserKey() {
+    const user = tg && tg.initDataUnsafe && tg.initDataUnsafe.user;
+    return user ? String(user.id) : 'local';
+}
+
+// Один запрос вместо цепочки auth → compliance/terms → listings.
+// Повторное открытие рисуется из прошлого ответа (IndexedDB), свежий приходит
+// следом по ETag и применяется, только если что-то изменилось.
+// Возвращает false, если нужно откатиться на старую цепочку запросов.
+async function loadBootstrap() {
+    try {
+        const { body, result } = await DataStore.staleWhileRevalidate(`bootstrap:${cacheUserKey()}`, '/api/bootstrap', {
+            headers: buildApiHeaders(),
+            onFresh: refreshFromBootstrap,
+            onError: failed => handleBootstrapError(failed.response)
+        });
+        if (body) {
+            return applyBootstrapPayload(body);
+        }
+        return result ? await handleBootstrapError(result.response) : false;
+    } catch (error) {
+        console.error('Ошибка начальной загрузки:', error);
+        return false;
+    }
+}
+
+async function handleBootstrapError(response) {
+    if (response.status === 403) {
+        const error = await response.json();
+        if (error?.detail?.code === 'user_banned') {
+            blockAppAccess(error?.detail?.reason);
+            return true;
+        }
+    }
+    return false;
+}
+
+function applyBootstrapPayload(payload) {
+    if (!payload.terms) {
+        return false;
+    }
+
+    const compliance = payload.compliance;
+    userInfo = compliance;
+    updateAdminButtonVisibility(compliance);
+    termsState.activeVersion = payload.terms.version;
+    termsState.accepted = Boolean(compliance.is_terms_accepted);
+    if (payload.terms.content !== undefined) {
+        termsState.currentTerms = payload.terms;
+    }
+    preloadedListings = payload.listings;
+    preloadedMyListings = payload.my_listings;
+
+    if (termsState.accepted) {
+        setTermsModalMode('view');
+        hideTermsGateModal();
+    } else {
+        setTermsModalMode('gate');
+        showTermsGateModal(payload.terms);
+    }
+    return true;
+}
+
+// Свежий bootstrap пришёл после показа сохранённого: обновляем только изменившееся
+function refreshFromBootstrap(payload) {
+    if (!applyBootstrapPayload(payload) || !termsState.accepted) {
+        return;
+    }
+    if (!appBootstrapped) {
+        bootstrapApp();
+        return;
+    }
+    if (payload.listings) {
+        mapListings = payload.listings;
+        preloadedListings = null;
+        renderMapMarkers();
+    }
 }
 
 // Авторизация через Telegram
@@ -356,6 +448,11 @@ function initMap() {
         // Центр на Минск
         map = L.map('map').setView([53.9045, 27.5615], 11);
 
+        // Маркеры объявлений — круги на одном canvas вместо DOM-узла на каждый;
+        // tolerance расширяет зону касания пальцем
+        markerRenderer = L.canvas({ padding: 0.5, tolerance: 6 });
+        markerLayer = L.layerGroup().addTo(map);
+
         // Выбираем стиль карты (по умолчанию светлый или сохранённый пользователем)
         let savedStyle = 'light';
         try {
@@ -485,8 +582,8 @@ window.toggleHelpHint = function() {
 function closeModal(modalId) {
     document.getElementById(modalId).classList.remove('active');
 
-    // Не сбрасываем currentMode и currentCoords, если это доска объявлений или мои объявления
-    if (modalId !== 'boardModal' && modalId !== 'myListingsModal') {
+    // Не сбрасываем currentMode и currentCoords, если это мои объявления
+    if (modalId !== 'myListingsModal') {
         currentMode = null;
         currentCoords = null;
         currentAddress = null;
@@ -685,13 +782,12 @@ async function submitTask(event) {
             contacts: document.getElementById('taskContacts').value,
         };
         try {
-            const response = await fetch(`/api/listings/${editingListing.id}`, {
-                method: 'PUT',
-                headers: buildApiHeaders({
-                    'Content-Type': 'application/json'
-                }),
-                body: JSON.stringify(body),
-            });
+            const response = await sendListingWrite('PUT', `/api/listings/${editingListing.id}`, body);
+            if (!response) {
+                editingListing = null;
+                finishQueuedWrite('taskModal', 'taskForm');
+                return;
+            }
             if (response.ok) {
                 alert('Задача обновлена');
                 editingListing = null;
@@ -725,16 +821,13 @@ async function submitTask(event) {
         longitude: currentCoords[1]
     };
     try {
-        const response = await fetch('/api/listings', {
-            method: 'POST',
-            headers: buildApiHeaders({
-                'Content-Type': 'application/json'
-            }),
-            body: JSON.stringify(data)
-        });
-        
+        const response = await sendListingWrite('POST', '/api/listings', data);
+        if (!response) {
+            finishQueuedWrite('taskModal', 'taskForm');
+            return;
+        }
+
         if (response.ok) {
-            const result = await response.json();
             alert('Задача опубликована!');
             closeModal('taskModal');
             document.getElementById('taskForm').reset();
@@ -782,13 +875,12 @@ async function submitWorker(event) {
             contacts: document.getElementById('workerContacts').value,
         };
         try {
-            const response = await fetch(`/api/listings/${editingListing.id}`, {
-                method: 'PUT',
-                headers: buildApiHeaders({
-                    'Content-Type': 'application/json'
-                }),
-                body: JSON.stringify(body),
-            });
+            const response = await sendListingWrite('PUT', `/api/listings/${editingListing.id}`, body);
+            if (!response) {
+                editingListing = null;
+                finishQueuedWrite('workerModal', 'workerForm');
+                return;
+            }
             if (response.ok) {
                 alert('Объявление обновлено');
                 editingListing = null;
@@ -822,16 +914,13 @@ async function submitWorker(event) {
         longitude: currentCoords[1]
     };
     try {
-        const response = await fetch('/api/listings', {
-            method: 'POST',
-            headers: buildApiHeaders({
-                'Content-Type': 'application/json'
-            }),
-            body: JSON.stringify(data)
-        });
-        
+        const response = await sendListingWrite('POST', '/api/listings', data);
+        if (!response) {
+            finishQueuedWrite('workerModal', 'workerForm');
+            return;
+        }
+
         if (response.ok) {
-            const result = await response.json();
             alert('Объявление опубликовано!');
             closeModal('workerModal');
             document.getElementById('workerForm').reset();
@@ -850,85 +939,193 @@ async function submitWorker(event) {
     }
 }
 
+// Создание и правка объявления; без сети запрос уходит в очередь и возвращается null.
+// Ключ идемпотентности общий для первой попытки и повторов из очереди: если запрос
+// дошёл, а ответ потерялся, повтор вернёт уже созданное объявление
+async function sendListingWrite(method, url, body) {
+    const idempotencyKey = DataStore.newIdempotencyKey();
+    if (!navigator.onLine) {
+        await DataStore.queueWrite(cacheUserKey(), method, url, body, idempotencyKey);
+        return null;
+    }
+    try {
+        return await fetch(url, {
+            method,
+            headers: buildApiHeaders({
+                'Content-Type': 'application/json',
+                'Idempotency-Key': idempotencyKey
+            }),
+            body: JSON.stringify(body)
+        });
+    } catch (error) {
+        if (!DataStore.isNetworkError(error)) {
+            throw error;
+        }
+        await DataStore.queueWrite(cacheUserKey(), method, url, body, idempotencyKey);
+        return null;
+    }
+}
+
+function finishQueuedWrite(modalId, formId) {
+    alert('Нет подключения: объявление сохранено и будет отправлено, когда появится сеть');
+    closeModal(modalId);
+    document.getElementById(formId).reset();
+}
+
+async function flushPendingWrites() {
+    const report = await DataStore.flushOutbox(cacheUserKey(), buildApiHeaders);
+    report.rejected.forEach(({ status, detail }) => {
+        alert('Отложенное объявление не отправлено: ' + (detail?.message || detail || `ошибка ${status}`));
+    });
+    if (report.rejected.some(({ status }) => status === 428)) {
+        termsState.accepted = false;
+        await checkTermsGate();
+    }
+    if (report.sent > 0) {
+        alert(`Отправлено отложенных объявлений: ${report.sent}`);
+        await loadListings();
+    }
+}
+
 // Загрузка всех объявлений
 async function loadListings() {
+    if (preloadedListings) {
+        mapListings = preloadedListings;
+        preloadedListings = null;
+        renderMapMarkers();
+        return;
+    }
+    // Повторная загрузка идёт после изменений — предзагруженные «мои объявления» устарели
+    preloadedMyListings = null;
     try {
-        const response = await fetch('/api/listings', {
+        const result = await DataStore.revalidate('listings', '/api/listings', {
             headers: buildApiHeaders()
         });
-        if (response.status === 403) {
-            const error = await response.json();
+        if (result.status === 403) {
+            const error = await result.response.json();
             if (error?.detail?.code === 'user_banned') {
                 blockAppAccess(error?.detail?.reason);
                 return;
             }
         }
-        const listings = await response.json();
-        
+        if (!result.body) {
+            return;
+        }
+
         // Сохраняем объявления для карты и перерисовываем маркеры с учётом фильтра
-        mapListings = listings || [];
+        mapListings = result.body;
         renderMapMarkers();
     } catch (error) {
         console.error('Ошибка загрузки объявлений:', error);
     }
 }
 
-// Перерисовка маркеров на карте с учётом текущего фильтра
-function renderMapMarkers() {
-    if (!map) return;
+// Popup строится только при открытии — по текущим данным объявления маркера
+function buildMarkerPopup(marker) {
+    const listing = marker._listing;
+    return `
+        <div class="job-popup-content">
+            ${listing.thumb_url ? `<img src="${listing.thumb_url}" alt="" loading="lazy" style="width:100%;max-height:140px;object-fit:cover;border-radius:6px;margin-bottom:6px;">` : ''}
+            <strong>${listing.title}</strong><br>
+            <small>${listing.address}</small><br>
+            <strong>💰 ${listing.payment}</strong><br>
+            <button onclick="window.showListingDetail(${listing.id})" class="job-popup-button">
+                Подробнее
+            </button>
+        </div>
+    `;
+}
 
-    // Удаляем старые маркеры
-    markers.forEach(marker => {
-        map.removeLayer(marker);
-    });
-    markers = [];
+function markerStyle(listing) {
+    return {
+        radius: 9,
+        color: '#fff',
+        weight: 2,
+        fillColor: listing.type === 'task' ? 'red' : WORKER_GREEN,
+        fillOpacity: 1
+    };
+}
 
-    const filtered = mapListings.filter(listing => {
-        if (currentMapFilter === 'task') return listing.type === 'task';
-        if (currentMapFilter === 'worker') return listing.type === 'worker';
-        return true; // all
+function createListingMarker(listing) {
+    const marker = L.circleMarker([listing.latitude, listing.longitude], {
+        ...markerStyle(listing),
+        renderer: markerRenderer
     });
+    marker._listingId = listing.id;
+    marker._listing = listing;
+    marker.bindPopup(buildMarkerPopup, {
+        className: 'job-popup',
+        maxWidth: 260,
+        minWidth: 260,
+        autoPan: true
+    });
+    marker.on('click', () => showListingDetail(marker._listingId));
+    return marker;
+}
 
-    filtered.forEach(listing => {
-        const color = listing.type === 'task' ? 'red' : WORKER_GREEN;
-        const icon = L.divIcon({
-            className: 'custom-marker',
-            html: `<div style="width:18px;height:18px;border-radius:50%;background:${color};border:2px solid #fff;box-shadow:0 0 4px rgba(0,0,0,0.5);"></div>`,
-            iconSize: [18, 18],
-            iconAnchor: [9, 9]
-        });
-
-        const popupContent = `
-            <div class="job-popup-content">
-                <strong>${listing.title}</strong><br>
-                <small>${listing.address}</small><br>
-                <strong>💰 ${listing.payment}</strong><br>
-                <button onclick="window.showListingDetail(${listing.id})" class="job-popup-button">
-                    Подробнее
-                </button>
-            </div>
-        `;
+// Синхронизация маркеров с mapListings и фильтром: добавляются, удаляются и
+// обновляются только изменившиеся, остальные маркеры не трогаются
+function renderMapMarkers() {
+    if (!map || !markerLayer) return;
+    const started = performance.now();
+
+    const visible = new Map();
+    mapListings.forEach(listing => {
+        if (currentMapFilter === 'task' && listing.type !== 'task') return;
+        if (currentMapFilter === 'worker' && listing.type !== 'worker') return;
+        visible.set(listing.id, listing);
+    });
 
-        const marker = L.marker([listing.latitude, listing.longitude], { 
-            icon
-        });
-        
-        // Сохраняем ID объявления в маркере
-        marker._listingId = listing.id;
-        
-        marker.bindPopup(popupContent, {
-            className: 'job-popup',
-            maxWidth: 260,
-            minWidth: 260,
-            autoPan: true
-        })
-            .on('click', () => showListingDetail(listing.id))
-            .addTo(map);
+    markersById.forEach((marker, id) => {
+        if (!visible.has(id)) {
+            markerLayer.removeLayer(marker);
+            markersById.delete(id);
+        }
+    });
 
-        markers.push(marker);
+    visible.forEach((listing, id) => {
+        const marker = markersById.get(id);
+        if (!marker) {
+            const created = createListingMarker(listing);
+            markersById.set(id, created);
+            markerLayer.addLayer(created);
+            return;
+        }
+        const previous = marker._listing;
+        if (previous === listing) return;
+        marker._listing = listing;
+        if (previous.latitude !== listing.latitude || previous.longitude !== listing.longitude) {
+            marker.setLatLng([listing.latitude, listing.longitude]);
+        }
+        if (previous.type !== listing.type) {
+            marker.setStyle(markerStyle(listing));
+        }
+        if (marker.isPopupOpen()) {
+            marker.getPopup().update();
+        }
     });
+
+    if (firstMarkerAt === null && markersById.size > 0) {
+        firstMarkerAt = performance.now();
+    }
+    markerRenderTimes.push(performance.now() - started);
+    if (markerRenderTimes.length > 50) {
+        markerRenderTimes.shift();
+    }
 }
 
+// Для замеров на устройстве (удалённая отладка WebView): время синхронизации маркеров
+window.getMarkerRenderStats = function() {
+    const sorted = [...markerRenderTimes].sort((a, b) => a - b);
+    return {
+        markers: markersById.size,
+        first_marker_ms: firstMarkerAt,
+        renders: sorted.length,
+        median_ms: sorted.length ? sorted[Math.floor(sorted.length / 2)] : null,
+        max_ms: sorted.length ? sorted[sorted.length - 1] : null
+    };
+};
+
 // Показать детали объявления (глобальная функция для popup)
 window.showListingDetail = async function(listingId) {
     try {
@@ -945,20 +1142,24 @@ window.showListingDetail = async function(listingId) {
         const listing = await response.json();
         
         const detailDiv = document.getElementById('listingDetail');
+        const photosHtml = renderListingPhotos(listing.photos);
         
         if (listing.type === 'task') {
             detailDiv.innerHTML = `
                 <h3>🔴 ЗАДАЧА</h3>
+                ${photosHtml}
                 <p><strong>👤 Заказчик:</strong> @${listing.username || 'не указан'}</p>
                 <p><strong>📝 Описание:</strong> ${listing.description}</p>
                 <p><strong>📍 Адрес:</strong> ${listing.address}</p>
                 <p><strong>💰 Оплата:</strong> ${listing.payment}</p>
                 <p><strong>📞 Контакты:</strong> ${listing.contacts}</p>
                 <button class="btn-contact" onclick="contactUser('${listing.contacts}')">Написать заказчику</button>
+                <div id="listingMatches"></div>
             `;
         } else {
             detailDiv.innerHTML = `
                 <h3>🟢 ИЩУ РАБОТУ</h3>
+                ${photosHtml}
                 <p><strong>👤 Исполнитель:</strong> @${listing.username || 'не указан'}</p>
                 <p><strong>🔧 Что умеет:</strong> ${listing.title}</p>
                 <p><strong>📝 Описание:</strong> ${listing.description}</p>
@@ -966,10 +1167,12 @@ window.showListingDetail = async function(listingId) {
                 <p><strong>💸 Оплата:</strong> ${listing.payment}</p>
                 <p><strong>📞 Контакты:</strong> ${listing.contacts}</p>
                 <button class="btn-contact" onclick="contactUser('${listing.contacts}')">Написать исполнителю</button>
+                <div id="listingMatches"></div>
             `;
         }
         
         document.getElementById('detailModal').classList.add('active');
+        loadListingMatches(listing);
         
         // Центрируем карту на объявлении
     if (map) {
@@ -981,6 +1184,51 @@ window.showListingDetail = async function(listingId) {
     }
 };
 
+// Подходящие пары из готового списка сервера: исполнители для задачи, задачи для исполнителя
+async function loadListingMatches(listing) {
+    const container = document.getElementById('listingMatches');
+    if (!container) return;
+    try {
+        const response = await fetch(`/api/listings/${listing.id}/matches?limit=5`, {
+            headers: buildApiHeaders()
+        });
+        if (!response.ok) return;
+        const { items } = await response.json();
+        // Пока ответ шёл, могли открыть другое объявление
+        if (!items.length || document.getElementById('listingMatches') !== container) return;
+        container.innerHTML = `
+            <h4 style="margin-top: 16px;">${listing.type === 'task' ? 'Подходящие исполнители' : 'Подходящие задачи'}</h4>
+            ${items.map(item => `
+                <div class="listing-item" style="cursor: pointer;" onclick="showListingDetail(${item.id})">
+                    <strong>${item.title}</strong>
+                    <p>📍 ${item.address} · ${item.distance_km} км</p>
+                    <p>💰 ${item.payment}</p>
+                </div>
+            `).join('')}
+        `;
+    } catch (error) {
+        console.warn('Не удалось загрузить подходящие объявления:', error);
+    }
+}
+
+// Галерея фото в карточке объявления: WebP с запасным JPEG-превью
+function renderListingPhotos(photos) {
+    if (!photos || photos.length === 0) return '';
+    return `
+        <div style="display: flex; gap: 8px; overflow-x: auto; margin: 8px 0;">
+            ${photos.map(photo => `
+                <a href="${photo.url}" target="_blank" rel="noopener">
+                    <picture>
+                        <source srcset="${photo.url}" type="image/webp">
+                        <img src="${photo.thumb_jpeg_url}" alt="" loading="lazy"
+                             style="height: 160px; border-radius: 8px; object-fit: cover;">
+                    </picture>
+                </a>
+            `).join('')}
+        </div>
+    `;
+}
+
 // Также создаём обычную функцию для совместимости
 async function showListingDetail(listingId) {
     return window.showListingDetail(listingId);
@@ -1008,17 +1256,20 @@ async function showMyListings() {
     if (!ensureTermsAcceptedUI()) return;
     
     try {
-        const response = await fetch('/api/listings/my', {
-            headers: buildApiHeaders()
-        });
-        if (response.status === 428) {
-            termsState.accepted = false;
-            await checkTermsGate();
-            return;
+        let listings = preloadedMyListings;
+        preloadedMyListings = null;
+        if (!listings) {
+            const response = await fetch('/api/listings/my', {
+                headers: buildApiHeaders()
+            });
+            if (response.status === 428) {
+                termsState.accepted = false;
+                await checkTermsGate();
+                return;
+            }
+            listings = await response.json();
         }
         
-        const listings = await response.json();
-        
         const tasks = listings.filter(l => l.type === 'task');
         const workers = listings.filter(l => l.type === 'worker');
         
@@ -1047,18 +1298,50 @@ function renderMyListings(tasks, workers) {
     
     content.innerHTML = listingsToShow.map(listing => `
         <div class="listing-item">
+            ${listing.thumb_url ? `<img src="${listing.thumb_url}" alt="" loading="lazy" style="width: 100%; max-height: 160px; object-fit: cover; border-radius: 8px; margin-bottom: 8px;">` : ''}
             <h4>${listing.title}</h4>
             <p>📍 ${listing.address}</p>
             <p>💰 ${listing.payment}</p>
+            <p>👁 Просмотров: ${listing.views || 0}</p>
             <p style="margin-top: 8px; color: #999; font-size: 12px;">${listing.description.substring(0, 100)}...</p>
             <div style="margin-top: 10px; display: flex; gap: 8px; flex-wrap: wrap;">
                 <button class="btn-remove" onclick="editListing(${listing.id}, '${listing.type}')">Редактировать</button>
                 <button class="btn-remove" onclick="removeListing(${listing.id})">Снять</button>
+                <label class="btn-remove" style="cursor: pointer;">
+                    Добавить фото
+                    <input type="file" accept="image/*" style="display: none;" onchange="uploadListingPhoto(${listing.id}, this)">
+                </label>
             </div>
         </div>
     `).join('');
 }
 
+// Загрузить фото к своему объявлению
+window.uploadListingPhoto = async function(listingId, input) {
+    const file = input.files && input.files[0];
+    if (!file) return;
+    const form = new FormData();
+    form.append('file', file);
+    try {
+        const response = await fetch(`/api/listings/${listingId}/photos`, {
+            method: 'POST',
+            headers: buildApiHeaders(),
+            body: form
+        });
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({}));
+            alert(error.detail || 'Не удалось загрузить фото');
+            return;
+        }
+        await showMyListings();
+    } catch (error) {
+        console.error('Ошибка загрузки фото:', error);
+        alert('Не удалось загрузить фото');
+    } finally {
+        input.value = '';
+    }
+};
+
 // Открыть объявление в режиме редактирования
 window.editListing = function(listingId, type) {
     const isTask = type === 'task';
@@ -1153,24 +1436,6 @@ async function removeListing(listingId) {
     }
 }
 
-// Глобальные переменные для доски объявлений
-let allListings = [];
-let currentBoardTab = 'tasks';
-
-// Показать доску объявлений
-async function showBoard() {
-    try {
-        const response = await fetch('/api/listings');
-        allListings = await response.json();
-        
-        document.getElementById('boardModal').classList.add('active');
-        applyFilters();
-    } catch (error) {
-        console.error('Ошибка загрузки объявлений:', error);
-        alert('Не удалось загрузить объявления');
-    }
-}
-
 // Быстрый фильтр маркеров на карте (полоска фильтров)
 function setMapFilter(filter, element) {
     currentMapFilter = filter;
@@ -1213,81 +1478,6 @@ function initMapFilters() {
 
 }
 
-// Переключение вкладок доски
-function switchBoardTab(tab) {
-    currentBoardTab = tab;
-    document.querySelectorAll('#boardModal .tab').forEach(t => t.classList.remove('active'));
-    event.target.classList.add('active');
-    applyFilters();
-}
-
-// Применение фильтров
-function applyFilters() {
-    const searchText = document.getElementById('filterSearch').value.toLowerCase();
-    const minPayment = parseFloat(document.getElementById('filterMinPayment').value) || 0;
-    const paymentType = document.getElementById('filterPaymentType').value;
-    
-    let filtered = allListings.filter(listing => {
-        // Фильтр по типу
-        if (currentBoardTab === 'tasks' && listing.type !== 'task') return false;
-        if (currentBoardTab === 'workers' && listing.type !== 'worker') return false;
-        
-        // Фильтр по поисковому запросу
-        if (searchText && !listing.title.toLowerCase().includes(searchText) && 
-            !listing.description.toLowerCase().includes(searchText)) {
-            return false;
-        }
-        
-        // Фильтр по оплате
-        if (minPayment > 0 || paymentType) {
-            const payment = listing.payment || '';
-            const paymentLower = payment.toLowerCase();
-            
-            // Извлекаем число из строки оплаты
-            const paymentMatch = payment.match(/(\d+\.?\d*)/);
-            const paymentAmount = paymentMatch ? parseFloat(paymentMatch[1]) : 0;
-            
-            if (minPayment > 0 && paymentAmount < minPayment) return false;
-            
-            if (paymentType && !paymentLower.includes(paymentType.toLowerCase())) return false;
-        }
-        
-        return true;
-    });
-    
-    renderBoardListings(filtered);
-}
-
-// Рендер списка объявлений на доске
-function renderBoardListings(listings) {
-    const container = document.getElementById('boardListings');
-    
-    if (listings.length === 0) {
-        container.innerHTML = '<p style="text-align: center; color: #999; padding: 20px;">Нет объявлений</p>';
-        return;
-    }
-    
-    container.innerHTML = listings.map(listing => {
-        const typeClass = listing.type === 'task' ? 'task' : 'worker';
-        const typeEmoji = listing.type === 'task' ? '🔴' : '🟢';
-        const typeText = listing.type === 'task' ? 'Ищут исполнителя' : 'Ищут работу';
-        
-        return `
-            <div class="listing-card" onclick="showListingDetail(${listing.id})">
-                <div class="listing-card-header">
-                    <span class="listing-card-type ${typeClass}">${typeEmoji} ${typeText}</span>
-                </div>
-                <div class="listing-card-title">${listing.title}</div>
-                <div class="listing-card-info">📍 ${listing.address}</div>
-                <div class="listing-card-info">💰 ${listing.payment}</div>
-                <div class="listing-card-info" style="margin-top: 8px; color: #999; font-size: 12px;">
-                    ${listing.description.substring(0, 100)}${listing.description.length > 100 ? '...' : ''}
-                </div>
-            </div>
-        `;
-    }).join('');
-}
-
 // ====== Стили карты (светлая/тёмная) ======
 
 // Применение стиля карты
@@ -0,0 +1,136 @@
+// Оконный список карточек доски: в DOM только карточки в видимой области
+// и запас overscan сверху и снизу, остальные занимают место высотой контейнера.
+// Высоты карточек разные — до первого показа берётся оценка, потом замер.
+class VirtualList {
+    constructor(container, { renderItem, estimateHeight = 180, gap = 12, overscan = 800, onNearEnd = null }) {
+        this.container = container;
+        this.renderItem = renderItem;
+        this.estimateHeight = estimateHeight;
+        this.gap = gap;
+        this.overscan = overscan;
+        this.onNearEnd = onNearEnd;
+
+        this.items = [];
+        this.heights = [];
+        this.offsets = [0];        // offsets[i] — верх i-й карточки, offsets[n] — высота списка
+        this.dirtyFrom = 0;        // с какого индекса offsets надо пересчитать
+        this.rendered = new Map(); // индекс -> элемент
+        this.frame = null;
+        this.width = container.clientWidth;
+
+        container.style.position = 'relative';
+        container.style.display = 'block';
+
+        this.schedule = this.schedule.bind(this);
+        window.addEventListener('scroll', this.schedule, { passive: true });
+        window.addEventListener('resize', () => {
+            if (this.container.clientWidth !== this.width) {
+                // Ширина изменилась — прежние замеры высот недействительны
+                this.width = this.container.clientWidth;
+                this.heights = this.items.map(() => this.estimateHeight);
+                this.dirtyFrom = 0;
+            }
+            this.schedule();
+        });
+    }
+
+    setItems(items) {
+        this.rendered.forEach(element => element.remove());
+        this.rendered.clear();
+        this.items = items.slice();
+        this.heights = this.items.map(() => this.estimateHeight);
+        this.dirtyFrom = 0;
+        this.update();
+    }
+
+    appendItems(items) {
+        if (!items.length) return;
+        this.dirtyFrom = Math.min(this.dirtyFrom, this.items.length);
+        items.forEach(item => {
+            this.items.push(item);
+            this.heights.push(this.estimateHeight);
+        });
+        this.schedule();
+    }
+
+    schedule() {
+        if (this.frame !== null) return;
+        this.frame = requestAnimationFrame(() => {
+            this.frame = null;
+            this.update();
+        });
+    }
+
+    recomputeOffsets() {
+        const count = this.items.length;
+        if (this.dirtyFrom > count) return;
+        this.offsets.length = count + 1;
+        for (let i = this.dirtyFrom; i < count; i++) {
+            this.offsets[i + 1] = this.offsets[i] + this.heights[i] + this.gap;
+        }
+        this.dirtyFrom = count + 1;
+        this.container.style.height = `${Math.max(0, this.offsets[count] - (count ? this.gap : 0))}px`;
+    }
+
+    // Первая карточка, нижний край которой ниже top
+    indexAt(top) {
+        let low = 0;
+        let high = this.items.length;
+        while (low < high) {
+            const middle = (low + high) >> 1;
+            if (this.offsets[middle + 1] <= top) {
+                low = middle + 1;
+            } else {
+                high = middle;
+            }
+        }
+        return low;
+    }
+
+    update() {
+        this.recomputeOffsets();
+        const viewTop = -this.container.getBoundingClientRect().top;
+        const start = this.indexAt(viewTop - this.overscan);
+        const end = Math.min(this.items.length, this.indexAt(viewTop + window.innerHeight + this.overscan) + 1);
+
+        this.rendered.forEach((element, index) => {
+            if (index < start || index >= end) {
+                element.remove();
+                this.rendered.delete(index);
+            }
+        });
+
+        const created = [];
+        for (let i = start; i < end; i++) {
+            if (this.rendered.has(i)) continue;
+            const template = document.createElement('template');
+            template.innerHTML = this.renderItem(this.items[i]).trim();
+            const element = template.content.firstElementChild;
+            element.style.position = 'absolute';
+            element.style.left = '0';
+            element.style.right = '0';
+            this.container.appendChild(element);
+            this.rendered.set(i, element);
+            created.push(i);
+        }
+
+        // Замер новых карточек; если оценка не совпала — сдвигаем всё ниже них
+        created.forEach(index => {
+            const height = this.rendered.get(index).offsetHeight;
+            if (height !== this.heights[index]) {
+                this.heights[index] = height;
+                this.dirtyFrom = Math.min(this.dirtyFrom, index);
+            }
+        });
+        this.recomputeOffsets();
+        this.rendered.forEach((element, index) => {
+            element.style.transform = `translateY(${this.offsets[index]}px)`;
+        });
+
+        if (this.onNearEnd && end >= this.items.length - 5) {
+            this.onNearEnd();
+        }
+    }
+}
+
+window.VirtualList = VirtualList;
@@ -0,0 +1,229 @@
+// Клиентский слой данных Mini App: ответы API хранятся в IndexedDB вместе с ETag.
+// Экран рисуется сразу из сохранённого ответа, затем запрос перепроверяется
+// через If-None-Match (304 — данные не менялись). Создание и правка объявлений
+// без сети попадают в очередь outbox и отправляются, когда сеть вернётся.
+// Запись в очереди принадлежит пользователю Telegram, который её создал, и
+// несёт Idempotency-Key: повтор запроса, ответ на который потерялся, не
+// создаёт второе объявление.
+// Статика страниц кэшируется service worker'ом (/sw.js, файл frontend/sw.js).
+const DataStore = (() => {
+    const DB_NAME = 'minsk_jobs';
+    const DB_VERSION = 1;
+    const RESPONSES = 'responses'; // ключ -> { etag, body, storedAt }
+    const OUTBOX = 'outbox';       // { id, owner, method, url, body, idempotencyKey, createdAt }
+    const MAX_RESPONSES = 50;
+
+    let dbPromise = null;
+
+    function openDb() {
+        if (!('indexedDB' in window)) {
+            return Promise.resolve(null);
+        }
+        if (!dbPromise) {
+            dbPromise = new Promise(resolve => {
+                const request = indexedDB.open(DB_NAME, DB_VERSION);
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    if (!db.objectStoreNames.contains(RESPONSES)) {
+                        db.createObjectStore(RESPONSES);
+                    }
+                    if (!db.objectStoreNames.contains(OUTBOX)) {
+                        db.createObjectStore(OUTBOX, { keyPath: 'id', autoIncrement: true });
+                    }
+                };
+                request.onsuccess = () => resolve(request.result);
+                // Приватный режим или запрет хранилища: работаем без кэша
+                request.onerror = () => resolve(null);
+            });
+        }
+        return dbPromise;
+    }
+
+    async function withStore(name, mode, action) {
+        const db = await openDb();
+        if (!db) return null;
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction(name, mode);
+            const result = action(transaction.objectStore(name));
+            transaction.oncomplete = () => resolve(result && 'result' in result ? result.result : result);
+            transaction.onerror = () => reject(transaction.error);
+        });
+    }
+
+    async function readCached(key) {
+        try {
+            return await withStore(RESPONSES, 'readonly', store => store.get(key)) || null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    async function writeCached(key, etag, body) {
+        try {
+            await withStore(RESPONSES, 'readwrite', store => store.put({ etag, body, storedAt: Date.now() }, key));
+            await pruneResponses();
+        } catch (error) {
+            console.warn('Не удалось сохранить ответ в IndexedDB:', error);
+        }
+    }
+
+    // Хранилище не растёт бесконечно: самые старые ответы удаляются
+    async function pruneResponses() {
+        const entries = [];
+        await withStore(RESPONSES, 'readonly', store => {
+            store.openCursor().onsuccess = event => {
+                const cursor = event.target.result;
+                if (!cursor) return;
+                entries.push([cursor.key, cursor.value.storedAt]);
+                cursor.continue();
+            };
+        });
+        if (entries.length <= MAX_RESPONSES) return;
+        entries.sort((a, b) => a[1] - b[1]);
+        const stale = entries.slice(0, entries.length - MAX_RESPONSES);
+        await withStore(RESPONSES, 'readwrite', store => stale.forEach(([key]) => store.delete(key)));
+    }
+
+    // Запрос с If-None-Match по сохранённому ETag.
+    // Возвращает { status, body, changed, response }: при 304 body — из кэша.
+    async function revalidate(key, url, options = {}) {
+        const cached = await readCached(key);
+        const headers = { ...(options.headers || {}) };
+        if (cached && cached.etag) {
+            headers['If-None-Match'] = cached.etag;
+        }
+        const response = await fetch(url, { ...options, headers });
+        if (response.status === 304 && cached) {
+            return { status: 304, body: cached.body, changed: false, response };
+        }
+        if (!response.ok) {
+            return { status: response.status, body: null, changed: false, response };
+        }
+        const body = await response.json();
+        const etag = response.headers.get('ETag');
+        if (etag) {
+            await writeCached(key, etag, body);
+        }
+        return { status: response.status, body, changed: true, response };
+    }
+
+    // Stale-while-revalidate: сразу отдаёт сохранённый ответ (если он есть),
+    // а свежий передаёт в onFresh, только если он отличается от сохранённого.
+    // Без кэша ждёт сеть. Возвращает { body, fromCache, revalidation }.
+    async function staleWhileRevalidate(key, url, { headers = {}, onFresh = null, onError = null } = {}) {
+        const cached = await readCached(key);
+        const revalidation = revalidate(key, url, { headers }).then(result => {
+            if (result.changed && cached && onFresh) {
+                onFresh(result.body, result);
+            } else if (!result.changed && result.status !== 304 && onError) {
+                onError(result);
+            }
+            return result;
+        });
+        if (cached) {
+            revalidation.catch(error => console.warn(`Перепроверка ${url} не удалась:`, error));
+            return { body: cached.body, fromCache: true, revalidation };
+        }
+        const result = await revalidation;
+        return { body: result.body, fromCache: false, revalidation, result };
+    }
+
+    function isNetworkError(error) {
+        return error instanceof TypeError || !navigator.onLine;
+    }
+
+    function newIdempotencyKey() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        const bytes = new Uint8Array(16);
+        crypto.getRandomValues(bytes);
+        return Array.from(bytes, byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function queueWrite(owner, method, url, body, idempotencyKey) {
+        await withStore(OUTBOX, 'readwrite', store => store.add({
+            owner, method, url, body, idempotencyKey, createdAt: Date.now()
+        }));
+    }
+
+    async function allWrites() {
+        try {
+            return await withStore(OUTBOX, 'readonly', store => store.getAll()) || [];
+        } catch (error) {
+            return [];
+        }
+    }
+
+    async function pendingWrites(owner) {
+        return (await allWrites()).filter(write => write.owner === owner);
+    }
+
+    // Отправка очереди пользователя owner по порядку; записи других пользователей
+    // этого устройства ждут их входа. Сетевая ошибка останавливает отправку до
+    // следующей попытки; ответ сервера с ошибкой (4xx) снимает запись из очереди.
+    // Возвращает { sent, rejected: [{ write, status, detail }] }.
+    let flushing = null;
+    function flushOutbox(owner, getHeaders) {
+        if (flushing) return flushing;
+        flushing = (async () => {
+            const report = { sent: 0, rejected: [] };
+            const writes = await allWrites();
+            // Записи старого формата без владельца и ключа отправить безопасно нельзя
+            const orphaned = writes.filter(write => !write.owner || !write.idempotencyKey);
+            if (orphaned.length) {
+                await withStore(OUTBOX, 'readwrite', store => orphaned.forEach(write => store.delete(write.id)));
+            }
+            for (const write of writes.filter(write => write.owner === owner && write.idempotencyKey)) {
+                let response;
+                try {
+                    response = await fetch(write.url, {
+                        method: write.method,
+                        headers: getHeaders({
+                            'Content-Type': 'application/json',
+                            'Idempotency-Key': write.idempotencyKey
+                        }),
+                        body: JSON.stringify(write.body)
+                    });
+                } catch (error) {
+                    break;
+                }
+                if (response.status >= 500 || response.status === 429) {
+                    break;
+                }
+                if (response.ok) {
+                    report.sent += 1;
+                } else {
+                    const error = await response.json().catch(() => ({}));
+                    report.rejected.push({ write, status: response.status, detail: error.detail });
+                }
+                await withStore(OUTBOX, 'readwrite', store => store.delete(write.id));
+            }
+            return report;
+        })().finally(() => {
+            flushing = null;
+        });
+        return flushing;
+    }
+
+    function registerServiceWorker() {
+        if (!('serviceWorker' in navigator)) return;
+        navigator.serviceWorker.register('/sw.js').catch(error => {
+            console.warn('Service worker не зарегистрирован:', error);
+        });
+    }
+
+    return {
+        readCached,
+        revalidate,
+        staleWhileRevalidate,
+        isNetworkError,
+        newIdempotencyKey,
+        queueWrite,
+        pendingWrites,
+        flushOutbox,
+        registerServiceWorker
+    };
+})();
+
+window.DataStore = DataStore;
@@ -0,0 +1,113 @@
+// Service worker Mini App: оболочка страниц и статика отдаются из Cache Storage
+// сразу и обновляются в фоне (stale-while-revalidate), тайлы — из кэша с
+// ограничением числа. Запросы /api не перехватываются: их кэширует
+// frontend/data_store.js в IndexedDB с перепроверкой по ETag.
+// Отдаётся по /sw.js, чтобы область действия охватывала / и /board.html.
+const SHELL_CACHE = 'shell-v1';
+const TILE_CACHE = 'tiles-v1';
+const MAX_TILES = 600;
+
+const SHELL_URLS = [
+    '/',
+    '/board.html',
+    '/static/app.js',
+    '/static/board_list.js',
+    '/static/data_store.js',
+    'https://unpkg.com/leaflet@1.9.4/dist/leaflet.css',
+    'https://unpkg.com/leaflet@1.9.4/dist/leaflet.js',
+    'https://telegram.org/js/telegram-web-app.js'
+];
+const SHELL_PAGES = ['/', '/board.html'];
+
+// Leaflet подключается с crossorigin (SRI) — его нужно кэшировать CORS-ответом,
+// скрипт Telegram — без него, непрозрачным ответом
+function shellRequest(url) {
+    if (url.startsWith('/')) return new Request(url);
+    return new Request(url, { mode: url.startsWith('https://unpkg.com/') ? 'cors' : 'no-cors' });
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(SHELL_CACHE).then(cache => Promise.all(
+            // Одна недоступная ссылка не должна срывать установку
+            // (cache.add отвергает непрозрачные ответы, поэтому fetch + put)
+            SHELL_URLS.map(url => {
+                const request = shellRequest(url);
+                return fetch(request).then(response => cache.put(request, response)).catch(() => {});
+            })
+        )).then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(
+                keys.filter(key => key !== SHELL_CACHE && key !== TILE_CACHE).map(key => caches.delete(key))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+async function staleWhileRevalidate(event, cacheKey) {
+    const cache = await caches.open(SHELL_CACHE);
+    const cached = await cache.match(cacheKey);
+    const network = fetch(event.request)
+        .then(response => {
+            if (response.ok || response.type === 'opaque') {
+                cache.put(cacheKey, response.clone());
+            }
+            return response;
+        });
+    if (cached) {
+        event.waitUntil(network.catch(() => {}));
+        return cached;
+    }
+    return network;
+}
+
+async function trimTiles(cache) {
+    const keys = await cache.keys();
+    // Cache Storage хранит ключи в порядке добавления: удаляем самые старые
+    for (let i = 0; i < keys.length - MAX_TILES; i++) {
+        await cache.delete(keys[i]);
+    }
+}
+
+async function cacheFirstTile(event) {
+    const cache = await caches.open(TILE_CACHE);
+    const cached = await cache.match(event.request);
+    if (cached) return cached;
+    const response = await fetch(event.request);
+    if (response.ok) {
+        await cache.put(event.request, response.clone());
+        event.waitUntil(trimTiles(cache));
+    }
+    return response;
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (url.origin === self.location.origin) {
+        if (url.pathname.startsWith('/tiles/')) {
+            event.respondWith(cacheFirstTile(event));
+            return;
+        }
+        if (request.mode === 'navigate' && SHELL_PAGES.includes(url.pathname)) {
+            // Параметры (?show=...) не плодят копии оболочки
+            event.respondWith(staleWhileRevalidate(event, url.pathname));
+            return;
+        }
+        if (url.pathname.startsWith('/static/')) {
+            event.respondWith(staleWhileRevalidate(event, request));
+        }
+        return;
+    }
+
+    if (SHELL_URLS.includes(request.url)) {
+        event.respondWith(staleWhileRevalidate(event, request));
+    }
+});
@@ -0,0 +1,40 @@
+"""
+Общие фикстуры: отдельная база SQLite во временном каталоге.
+
+DATABASE_URL задаётся до импорта backend — database.py создаёт engine при импорте.
+"""
+
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="minsk_jobs_tests_")
+os.environ["DB_TYPE"] = "sqlite"
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/tests.db"
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123:tests")
+
+import pytest
+
+from backend import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+from backend.database import Base, SessionLocal, engine
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def make_user(db):
+    def make(telegram_id: int, **fields) -> models.User:
+        user = models.User(telegram_id=telegram_id, username=f"user{telegram_id}", **fields)
+        db.add(user)
+        db.commit()
+        return user
+
+    return make
@@ -0,0 +1,46 @@
+import asyncio
+
+from backend import routes
+
+
+def _search(db, admin, search):
+    return asyncio.run(
+        routes.admin_list_users(
+            search=search, is_banned=None, role=None, cursor=None, page_size=50, user=admin, db=db
+        )
+    )
+
+
+def test_telegram_id_prefix_search(db, make_user):
+    routes.admin_user_count_cache.invalidate()
+    admin = make_user(1, role="admin")
+    make_user(123456789)
+    make_user(123999)
+    make_user(555)
+
+    result = _search(db, admin, "123")
+
+    assert sorted(item["telegram_id"] for item in result["items"]) == [123999, 123456789]
+
+
+def test_overlong_numeric_search_is_not_an_id_range(db, make_user):
+    routes.admin_user_count_cache.invalidate()
+    admin = make_user(1, role="admin")
+    make_user(123456789)
+
+    for term in ("12345678901234567890123", "١٢٣"):
+        result = _search(db, admin, term)
+        assert result["items"] == []
+        assert result["total"] == 0
+
+
+def test_cached_exact_count_is_not_reported_as_estimate(db, make_user):
+    routes.admin_user_count_cache.invalidate()
+    admin = make_user(1, role="admin")
+    make_user(2)
+
+    first = _search(db, admin, None)
+    cached = _search(db, admin, None)
+
+    assert (first["total"], first["total_is_estimate"]) == (2, False)
+    assert (cached["total"], cached["total_is_estimate"]) == (2, False)
@@ -0,0 +1,74 @@
+import asyncio
+
+from backend.alerts import AlertDispatcher, SubscriptionEntry, SubscriptionMatcher
+
+LISTING = {
+    "id": 1,
+    "user_id": None,
+    "type": "task",
+    "title": "Выгулять собаку",
+    "description": "Утром и вечером",
+    "payment": "20 руб",
+    "address": "Минск",
+    "latitude": 53.9,
+    "longitude": 27.56,
+}
+
+
+class FakeSender:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+
+    def send_message(self, chat_id: int, text: str) -> bool:
+        if chat_id in self.failing:
+            return False
+        self.sent.append(chat_id)
+        return True
+
+
+def _dispatcher(sender, chat_ids, **options) -> AlertDispatcher:
+    matcher = SubscriptionMatcher()
+    for chat_id in chat_ids:
+        matcher.add(
+            SubscriptionEntry(id=chat_id, user_id=chat_id, chat_id=chat_id, latitude=53.9, longitude=27.56, radius_km=5.0)
+        )
+    return AlertDispatcher(matcher=matcher, sender=sender, **options)
+
+
+def _flush(dispatcher, listing_id: int) -> int:
+    dispatcher.enqueue({**LISTING, "id": listing_id})
+    return asyncio.run(dispatcher.flush())
+
+
+def test_user_limit_counts_delivered_messages():
+    sender = FakeSender()
+    dispatcher = _dispatcher(sender, [10], user_limit=2)
+
+    delivered = [_flush(dispatcher, listing_id) for listing_id in range(1, 5)]
+
+    assert delivered == [1, 1, 0, 0]
+    assert sender.sent == [10, 10]
+
+
+def test_failed_send_does_not_use_up_the_limit():
+    sender = FakeSender(failing={10})
+    dispatcher = _dispatcher(sender, [10], user_limit=1)
+
+    assert _flush(dispatcher, 1) == 0
+    assert 10 not in dispatcher._sent_at
+
+    sender.failing.clear()
+    assert _flush(dispatcher, 2) == 1
+
+
+def test_chats_without_recent_sends_are_evicted():
+    dispatcher = _dispatcher(FakeSender(), [], user_window=60.0)
+    dispatcher.record_sent(10, now=0.0)
+    dispatcher.record_sent(11, now=50.0)
+
+    dispatcher.prune(now=100.0)
+
+    assert list(dispatcher._sent_at) == [11]
+    dispatcher.prune(now=200.0)
+    assert dispatcher._sent_at == {}
@@ -0,0 +1,42 @@
+from sqlalchemy import select, text
+
+from backend import analytics
+from backend.database import engine, normalize_sqlite_timestamps
+from backend.models import AnalyticsRollup
+
+
+def _insert_closed_legacy(db, user_id: int, count: int) -> None:
+    # Закрытые до появления closed_at: время скопировано из created_at, все в одной секунде
+    db.execute(
+        text(
+            "INSERT INTO listings (user_id, type, title, description, address, payment, contacts, "
+            "latitude, longitude, status, created_at, closed_at) VALUES (:user_id, 'task', 't', 'd', 'a', "
+            "'p', 'c', 53.9, 27.56, 'closed', '2026-10-01 09:00:00', '2026-10-01 09:00:00')"
+        ),
+        [{"user_id": user_id} for _ in range(count)],
+    )
+    db.commit()
+
+
+def _closed_total() -> int:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(AnalyticsRollup.value).where(
+                AnalyticsRollup.period == "day",
+                AnalyticsRollup.metric == "listings_closed",
+                AnalyticsRollup.cell == "",
+            )
+        ).scalar() or 0
+
+
+def test_same_second_closed_rows_are_counted_once_across_batches(db, make_user, monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_BATCH_SIZE", 3)
+    user = make_user(801)
+    _insert_closed_legacy(db, user.id, 8)
+    normalize_sqlite_timestamps(db.connection(), "listings", ("closed_at",))
+    db.commit()
+
+    analytics.refresh_analytics()
+    analytics.refresh_analytics()
+
+    assert _closed_total() == 8
@@ -0,0 +1,78 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from backend import lifecycle, photos, routes
+from backend.models import Listing, ListingArchive, ListingPhoto
+
+
+def _listing(db, user_id: int, closed_at) -> Listing:
+    listing = Listing(
+        user_id=user_id, type="task", title="t", description="d", address="a", payment="p", contacts="c",
+        latitude=53.9, longitude=27.56, status="closed" if closed_at else "active", closed_at=closed_at,
+    )
+    db.add(listing)
+    db.commit()
+    return listing
+
+
+def _photo(db, listing: Listing, digest: str, position: int = 0) -> None:
+    db.add(
+        ListingPhoto(
+            listing_id=listing.id, user_id=listing.user_id, digest=digest, width=10, height=10, position=position
+        )
+    )
+    db.commit()
+    for variant, ext in photos.PHOTO_VARIANTS:
+        path = photos.photo_path(f"{digest}_{variant}.{ext}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+
+
+def _files(digest: str) -> list[bool]:
+    return [os.path.exists(photos.photo_path(f"{digest}_{variant}.{ext}")) for variant, ext in photos.PHOTO_VARIANTS]
+
+
+def test_archiving_removes_photo_rows_and_unshared_files(db, make_user, monkeypatch, tmp_path):
+    monkeypatch.setattr(photos, "PHOTOS_DIR", str(tmp_path))
+    user = make_user(901)
+    long_ago = datetime.now(timezone.utc) - timedelta(days=60)
+    archived = _listing(db, user.id, long_ago)
+    active = _listing(db, user.id, None)
+    own, shared = "a" * 64, "b" * 64
+    _photo(db, archived, own)
+    _photo(db, archived, shared, position=1)
+    _photo(db, active, shared)
+    archived_id, active_id = archived.id, active.id
+
+    assert lifecycle.archive_closed_listings(after_days=30) == 1
+
+    db.expire_all()
+    assert db.get(ListingArchive, archived_id) is not None
+    rows = db.execute(select(ListingPhoto.listing_id, ListingPhoto.digest)).all()
+    assert [tuple(row) for row in rows] == [(active_id, shared)]
+    assert _files(own) == [False, False, False]
+    assert _files(shared) == [True, True, True]
+
+
+def test_deleting_a_photo_removes_files_no_other_photo_uses(db, make_user, monkeypatch, tmp_path):
+    monkeypatch.setattr(photos, "PHOTOS_DIR", str(tmp_path))
+    user = make_user(902)
+    first, second = _listing(db, user.id, None), _listing(db, user.id, None)
+    own, shared = "c" * 64, "d" * 64
+    _photo(db, first, own)
+    _photo(db, first, shared, position=1)
+    _photo(db, second, shared)
+    own_id, shared_id = (
+        db.execute(select(ListingPhoto.id).where(ListingPhoto.listing_id == first.id).order_by(ListingPhoto.position))
+        .scalars()
+        .all()
+    )
+
+    asyncio.run(routes.delete_listing_photo(first.id, own_id, user=user, db=db))
+    asyncio.run(routes.delete_listing_photo(first.id, shared_id, user=user, db=db))
+
+    assert _files(own) == [False, False, False]
+    assert _files(shared) == [True, True, True]
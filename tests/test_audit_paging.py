@@ -0,0 +1,72 @@
+import asyncio
+
+from sqlalchemy import text
+
+from backend import routes
+from backend.database import normalize_sqlite_timestamps
+
+
+def _insert_legacy_rows(db, admin_id: int, count: int) -> None:
+    # Старые строки: created_at из CURRENT_TIMESTAMP, без микросекунд, все в одной секунде
+    db.execute(
+        text(
+            "INSERT INTO admin_audit_logs (admin_user_id, action, created_at) "
+            "VALUES (:admin, 'ban_user', '2026-10-19 12:00:00')"
+        ),
+        [{"admin": admin_id} for _ in range(count)],
+    )
+    db.commit()
+    normalize_sqlite_timestamps(db.connection(), "admin_audit_logs", ("created_at",))
+    db.commit()
+
+
+def _page(db, admin, cursor):
+    return asyncio.run(
+        routes.admin_get_audit(
+            limit=2, cursor=cursor, admin_user_id=None, target_user_id=None, action=None,
+            since=None, until=None, admin_user=admin, db=db,
+        )
+    )
+
+
+def test_pages_through_same_second_legacy_rows_once(db, make_user):
+    admin = make_user(1, role="admin")
+    _insert_legacy_rows(db, admin.id, 7)
+
+    seen, cursor = [], None
+    for _ in range(10):
+        page = _page(db, admin, cursor)
+        seen.extend(item.id for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert cursor is None
+    assert seen == sorted(seen, reverse=True)
+    assert len(seen) == len(set(seen)) == 7
+
+
+def test_export_finishes_on_same_second_legacy_rows(db, make_user, monkeypatch):
+    monkeypatch.setattr(routes, "AUDIT_EXPORT_CHUNK_SIZE", 3)
+    admin = make_user(1, role="admin")
+    _insert_legacy_rows(db, admin.id, 10)
+
+    chunks = list(routes._iter_audit_export([], "ndjson"))
+
+    lines = [line for chunk in chunks for line in chunk.splitlines()]
+    assert len(lines) == 10
+
+
+def test_normalize_keeps_microsecond_values(db, make_user):
+    admin = make_user(1, role="admin")
+    db.execute(
+        text(
+            "INSERT INTO admin_audit_logs (admin_user_id, action, created_at) "
+            "VALUES (:admin, 'ban_user', '2026-10-19 12:00:00.123456')"
+        ),
+        {"admin": admin.id},
+    )
+    db.commit()
+
+    assert normalize_sqlite_timestamps(db.connection(), "admin_audit_logs", ("created_at",)) == 0
+    assert db.execute(text("SELECT created_at FROM admin_audit_logs")).scalar() == "2026-10-19 12:00:00.123456"
@@ -0,0 +1,32 @@
+from sqlalchemy import func, select
+
+from backend.audit import AuditWriter, audit_row
+from backend.models import AdminAuditLog
+
+
+def _count(db) -> int:
+    return db.execute(select(func.count()).select_from(AdminAuditLog)).scalar()
+
+
+def test_flush_drops_unwritable_rows_and_keeps_the_rest(db, make_user):
+    admin = make_user(1001, role="admin")
+    writer = AuditWriter(flush_interval=0.01, attempts=2)
+    writer.submit([
+        audit_row(admin.id, "ban_user", details={"reason": "spam"}),
+        audit_row(admin.id, "ban_user", details={"bad": object()}),
+        audit_row(admin.id, "unban_user"),
+    ])
+
+    assert writer.flush() == 2
+    assert _count(db) == 2
+    assert writer._queue.empty()
+
+
+def test_background_writer_does_not_requeue_a_failing_batch(db, make_user):
+    admin = make_user(1002, role="admin")
+    writer = AuditWriter(flush_interval=0.01, attempts=2)
+    writer.start()
+    writer.submit([audit_row(admin.id, "ban_user", details={"bad": object()}), audit_row(admin.id, "unban_user")])
+
+    assert writer.stop() == 0
+    assert _count(db) == 1
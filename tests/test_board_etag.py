@@ -0,0 +1,37 @@
+from fastapi.testclient import TestClient
+
+from backend import routes
+from backend.main import app
+from backend.models import Listing
+
+
+def _add_listing(db, user_id: int, title: str) -> None:
+    db.add(
+        Listing(
+            user_id=user_id, type="task", title=title, description="d", address="Минск", payment="20 BYN",
+            contacts="c", latitude=53.9, longitude=27.56, status="active",
+        )
+    )
+    db.commit()
+
+
+def test_board_etag_comes_from_the_feed_the_page_was_built_from(db, make_user):
+    routes._invalidate_listing_feed("listing_changed", None)
+    client = TestClient(app)
+    user = make_user(1301)
+    _add_listing(db, user.id, "Первое")
+    first = client.get("/api/listings/board")
+    assert [item["title"] for item in first.json()["items"]] == ["Первое"]
+
+    # Лента уже новая, а индекс доски ещё от старой версии
+    _add_listing(db, user.id, "Второе")
+    routes.listing_feed_cache.invalidate()
+    stale = client.get("/api/listings/board")
+    assert stale.json()["items"] == first.json()["items"]
+    assert stale.headers["ETag"] == first.headers["ETag"]
+
+    routes._invalidate_listing_feed("listing_changed", None)
+    fresh = client.get("/api/listings/board", headers={"If-None-Match": first.headers["ETag"]})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != first.headers["ETag"]
+    assert len(fresh.json()["items"]) == 2
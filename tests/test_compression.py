@@ -0,0 +1,92 @@
+import asyncio
+import gzip
+
+from backend import compression
+from backend.compression import CompressionMiddleware, PrecompressedBody, negotiate, precompressed_response
+
+
+def test_negotiation_follows_q_values():
+    assert negotiate(None) is None
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=1.0, br;q=0") == "gzip"
+    assert negotiate("deflate, *;q=0.5") == compression.SUPPORTED_ENCODINGS[0]
+    assert negotiate("*;q=0") is None
+    assert negotiate("identity;q=0") is None
+    assert negotiate("gzip;q=0, identity;q=0") is None
+    if "br" in compression.SUPPORTED_ENCODINGS:
+        assert negotiate("gzip;q=0.8, br;q=0.9") == "br"
+        assert negotiate("gzip;q=0.9, br;q=0.8") == "gzip"
+
+
+def _run(app, accept_encoding: str) -> tuple[dict, bytes]:
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(CompressionMiddleware(app)(scope, receive, send))
+    headers = {key.decode(): value.decode() for key, value in messages[0]["headers"]}
+    return headers, b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def _json_app(body: bytes):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    return app
+
+
+def _count_threads(monkeypatch) -> list:
+    calls = []
+    real_to_thread = asyncio.to_thread
+
+    async def to_thread(func, *args):
+        calls.append(func)
+        return await real_to_thread(func, *args)
+
+    monkeypatch.setattr(compression.asyncio, "to_thread", to_thread)
+    return calls
+
+
+def test_identity_only_client_gets_the_body_as_is():
+    body = b'{"items": "' + b"x" * 5000 + b'"}'
+    headers, received = _run(_json_app(body), "identity;q=1, gzip;q=0")
+    assert "content-encoding" not in headers
+    assert received == body
+
+
+def test_large_bodies_are_compressed_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(compression, "COMPRESSION_THREAD_MIN_SIZE", 4096)
+    calls = _count_threads(monkeypatch)
+
+    small = b'{"items": "' + b"x" * 2000 + b'"}'
+    headers, received = _run(_json_app(small), "gzip")
+    assert headers["content-encoding"] == "gzip" and gzip.decompress(received) == small
+    assert calls == []
+
+    large = b'{"items": "' + b"x" * 50000 + b'"}'
+    headers, received = _run(_json_app(large), "gzip")
+    assert gzip.decompress(received) == large
+    assert headers["content-length"] == str(len(received))
+    assert calls == [compression.compress]
+
+
+def test_first_compression_of_a_cached_body_runs_in_a_thread(monkeypatch):
+    monkeypatch.setattr(compression, "COMPRESSION_THREAD_MIN_SIZE", 4096)
+    calls = _count_threads(monkeypatch)
+    body = PrecompressedBody(b"[" + b'"listing",' * 5000 + b'"end"]')
+
+    first = asyncio.run(precompressed_response(body, "gzip"))
+    second = asyncio.run(precompressed_response(body, "gzip"))
+
+    assert first.body == second.body and gzip.decompress(first.body) == body.body
+    assert len(calls) == 1
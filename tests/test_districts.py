@@ -0,0 +1,55 @@
+import asyncio
+
+from backend import routes
+from backend.districts import district_for, in_service_area
+from backend.models import Listing
+from backend.schemas import ListingCreate
+
+
+def _listing(latitude: float, longitude: float) -> ListingCreate:
+    return ListingCreate(
+        type="task",
+        title="Перевезти диван",
+        description="Нужна помощь с переездом",
+        address="Минск",
+        payment="40 руб",
+        contacts="@owner",
+        latitude=latitude,
+        longitude=longitude,
+    )
+
+
+def test_point_outside_districts_but_inside_service_area_is_accepted(db, make_user):
+    user = make_user(701)
+    # Боровляны: за МКАД и за встроенными границами районов, но в зоне обслуживания
+    latitude, longitude = 54.005, 27.68
+    assert district_for(latitude, longitude) is None
+    assert in_service_area(latitude, longitude)
+
+    created = asyncio.run(
+        routes.create_listing(listing=_listing(latitude, longitude), idempotency_key=None, user=user, db=db)
+    )
+
+    assert db.query(Listing.district_id).filter(Listing.id == created["id"]).scalar() is None
+
+
+def test_point_in_city_centre_gets_a_district(db, make_user):
+    user = make_user(702)
+
+    created = asyncio.run(
+        routes.create_listing(listing=_listing(53.8935, 27.5476), idempotency_key=None, user=user, db=db)
+    )
+
+    assert db.query(Listing.district_id).filter(Listing.id == created["id"]).scalar() is not None
+
+
+def test_point_far_from_minsk_is_rejected(db, make_user):
+    user = make_user(703)
+
+    try:
+        asyncio.run(routes.create_listing(listing=_listing(52.43, 31.0), idempotency_key=None, user=user, db=db))
+    except routes.HTTPException as e:
+        assert e.status_code == 400
+        assert e.detail["code"] == "outside_service_area"
+    else:
+        raise AssertionError("Гомель не в зоне обслуживания")
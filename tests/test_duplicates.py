@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from backend import routes, similarity
+from backend.models import ListingSignature
+from backend.schemas import ListingCreate
+
+TITLE = "Собрать шкаф-купе в спальне"
+DESCRIPTION = "Нужно собрать шкаф-купе из трёх секций, двери зеркальные, инструмент есть, подъезд без лифта"
+OTHER_TITLE = "Выгулять собаку утром"
+OTHER_DESCRIPTION = "Нужно выгуливать спокойного лабрадора по утрам в парке Челюскинцев"
+
+
+def _listing(title=TITLE, description=DESCRIPTION):
+    return ListingCreate(
+        type="task",
+        title=title,
+        description=description,
+        address="Минск, ул. Сурганова, 10",
+        payment="60 руб",
+        contacts="@owner",
+        latitude=53.92,
+        longitude=27.59,
+    )
+
+
+def _create(db, user, listing):
+    return asyncio.run(routes.create_listing(listing=listing, idempotency_key=None, user=user, db=db))
+
+
+def test_short_text_has_no_signature():
+    assert similarity.minhash("Шкаф", "Собрать") is None
+
+
+def test_near_copy_shares_a_bucket_and_scores_high():
+    original = similarity.minhash(TITLE, DESCRIPTION)
+    copy = similarity.minhash(TITLE, DESCRIPTION.replace("трёх", "четырёх"))
+    other = similarity.minhash(OTHER_TITLE, OTHER_DESCRIPTION)
+
+    assert similarity.similarity(original, copy) >= similarity.DUPLICATE_MIN_SIMILARITY
+    assert set(similarity.buckets(original)) & set(similarity.buckets(copy))
+    assert similarity.similarity(original, other) < similarity.DUPLICATE_MIN_SIMILARITY
+    assert similarity.unpack(similarity.pack(original)) == original
+
+
+def test_flag_mode_records_the_nearest_copy(db, make_user, monkeypatch):
+    monkeypatch.setattr(similarity, "DUPLICATE_MODE", "flag")
+    user = make_user(701)
+    first = _create(db, user, _listing())
+    second = _create(db, user, _listing(description=DESCRIPTION.replace("трёх", "четырёх")))
+
+    row = db.get(ListingSignature, second["id"])
+    assert row.duplicate_of == first["id"]
+    assert row.similarity >= similarity.DUPLICATE_MIN_SIMILARITY
+    assert db.get(ListingSignature, first["id"]).duplicate_of is None
+    # Собственное объявление при редактировании копией себя не считается
+    assert similarity.find_duplicates(db, similarity.minhash(TITLE, DESCRIPTION), exclude_id=first["id"]) == [
+        (second["id"], row.similarity)
+    ]
+
+
+def test_reject_mode_returns_409(db, make_user, monkeypatch):
+    monkeypatch.setattr(similarity, "DUPLICATE_MODE", "reject")
+    user = make_user(702)
+    first = _create(db, user, _listing())
+
+    with pytest.raises(HTTPException) as error:
+        _create(db, user, _listing())
+
+    assert error.value.status_code == 409
+    assert error.value.detail["duplicate_of"] == first["id"]
+
+
+def test_unrelated_listing_is_not_flagged(db, make_user, monkeypatch):
+    monkeypatch.setattr(similarity, "DUPLICATE_MODE", "flag")
+    user = make_user(703)
+    _create(db, user, _listing())
+    other = _create(db, user, _listing(OTHER_TITLE, OTHER_DESCRIPTION))
+
+    assert db.get(ListingSignature, other["id"]).duplicate_of is None
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from backend import lifecycle, routes
+from backend.models import Listing, ListingIdempotencyKey
+from backend.schemas import ListingCreate
+
+LISTING = ListingCreate(
+    type="task",
+    title="Собрать шкаф",
+    description="Нужно собрать шкаф-купе",
+    address="Минск, ул. Сурганова, 10",
+    payment="60 руб",
+    contacts="@owner",
+    latitude=53.92,
+    longitude=27.59,
+)
+
+
+def _create(db, user, key):
+    return asyncio.run(routes.create_listing(listing=LISTING, idempotency_key=key, user=user, db=db))
+
+
+def test_replay_with_same_key_returns_the_created_listing(db, make_user):
+    user = make_user(601)
+
+    first = _create(db, user, "queued-write-1")
+    replay = _create(db, user, "queued-write-1")
+
+    assert replay == first
+    assert db.query(Listing).count() == 1
+
+
+def test_key_is_scoped_to_the_user(db, make_user):
+    first_user, second_user = make_user(602), make_user(603)
+
+    first = _create(db, first_user, "same-key")
+    second = _create(db, second_user, "same-key")
+
+    assert second["id"] != first["id"]
+    assert db.query(Listing).count() == 2
+
+
+def test_requests_without_key_are_not_deduplicated(db, make_user):
+    user = make_user(604)
+
+    _create(db, user, None)
+    _create(db, user, None)
+
+    assert db.query(Listing).count() == 2
+
+
+def test_expired_keys_are_purged(db, make_user):
+    user = make_user(605)
+    _create(db, user, "old")
+    db.query(ListingIdempotencyKey).update({"expires_at": datetime.now(timezone.utc) - timedelta(hours=1)})
+    db.commit()
+
+    assert lifecycle.purge_idempotency_keys() == 1
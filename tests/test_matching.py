@@ -0,0 +1,85 @@
+import threading
+
+from backend import matching
+from backend.matching import MatchIndex, MatchingEngine
+
+
+def _row(listing_id: int, listing_type: str, user_id: int, title: str, latitude: float = 53.9) -> dict:
+    return {
+        "id": listing_id, "user_id": user_id, "type": listing_type, "title": title,
+        "description": "Переезд, грузчики, сборка мебели", "address": "Минск", "payment": "30 BYN",
+        "latitude": latitude, "longitude": 27.56, "created_at": None,
+    }
+
+
+def _index() -> MatchIndex:
+    index = MatchIndex(top_k=2, spare=1)
+    index.upsert(_row(1, "task", 100, "Помочь с переездом"))
+    for worker_id, offset in ((11, 0.0), (12, 0.002), (13, 0.004), (14, 0.006)):
+        index.upsert(_row(worker_id, "worker", worker_id, "Грузчик, переезд", latitude=53.9 + offset))
+    return index
+
+
+def _ids(index: MatchIndex, listing_id: int) -> list[int]:
+    return [item["id"] for item in index.matches(listing_id, 10)]
+
+
+def test_closed_listing_is_replaced_from_the_spare_without_recompute():
+    index = _index()
+    assert _ids(index, 1) == [11, 12]
+
+    index.remove(11)
+
+    assert _ids(index, 1) == [12, 13]
+    assert index.recomputes == 0
+
+
+def test_list_is_recomputed_once_the_spare_runs_out():
+    index = _index()
+    index.remove(11)
+    index.remove(12)
+
+    assert _ids(index, 1) == [13, 14]
+    assert index.recomputes == 1
+
+
+def test_first_load_is_retried_until_it_succeeds(monkeypatch):
+    monkeypatch.setattr(matching, "UPDATE_RETRY_SECONDS", 0.01)
+    engine = MatchingEngine(MatchIndex())
+    attempts = []
+
+    def load():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("database is not ready")
+        engine.ready = True
+        return 0
+
+    monkeypatch.setattr(engine, "load", load)
+    assert engine._load_until_ready()
+    assert engine.ready and len(attempts) == 3
+
+
+def test_failed_refresh_keeps_listing_ids_pending(monkeypatch):
+    monkeypatch.setattr(matching, "UPDATE_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(matching, "MATCHING_ENABLED", True)
+    engine = MatchingEngine(MatchIndex())
+    refreshed = []
+    done = threading.Event()
+
+    def refresh(listing_ids):
+        if not refreshed:
+            refreshed.append(None)
+            raise RuntimeError("connection lost")
+        refreshed.append(list(listing_ids))
+        done.set()
+
+    monkeypatch.setattr(engine, "load", lambda: 0)
+    monkeypatch.setattr(engine, "refresh", refresh)
+    engine.on_listing_changed("listing_changed", "5")
+    engine.start()
+    try:
+        assert done.wait(5)
+    finally:
+        engine.stop()
+    assert refreshed == [None, [5]]
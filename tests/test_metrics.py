@@ -0,0 +1,45 @@
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from backend import metrics
+from backend.cache import TTLCache
+from backend.database import engine
+
+
+def test_failed_statement_does_not_skew_later_timings(db):
+    stats = metrics.RequestStats()
+    token = metrics.begin_request_stats(stats)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            assert stats.active_statement is None
+            conn.rollback()
+            time.sleep(0.05)
+            started = time.perf_counter()
+            conn.execute(text("SELECT 1"))
+            wall = time.perf_counter() - started
+            assert "metrics_query_start" not in conn.info
+    finally:
+        metrics.end_request_stats(token)
+
+    assert stats.statements == 1
+    # С парой «старт от упавшего выражения» время включало бы паузу выше
+    assert stats.db_time <= wall
+
+
+def test_cache_hit_and_miss_counters_are_exposed_as_counters():
+    cache = TTLCache("metrics_test", ttl=60.0, maxsize=4)
+    cache.get("missing")
+    cache.set("key", 1)
+    cache.get("key")
+
+    rendered = "\n".join(line for metric in metrics.REGISTRY for line in metric.render())
+
+    assert "# TYPE cache_hits_total counter" in rendered
+    assert "# TYPE cache_misses_total counter" in rendered
+    assert 'cache_hits_total{cache="metrics_test"} 1' in rendered
+    assert 'cache_misses_total{cache="metrics_test"} 1' in rendered
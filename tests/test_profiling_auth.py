@@ -0,0 +1,33 @@
+import os
+
+from bench.initdata import mint_init_data
+from backend import routes
+from backend.models import User
+
+
+def _init_data(telegram_id: int, username: str = "someone") -> str:
+    return mint_init_data(os.environ["TELEGRAM_BOT_TOKEN"], telegram_id, username)
+
+
+def test_admin_check_is_read_only(db, make_user, monkeypatch):
+    published = []
+    monkeypatch.setattr(routes, "publish", lambda *args: published.append(args))
+    make_user(1401, role="admin")
+    make_user(1402)
+
+    assert routes.is_admin_init_data(_init_data(1401, "renamed_admin"))
+    assert not routes.is_admin_init_data(_init_data(1402, "renamed_user"))
+    assert not routes.is_admin_init_data(_init_data(1403))
+
+    db.expire_all()
+    assert db.query(User).count() == 2
+    assert db.query(User.username).filter(User.telegram_id == 1402).scalar() == "user1402"
+    assert published == []
+
+
+def test_forged_or_banned_init_data_is_not_admin(db, make_user):
+    make_user(1404, role="admin", is_banned=True)
+    make_user(1405, role="admin")
+
+    assert not routes.is_admin_init_data(_init_data(1404))
+    assert not routes.is_admin_init_data(_init_data(1405) + "0")
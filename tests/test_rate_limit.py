@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import pytest
+
+from backend import ratelimit
+from backend.ratelimit import DatabaseBackend, MemoryBackend, RateLimitMiddleware, RateLimitRule
+
+CHECK = [("write:ip:10.0.0.1", 3, 60.0)]
+
+
+@pytest.fixture(params=["memory", "database"])
+def backend(request):
+    if request.param == "memory":
+        return MemoryBackend()
+    request.getfixturevalue("db")
+    return DatabaseBackend()
+
+
+def test_limit_holds_across_the_window_boundary(backend):
+    assert [backend.hit(CHECK, now) for now in (600.0, 605.0, 610.0)] == [0.0, 0.0, 0.0]
+    # Четвёртый в том же окне ждёт, пока окно закончится
+    assert backend.hit(CHECK, 615.0) == pytest.approx(45.0)
+    # Через секунду после границы предыдущее окно весит 3 · 59/60 — место для одного запроса есть
+    assert backend.hit(CHECK, 661.0) == 0.0
+    wait = backend.hit(CHECK, 662.0)
+    assert wait == pytest.approx(18.0)
+    # Отклонённые не засчитываются: после Retry-After (с запасом, как в middleware) запрос проходит
+    assert backend.hit(CHECK, 662.0 + int(wait) + 1) == 0.0
+
+
+def test_rejected_request_does_not_count_against_any_key(backend):
+    checks = CHECK + [("write:user:7", 10, 60.0)]
+    for now in (600.0, 601.0, 602.0):
+        assert backend.hit(checks, now) == 0.0
+    assert backend.hit(checks, 603.0) > 0
+    # Ключ пользователя в отклонённом запросе не увеличился: 3 из 10
+    for now in (604.0, 605.0, 606.0, 607.0, 608.0, 609.0, 610.0):
+        assert backend.hit([("write:user:7", 10, 60.0)], now) == 0.0
+    assert backend.hit([("write:user:7", 10, 60.0)], 611.0) > 0
+
+
+def _post(middleware, ip: str = "10.0.0.1") -> tuple[int, dict, dict]:
+    scope = {"type": "http", "method": "POST", "path": "/api/listings", "headers": [], "client": (ip, 5000)}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    headers = {key.decode(): value.decode() for key, value in messages[0].get("headers", [])}
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return messages[0]["status"], headers, json.loads(body) if body else {}
+
+
+def test_middleware_answers_429_with_retry_after(monkeypatch):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    monkeypatch.setitem(ratelimit._EXACT_ROUTES, ("POST", "/api/listings"), RateLimitRule("write", None, (2, 60.0)))
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "_backend", MemoryBackend())
+    clock = iter([600.0, 601.0, 602.0, 662.0])
+    monkeypatch.setattr(ratelimit.time, "time", lambda: next(clock))
+    middleware = RateLimitMiddleware(app, identify=lambda init_data: None)
+
+    assert _post(middleware)[0] == 201
+    assert _post(middleware)[0] == 201
+    status, headers, body = _post(middleware)
+    assert status == 429
+    assert headers["retry-after"] == "59"
+    assert body["detail"]["retry_after"] == 59
+    # Другой адрес считается отдельно
+    assert _post(middleware, ip="10.0.0.2")[0] == 201
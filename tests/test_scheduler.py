@@ -0,0 +1,87 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+
+from backend import lifecycle
+from backend.alerts import AlertDispatcher
+from backend.database import engine
+from backend.models import Listing, SchedulerLease
+from backend.scheduler import LeaderLease, Scheduler
+
+
+class FakeSender:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id: int, text: str) -> bool:
+        self.sent.append(chat_id)
+        return True
+
+
+def _lease_holder() -> str:
+    with engine.connect() as conn:
+        return conn.execute(select(SchedulerLease.holder)).scalar()
+
+
+def test_lease_is_renewed_while_a_long_job_runs(db):
+    scheduler = Scheduler(LeaderLease("test", ttl=0.3, holder="first"))
+    rival = LeaderLease("test", ttl=0.3, holder="second")
+    rival_won = []
+
+    def long_job() -> int:
+        for _ in range(8):
+            time.sleep(0.1)
+            rival_won.append(rival.try_acquire())
+        return 1
+
+    scheduler.add_job("long", 3600, long_job)
+    assert asyncio.run(scheduler.run_pending()) == {"long": 1}
+    assert not any(rival_won)
+    assert _lease_holder() == "first"
+
+
+def test_jobs_stop_once_the_lease_is_taken(db):
+    scheduler = Scheduler(LeaderLease("test", ttl=0.3, holder="first"))
+    ran = []
+
+    def steal() -> int:
+        ran.append("steal")
+        with engine.begin() as conn:
+            conn.execute(
+                update(SchedulerLease).values(holder="second", expires_at=datetime.now(timezone.utc) + timedelta(hours=1))
+            )
+        return 0
+
+    scheduler.add_job("steal", 3600, steal)
+    scheduler.add_job("next", 3600, lambda: ran.append("next") or 0)
+    asyncio.run(scheduler.run_pending())
+
+    assert ran == ["steal"]
+    assert not scheduler.is_leader
+
+
+def test_expiry_notices_go_through_the_dispatcher_limit(db, make_user, monkeypatch):
+    sender = FakeSender()
+    dispatcher = AlertDispatcher(sender=sender, user_limit=1, user_window=3600)
+    monkeypatch.setattr(lifecycle, "alert_dispatcher", dispatcher)
+    owner = make_user(1201)
+    created = datetime.now(timezone.utc) - timedelta(days=60)
+    db.add_all([
+        Listing(
+            user_id=owner.id, type="task", title=f"t{i}", description="d", address="a", payment="p",
+            contacts="c", latitude=53.9, longitude=27.56, status="active", created_at=created,
+        )
+        for i in range(2)
+    ])
+    db.commit()
+
+    assert lifecycle.expire_listings(ttl_days=30) == 2
+    assert sender.sent == []
+
+    dispatcher.record_sent(owner.telegram_id)
+    assert asyncio.run(dispatcher.flush()) == 0
+    dispatcher._sent_at.clear()
+    assert asyncio.run(dispatcher.flush()) == 1
+    assert sender.sent == [owner.telegram_id]
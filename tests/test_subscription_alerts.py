@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+
+from backend.alerts import AlertDispatcher
+from backend.invalidation import InvalidationBus
+from backend.models import Subscription
+
+LISTING = {
+    "id": 100,
+    "user_id": None,
+    "type": "task",
+    "title": "Помыть окна",
+    "description": "Нужно помыть окна в квартире",
+    "payment": "50 руб",
+    "address": "Минск, пр. Независимости, 1",
+    "latitude": 53.9,
+    "longitude": 27.56,
+}
+
+
+def _other_worker() -> tuple[InvalidationBus, AlertDispatcher]:
+    """Диспетчер другого воркера: события приходят к нему только через транспорт шины"""
+    bus = InvalidationBus(transport=None)
+    dispatcher = AlertDispatcher()
+    bus.subscribe("subscription_changed", dispatcher.on_user_changed)
+    bus.subscribe("user_changed", dispatcher.on_user_changed)
+    return bus, dispatcher
+
+
+def _deliver(bus: InvalidationBus, dispatcher: AlertDispatcher, event: str, key) -> None:
+    bus._deliver(json.dumps({"o": "another-worker", "e": event, "k": None if key is None else str(key), "t": time.time()}))
+    assert dispatcher.wait_reloaded(5)
+
+
+def _subscribe(db, user, **fields) -> Subscription:
+    subscription = Subscription(
+        user_id=user.id, latitude=53.9, longitude=27.56, radius_km=3.0, is_active=True, **fields
+    )
+    db.add(subscription)
+    db.commit()
+    return subscription
+
+
+def _recipients(dispatcher: AlertDispatcher) -> list[int]:
+    return [chat_id for chat_id, _ in dispatcher.build_batch([LISTING])]
+
+
+def test_other_worker_picks_up_new_and_deleted_subscription(db, make_user):
+    bus, dispatcher = _other_worker()
+    user = make_user(501)
+    subscription = _subscribe(db, user, keyword="окна")
+    assert _recipients(dispatcher) == []
+
+    _deliver(bus, dispatcher, "subscription_changed", user.id)
+    assert _recipients(dispatcher) == [501]
+
+    subscription.is_active = False
+    db.commit()
+    _deliver(bus, dispatcher, "subscription_changed", user.id)
+    assert _recipients(dispatcher) == []
+
+
+def test_ban_and_unban_reach_other_worker(db, make_user):
+    bus, dispatcher = _other_worker()
+    user = make_user(502)
+    _subscribe(db, user)
+    dispatcher.load(db)
+    assert _recipients(dispatcher) == [502]
+
+    user.is_banned = True
+    db.commit()
+    _deliver(bus, dispatcher, "user_changed", user.id)
+    assert _recipients(dispatcher) == []
+
+    user.is_banned = False
+    db.commit()
+    _deliver(bus, dispatcher, "user_changed", user.id)
+    assert _recipients(dispatcher) == [502]
+
+
+def test_event_without_key_reloads_everything(db, make_user):
+    bus, dispatcher = _other_worker()
+    first, second = make_user(503), make_user(504)
+    _subscribe(db, first)
+    _subscribe(db, second)
+    dispatcher.load(db)
+
+    second.is_banned = True
+    db.commit()
+    _deliver(bus, dispatcher, "user_changed", None)
+    assert _recipients(dispatcher) == [503]
+
+
+def test_matcher_filters_keyword_type_and_radius(db, make_user):
+    _, dispatcher = _other_worker()
+    user = make_user(505)
+    _subscribe(db, user, keyword="окна", type="task")
+    _subscribe(db, make_user(506), keyword="ремонт")
+    _subscribe(db, make_user(507), type="worker")
+    far = Subscription(user_id=make_user(508).id, latitude=53.5, longitude=27.0, radius_km=3.0, is_active=True)
+    db.add(far)
+    db.commit()
+    dispatcher.load(db)
+
+    assert _recipients(dispatcher) == [505]
+    # Автор объявления уведомлений о нём не получает
+    assert dispatcher.build_batch([{**LISTING, "id": 101, "user_id": user.id}]) == []
+
+
+def test_bus_subscriber_does_not_touch_the_database(db, make_user, monkeypatch):
+    bus, dispatcher = _other_worker()
+    user = make_user(509)
+    _subscribe(db, user)
+    loads = []
+    monkeypatch.setattr(dispatcher, "load_user", lambda session, user_id: loads.append(user_id))
+    release = threading.Event()
+    original = dispatcher._reload_pending
+    monkeypatch.setattr(dispatcher, "_reload_pending", lambda: (release.wait(5), original()))
+
+    for _ in range(3):
+        bus._dispatch("user_changed", str(user.id))
+    assert loads == []
+
+    release.set()
+    assert dispatcher.wait_reloaded(5)
+    assert loads == [user.id]
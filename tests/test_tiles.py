@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from backend import tiles
+from backend.tiles import MINSK_BBOX, TileCache, TileError, TileKey, TileProxy, parse_tile, tiles_for_bbox
+
+
+def test_minsk_tiles_are_accepted_at_every_zoom():
+    for zoom in (7, 12, 17):
+        x, y = tiles_for_bbox(MINSK_BBOX, zoom)[0]
+        assert parse_tile("light", zoom, x, f"{y}.png") == TileKey("light", zoom, x, y)
+
+
+def test_tiles_far_from_minsk_are_rejected_above_the_open_zoom():
+    paris_x, paris_y = tiles_for_bbox((48.85, 2.35, 48.86, 2.36), 14)[0]
+    with pytest.raises(TileError) as error:
+        parse_tile("osm", 14, paris_x, str(paris_y))
+    assert error.value.status_code == 403
+
+    world_x, world_y = tiles_for_bbox((48.85, 2.35, 48.86, 2.36), tiles.TILE_OPEN_MAX_ZOOM)[0]
+    assert parse_tile("osm", tiles.TILE_OPEN_MAX_ZOOM, world_x, str(world_y)).z == tiles.TILE_OPEN_MAX_ZOOM
+
+
+def test_first_lookup_loads_the_cache_in_a_thread(tmp_path, monkeypatch):
+    cache = TileCache(root=str(tmp_path))
+    key = TileKey("light", 12, *tiles_for_bbox(MINSK_BBOX, 12)[0])
+    path = tmp_path / key.relative_path
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"png")
+    threads = []
+    real_to_thread = asyncio.to_thread
+
+    async def to_thread(func, *args):
+        threads.append(getattr(func, "__name__", func))
+        return await real_to_thread(func, *args)
+
+    monkeypatch.setattr(tiles.asyncio, "to_thread", to_thread)
+    assert asyncio.run(TileProxy(cache).get(key)) == str(path)
+    assert threads == ["ensure_loaded"]
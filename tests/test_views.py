@@ -0,0 +1,74 @@
+import asyncio
+import math
+import os
+from datetime import datetime, timedelta, timezone
+
+from bench.initdata import mint_init_data
+from backend import routes, stats
+from backend.models import Listing, ListingStats
+from backend.stats import ViewCounter, popularity, views_score
+
+
+def _listing(db, user_id: int) -> Listing:
+    listing = Listing(
+        user_id=user_id, type="task", title="t", description="d", address="a", payment="p", contacts="c",
+        latitude=53.9, longitude=27.56, status="active",
+    )
+    db.add(listing)
+    db.commit()
+    return listing
+
+
+def test_viewer_is_counted_once_per_window(monkeypatch):
+    counter = ViewCounter()
+
+    assert counter.record_view(7, viewer_id=1)
+    assert not counter.record_view(7, viewer_id=1)
+    assert counter.record_view(7, viewer_id=2)
+    assert counter.record_view(8, viewer_id=1)
+
+    assert counter.pending(7) == 2
+    assert counter.pending(8) == 1
+
+
+def test_only_authenticated_non_owner_views_are_counted(db, make_user, monkeypatch):
+    counter = ViewCounter()
+    monkeypatch.setattr(routes, "view_counter", counter)
+    owner, viewer = make_user(1101), make_user(1102)
+    listing = _listing(db, owner.id)
+    init_data = mint_init_data(os.environ["TELEGRAM_BOT_TOKEN"], viewer.telegram_id, viewer.username)
+
+    asyncio.run(routes.get_listing(listing.id, init_data=None, db=db))
+    asyncio.run(routes.record_listing_view(listing.id, user=owner, db=db))
+    for _ in range(5):
+        asyncio.run(routes.get_listing(listing.id, init_data=init_data, db=db))
+        asyncio.run(routes.record_listing_view(listing.id, user=viewer, db=db))
+
+    assert counter.pending(listing.id) == 1
+
+
+def test_flush_accumulates_decayed_score_with_logaddexp(db, make_user, monkeypatch):
+    listing = _listing(db, make_user(1103).id)
+    counter = ViewCounter()
+    first = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    second = first + timedelta(hours=stats.POPULARITY_HALF_LIFE_HOURS)
+    for at, views in ((first, 3), (second, 2)):
+        monkeypatch.setattr(stats, "datetime", _frozen(at))
+        counter.record(listing.id, views)
+        assert counter.flush() == 1
+
+    row = db.get(ListingStats, listing.id)
+    assert row.views == 5
+    expected = math.log(math.exp(views_score(3, first) - views_score(2, second)) + 1) + views_score(2, second)
+    assert math.isclose(row.score, expected)
+    # Через период полураспада три первых просмотра весят полтора
+    assert math.isclose(popularity(row.score, second), 3.5)
+
+
+def _frozen(at: datetime):
+    class Frozen(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return at
+
+    return Frozen